@@ -0,0 +1,54 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Run the whole benchmark suite, writing the results as JSON, one line per\
+    benchmark, so that they can be kept and compared across releases.
+
+Run with ``python -m benchmarks``.
+"""
+
+import argparse
+from contextlib import redirect_stdout
+import importlib
+import sys
+
+#: The benchmark modules, in the order they are run
+BENCHMARKS = (
+    "bench_event_loop", "bench_framing", "bench_async", "bench_udp_batch",
+    "bench_topology", "bench_metrics", "bench_chain", "bench_bulk",
+    "bench_compression", "bench_arq", "bench_fec", "bench_striping",
+    "bench_coalesce")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--count", type=int, default=5000,
+                        help="number of packets to time per measurement")
+    parser.add_argument("--output", type=argparse.FileType("a"),
+                        default=sys.stdout, metavar="FILE",
+                        help="file to append the results to")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS,
+                        help="run just this benchmark (may be repeated)")
+    args = parser.parse_args(args)
+    for name in args.only or BENCHMARKS:
+        sys.stderr.write("running {}\n".format(name))
+        module = importlib.import_module("." + name, __package__)
+        with redirect_stdout(args.output):
+            module.main(["--json", "--count", str(args.count)])
+        args.output.flush()
+
+
+if __name__ == "__main__":
+    main()
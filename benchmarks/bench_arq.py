@@ -0,0 +1,121 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" SCP round trips to a simulated board across a delayed, lossy link,\
+    through a TCP tunnel and through a reliable UDP tunnel.
+
+SCP ``READ`` requests of 256 bytes, with a window of them outstanding, go
+through a proxy client and server, tunnelled either over TCP (``-T``),
+whose connection crosses an :py:class:`~.ImpairedTCPRelay`, or over the
+reliable UDP tunnel (``--sdp-via-arq``), whose datagrams cross an
+:py:class:`~.ImpairedUDPtoUDP`. A TCP tunnel holds up everything behind a
+lost packet until it is resent; the reliable UDP tunnel only delays the
+lost one.
+
+Run with ``python -m benchmarks.bench_arq``.
+"""
+
+import time
+
+from spinnaker_proxy.arq import ARQtoUDP, UDPtoARQ
+from spinnaker_proxy.bulk import MAX_TRANSFER, SCP_READ, scp_transfer
+from spinnaker_proxy.impairment import (
+    Impairment, ImpairedTCPRelay, ImpairedUDPtoUDP)
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP
+from spinnaker_proxy.support import udp_socket
+from .common import ProxyProcess, parse_arguments, report
+from .fake_board import FakeBoard, scp_sequence
+
+#: The loss rates of the link to measure across
+LOSSES = (0.0, 0.01, 0.05)
+
+#: The one-way delay of the link, in seconds
+DELAY = 0.005
+
+#: The most SCP requests outstanding at once
+WINDOW = 8
+
+#: How much memory the simulated board has
+MEMORY_SIZE = 1024 * 1024
+
+
+def _tcp_tunnel(board, link):
+    server = TCPtoUDP(0, board.scp_address)
+    impaired = ImpairedTCPRelay(
+        0, ("127.0.0.1", server.tcp_listen_sock.getsockname()[1]),
+        upstream=link, downstream=link)
+    client = UDPtoTCP(
+        0, ("127.0.0.1", impaired.tcp_listen_sock.getsockname()[1]))
+    return server, impaired, client
+
+
+def _arq_tunnel(board, link):
+    server = ARQtoUDP(0, board.scp_address)
+    impaired = ImpairedUDPtoUDP(
+        0, ("127.0.0.1", server.arq_sock.getsockname()[1]),
+        upstream=link, downstream=link)
+    client = UDPtoARQ(0, ("127.0.0.1", impaired.ext_sock.getsockname()[1]))
+    return server, impaired, client
+
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(board, tunnel, loss, count):
+    """ Time reads through a tunnel across the lossy link.
+    """
+    link = Impairment(delay=DELAY, loss=loss, seed=1)
+    server, impaired, client = tunnel(board, link)
+    port = client.udp_sock.getsockname()[1]
+    with ProxyProcess([server]), ProxyProcess([impaired]), \
+            ProxyProcess([client]), \
+            udp_socket(connect_address=("127.0.0.1", port)) as host:
+        host.settimeout(10)
+        sent_at = {}
+        latencies = []
+        sent = 0
+        start = time.perf_counter()
+        while len(latencies) < count:
+            while len(sent_at) < WINDOW and sent < count:
+                seq = sent & 0xFFFF
+                sent_at[seq] = time.perf_counter()
+                host.send(scp_transfer(
+                    SCP_READ, seq, 0, 0, (sent * MAX_TRANSFER) % MEMORY_SIZE,
+                    MAX_TRANSFER))
+                sent += 1
+            seq = scp_sequence(host.recv(65536))
+            latencies.append(time.perf_counter() - sent_at.pop(seq))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"requests_per_s": count / elapsed,
+            "p50_ms": _percentile(latencies, 0.5) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000}
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    with FakeBoard(memory_size=MEMORY_SIZE) as board:
+        for loss in LOSSES:
+            for name, tunnel in (("tcp", _tcp_tunnel), ("arq", _arq_tunnel)):
+                result = {"tunnel": name, "loss_percent": loss * 100}
+                result.update(measure(board, tunnel, loss, args.count))
+                results.append(result)
+    report("arq", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Throughput of the asyncio proxies compared with the event-loop proxies.
+
+Run with ``python -m benchmarks.bench_async``.
+"""
+
+from spinnaker_proxy.async_proxies import (
+    AsyncTCPtoUDP, AsyncUDPtoTCP, AsyncUDPtoUDP)
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP, UDPtoUDP
+from spinnaker_proxy.support import tcp_socket, udp_socket
+from .common import (
+    AsyncProxyProcess, EchoBoard, ProxyProcess, parse_arguments, report,
+    time_windowed)
+
+#: How many round trips may be outstanding at once
+WINDOWS = (1, 8, 32)
+
+#: The size of the datagrams sent
+PAYLOAD = b"x" * 256
+
+
+def _free_tcp_port():
+    with tcp_socket(bind_port=0) as s:
+        return s.getsockname()[1]
+
+
+def _udp_port(proxy):
+    sock = getattr(proxy, "ext_sock", None) or proxy.udp_sock
+    return sock.getsockname()[1]
+
+
+def _chain(engine, transport, board_address):
+    """ Build a client/server proxy pair, returning the client's UDP port and\
+        a context manager to run them.
+    """
+    if engine == "sync":
+        to_udp, from_udp, to_tcp, runner = (
+            UDPtoUDP, TCPtoUDP, UDPtoTCP, ProxyProcess)
+    else:
+        to_udp, from_udp, to_tcp, runner = (
+            AsyncUDPtoUDP, AsyncTCPtoUDP, AsyncUDPtoTCP, AsyncProxyProcess)
+    if transport == "udp":
+        server = to_udp(0, board_address)
+        client = to_udp(0, ("127.0.0.1", _udp_port(server)))
+    else:
+        port = _free_tcp_port()
+        server = from_udp(port, board_address)
+        client = to_tcp(0, ("127.0.0.1", port))
+    return _udp_port(client), runner([server, client])
+
+
+def measure(engine, transport, window, count):
+    with EchoBoard() as board:
+        port, runner = _chain(engine, transport, board.address)
+        with runner:
+            with udp_socket(connect_address=("127.0.0.1", port)) as host:
+                host.settimeout(2)
+
+                def recv():
+                    return host.recv(4096)
+                time_windowed(host.send, recv, 100, PAYLOAD, window)
+                return time_windowed(
+                    host.send, recv, count, PAYLOAD, window)
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    for transport in ("udp", "tcp"):
+        for window in WINDOWS:
+            for engine in ("sync", "asyncio"):
+                results.append({
+                    "engine": engine,
+                    "transport": transport,
+                    "window": window,
+                    "round_trips_per_s": measure(
+                        engine, transport, window, args.count),
+                })
+    report("async", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
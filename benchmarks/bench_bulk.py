@@ -0,0 +1,137 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Reading and writing a simulated board's memory across a delayed link,\
+    by tunnelling each SCP request, and by bulk operations done by the\
+    proxy server.
+
+Per-packet tunnelling sends SCP ``READ`` and ``WRITE`` requests of 256
+bytes through a proxy client and server (``-T``), with a window of them
+outstanding. Bulk operations go from a :py:class:`~.BulkClient` to a
+:py:class:`~.BulkTCPtoUDP`. Either way, the TCP connection crosses an
+:py:class:`~.ImpairedTCPRelay` that delays it in each direction, and
+``--count`` requests' worth of data is moved.
+
+Run with ``python -m benchmarks.bench_bulk``.
+"""
+
+import struct
+import time
+
+from spinnaker_proxy.bulk import (
+    MAX_TRANSFER, SCP_READ, SCP_WRITE, BulkClient, BulkTCPtoUDP, scp_transfer)
+from spinnaker_proxy.impairment import Impairment, ImpairedTCPRelay
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP
+from spinnaker_proxy.support import udp_socket
+from .common import ProxyProcess, parse_arguments, report
+from .fake_board import FakeBoard, scp_sequence
+
+#: The one-way delays of the link to measure across, in seconds
+DELAYS = (0.0, 0.005)
+
+#: The most SCP requests outstanding at once when tunnelling them
+WINDOW = 8
+
+#: How much memory the simulated board has
+MEMORY_SIZE = 16 * 1024 * 1024
+
+
+def _relay(port, delay):
+    """ Make a relay that delays a TCP connection in each direction.
+    """
+    return ImpairedTCPRelay(
+        0, ("127.0.0.1", port), upstream=Impairment(delay=delay),
+        downstream=Impairment(delay=delay))
+
+
+def _transfer_packets(host, command, count):
+    """ Read or write memory one SCP request at a time, with up to\
+        :py:data:`WINDOW` outstanding.
+    """
+    data = bytes(MAX_TRANSFER) if command == SCP_WRITE else b""
+    outstanding = set()
+    sent = received = 0
+    while received < count:
+        while len(outstanding) < WINDOW and sent < count:
+            seq = sent & 0xFFFF
+            outstanding.add(seq)
+            host.send(scp_transfer(
+                command, seq, 0, 0, sent * MAX_TRANSFER, MAX_TRANSFER, data))
+            sent += 1
+        outstanding.discard(scp_sequence(host.recv(65536)))
+        received += 1
+
+
+def measure_packets(board, delay, count):
+    """ Time reads and writes with each SCP request tunnelled.
+    """
+    server = TCPtoUDP(0, board.scp_address)
+    relay = _relay(server.tcp_listen_sock.getsockname()[1], delay)
+    client = UDPtoTCP(
+        0, ("127.0.0.1", relay.tcp_listen_sock.getsockname()[1]))
+    port = client.udp_sock.getsockname()[1]
+    result = {}
+    with ProxyProcess([server]), ProxyProcess([relay]), \
+            ProxyProcess([client]), \
+            udp_socket(connect_address=("127.0.0.1", port)) as host:
+        host.settimeout(5)
+        for name, command in (("read", SCP_READ), ("write", SCP_WRITE)):
+            start = time.perf_counter()
+            _transfer_packets(host, command, count)
+            result[name + "_mb_per_s"] = (
+                count * MAX_TRANSFER / (time.perf_counter() - start) / 1e6)
+    return result
+
+
+def measure_bulk(board, delay, count):
+    """ Time reads and writes done as bulk operations.
+    """
+    server = BulkTCPtoUDP(0, board.scp_address, window=WINDOW)
+    relay = _relay(server.tcp_listen_sock.getsockname()[1], delay)
+    address = ("127.0.0.1", relay.tcp_listen_sock.getsockname()[1])
+    length = count * MAX_TRANSFER
+    result = {}
+    with ProxyProcess([server]), ProxyProcess([relay]):
+        # Give the relay time to start listening
+        time.sleep(0.1)
+        with BulkClient(address) as client:
+            start = time.perf_counter()
+            client.read(0, 0, 0, length)
+            result["read_mb_per_s"] = (
+                length / (time.perf_counter() - start) / 1e6)
+            data = struct.pack("<I", 0xDEADBEEF) * (length // 4)
+            start = time.perf_counter()
+            client.write(0, 0, 0, data)
+            result["write_mb_per_s"] = (
+                length / (time.perf_counter() - start) / 1e6)
+    return result
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    with FakeBoard(memory_size=MEMORY_SIZE) as board:
+        for delay in DELAYS:
+            for name, measure in (("packets", measure_packets),
+                                  ("bulk", measure_bulk)):
+                result = {"mode": name, "delay_ms": delay * 1000,
+                          "bytes": args.count * MAX_TRANSFER}
+                result.update(measure(board, delay, args.count))
+                results.append(result)
+    report("bulk", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" SCP and boot traffic through a proxy client and proxy server to a\
+    simulated board, with each way of tunnelling.
+
+Each transport (``udp``; ``-t``, boot via TCP; ``-T``, SCP via TCP) is
+measured with its own client and server, each in its own process, in front
+of a :py:class:`~.FakeBoard`. SCP is measured as round trips with a window of
+outstanding requests, giving the rate, the latency percentiles and the CPU
+used (by the client and server together) per request; boot as a one-way
+stream of packets, with up to a window of them not yet at the board, giving
+the rate at which they reach it.
+
+Run with ``python -m benchmarks.bench_chain``.
+"""
+
+import time
+
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP, UDPtoUDP
+from spinnaker_proxy.support import udp_socket
+from .common import ProxyProcess, parse_arguments, process_usage, report
+from .fake_board import FakeBoard, scp_request, scp_sequence
+
+#: The ways of tunnelling to compare: (name, SCP via TCP?, boot via TCP?)
+TRANSPORTS = (
+    ("udp", False, False),
+    ("-t", False, True),
+    ("-T", True, False),
+)
+
+#: The sizes of SCP request data to measure with
+SCP_PAYLOADS = (16, 256)
+
+#: The numbers of SCP requests that may be outstanding at once
+WINDOWS = (1, 8, 64)
+
+#: The size of boot packets
+BOOT_PAYLOAD = 1024
+
+#: The SCP command to send (READ)
+COMMAND = 2
+
+#: The most boot packets that may be on their way to the board at once
+BOOT_WINDOW = 64
+
+#: How long to wait for boot packets to arrive before counting those still
+#: on their way as lost, in seconds
+BOOT_TIMEOUT = 0.2
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _tunnel(via_tcp, address):
+    """ Make a server and client proxy pair tunnelling to an address.
+    """
+    if via_tcp:
+        server = TCPtoUDP(0, address)
+        client = UDPtoTCP(
+            0, ("127.0.0.1", server.tcp_listen_sock.getsockname()[1]))
+        return server, client, client.udp_sock.getsockname()[1]
+    server = UDPtoUDP(0, address)
+    client = UDPtoUDP(0, ("127.0.0.1", server.ext_sock.getsockname()[1]))
+    return server, client, client.ext_sock.getsockname()[1]
+
+
+class _Chain(object):
+    """ A fake board, and a proxy server and client in front of it.
+    """
+
+    def __init__(self, scp_via_tcp, boot_via_tcp, service_time):
+        self.board = FakeBoard(service_time)
+        scp_server, scp_client, self.scp_port = _tunnel(
+            scp_via_tcp, self.board.scp_address)
+        boot_server, boot_client, self.boot_port = _tunnel(
+            boot_via_tcp, self.board.boot_address)
+        self.server = ProxyProcess([scp_server, boot_server])
+        self.client = ProxyProcess([scp_client, boot_client])
+
+    def __enter__(self):
+        self.board.__enter__()
+        self.server.__enter__()
+        self.client.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.client.__exit__(exc_type, exc_val, exc_tb)
+        self.server.__exit__(exc_type, exc_val, exc_tb)
+        self.board.__exit__(exc_type, exc_val, exc_tb)
+        return False
+
+    def cpu(self):
+        """ The CPU time used by the proxies so far, in seconds.
+        """
+        return sum(process_usage(p.pid)[1] for p in (self.server, self.client))
+
+
+def measure_scp(chain, payload, window, count):
+    """ Time SCP round trips, with up to ``window`` outstanding.
+    """
+    data = b"x" * payload
+    with udp_socket(connect_address=("127.0.0.1", chain.scp_port)) as host:
+        host.settimeout(5)
+        # Warm up (and, for TCP, let the client see who to answer)
+        host.send(scp_request(COMMAND, 0, data))
+        host.recv(65536)
+
+        sent = {}
+        latencies = []
+        cpu = chain.cpu()
+        start = time.perf_counter()
+        seq = 0
+        while len(latencies) < count:
+            while len(sent) < window and seq < count:
+                seq += 1
+                sent[seq & 0xFFFF] = time.perf_counter()
+                host.send(scp_request(COMMAND, seq & 0xFFFF, data))
+            response = host.recv(65536)
+            latencies.append(
+                time.perf_counter() - sent.pop(scp_sequence(response)))
+        elapsed = time.perf_counter() - start
+        cpu = chain.cpu() - cpu
+    latencies.sort()
+    return {
+        "packets_per_s": count / elapsed,
+        "mb_per_s": count * payload / elapsed / 1e6,
+        "p50_us": _percentile(latencies, 0.5) * 1e6,
+        "p99_us": _percentile(latencies, 0.99) * 1e6,
+        "cpu_us_per_packet": cpu / count * 1e6,
+    }
+
+
+def measure_boot(chain, count):
+    """ Time a stream of boot packets reaching the board, with up to\
+        :py:data:`BOOT_WINDOW` on their way at once.
+    """
+    packet = b"b" * BOOT_PAYLOAD
+    board = chain.board
+    with udp_socket(connect_address=("127.0.0.1", chain.boot_port)) as host:
+        # Packets sent less those received or given up on
+        expected = board.boot_received
+        sent = lost = 0
+        cpu = chain.cpu()
+        start = last_progress = time.perf_counter()
+        while sent < count or board.boot_received < expected + sent - lost:
+            received = board.boot_received
+            outstanding = expected + sent - lost - received
+            now = time.perf_counter()
+            if sent < count and outstanding < BOOT_WINDOW:
+                host.send(packet)
+                sent += 1
+            elif now - last_progress > BOOT_TIMEOUT:
+                lost += outstanding
+                last_progress = now
+            else:
+                time.sleep(0)
+            if board.boot_received != received:
+                last_progress = now
+        elapsed = time.perf_counter() - start
+        cpu = chain.cpu() - cpu
+    delivered = count - lost
+    return {
+        "packets_per_s": delivered / elapsed,
+        "mb_per_s": delivered * BOOT_PAYLOAD / elapsed / 1e6,
+        "lost_pct": 100.0 * lost / count,
+        "cpu_us_per_packet": cpu / max(delivered, 1) * 1e6,
+    }
+
+
+def _add_arguments(parser):
+    parser.add_argument("--service-time", type=float, default=0.0,
+                        metavar="US",
+                        help="microseconds the simulated board takes to "
+                        "answer each SCP request")
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args, _add_arguments)
+    service_time = args.service_time / 1e6
+    scp_results = []
+    boot_results = []
+    for name, scp_via_tcp, boot_via_tcp in TRANSPORTS:
+        with _Chain(scp_via_tcp, boot_via_tcp, service_time) as chain:
+            for payload in SCP_PAYLOADS:
+                for window in WINDOWS:
+                    result = {"transport": name, "payload": payload,
+                              "window": window}
+                    result.update(measure_scp(
+                        chain, payload, window, args.count))
+                    scp_results.append(result)
+            result = {"transport": name, "payload": BOOT_PAYLOAD}
+            result.update(measure_boot(chain, args.count))
+            boot_results.append(result)
+    report("chain_scp", scp_results, args.json)
+    report("chain_boot", boot_results, args.json)
+
+
+if __name__ == "__main__":
+    main()
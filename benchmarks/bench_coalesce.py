@@ -0,0 +1,108 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" SCP round trips and boot streams through TCP tunnels, with and without\
+    their writes coalesced.
+
+Both SCP and boot packets go through TCP tunnels (``-t -T``) between a proxy
+client and server in front of a :py:class:`~.FakeBoard`, writing each
+datagram as it arrives, at the end of each pass of the event loop, or after
+holding it back for up to a delay; measured as by
+:py:mod:`~benchmarks.bench_chain`.
+
+Run with ``python -m benchmarks.bench_coalesce``.
+"""
+
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP
+from .bench_chain import measure_boot, measure_scp
+from .common import ProxyProcess, parse_arguments, process_usage, report
+from .fake_board import FakeBoard
+
+#: The coalescing delays (in seconds) to compare; ``None`` writes each
+#: datagram as it arrives
+DELAYS = (None, 0.0, 0.0002)
+
+#: The numbers of SCP requests that may be outstanding at once
+WINDOWS = (1, 64)
+
+#: The size of SCP request data
+SCP_PAYLOAD = 256
+
+
+def _tunnel(address, delay):
+    server = TCPtoUDP(0, address, coalesce_delay=delay)
+    client = UDPtoTCP(
+        0, ("127.0.0.1", server.tcp_listen_sock.getsockname()[1]),
+        coalesce_delay=delay)
+    return server, client, client.udp_sock.getsockname()[1]
+
+
+class _Chain(object):
+    """ A fake board, and a proxy server and client in front of it.
+    """
+
+    def __init__(self, delay):
+        self.board = FakeBoard()
+        scp_server, scp_client, self.scp_port = _tunnel(
+            self.board.scp_address, delay)
+        boot_server, boot_client, self.boot_port = _tunnel(
+            self.board.boot_address, delay)
+        self.server = ProxyProcess([scp_server, boot_server])
+        self.client = ProxyProcess([scp_client, boot_client])
+
+    def __enter__(self):
+        self.board.__enter__()
+        self.server.__enter__()
+        self.client.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.client.__exit__(exc_type, exc_val, exc_tb)
+        self.server.__exit__(exc_type, exc_val, exc_tb)
+        self.board.__exit__(exc_type, exc_val, exc_tb)
+        return False
+
+    def cpu(self):
+        """ The CPU time used by the proxies so far, in seconds.
+        """
+        return sum(process_usage(p.pid)[1] for p in (self.server, self.client))
+
+
+def _name(delay):
+    if delay is None:
+        return "off"
+    return "{:g}us".format(delay * 1e6)
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    scp_results = []
+    boot_results = []
+    for delay in DELAYS:
+        with _Chain(delay) as chain:
+            for window in WINDOWS:
+                result = {"coalesce": _name(delay), "window": window}
+                result.update(measure_scp(
+                    chain, SCP_PAYLOAD, window, args.count))
+                scp_results.append(result)
+            result = {"coalesce": _name(delay)}
+            result.update(measure_boot(chain, args.count))
+            boot_results.append(result)
+    report("coalesce_scp", scp_results, args.json)
+    report("coalesce_boot", boot_results, args.json)
+
+
+if __name__ == "__main__":
+    main()
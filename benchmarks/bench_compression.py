@@ -0,0 +1,102 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Writing a simulated board's memory through a TCP tunnel across a slow\
+    link, with and without compression.
+
+SCP ``WRITE`` requests of 256 bytes, with a window of them outstanding, go
+through a proxy client and server (``-T``) whose TCP connection crosses an
+:py:class:`~.ImpairedTCPRelay` that limits its bandwidth. The data written
+is either zeros (which compress well) or random (which do not, so
+compression should switch itself off).
+
+Run with ``python -m benchmarks.bench_compression``.
+"""
+
+import os
+import time
+
+from spinnaker_proxy.bulk import MAX_TRANSFER, SCP_WRITE, scp_transfer
+from spinnaker_proxy.impairment import Impairment, ImpairedTCPRelay
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP
+from spinnaker_proxy.support import udp_socket
+from .common import ProxyProcess, parse_arguments, report
+from .fake_board import FakeBoard, scp_sequence
+
+#: The bandwidth of the link, in bytes per second
+BANDWIDTH = 250000
+
+#: The most SCP requests outstanding at once
+WINDOW = 64
+
+#: How much memory the simulated board has
+MEMORY_SIZE = 16 * 1024 * 1024
+
+#: The data to write
+PAYLOADS = {
+    "zeros": lambda: bytes(MAX_TRANSFER),
+    "random": lambda: os.urandom(MAX_TRANSFER),
+}
+
+
+def measure(board, compress, payload, count):
+    """ Time writes through a tunnel across the slow link.
+    """
+    link = Impairment(bandwidth=BANDWIDTH)
+    server = TCPtoUDP(0, board.scp_address, compress=compress)
+    relay = ImpairedTCPRelay(
+        0, ("127.0.0.1", server.tcp_listen_sock.getsockname()[1]),
+        upstream=link, downstream=link)
+    client = UDPtoTCP(
+        0, ("127.0.0.1", relay.tcp_listen_sock.getsockname()[1]),
+        compress=compress)
+    port = client.udp_sock.getsockname()[1]
+    requests = [
+        scp_transfer(SCP_WRITE, i & 0xFFFF, 0, 0,
+                     (i * MAX_TRANSFER) % MEMORY_SIZE, MAX_TRANSFER, payload())
+        for i in range(count)]
+    with ProxyProcess([server]), ProxyProcess([relay]), \
+            ProxyProcess([client]), \
+            udp_socket(connect_address=("127.0.0.1", port)) as host:
+        host.settimeout(5)
+        outstanding = set()
+        sent = received = 0
+        start = time.perf_counter()
+        while received < count:
+            while len(outstanding) < WINDOW and sent < count:
+                outstanding.add(sent & 0xFFFF)
+                host.send(requests[sent])
+                sent += 1
+            outstanding.discard(scp_sequence(host.recv(65536)))
+            received += 1
+        elapsed = time.perf_counter() - start
+    return {"mb_per_s": count * MAX_TRANSFER / elapsed / 1e6}
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    with FakeBoard(memory_size=MEMORY_SIZE) as board:
+        for name, payload in PAYLOADS.items():
+            for compress in (False, True):
+                result = {"payload": name, "compress": compress,
+                          "bytes": args.count * MAX_TRANSFER}
+                result.update(measure(board, compress, payload, args.count))
+                results.append(result)
+    report("compression", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
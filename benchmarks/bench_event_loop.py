@@ -0,0 +1,107 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" How the per-packet cost of forwarding scales with the number of (idle)\
+    tunnels served by one process.
+
+Run with ``python -m benchmarks.bench_event_loop``.
+"""
+
+import select
+
+from spinnaker_proxy.proxies import UDPtoUDP
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import udp_socket
+from .common import ProxyProcess, parse_arguments, report, time_round_trips
+
+#: The numbers of idle tunnels to measure with
+IDLE_TUNNELS = (0, 10, 100, 500, 2000)
+
+#: ``select()`` cannot handle file descriptors beyond this
+_FD_SETSIZE = 1024
+
+
+def legacy_run_proxies(datagram_proxies, event):
+    """ The previous, rebuild-and-``select()``-every-iteration loop, for\
+        comparison.
+    """
+    try:
+        while not event.is_set():
+            select_handlers = {}
+            for p in datagram_proxies:
+                select_handlers.update(p.get_select_handlers())
+            fds = list(s for s in select_handlers if s and s.fileno() >= 0)
+            if not fds:
+                break
+            readers, _writers, errs = select.select(fds, [], fds, 0.5)
+            for sock in set(readers + errs):
+                select_handlers[sock]()
+    finally:
+        for p in datagram_proxies:
+            p.close()
+
+
+def measure(runner, idle, count):
+    """ Measure the round-trip rate through one busy tunnel while ``idle``\
+        other tunnels are also being served.
+    """
+    board = udp_socket(bind_port=0)
+    board_address = ("127.0.0.1", board.getsockname()[1])
+    active = UDPtoUDP(0, board_address)
+    proxies = [active] + [
+        UDPtoUDP(0, board_address) for _ in range(idle)]
+    if runner is legacy_run_proxies and max(
+            s.fileno() for p in proxies
+            for s in p.get_select_handlers()) >= _FD_SETSIZE:
+        for p in proxies:
+            p.close()
+        board.close()
+        return None
+
+    host = udp_socket(
+        connect_address=("127.0.0.1", active.ext_sock.getsockname()[1]))
+
+    def round_trip():
+        datagram, address = board.recvfrom(4096)
+        board.sendto(datagram, address)
+        host.recv(4096)
+
+    try:
+        with ProxyProcess(proxies, runner):
+            # Warm up (and let the proxy learn the host's address)
+            time_round_trips(host.send, round_trip, 100, b"x" * 32)
+            return time_round_trips(host.send, round_trip, count, b"x" * 32)
+    finally:
+        host.close()
+        board.close()
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    for idle in IDLE_TUNNELS:
+        for name, runner in (("epoll", run_proxies),
+                             ("select", legacy_run_proxies)):
+            rate = measure(runner, idle, args.count)
+            results.append({
+                "loop": name,
+                "idle_tunnels": idle,
+                "round_trips_per_s": rate if rate is not None else "n/a",
+            })
+    report("event_loop", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" SCP round trips to a simulated board across a long, lossy link, through\
+    a UDP tunnel with and without forward error correction.
+
+SCP ``READ`` requests, with a window of them outstanding, go through a proxy
+client and server whose datagrams cross an :py:class:`~.ImpairedUDPtoUDP`.
+As host software does, a request that gets no response in time is sent
+again; with forward error correction, most losses are repaired without
+that.
+
+Run with ``python -m benchmarks.bench_fec``.
+"""
+
+import socket
+import time
+
+from spinnaker_proxy.bulk import MAX_TRANSFER, SCP_READ, scp_transfer
+from spinnaker_proxy.fec import FECtoUDP, UDPtoFEC
+from spinnaker_proxy.impairment import Impairment, ImpairedUDPtoUDP
+from spinnaker_proxy.proxies import UDPtoUDP
+from spinnaker_proxy.support import udp_socket
+from .common import ProxyProcess, parse_arguments, report
+from .fake_board import FakeBoard, scp_sequence
+
+#: The loss rates of the link to measure across
+LOSSES = (0.0, 0.01, 0.05)
+
+#: The one-way delay of the link, in seconds
+DELAY = 0.025
+
+#: The most SCP requests outstanding at once
+WINDOW = 32
+
+#: How long (in seconds) to wait for a response before sending again
+RETRY_TIMEOUT = 0.25
+
+#: How much memory the simulated board has
+MEMORY_SIZE = 1024 * 1024
+
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(board, use_fec, loss, count):
+    """ Time reads through a tunnel across the lossy link.
+    """
+    link = Impairment(delay=DELAY, loss=loss, seed=1)
+    server = (FECtoUDP if use_fec else UDPtoUDP)(0, board.scp_address)
+    impaired = ImpairedUDPtoUDP(
+        0, ("127.0.0.1", server.ext_sock.getsockname()[1]),
+        upstream=link, downstream=link)
+    client = (UDPtoFEC if use_fec else UDPtoUDP)(
+        0, ("127.0.0.1", impaired.ext_sock.getsockname()[1]))
+    port = client.ext_sock.getsockname()[1]
+    with ProxyProcess([server]), ProxyProcess([impaired]), \
+            ProxyProcess([client]), \
+            udp_socket(connect_address=("127.0.0.1", port)) as host:
+        host.settimeout(RETRY_TIMEOUT / 10)
+        # Map from sequence number to (request, first sent, last sent)
+        outstanding = {}
+        latencies = []
+        sent = retries = 0
+        start = time.perf_counter()
+        while len(latencies) < count:
+            while len(outstanding) < WINDOW and sent < count:
+                seq = sent & 0xFFFF
+                request = scp_transfer(
+                    SCP_READ, seq, 0, 0, (sent * MAX_TRANSFER) % MEMORY_SIZE,
+                    MAX_TRANSFER)
+                now = time.perf_counter()
+                outstanding[seq] = (request, now, now)
+                host.send(request)
+                sent += 1
+            try:
+                seq = scp_sequence(host.recv(65536))
+                if seq in outstanding:
+                    latencies.append(
+                        time.perf_counter() - outstanding.pop(seq)[1])
+            except socket.timeout:
+                pass
+            now = time.perf_counter()
+            for seq, (request, first, last) in list(outstanding.items()):
+                if now - last > RETRY_TIMEOUT:
+                    host.send(request)
+                    outstanding[seq] = (request, first, now)
+                    retries += 1
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"requests_per_s": count / elapsed,
+            "p50_ms": _percentile(latencies, 0.5) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+            "retries": retries}
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    with FakeBoard(memory_size=MEMORY_SIZE) as board:
+        for loss in LOSSES:
+            for use_fec in (False, True):
+                result = {"fec": use_fec, "loss_percent": loss * 100}
+                result.update(measure(board, use_fec, loss, args.count))
+                results.append(result)
+    report("fec", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
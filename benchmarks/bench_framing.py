@@ -0,0 +1,87 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Receive-and-decode speed of the TCP framing when one read holds many\
+    datagrams.
+
+Run with ``python -m benchmarks.bench_framing``.
+"""
+
+import socket
+import struct
+import time
+
+from spinnaker_proxy.support import TCPDatagramProtocol
+from .common import parse_arguments, report
+
+_LENGTH = struct.Struct("!I")
+
+#: How many datagrams arrive in a single read
+BURSTS = (1, 16, 256, 2048)
+
+#: The size of each datagram (a small SCP request)
+DATAGRAM = b"x" * 24
+
+
+def legacy_decode(buf, tcp_data):
+    """ The previous, copy-the-remainder-per-datagram, decoder.
+    """
+    buf += tcp_data
+    datagrams = []
+    while len(buf) >= 4:
+        datagram_length = _LENGTH.unpack(buf[:4])[0]
+        if len(buf) < 4 + datagram_length:
+            break
+        datagram, buf = buf[4:4 + datagram_length], buf[4 + datagram_length:]
+        datagrams.append(datagram)
+    return buf, datagrams
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    a, b = socket.socketpair()
+    for burst in BURSTS:
+        chunk = (_LENGTH.pack(len(DATAGRAM)) + DATAGRAM) * burst
+        reads = max(1, args.count * 10 // burst)
+
+        start = time.perf_counter()
+        buf = b""
+        for _ in range(reads):
+            a.sendall(chunk)
+            buf, _datagrams = legacy_decode(buf, b.recv(len(chunk)))
+        legacy = reads * burst / (time.perf_counter() - start)
+
+        protocol = TCPDatagramProtocol()
+        start = time.perf_counter()
+        for _ in range(reads):
+            a.sendall(chunk)
+            protocol.recv_into(b, len(chunk))
+            for _datagram in protocol.frames():
+                pass
+        current = reads * burst / (time.perf_counter() - start)
+
+        results.append({
+            "datagrams_per_read": burst,
+            "legacy_datagrams_per_s": legacy,
+            "datagrams_per_s": current,
+        })
+    a.close()
+    b.close()
+    report("framing", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" What keeping (and serving) counters costs a UDP to UDP proxy.
+
+Compares a proxy with its forwarding methods as they were before counters
+were added, the proxy as it is, and the proxy while its metrics are being
+scraped ten times a second. So that the small differences are not lost in
+the noise of scheduling several processes, the forwarding methods are called
+directly (in this process) on bursts of waiting datagrams, and only they are
+timed; each mode is measured several times, interleaved, and the best time
+kept.
+
+Run with ``python -m benchmarks.bench_metrics``.
+"""
+
+from functools import partial
+import socket
+import threading
+import time
+from urllib.request import urlopen
+
+from spinnaker_proxy.metrics import MetricsServer, proxy_stats
+from spinnaker_proxy.proxies import UDPtoUDP
+from spinnaker_proxy.support import udp_socket
+from spinnaker_proxy.udp_batch import datagram_batch
+from .common import parse_arguments, report
+
+#: The batch sizes to measure with
+BATCH_SIZES = (1, 32)
+
+#: The ways of running the proxy to compare
+MODES = ("uncounted", "counted", "scraped")
+
+#: How many times to measure each mode
+ROUNDS = 10
+
+#: How many datagrams to have waiting for each timed burst of forwarding
+BURST = 128
+
+#: The size of the datagrams sent
+PAYLOAD = b"x" * 256
+
+#: How often to scrape the metrics, in seconds
+SCRAPE_INTERVAL = 0.1
+
+
+class _UncountedUDPtoUDP(UDPtoUDP):
+    """ A UDP to UDP proxy that forwards as it did before it had counters.
+    """
+
+    def ext_to_int(self):
+        if self.batch_size > 1:
+            self._ext_to_int_batched()
+            return
+        datagram, ext_address = self.ext_sock.recvfrom(self.bufsize)
+        session = self._session(ext_address, time.monotonic())
+        session.sock.send(datagram)
+
+    def int_to_ext(self, session):
+        if self.batch_size > 1:
+            self._int_to_ext_batched(session)
+            return
+        datagram = session.sock.recv(self.bufsize)
+        self._session(session.address, time.monotonic())
+        self.ext_sock.sendto(datagram, session.address)
+
+    def _ext_to_int_batched(self):
+        batch = self._ext_batch
+        if batch is None:
+            batch = self._ext_batch = datagram_batch(
+                self.batch_size, self.bufsize)
+        count = batch.recv(self.ext_sock)
+        now = time.monotonic()
+        addresses = [batch.address(i) for i in range(count)]
+        start = 0
+        while start < count:
+            ext_address = addresses[start]
+            end = start + 1
+            while end < count and addresses[end] == ext_address:
+                end += 1
+            session = self._session(ext_address, now)
+            batch.forward(session.sock, end - start, start=start)
+            start = end
+
+    def _int_to_ext_batched(self, session):
+        batch = self._int_batch
+        if batch is None:
+            batch = self._int_batch = datagram_batch(
+                self.batch_size, self.bufsize)
+        count = batch.recv(session.sock)
+        if not count:
+            return
+        self._session(session.address, time.monotonic())
+        batch.forward(self.ext_sock, count, session.address)
+
+
+def _scrape(url, stop):
+    while not stop.wait(SCRAPE_INTERVAL):
+        with urlopen(url, timeout=1) as response:
+            response.read()
+
+
+def measure(mode, batch_size, count):
+    """ Measure how long a proxy takes to forward datagrams from a host to\
+        a board.
+
+    :return: The time per datagram, in nanoseconds.
+    :rtype: float
+    """
+    with udp_socket(bind_port=0) as board:
+        cls = _UncountedUDPtoUDP if mode == "uncounted" else UDPtoUDP
+        proxy = cls(0, ("127.0.0.1", board.getsockname()[1]),
+                    batch_size=batch_size)
+        proxy.ext_sock.setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+        stop = threading.Event()
+        scraper = server = None
+        if mode == "scraped":
+            server = MetricsServer(0, partial(proxy_stats, [proxy]))
+            server.start()
+            scraper = threading.Thread(target=_scrape, args=(
+                "http://127.0.0.1:{}/metrics".format(server.port), stop))
+            scraper.start()
+        host = udp_socket(connect_address=(
+            "127.0.0.1", proxy.ext_sock.getsockname()[1]))
+        try:
+            elapsed = 0.0
+            for _ in range(count // BURST):
+                for _ in range(BURST):
+                    host.send(PAYLOAD)
+                start = time.perf_counter()
+                for _ in range(BURST // batch_size):
+                    proxy.ext_to_int()
+                elapsed += time.perf_counter() - start
+            return elapsed * 1e9 / (count // BURST * BURST)
+        finally:
+            stop.set()
+            if scraper is not None:
+                scraper.join()
+                server.close()
+            host.close()
+            proxy.close()
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    for batch_size in BATCH_SIZES:
+        best = dict.fromkeys(MODES, float("inf"))
+        for _ in range(ROUNDS):
+            for mode in MODES:
+                best[mode] = min(
+                    best[mode], measure(mode, batch_size, args.count))
+        for mode in MODES:
+            results.append({
+                "mode": mode,
+                "batch_size": batch_size,
+                "ns_per_packet": best[mode],
+                "cost_pct": 100.0 * (best[mode] / best["uncounted"] - 1),
+            })
+    report("metrics", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
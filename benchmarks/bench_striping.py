@@ -0,0 +1,95 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" SCP round trips to a simulated board through a TCP tunnel striped\
+    across several connections.
+
+SCP ``READ`` requests of 256 bytes, with a window of them outstanding, go
+through a proxy client and server joined by one TCP connection (the plain
+``-T`` tunnel) or by a pool of them, with datagrams spread over the pool by
+each policy. Over loopback no one connection is the bottleneck, so this
+measures what spreading and putting datagrams back in order costs.
+
+Run with ``python -m benchmarks.bench_striping``.
+"""
+
+from functools import partial
+import time
+
+from spinnaker_proxy.bulk import MAX_TRANSFER, SCP_READ, scp_transfer
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP
+from spinnaker_proxy.striping import (
+    STRIPE_POLICIES, StripedTCPtoUDP, StripedUDPtoTCP)
+from spinnaker_proxy.support import udp_socket
+from .common import ProxyProcess, parse_arguments, report
+from .fake_board import FakeBoard, scp_sequence
+
+#: The numbers of connections to measure with
+STRIPES = (2, 4)
+
+#: The most SCP requests outstanding at once
+WINDOW = 32
+
+#: How much memory the simulated board has
+MEMORY_SIZE = 1024 * 1024
+
+
+def measure(board, server, client, count):
+    """ Time reads through a tunnel.
+    """
+    server = server(0, board.scp_address)
+    client = client(0, (
+        "127.0.0.1", server.tcp_listen_sock.getsockname()[1]))
+    port = client.udp_sock.getsockname()[1]
+    with ProxyProcess([server]), ProxyProcess([client]), \
+            udp_socket(connect_address=("127.0.0.1", port)) as host:
+        host.settimeout(10)
+        outstanding = set()
+        received = sent = 0
+        start = time.perf_counter()
+        while received < count:
+            while len(outstanding) < WINDOW and sent < count:
+                seq = sent & 0xFFFF
+                outstanding.add(seq)
+                host.send(scp_transfer(
+                    SCP_READ, seq, 0, 0, (sent * MAX_TRANSFER) % MEMORY_SIZE,
+                    MAX_TRANSFER))
+                sent += 1
+            outstanding.discard(scp_sequence(host.recv(65536)))
+            received += 1
+        elapsed = time.perf_counter() - start
+    return {"requests_per_s": count / elapsed}
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    with FakeBoard(memory_size=MEMORY_SIZE) as board:
+        result = {"stripes": 1, "policy": None}
+        result.update(measure(board, TCPtoUDP, UDPtoTCP, args.count))
+        results.append(result)
+        for stripes in STRIPES:
+            for policy in STRIPE_POLICIES:
+                result = {"stripes": stripes, "policy": policy}
+                result.update(measure(
+                    board, partial(StripedTCPtoUDP, policy=policy),
+                    partial(StripedUDPtoTCP, stripes=stripes, policy=policy),
+                    args.count))
+                results.append(result)
+    report("striping", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
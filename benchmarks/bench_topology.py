@@ -0,0 +1,99 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" How one proxy server process scales with the number of boards in its\
+    topology.
+
+Each board has its SCP tunnelled via UDP and its boot packets via TCP, and is
+stood in for by a socket which echoes datagrams back. Memory and idle CPU are
+those of the server process; the round-trip rate is for SCP to one board.
+
+Run with ``python -m benchmarks.bench_topology``.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from spinnaker_proxy.spinnaker_proxy import (
+    _construct_proxies, _parse_arguments)
+from spinnaker_proxy.support import udp_socket
+from .common import (
+    EchoBoards, ProxyProcess, parse_arguments, process_usage, report,
+    time_round_trips)
+
+#: The numbers of boards to measure with
+BOARDS = (1, 10, 100, 250)
+
+#: How long to measure idle CPU use over, in seconds
+IDLE_TIME = 2.0
+
+
+def _topology(addresses):
+    """ Write a topology file for the (loopback) boards.
+    """
+    fd, filename = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump({
+            "defaults": {"boot": "tcp", "target": "127.0.0.1",
+                         "scp_tunnel_port": 0, "boot_tunnel_port": 0},
+            "boards": [
+                {"scp_port": port, "boot_port": port}
+                for _, port in addresses]}, f)
+    return filename
+
+
+def measure(boards, count):
+    with EchoBoards(boards) as echo:
+        filename = _topology(echo.addresses)
+        try:
+            start = time.perf_counter()
+            proxies = list(_construct_proxies(
+                _parse_arguments(["-s", "--config", filename])))
+            startup = time.perf_counter() - start
+        finally:
+            os.remove(filename)
+        # The SCP proxy of the last board
+        port = proxies[-2].ext_sock.getsockname()[1]
+        with ProxyProcess(proxies) as process:
+            time.sleep(0.5)
+            rss, cpu = process_usage(process.pid)
+            time.sleep(IDLE_TIME)
+            idle_cpu = (process_usage(process.pid)[1] - cpu) / IDLE_TIME
+            with udp_socket(connect_address=("127.0.0.1", port)) as host:
+                host.settimeout(2)
+
+                def recv():
+                    return host.recv(4096)
+                time_round_trips(host.send, recv, 100, b"x" * 32)
+                rate = time_round_trips(host.send, recv, count, b"x" * 32)
+    return {
+        "boards": boards,
+        "startup_ms": startup * 1000,
+        "rss_kb": rss,
+        "idle_cpu_pct": idle_cpu * 100,
+        "round_trips_per_s": rate,
+    }
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = [measure(boards, args.count) for boards in BOARDS]
+    report("topology", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
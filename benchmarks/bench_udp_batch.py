@@ -0,0 +1,86 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Packet rate through a UDP to UDP proxy with and without batched I/O.
+
+Run with ``python -m benchmarks.bench_udp_batch``.
+"""
+
+from spinnaker_proxy.proxies import UDPtoUDP
+from spinnaker_proxy.support import udp_socket
+from spinnaker_proxy.udp_batch import HAVE_MMSG, PortableDatagramBatch
+from .common import (
+    EchoBoard, ProxyProcess, parse_arguments, report, time_windowed)
+
+#: The ways of moving datagrams to compare: (name, batch size, portable?)
+MODES = (
+    ("unbatched", 1, False),
+    ("portable", 32, True),
+    ("mmsg", 8, False),
+    ("mmsg", 32, False),
+)
+
+#: How many packets may be in flight at once
+WINDOWS = (8, 64)
+
+#: The size of the datagrams sent
+PAYLOAD = b"x" * 256
+
+
+def _proxy(board_address, batch_size, portable):
+    proxy = UDPtoUDP(0, board_address, batch_size=batch_size)
+    if portable:
+        proxy._ext_batch = PortableDatagramBatch(batch_size, proxy.bufsize)
+        proxy._int_batch = PortableDatagramBatch(batch_size, proxy.bufsize)
+    return proxy
+
+
+def measure(batch_size, portable, window, count):
+    """ Measure the rate of packets (in each direction) through a proxy\
+        between a host and an echoing board.
+    """
+    with EchoBoard() as board:
+        proxy = _proxy(board.address, batch_size, portable)
+        port = proxy.ext_sock.getsockname()[1]
+        with ProxyProcess([proxy]):
+            with udp_socket(connect_address=("127.0.0.1", port)) as host:
+                host.settimeout(2)
+
+                def recv():
+                    return host.recv(4096)
+                time_windowed(host.send, recv, 100, PAYLOAD, window)
+                return time_windowed(
+                    host.send, recv, count, PAYLOAD, window)
+
+
+def main(args=None):
+    args = parse_arguments(__doc__.split("\n")[0], args)
+    results = []
+    for window in WINDOWS:
+        for name, batch_size, portable in MODES:
+            if name == "mmsg" and not HAVE_MMSG:
+                continue
+            results.append({
+                "mode": name,
+                "batch_size": batch_size,
+                "window": window,
+                "packets_per_s": measure(
+                    batch_size, portable, window, args.count),
+            })
+    report("udp_batch", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Shared machinery for the loopback benchmarks.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import selectors
+import sys
+import threading
+import time
+
+from spinnaker_proxy import __version__
+from spinnaker_proxy.async_proxies import run_proxies_async
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import udp_socket
+
+
+class _ChildProcess(object):
+    """ Runs a function in a forked child process for the duration of a\
+        ``with`` block. Separate processes are used so that the benchmark
+        measures the code under test, not contention for the GIL.
+    """
+
+    def __init__(self, target, *args):
+        self._process = multiprocessing.get_context("fork").Process(
+            target=target, args=args)
+        self._process.daemon = True
+
+    def __enter__(self):
+        self._process.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._process.terminate()
+        self._process.join(2)
+        return False
+
+    @property
+    def pid(self):
+        """ The child's process ID (once started).
+
+        :rtype: int
+        """
+        return self._process.pid
+
+
+class ProxyProcess(_ChildProcess):
+    """ Runs a set of proxies in a child process.
+    """
+
+    def __init__(self, proxies, runner=run_proxies):
+        self._proxies = list(proxies)
+        super(ProxyProcess, self).__init__(
+            runner, self._proxies, threading.Event())
+
+    def __enter__(self):
+        super(ProxyProcess, self).__enter__()
+        # The child has its own copies of the sockets now
+        for p in self._proxies:
+            p.close()
+        return self
+
+
+def _run_async(proxies):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(run_proxies_async(proxies))
+
+
+class AsyncProxyProcess(_ChildProcess):
+    """ Runs a set of asynchronous proxies on their own event loop in a\
+        child process.
+    """
+
+    def __init__(self, proxies):
+        super(AsyncProxyProcess, self).__init__(_run_async, list(proxies))
+
+
+def _echo(sock):
+    while True:
+        datagram, address = sock.recvfrom(65536)
+        sock.sendto(datagram, address)
+
+
+class EchoBoard(_ChildProcess):
+    """ A stand-in for a SpiNNaker board which echoes every datagram back to\
+        its sender, from a child process.
+    """
+
+    def __init__(self, port=0):
+        self.sock = udp_socket(bind_port=port)
+        #: The address to send datagrams to
+        self.address = ("127.0.0.1", self.sock.getsockname()[1])
+        super(EchoBoard, self).__init__(_echo, self.sock)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super(EchoBoard, self).__exit__(exc_type, exc_val, exc_tb)
+        self.sock.close()
+        return False
+
+
+def _echo_all(socks):
+    with selectors.DefaultSelector() as selector:
+        for sock in socks:
+            selector.register(sock, selectors.EVENT_READ)
+        while True:
+            for key, _ in selector.select():
+                datagram, address = key.fileobj.recvfrom(65536)
+                key.fileobj.sendto(datagram, address)
+
+
+class EchoBoards(_ChildProcess):
+    """ Many stand-ins for SpiNNaker boards, each echoing every datagram back\
+        to its sender, all served by one child process.
+    """
+
+    def __init__(self, count):
+        self.socks = [udp_socket(bind_port=0) for _ in range(count)]
+        #: The addresses to send datagrams to
+        self.addresses = [
+            ("127.0.0.1", sock.getsockname()[1]) for sock in self.socks]
+        super(EchoBoards, self).__init__(_echo_all, self.socks)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super(EchoBoards, self).__exit__(exc_type, exc_val, exc_tb)
+        for sock in self.socks:
+            sock.close()
+        return False
+
+
+def process_usage(pid):
+    """ Get the memory and CPU time used by a process (on Linux).
+
+    :param int pid: The process ID.
+    :return: The resident set size in kB, and the CPU time in seconds.
+    :rtype: tuple(int, float)
+    """
+    with open("/proc/{}/status".format(pid)) as f:
+        rss = next(int(line.split()[1]) for line in f
+                   if line.startswith("VmRSS:"))
+    with open("/proc/{}/stat".format(pid)) as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime are the 14th and 15th fields (counting the pid and
+    # command as the first two)
+    ticks = int(fields[11]) + int(fields[12])
+    return rss, ticks / os.sysconf("SC_CLK_TCK")
+
+
+def time_round_trips(send, recv, count, payload):
+    """ Time a series of strictly sequential round trips.
+
+    :param ~collections.abc.Callable send: Sends a payload.
+    :param ~collections.abc.Callable recv: Receives (and returns) a reply.
+    :param int count: How many round trips to time.
+    :param bytes payload: What to send.
+    :return: The number of round trips per second.
+    :rtype: float
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        send(payload)
+        recv()
+    return count / (time.perf_counter() - start)
+
+
+def time_windowed(send, recv, count, payload, window):
+    """ Time a series of round trips with up to ``window`` outstanding at\
+        once.
+
+    :param ~collections.abc.Callable send: Sends a payload.
+    :param ~collections.abc.Callable recv: Receives (and returns) a reply.
+    :param int count: How many round trips to time.
+    :param bytes payload: What to send.
+    :param int window: How many round trips may be outstanding at once.
+    :return: The number of round trips per second.
+    :rtype: float
+    """
+    start = time.perf_counter()
+    for _ in range(count // window):
+        for _ in range(window):
+            send(payload)
+        for _ in range(window):
+            recv()
+    return (count // window) * window / (time.perf_counter() - start)
+
+
+def parse_arguments(description, args=None, add_arguments=None):
+    """ The command line arguments common to all benchmarks.
+
+    :param str description: What the benchmark measures.
+    :param args: The arguments to parse (by default, the command line).
+    :type args: list(str) or None
+    :param add_arguments:
+        Adds any arguments that are particular to the benchmark.
+    :type add_arguments:
+        ~collections.abc.Callable(~argparse.ArgumentParser, None) or None
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--count", type=int, default=5000,
+                        help="number of packets to time per measurement")
+    parser.add_argument("--json", action="store_true",
+                        help="emit machine-readable results")
+    if add_arguments is not None:
+        add_arguments(parser)
+    return parser.parse_args(args)
+
+
+def report(name, results, as_json=False, stream=None):
+    """ Print a list of result records.
+
+    :param str name: The name of the benchmark.
+    :param list(dict) results: The measurements.
+    :param bool as_json: Whether to emit JSON instead of a table. The JSON
+        also says what versions of the proxy and Python were measured, so
+        that results can be compared across releases.
+    :param stream: Where to print to (by default, standard output).
+    """
+    if stream is None:
+        stream = sys.stdout
+    if as_json:
+        json.dump({"benchmark": name, "version": __version__,
+                   "python": platform.python_version(),
+                   "results": results}, stream)
+        stream.write("\n")
+        return
+    stream.write("{}\n".format(name))
+    if not results:
+        return
+    keys = list(results[0])
+    stream.write("  ".join("{:>14}".format(k) for k in keys) + "\n")
+    for result in results:
+        stream.write("  ".join(
+            "{:>14.1f}".format(result[k]) if isinstance(result[k], float)
+            else "{:>14}".format(str(result[k]))
+            for k in keys) + "\n")
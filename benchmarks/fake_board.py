@@ -0,0 +1,152 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" A simulated SpiNNaker board, for benchmarks.
+"""
+
+from collections import deque
+import multiprocessing
+import selectors
+import socket
+import struct
+import time
+
+from spinnaker_proxy.scp import FLAG_REPLY_EXPECTED, RC_OK, parse_header
+from spinnaker_proxy.support import udp_socket
+from .common import _ChildProcess
+
+_SCP_HEADER = struct.Struct("<2xB7xHH")
+_SCP_ARGUMENTS = struct.Struct("<14xII")
+
+#: The SCP commands that read and write memory
+_READ, _WRITE = 2, 3
+
+#: The size of receive buffer the board asks for
+RCVBUF = 4 * 1024 * 1024
+
+
+def scp_request(command, seq, data=b""):
+    """ Make an SCP request (that expects a response), as sent over UDP.
+
+    :param int command: The SCP command.
+    :param int seq: The sequence number.
+    :param bytes data: The arguments and data of the request.
+    :rtype: bytes
+    """
+    return _SCP_HEADER.pack(FLAG_REPLY_EXPECTED | 0x07, command, seq) + data
+
+
+def scp_sequence(datagram):
+    """ Get the sequence number of an SCP packet.
+
+    :param bytes datagram: The packet.
+    :rtype: int
+    """
+    return parse_header(datagram)[2]
+
+
+def _respond(datagram, memory=None):
+    """ Make the response to an SCP request: the same packet with an OK\
+        return code in place of the command. If the board has memory, reads
+        and writes of it are done instead, and answered as a board would.
+    """
+    command = parse_header(datagram)[1]
+    if memory is not None and command in (_READ, _WRITE):
+        address, length = _SCP_ARGUMENTS.unpack_from(datagram)
+        address %= len(memory)
+        response = bytearray(datagram[:_SCP_HEADER.size])
+        if command == _READ:
+            response += memory[address:address + length]
+        else:
+            memory[address:address + length] = \
+                datagram[_SCP_ARGUMENTS.size + 4:]
+    else:
+        response = bytearray(datagram)
+    struct.pack_into("<H", response, 10, RC_OK)
+    return response
+
+
+def _serve(scp_sock, boot_sock, service_time, boot_received, memory_size):
+    # Requests are served one at a time, as by the board's monitor processor
+    waiting = deque()
+    busy_until = 0.0
+    memory = bytearray(memory_size) if memory_size else None
+    with selectors.DefaultSelector() as selector:
+        selector.register(scp_sock, selectors.EVENT_READ)
+        selector.register(boot_sock, selectors.EVENT_READ)
+        while True:
+            timeout = None
+            if waiting:
+                timeout = max(0.0, waiting[0][0] - time.monotonic())
+            for key, _ in selector.select(timeout):
+                datagram, address = key.fileobj.recvfrom(65536)
+                if key.fileobj is boot_sock:
+                    boot_received.value += 1
+                    continue
+                header = parse_header(datagram)
+                if header is None or not header[0] & FLAG_REPLY_EXPECTED:
+                    continue
+                busy_until = max(busy_until, time.monotonic()) + service_time
+                waiting.append(
+                    (busy_until, _respond(datagram, memory), address))
+            now = time.monotonic()
+            while waiting and waiting[0][0] <= now:
+                _, response, address = waiting.popleft()
+                scp_sock.sendto(response, address)
+
+
+class FakeBoard(_ChildProcess):
+    """ A stand-in for a SpiNNaker board, in a child process, which answers\
+        SCP requests (that expect a response) after a service time, one at\
+        a time, and silently counts the boot packets sent to it.
+    """
+
+    def __init__(self, service_time=0.0, memory_size=0):
+        """
+        :param float service_time:
+            How long (in seconds) the board takes to handle each SCP request.
+        :param int memory_size:
+            How many bytes of memory the board has for SCP ``READ`` and
+            ``WRITE`` requests to use (addresses wrap around it); with none,
+            those requests are answered like any other.
+        """
+        self._scp_sock = udp_socket(bind_port=0)
+        self._boot_sock = udp_socket(bind_port=0)
+        for sock in (self._scp_sock, self._boot_sock):
+            # Unlike a real board, don't drop packets for want of buffers
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+        #: Where to send SCP requests
+        self.scp_address = ("127.0.0.1", self._scp_sock.getsockname()[1])
+        #: Where to send boot packets
+        self.boot_address = ("127.0.0.1", self._boot_sock.getsockname()[1])
+        self._boot_received = multiprocessing.get_context("fork").Value(
+            "Q", 0, lock=False)
+        super(FakeBoard, self).__init__(
+            _serve, self._scp_sock, self._boot_sock, service_time,
+            self._boot_received, memory_size)
+
+    @property
+    def boot_received(self):
+        """ How many boot packets the board has received.
+
+        :rtype: int
+        """
+        return self._boot_received.value
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super(FakeBoard, self).__exit__(exc_type, exc_val, exc_tb)
+        self._scp_sock.close()
+        self._boot_sock.close()
+        return False
@@ -0,0 +1,746 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" A reliable tunnel over UDP, which resends lost datagrams without\
+    holding up the others (as a TCP tunnel must).
+
+Each end of the tunnel numbers the datagrams it sends, and keeps each one
+until the other end acknowledges it. An acknowledgement says which datagram
+is next expected in order, and lists (as SACK blocks) those received beyond
+it. A datagram is sent again once one sent :py:data:`DUP_THRESHOLD` after
+it has been acknowledged, or when nothing has been acknowledged for a
+retransmission timeout estimated from the round trip time as TCP does (RFC
+6298). How many datagrams may be unacknowledged at once is limited by a
+congestion window that grows while datagrams get through and shrinks when
+they are lost, as in TCP Reno.
+
+Datagrams are passed on as soon as they arrive, whatever their order,
+except through ordered tunnels (for booting), which hold them back until
+those before them have arrived.
+
+Every packet starts with a byte saying what it is, the session (picked at
+random by the proxy client when it starts, so that a proxy server can tell
+when a new client has taken over) and the sender's stream (picked at random
+by each end when it starts sending, so that the other end can tell when it
+has restarted):
+
+``DATA``
+    followed by the datagram's sequence number, the sequence number of the
+    oldest datagram not yet acknowledged, and the datagram.
+``ACK``
+    followed by the sequence number of the next datagram expected, and a
+    count of SACK blocks, each a range of sequence numbers received beyond
+    it (as offsets from it).
+"""
+
+from collections import OrderedDict, deque
+import logging
+import random
+import struct
+import time
+
+from .proxies import DEFAULT_BUFFER_SIZE
+from .support import DatagramProxy, udp_socket
+
+KIND_DATA = 0
+KIND_ACK = 1
+
+_HEADER = struct.Struct("<BII")
+_DATA = struct.Struct("<BIIQQ")
+_ACK = struct.Struct("<BIIQB")
+_BLOCK = struct.Struct("<II")
+
+#: The most SACK blocks to put in an acknowledgement
+MAX_SACK_BLOCKS = 16
+
+#: How many datagrams sent after one must be acknowledged for it to count
+#: as lost
+DUP_THRESHOLD = 3
+
+#: The retransmission timeout (in seconds) before the round trip time has
+#: been measured
+INITIAL_RTO = 0.5
+#: The shortest retransmission timeout, in seconds
+MIN_RTO = 0.02
+#: The longest retransmission timeout, in seconds
+MAX_RTO = 4.0
+
+#: The congestion window (in datagrams) to start with
+INITIAL_WINDOW = 4
+#: The smallest congestion window after a loss, in datagrams
+MIN_WINDOW = 2
+#: The largest congestion window, in datagrams
+MAX_WINDOW = 1024
+
+#: The default most bytes of datagrams to queue while the congestion window
+#: is full
+DEFAULT_QUEUE_BYTES = 1024 * 1024
+
+
+def packet_session(packet):
+    """ Get the session of a tunnel packet.
+
+    :param bytes packet: The packet.
+    :return: The session, or ``None`` if the packet is not a tunnel packet.
+    :rtype: int or None
+    """
+    if len(packet) < _HEADER.size:
+        return None
+    kind, session, _ = _HEADER.unpack_from(packet)
+    if kind not in (KIND_DATA, KIND_ACK):
+        return None
+    return session
+
+
+class _Sent(object):
+    """ A datagram sent but not yet acknowledged.
+    """
+
+    __slots__ = ["datagram", "sent_at", "retransmitted"]
+
+    def __init__(self, datagram, sent_at):
+        self.datagram = datagram
+        self.sent_at = sent_at
+        self.retransmitted = False
+
+
+class ARQConnection(object):
+    """ One end of a reliable tunnel over UDP: sends datagrams to the other\
+        end, sending them again until they are acknowledged, and receives\
+        the other end's.
+
+    The connection must be attached to an event loop, for its timers.
+    """
+
+    #: The names of the counters in :py:meth:`get_stats`
+    COUNTERS = ("sent", "retransmits", "timeouts", "received", "duplicates",
+                "acks_sent", "dropped")
+
+    def __init__(self, session, transmit, deliver, ordered=False,
+                 queue_bytes=DEFAULT_QUEUE_BYTES):
+        """
+        :param int session: The session the connection belongs to.
+        :param ~collections.abc.Callable transmit:
+            How to send a packet to the other end.
+        :param ~collections.abc.Callable deliver:
+            What to pass each datagram received from the other end to.
+        :param bool ordered:
+            Whether to deliver datagrams in the order they were sent.
+        :param int queue_bytes:
+            The most bytes of datagrams to queue while the congestion window
+            is full; any more are dropped.
+        """
+        #: The session the connection belongs to
+        self.session = session
+        #: Whether datagrams are delivered in the order they were sent
+        self.ordered = ordered
+        #: The most bytes of datagrams to queue while the window is full
+        self.queue_bytes = queue_bytes
+        self._transmit = transmit
+        self._deliver = deliver
+        self._loop = None
+
+        # Sending
+        self._stream = random.getrandbits(32)
+        self._next_seq = 0
+        self._unacked = OrderedDict()
+        self._waiting = deque()
+        #: How many bytes of datagrams are waiting for the window to open
+        self.queued_bytes = 0
+        self._highest_acked = -1
+        self._recovery_end = 0
+        self._window = float(INITIAL_WINDOW)
+        self._ssthresh = float(MAX_WINDOW)
+        self._srtt = None
+        self._rttvar = None
+        self._rto = INITIAL_RTO
+        self._timer = None
+
+        # Receiving
+        self._peer_stream = None
+        self._expected = 0
+        self._received = set()
+        self._held = {}
+        self._ack_timer = None
+
+        #: How many datagrams have been sent (not counting resending)
+        self.sent = 0
+        #: How many times a datagram has been sent again
+        self.retransmits = 0
+        #: How many times nothing was acknowledged for a whole timeout
+        self.timeouts = 0
+        #: How many datagrams have been received (not counting duplicates)
+        self.received = 0
+        #: How many datagrams have been received more than once
+        self.duplicates = 0
+        #: How many acknowledgements have been sent
+        self.acks_sent = 0
+        #: How many datagrams were dropped because the queue was full
+        self.dropped = 0
+
+    def attach(self, loop):
+        """ Use an event loop's timers.
+
+        :param ~spinnaker_proxy.event_loop.EventLoop loop: The loop.
+        """
+        self._loop = loop
+
+    def send(self, datagram):
+        """ Send a datagram to the other end, once the window allows.
+
+        :param bytes datagram: The datagram.
+        """
+        if len(self._unacked) < self._window and not self._waiting:
+            self._send_new(bytes(datagram))
+        elif self.queued_bytes + len(datagram) > self.queue_bytes:
+            self.dropped += 1
+        else:
+            self._waiting.append(bytes(datagram))
+            self.queued_bytes += len(datagram)
+
+    def _send_new(self, datagram):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._unacked[seq] = _Sent(datagram, time.monotonic())
+        self.sent += 1
+        self._send_data(seq, datagram)
+        if self._timer is None:
+            self._restart_timer()
+
+    def _send_data(self, seq, datagram):
+        base = next(iter(self._unacked))
+        self._transmit(_DATA.pack(
+            KIND_DATA, self.session, self._stream, seq, base) + datagram)
+
+    def _send_waiting(self):
+        while self._waiting and len(self._unacked) < self._window:
+            datagram = self._waiting.popleft()
+            self.queued_bytes -= len(datagram)
+            self._send_new(datagram)
+
+    def _retransmit(self, seq, sent, now):
+        sent.sent_at = now
+        sent.retransmitted = True
+        self.retransmits += 1
+        self._send_data(seq, sent.datagram)
+
+    def _restart_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._unacked and self._loop is not None:
+            self._timer = self._loop.call_later(self._rto, self._on_timeout)
+
+    def _on_timeout(self):
+        """ Nothing was acknowledged for a whole timeout: send the oldest\
+            datagram again, and start again from a small window.
+        """
+        self._timer = None
+        if not self._unacked:
+            return
+        self.timeouts += 1
+        self._ssthresh = max(len(self._unacked) / 2, MIN_WINDOW)
+        self._window = 1.0
+        self._recovery_end = self._next_seq
+        self._rto = min(self._rto * 2, MAX_RTO)
+        seq, sent = next(iter(self._unacked.items()))
+        self._retransmit(seq, sent, time.monotonic())
+        self._restart_timer()
+
+    def on_packet(self, packet):
+        """ Handle a packet from the other end.
+
+        :param bytes packet: The packet.
+        """
+        if packet[0] == KIND_DATA and len(packet) >= _DATA.size:
+            self._on_data(packet)
+        elif packet[0] == KIND_ACK and len(packet) >= _ACK.size:
+            self._on_ack(packet)
+
+    def _on_data(self, packet):
+        _, _, stream, seq, base = _DATA.unpack_from(packet)
+        if stream != self._peer_stream:
+            # The other end has (re)started sending; nothing before its
+            # oldest unacknowledged datagram will come again
+            self._peer_stream = stream
+            self._expected = base
+            self._received.clear()
+            self._held.clear()
+        self._schedule_ack()
+        if seq < self._expected or seq in self._received:
+            self.duplicates += 1
+            return
+        self.received += 1
+        datagram = packet[_DATA.size:]
+        if self.ordered:
+            self._held[seq] = datagram
+        else:
+            self._deliver(datagram)
+        self._received.add(seq)
+        while self._expected in self._received:
+            self._received.remove(self._expected)
+            if self.ordered:
+                self._deliver(self._held.pop(self._expected))
+            self._expected += 1
+
+    def _schedule_ack(self):
+        """ Acknowledge what has been received, once everything that has\
+            arrived together has been handled.
+        """
+        if self._ack_timer is None:
+            if self._loop is None:
+                self._send_ack()
+            else:
+                self._ack_timer = self._loop.call_later(0, self._send_ack)
+
+    def _send_ack(self):
+        self._ack_timer = None
+        blocks = []
+        start = end = None
+        for seq in sorted(self._received):
+            if seq == end:
+                end += 1
+                continue
+            if start is not None:
+                blocks.append((start, end))
+                if len(blocks) == MAX_SACK_BLOCKS:
+                    start = None
+                    break
+            start, end = seq, seq + 1
+        if start is not None:
+            blocks.append((start, end))
+        self.acks_sent += 1
+        self._transmit(b"".join(
+            [_ACK.pack(KIND_ACK, self.session, self._peer_stream,
+                       self._expected, len(blocks))] +
+            [_BLOCK.pack(s - self._expected, e - self._expected)
+             for s, e in blocks]))
+
+    def _on_ack(self, packet):
+        _, _, stream, cumulative, count = _ACK.unpack_from(packet)
+        if stream != self._stream:
+            # For an earlier life of this end
+            return
+        now = time.monotonic()
+        unacked = self._unacked
+        acked = []
+        while unacked and next(iter(unacked)) < cumulative:
+            acked.append(unacked.popitem(last=False))
+        offset = _ACK.size
+        for _ in range(count):
+            if offset + _BLOCK.size > len(packet):
+                break
+            start, end = _BLOCK.unpack_from(packet, offset)
+            offset += _BLOCK.size
+            for seq in range(cumulative + start, cumulative + end):
+                sent = unacked.pop(seq, None)
+                if sent is not None:
+                    acked.append((seq, sent))
+        if not acked:
+            return
+        self._highest_acked = max(
+            self._highest_acked, max(seq for seq, _ in acked))
+        samples = [sent.sent_at for _, sent in acked if not sent.retransmitted]
+        if samples:
+            self._measure_rtt(now - max(samples))
+        elif self._srtt is not None:
+            # Datagrams are getting through again, so stop backing off
+            self._rto = self._base_rto()
+        for _ in acked:
+            if self._window < self._ssthresh:
+                self._window += 1
+            else:
+                self._window += 1 / self._window
+        self._window = min(self._window, MAX_WINDOW)
+        self._detect_losses(now)
+        self._restart_timer()
+        self._send_waiting()
+
+    def _measure_rtt(self, rtt):
+        """ Update the retransmission timeout from a round trip time\
+            measurement, as in RFC 6298.
+        """
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+        else:
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - rtt)
+            self._srtt = 0.875 * self._srtt + 0.125 * rtt
+        self._rto = self._base_rto()
+
+    def _base_rto(self):
+        return min(max(self._srtt + 4 * self._rttvar, MIN_RTO), MAX_RTO)
+
+    def _detect_losses(self, now):
+        """ Send again the datagrams that enough later ones have overtaken.
+        """
+        interval = self._srtt if self._srtt is not None else self._rto
+        for seq, sent in self._unacked.items():
+            if seq + DUP_THRESHOLD > self._highest_acked:
+                break
+            if sent.retransmitted and now - sent.sent_at < interval:
+                # Resent too recently to have been acknowledged yet
+                continue
+            if seq >= self._recovery_end:
+                # A new loss; halve the window (once per window of data)
+                self._ssthresh = max(self._window / 2, MIN_WINDOW)
+                self._window = self._ssthresh
+                self._recovery_end = self._next_seq
+            self._retransmit(seq, sent, now)
+
+    def close(self):
+        """ Stop the connection's timers.
+        """
+        for timer in (self._timer, self._ack_timer):
+            if timer is not None:
+                timer.cancel()
+        self._timer = self._ack_timer = None
+
+    def get_stats(self):
+        """ Get the current values of the connection's counters.
+
+        :rtype: dict(str, int)
+        """
+        stats = {"arq_" + key: getattr(self, key) for key in self.COUNTERS}
+        stats["arq_in_flight"] = len(self._unacked)
+        stats["arq_queued_bytes"] = self.queued_bytes
+        stats["arq_window"] = int(self._window)
+        stats["arq_srtt_usec"] = int((self._srtt or 0) * 1e6)
+        return stats
+
+
+class _ARQProxy(DatagramProxy):
+    """ Support for the two ends of a reliable UDP tunnel.
+    """
+
+    COUNTERS = ("udp_to_arq_packets", "udp_to_arq_bytes",
+                "arq_to_udp_packets", "arq_to_udp_bytes", "arq_connections",
+                "data_before_connection", "udp_errors")
+
+    #: How many datagrams have arrived to go down the tunnel
+    udp_to_arq_packets = 0
+    #: How many bytes have arrived to go down the tunnel
+    udp_to_arq_bytes = 0
+    #: How many datagrams have been forwarded from the tunnel
+    arq_to_udp_packets = 0
+    #: How many bytes have been forwarded from the tunnel
+    arq_to_udp_bytes = 0
+    #: How many tunnel sessions have been started
+    arq_connections = 0
+    #: How many datagrams were discarded because the other side of the proxy
+    #: was not connected yet
+    data_before_connection = 0
+
+    #: The current connection over the tunnel (or ``None`` if there is none)
+    connection = None
+
+    def _init_arq(self, bufsize, ordered, queue_bytes):
+        #: The most data to read at once
+        self.bufsize = bufsize
+        #: Whether datagrams are delivered in the order they were sent
+        self.ordered = ordered
+        #: The most bytes of datagrams to queue while the window is full
+        self.queue_bytes = queue_bytes
+        # The totals of the counters of the connections that have ended
+        self._ended = {
+            "arq_" + key: 0 for key in ARQConnection.COUNTERS}
+
+    def _connect(self, session, transmit, deliver):
+        """ Start a new connection over the tunnel, ending any current one.
+        """
+        self._end_connection()
+        self.connection = ARQConnection(
+            session, transmit, deliver, self.ordered, self.queue_bytes)
+        if self._loop is not None:
+            self.connection.attach(self._loop)
+        self.arq_connections += 1
+
+    def _end_connection(self):
+        if self.connection is not None:
+            self.connection.close()
+            stats = self.connection.get_stats()
+            for key in self._ended:
+                self._ended[key] += stats[key]
+            self.connection = None
+
+    def attach(self, loop):
+        super(_ARQProxy, self).attach(loop)
+        if self.connection is not None:
+            self.connection.attach(loop)
+
+    def get_stats(self):
+        stats = super(_ARQProxy, self).get_stats()
+        stats.update(self._ended)
+        if self.connection is not None:
+            for key, value in self.connection.get_stats().items():
+                stats[key] = stats.get(key, 0) + value
+        return stats
+
+
+class UDPtoARQ(_ARQProxy):
+    """ The proxy client end of a reliable UDP tunnel.
+
+    This proxy listens on a UDP port, and forwards the datagrams that arrive
+    through the tunnel to a proxy server. Datagrams coming back through the
+    tunnel are sent to the last address a UDP datagram was received from.
+
+    The proxy must be attached to an event loop.
+
+    UDP datagrams are taken to be SCP requests (and those coming back to be
+    their responses) if :py:attr:`scp_latency` or :py:attr:`scp_cache` is
+    set.
+    """
+
+    def __init__(self, udp_port, arq_address, bufsize=DEFAULT_BUFFER_SIZE,
+                 ordered=False, queue_bytes=DEFAULT_QUEUE_BYTES):
+        """
+        :param udp_port:
+        :type udp_port: int or None
+        :param tuple(str,int) arq_address: Where the proxy server is.
+        :param int bufsize:
+        :param bool ordered:
+            Whether to deliver datagrams in the order they were sent.
+        :param int queue_bytes:
+            The most bytes of datagrams to queue while the congestion window
+            is full.
+        """
+        self._init_arq(bufsize, ordered, queue_bytes)
+        #: The UDP socket
+        self.udp_sock = udp_socket(bind_port=udp_port)
+        #: The address associated with the UDP socket
+        self.udp_address = None
+        #: The socket for the tunnel
+        try:
+            self.arq_sock = udp_socket(connect_address=arq_address)
+        except Exception as e:
+            self.udp_sock.close()
+            raise e
+        self._connect(random.getrandbits(32), self._transmit, self._forward)
+
+    def udp_to_arq(self):
+        """ Forward a received UDP datagram through the tunnel.
+        """
+        try:
+            datagram, udp_address = self.udp_sock.recvfrom(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if udp_address != self.udp_address:
+            logging.info("new UDP connection from {}".format(udp_address))
+            self.udp_address = udp_address
+        if self.on_boot is not None:
+            self.on_boot()
+        if self.scp_cache is not None and not self.scp_cache.request(
+                datagram, self._reply):
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.request(datagram)
+        self.udp_to_arq_packets += 1
+        self.udp_to_arq_bytes += len(datagram)
+        self.connection.send(datagram)
+
+    def _reply(self, datagram):
+        """ Answer the UDP sender directly, with a cached response.
+        """
+        try:
+            self.udp_sock.sendto(datagram, self.udp_address)
+        except OSError as error:
+            self._udp_error(error)
+
+    def arq_to_udp(self):
+        """ Handle a packet arriving through the tunnel.
+        """
+        try:
+            packet = self.arq_sock.recv(self.bufsize + _DATA.size)
+        except ConnectionRefusedError:
+            # The proxy server is not (yet) there; the datagrams sent will
+            # be sent again
+            return
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if packet_session(packet) == self.connection.session:
+            self.connection.on_packet(packet)
+
+    def _transmit(self, packet):
+        try:
+            self.arq_sock.send(packet)
+        except ConnectionRefusedError:
+            # As though the packet were lost
+            pass
+        except OSError as error:
+            self._udp_error(error)
+
+    def _forward(self, datagram):
+        if self.udp_address is None:
+            logging.warning("got tunnel data before UDP 'connection' made")
+            self.data_before_connection += 1
+            return
+        try:
+            self.udp_sock.sendto(datagram, self.udp_address)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.response(datagram)
+        if self.scp_cache is not None:
+            self.scp_cache.response(datagram)
+        self.arq_to_udp_packets += 1
+        self.arq_to_udp_bytes += len(datagram)
+
+    def get_select_handlers(self):
+        return {
+            self.udp_sock: self.udp_to_arq,
+            self.arq_sock: self.arq_to_udp,
+        }
+
+    def close(self):
+        self._end_connection()
+        if self.udp_sock:
+            self._close_socket(self.udp_sock)
+            self.udp_sock = None
+        if self.arq_sock:
+            self._close_socket(self.arq_sock)
+            self.arq_sock = None
+
+
+class ARQtoUDP(_ARQProxy):
+    """ The proxy server end of a reliable UDP tunnel.
+
+    Datagrams arriving through the tunnel are forwarded as UDP datagrams to
+    the specified destination. UDP datagrams received are forwarded back
+    through the tunnel. When a new proxy client starts a session, any
+    previous one is ended.
+
+    The proxy must be attached to an event loop.
+
+    Datagrams from the tunnel are taken to be SCP requests (and those coming
+    back over UDP to be their responses) if :py:attr:`scp_latency`,
+    :py:attr:`scp_window` or :py:attr:`scp_dedup` is set.
+    """
+
+    def __init__(self, arq_port, udp_address, bufsize=DEFAULT_BUFFER_SIZE,
+                 ordered=False, queue_bytes=DEFAULT_QUEUE_BYTES):
+        """
+        :param arq_port:
+        :type arq_port: int or None
+        :param tuple(str,int) udp_address:
+        :param int bufsize:
+        :param bool ordered:
+            Whether to deliver datagrams in the order they were sent.
+        :param int queue_bytes:
+            The most bytes of datagrams to queue while the congestion window
+            is full.
+        """
+        self._init_arq(bufsize, ordered, queue_bytes)
+        #: The socket for the tunnel
+        self.arq_sock = udp_socket(bind_port=arq_port)
+        #: Where the current proxy client is (or ``None`` if not connected)
+        self.arq_address = None
+        #: The UDP socket
+        try:
+            self.udp_sock = udp_socket(connect_address=udp_address)
+        except Exception as e:
+            self.arq_sock.close()
+            raise e
+
+    def arq_to_udp(self):
+        """ Handle a packet arriving through the tunnel.
+        """
+        try:
+            packet, address = self.arq_sock.recvfrom(
+                self.bufsize + _DATA.size)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        session = packet_session(packet)
+        if session is None:
+            return
+        if self.connection is None or session != self.connection.session:
+            if packet[0] != KIND_DATA:
+                return
+            logging.info("new tunnel session from {}".format(address))
+            self._connect(session, self._transmit, self._forward)
+        # The client may have moved (e.g., a NAT changed its port)
+        self.arq_address = address
+        self.connection.on_packet(packet)
+
+    def _transmit(self, packet):
+        try:
+            self.arq_sock.sendto(packet, self.arq_address)
+        except OSError as error:
+            # As though the packet were lost
+            self._udp_error(error)
+
+    def _forward(self, datagram):
+        if self.scp_dedup is not None and not self.scp_dedup.request(
+                datagram, self.connection.send):
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.request(datagram)
+        if self.scp_window is not None:
+            self.scp_window.request(datagram, self._send_udp)
+        else:
+            self._send_udp(datagram)
+
+    def _send_udp(self, datagram):
+        if self.udp_sock is None:
+            return
+        try:
+            self.udp_sock.send(datagram)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self.arq_to_udp_packets += 1
+        self.arq_to_udp_bytes += len(datagram)
+
+    def udp_to_arq(self):
+        """ Forward a received UDP datagram back through the tunnel.
+        """
+        try:
+            datagram = self.udp_sock.recv(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if self.scp_window is not None:
+            self.scp_window.response(datagram)
+        if self.scp_dedup is not None:
+            self.scp_dedup.response(datagram)
+        if self.connection is None:
+            logging.warning("got UDP data when no tunnel session started")
+            self.data_before_connection += 1
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.response(datagram)
+        self.udp_to_arq_packets += 1
+        self.udp_to_arq_bytes += len(datagram)
+        self.connection.send(datagram)
+
+    def get_select_handlers(self):
+        return {
+            self.arq_sock: self.arq_to_udp,
+            self.udp_sock: self.udp_to_arq,
+        }
+
+    def close(self):
+        self._end_connection()
+        if self.scp_window is not None:
+            self.scp_window.close()
+        if self.arq_sock:
+            self._close_socket(self.arq_sock)
+            self.arq_sock = None
+        if self.udp_sock:
+            self._close_socket(self.udp_sock)
+            self.udp_sock = None
@@ -0,0 +1,516 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" :py:mod:`asyncio` implementations of the proxy classes.
+
+These behave exactly like their counterparts in
+:py:mod:`spinnaker_proxy.proxies` (and use the same wire format over TCP, so
+an asynchronous client can talk to a synchronous server and vice versa), but
+are driven by an :py:mod:`asyncio` event loop so that they can be mixed with
+other coroutines.
+"""
+
+from abc import abstractmethod, ABCMeta as Abstract
+import asyncio
+import logging
+
+from .proxies import DEFAULT_BUFFER_SIZE
+from .support import TCPDatagramProtocol, tcp_socket, udp_socket
+
+
+class _DatagramEndpoint(asyncio.DatagramProtocol):
+    """ Passes datagrams received on a UDP endpoint to a callback.
+    """
+
+    def __init__(self, on_datagram):
+        self._on_datagram = on_datagram
+
+    def datagram_received(self, data, addr):
+        self._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        logging.warning("UDP error: {}".format(exc))
+
+
+class _DatagramTransport(object):
+    """ A minimal datagram transport. Unlike the one built into
+    :py:mod:`asyncio` (which reads a single datagram each time its socket
+    becomes readable), this drains up to :py:attr:`MAX_BATCH` datagrams per
+    wakeup, which greatly reduces the per-datagram overhead under load.
+    """
+
+    #: The most datagrams to read in one go
+    MAX_BATCH = 32
+
+    def __init__(self, loop, sock, protocol, bufsize):
+        self._loop = loop
+        self._sock = sock
+        self._protocol = protocol
+        self._bufsize = bufsize
+        self._paused = False
+        sock.setblocking(False)
+        loop.add_reader(sock, self._read_ready)
+
+    def _read_ready(self):
+        for _ in range(self.MAX_BATCH):
+            if self._paused:
+                # Paused by what was done with the datagram before
+                return
+            try:
+                data, addr = self._sock.recvfrom(self._bufsize)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self._protocol.error_received(e)
+                return
+            self._protocol.datagram_received(data, addr)
+
+    def sendto(self, data, addr=None):
+        """ Send a datagram, dropping it if the socket's buffer is full (just
+        as the network might).
+        """
+        try:
+            if addr is None:
+                self._sock.send(data)
+            else:
+                self._sock.sendto(data, addr)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError as e:
+            self._protocol.error_received(e)
+
+    def pause_reading(self):
+        """ Stop reading datagrams; those that arrive wait in (and may\
+            overflow) the socket's buffer.
+        """
+        if self._sock is not None and not self._paused:
+            self._paused = True
+            self._loop.remove_reader(self._sock)
+
+    def resume_reading(self):
+        """ Start reading datagrams again.
+        """
+        if self._sock is not None and self._paused:
+            self._paused = False
+            self._loop.add_reader(self._sock, self._read_ready)
+
+    def close(self):
+        if self._sock is not None:
+            self._loop.remove_reader(self._sock)
+            self._sock.close()
+            self._sock = None
+
+
+def _datagram_endpoint(loop, sock, on_datagram, bufsize):
+    """ Start reading datagrams from a socket on an event loop.
+
+    :return: The transport for the socket.
+    :rtype: _DatagramTransport
+    """
+    return _DatagramTransport(
+        loop, sock, _DatagramEndpoint(on_datagram), bufsize)
+
+
+# BufferedProtocol lets TCP data be read straight into the framing buffer;
+# it is not available before Python 3.7
+_StreamProtocol = getattr(asyncio, "BufferedProtocol", asyncio.Protocol)
+
+
+class _StreamEndpoint(_StreamProtocol):
+    """ Passes the events on a TCP connection to callbacks.
+    """
+
+    def __init__(self, on_connect, on_data, on_close, on_writing_paused):
+        self._on_connect = on_connect
+        self._on_data = on_data
+        self._on_close = on_close
+        self._on_writing_paused = on_writing_paused
+        #: The transport of the connection
+        self.transport = None
+        #: How to handle messages in the proxy protocol
+        self.tcp_protocol = TCPDatagramProtocol()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._on_connect(self, transport)
+
+    def get_buffer(self, sizehint):
+        return self.tcp_protocol.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self.tcp_protocol.buffer_updated(nbytes)
+        self._on_data(self, self.tcp_protocol.frames())
+
+    def data_received(self, data):
+        self._on_data(self, self.tcp_protocol.recv(data))
+
+    def pause_writing(self):
+        self._on_writing_paused(self, True)
+
+    def resume_writing(self):
+        self._on_writing_paused(self, False)
+
+    def connection_lost(self, exc):
+        self._on_close(self)
+
+
+class AsyncDatagramProxy(object, metaclass=Abstract):
+    """ A simple proxy server, driven by :py:mod:`asyncio`, which\
+        transparently forwards datagram-based communications."""
+
+    #: The event loop the proxy was started on
+    _loop = None
+
+    #: The future set when the proxy is closed
+    _closed = None
+
+    #: Whether the proxy has been closed
+    _is_closed = False
+
+    @abstractmethod
+    async def start(self):
+        """ Open the proxy's sockets and start forwarding datagrams.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self):
+        """ Close all open connections.
+        """
+        raise NotImplementedError
+
+    def _mark_closed(self):
+        self._is_closed = True
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    async def wait_closed(self):
+        """ Wait until the (started) proxy has been closed.
+        """
+        if self._is_closed:
+            return
+        if self._closed is None:
+            self._closed = self._loop.create_future()
+        await self._closed
+
+
+class AsyncUDPtoUDP(AsyncDatagramProxy):
+    """ A UDP to UDP proxy.
+
+    See :py:class:`~spinnaker_proxy.proxies.UDPtoUDP`.
+    """
+
+    def __init__(self, ext_udp_port, int_udp_address,
+                 bufsize=DEFAULT_BUFFER_SIZE):
+        #: The buffer size (usually 4kB)
+        self.bufsize = bufsize
+
+        # The sockets are made immediately, as with the synchronous proxies,
+        # so that any problems with them are reported promptly; they are
+        # owned by their transports once the proxy is started
+
+        #: The external socket
+        self.ext_sock = udp_socket(bind_port=ext_udp_port)
+        try:
+            #: The internal socket
+            self.int_sock = udp_socket(connect_address=int_udp_address)
+        except Exception as e:
+            self.ext_sock.close()
+            raise e
+
+        #: The external transport
+        self.ext_transport = None
+        #: The address associated with the external transport
+        self.ext_address = None
+        #: The internal transport
+        self.int_transport = None
+
+    async def start(self):
+        self._loop = asyncio.get_event_loop()
+        self.int_transport = _datagram_endpoint(
+            self._loop, self.int_sock, self.int_to_ext, self.bufsize)
+        self.ext_transport = _datagram_endpoint(
+            self._loop, self.ext_sock, self.ext_to_int, self.bufsize)
+
+    def ext_to_int(self, datagram, ext_address):
+        """ Forward a UDP datagram arriving from the external endpoint to the\
+            internal endpoint."""
+        if ext_address != self.ext_address:
+            logging.info("new UDP connection from {}".format(ext_address))
+            self.ext_address = ext_address
+        self.int_transport.sendto(datagram)
+
+    def int_to_ext(self, datagram, _address):
+        """ Forward a UDP datagram arriving from the internal endpoint to the\
+            external endpoint."""
+        if self.ext_address is None:
+            logging.warning("got UDP data before UDP 'connection' made")
+            return
+        self.ext_transport.sendto(datagram, self.ext_address)
+
+    def close(self):
+        # Sockets are owned by their transports once started
+        if self.ext_transport:
+            self.ext_transport.close()
+            self.ext_transport = None
+        elif not self._is_closed:
+            self.ext_sock.close()
+        if self.int_transport:
+            self.int_transport.close()
+            self.int_transport = None
+        elif not self._is_closed:
+            self.int_sock.close()
+        self._mark_closed()
+
+
+class AsyncUDPtoTCP(AsyncDatagramProxy):
+    """ Forward UDP datagrams over a TCP connection.
+
+    See :py:class:`~spinnaker_proxy.proxies.UDPtoTCP`. Unlike that class, the
+    TCP connection is made (asynchronously) when the proxy is started; if it is
+    closed by the other end, the proxy closes too.
+    """
+
+    def __init__(self, udp_port, tcp_address,
+                 bufsize=DEFAULT_BUFFER_SIZE):
+        """
+        :param udp_port:
+        :type udp_port: int or None
+        :param str tcp_address:
+        :param int bufsize:
+        """
+        #: The buffer size (usually 4kB)
+        self.bufsize = bufsize
+        #: The UDP socket (owned by :py:attr:`udp_transport` once started)
+        self.udp_sock = udp_socket(bind_port=udp_port)
+        self._tcp_address = tcp_address
+
+        #: The UDP transport
+        self.udp_transport = None
+        #: The address associated with the UDP transport
+        self.udp_address = None
+        #: The TCP (client) transport
+        self.tcp_transport = None
+
+        #: How to handle messages in the proxy protocol
+        self.tcp_protocol = None
+
+    async def start(self):
+        self._loop = asyncio.get_event_loop()
+        # Connect before reading UDP, so early datagrams wait in the kernel
+        try:
+            host, port = self._tcp_address
+            await self._loop.create_connection(
+                lambda: _StreamEndpoint(
+                    self._on_connect, self.tcp_to_udp, self._on_close,
+                    self._on_writing_paused),
+                host, port)
+        except Exception as e:
+            self.close()
+            raise e
+        self.udp_transport = _datagram_endpoint(
+            self._loop, self.udp_sock, self.udp_to_tcp, self.bufsize)
+
+    def _on_connect(self, endpoint, transport):
+        self.tcp_transport = transport
+        self.tcp_protocol = endpoint.tcp_protocol
+
+    def _on_writing_paused(self, _endpoint, paused):
+        # Leave datagrams in the kernel while the TCP connection is full
+        if self.udp_transport is None:
+            pass
+        elif paused:
+            self.udp_transport.pause_reading()
+        else:
+            self.udp_transport.resume_reading()
+
+    def _on_close(self, _endpoint):
+        self.tcp_transport = None
+        self.close()
+
+    def udp_to_tcp(self, datagram, udp_address):
+        """ Forward received UDP datagrams over TCP.
+        """
+        if udp_address != self.udp_address:
+            logging.info("new UDP connection from {}".format(udp_address))
+            self.udp_address = udp_address
+        if self.tcp_transport is not None:
+            self.tcp_transport.writelines(self.tcp_protocol.encode(datagram))
+
+    def tcp_to_udp(self, _endpoint, datagrams):
+        """ Forward datagrams unpacked from received TCP data over UDP.
+        """
+        for datagram in datagrams:
+            # Forward the datagram to the last UDP address received from
+            if self.udp_address is None:
+                logging.warning("got TCP data before UDP 'connection' made")
+                continue
+            self.udp_transport.sendto(datagram, self.udp_address)
+
+    def close(self):
+        if self.udp_transport:
+            self.udp_transport.close()
+            self.udp_transport = None
+        elif not self._is_closed:
+            self.udp_sock.close()
+        if self.tcp_transport:
+            transport, self.tcp_transport = self.tcp_transport, None
+            transport.close()
+        self._mark_closed()
+
+
+class AsyncTCPtoUDP(AsyncDatagramProxy):
+    """ Unpack datagrams sent over a TCP connection into UDP datagrams.
+
+    See :py:class:`~spinnaker_proxy.proxies.TCPtoUDP`. When a connection is
+    made to the TCP server, all previous TCP connections are closed.
+    """
+
+    def __init__(self, tcp_port, udp_address,
+                 bufsize=DEFAULT_BUFFER_SIZE):
+        """
+        :param tcp_port:
+        :type tcp_port: int or None
+        :param str udp_address:
+        :param int bufsize:
+        """
+        #: The buffer size (usually 4kB)
+        self.bufsize = bufsize
+        #: The TCP server socket (owned by :py:attr:`tcp_server` once started)
+        self.tcp_listen_sock = tcp_socket(bind_port=tcp_port)
+        self.tcp_listen_sock.listen(1)
+        try:
+            #: The UDP socket (owned by :py:attr:`udp_transport` once started)
+            self.udp_sock = udp_socket(connect_address=udp_address)
+        except Exception as e:
+            self.tcp_listen_sock.close()
+            raise e
+
+        #: The TCP server
+        self.tcp_server = None
+        #: The endpoint of the most recently connected client (or ``None``
+        #: if not connected)
+        self.tcp_endpoint = None
+        #: How to handle messages in the proxy protocol
+        self.tcp_protocol = None
+        #: The UDP transport
+        self.udp_transport = None
+
+    async def start(self):
+        self._loop = asyncio.get_event_loop()
+        self.udp_transport = _datagram_endpoint(
+            self._loop, self.udp_sock, self.udp_to_tcp, self.bufsize)
+        self.tcp_server = await self._loop.create_server(
+            lambda: _StreamEndpoint(
+                self.on_connect, self.tcp_to_udp, self._on_close,
+                self._on_writing_paused),
+            sock=self.tcp_listen_sock, backlog=1)
+
+    def _close_endpoint(self):
+        if self.tcp_endpoint is not None:
+            endpoint, self.tcp_endpoint = self.tcp_endpoint, None
+            endpoint.transport.close()
+            self._pause_udp(False)
+
+    def on_connect(self, endpoint, transport):
+        """ Callback to handle new TCP connections.
+        """
+        self._close_endpoint()
+        self.tcp_endpoint = endpoint
+        self.tcp_protocol = endpoint.tcp_protocol
+        logging.info("new TCP connection from {}".format(
+            transport.get_extra_info("peername")))
+
+    def _on_writing_paused(self, endpoint, paused):
+        if endpoint is self.tcp_endpoint:
+            self._pause_udp(paused)
+
+    def _pause_udp(self, paused):
+        # Leave datagrams in the kernel while the TCP connection is full (but
+        # not once it is gone)
+        if self.udp_transport is None:
+            pass
+        elif paused:
+            self.udp_transport.pause_reading()
+        else:
+            self.udp_transport.resume_reading()
+
+    def _on_close(self, endpoint):
+        if endpoint is self.tcp_endpoint:
+            self.tcp_endpoint = None
+            self._pause_udp(False)
+
+    def udp_to_tcp(self, datagram, _address):
+        """ Forward received UDP datagrams over TCP.
+        """
+        if self.tcp_endpoint is None:
+            logging.warning("got UDP data when TCP connection not made")
+            return
+        self.tcp_endpoint.transport.writelines(
+            self.tcp_protocol.encode(datagram))
+
+    def tcp_to_udp(self, endpoint, datagrams):
+        """ Forward datagrams unpacked from received TCP data over UDP.
+        """
+        if endpoint is not self.tcp_endpoint:
+            return
+        for datagram in datagrams:
+            self.udp_transport.sendto(datagram)
+
+    def close(self):
+        if self.udp_transport:
+            self.udp_transport.close()
+            self.udp_transport = None
+        elif not self._is_closed:
+            self.udp_sock.close()
+        if self.tcp_server:
+            self.tcp_server.close()
+            self.tcp_server = None
+        elif not self._is_closed:
+            self.tcp_listen_sock.close()
+        self._close_endpoint()
+        self._mark_closed()
+
+
+async def run_proxies_async(datagram_proxies, stop=None):
+    """ Run a given set of asynchronous proxy servers.
+
+    :param ~typing.Iterable(AsyncDatagramProxy) datagram_proxies:
+        The proxies to run.
+    :param stop: A way to ask the proxies to shut down. If not provided,
+        runs until all the proxies have closed themselves (or the task
+        running this is cancelled).
+    :type stop: ~asyncio.Event or None
+    """
+    datagram_proxies = list(datagram_proxies)
+    if not datagram_proxies:
+        return
+    try:
+        for p in datagram_proxies:
+            await p.start()
+
+        waiters = [asyncio.ensure_future(
+            asyncio.wait([asyncio.ensure_future(p.wait_closed())
+                          for p in datagram_proxies]))]
+        if stop is not None:
+            waiters.append(asyncio.ensure_future(stop.wait()))
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+    finally:
+        for p in datagram_proxies:
+            p.close()
@@ -0,0 +1,108 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Understanding just enough of the SpiNNaker boot protocol to recognise\
+    a boot sequence going by.
+
+A boot packet is a big-endian 16-bit protocol version, then a big-endian
+32-bit operation and three 32-bit arguments, followed by the data. A board
+is booted by a sequence of packets: a ``START``, the image in a series of
+``BLOCK`` packets, and an ``END``. Boards do not answer boot packets.
+"""
+
+import hashlib
+import struct
+
+_BOOT_HEADER = struct.Struct("!H4I")
+
+#: The operation that starts a boot sequence
+OP_START = 1
+#: The operation that carries a block of the boot image
+OP_BLOCK = 3
+#: The operation that ends a boot sequence
+OP_END = 5
+
+# How each packet of a stored sequence is prefixed: the time since the one
+# before in microseconds, and its length
+_RECORD = struct.Struct("!IH")
+
+
+def boot_operation(datagram):
+    """ Get the operation of a boot packet.
+
+    :param datagram: The packet, as sent over UDP.
+    :type datagram: bytes or memoryview
+    :return: The operation, or ``None`` if the datagram is too short to be a
+        boot packet.
+    :rtype: int or None
+    """
+    if len(datagram) < _BOOT_HEADER.size:
+        return None
+    return _BOOT_HEADER.unpack_from(datagram)[1]
+
+
+def sequence_digest(datagrams):
+    """ Identify a boot sequence by its content (but not its timing).
+
+    :param ~typing.Iterable(bytes) datagrams: The packets of the sequence.
+    :return: A SHA-256 digest.
+    :rtype: bytes
+    """
+    digest = hashlib.sha256()
+    for datagram in datagrams:
+        digest.update(_RECORD.pack(0, len(datagram)))
+        digest.update(datagram)
+    return digest.digest()
+
+
+def encode_sequence(packets):
+    """ Pack up a boot sequence, with its timing, to send or store.
+
+    :param ~typing.Iterable(tuple(float,bytes)) packets:
+        The time (in seconds) since the packet before, and the packet, for
+        each packet of the sequence.
+    :rtype: bytes
+    """
+    parts = []
+    for gap, datagram in packets:
+        parts.append(_RECORD.pack(
+            min(int(gap * 1e6), 0xFFFFFFFF), len(datagram)))
+        parts.append(bytes(datagram))
+    return b"".join(parts)
+
+
+def decode_sequence(data):
+    """ Unpack a boot sequence packed by :py:func:`encode_sequence`.
+
+    :param data: The packed sequence (e.g., a memory-mapped file).
+    :type data: bytes or memoryview or mmap.mmap
+    :return: The time (in seconds) since the packet before, and a view of
+        the packet, for each packet of the sequence.
+    :rtype: list(tuple(float,memoryview))
+    :raises ValueError: If the data is truncated.
+    """
+    view = memoryview(data)
+    packets = []
+    offset = 0
+    while offset < len(view):
+        if offset + _RECORD.size > len(view):
+            raise ValueError("truncated boot sequence")
+        gap, length = _RECORD.unpack_from(view, offset)
+        offset += _RECORD.size
+        if offset + length > len(view):
+            raise ValueError("truncated boot sequence")
+        packets.append((gap / 1e6, view[offset:offset + length]))
+        offset += length
+    return packets
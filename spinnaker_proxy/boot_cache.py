@@ -0,0 +1,468 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Booting boards from a cache of boot images held by the proxy server, so\
+    that an image only crosses the Internet the first time it is used.
+
+The proxy client holds back each boot sequence until it ends, and then
+offers the server the sequence's digest. If the server has the sequence
+cached, it replays it to the board (with its original timing) and says so;
+otherwise the client sends the whole sequence, which the server stores and
+then replays.
+
+Over the TCP tunnel, each frame starts with a byte saying what it is:
+``DATA`` (followed by a datagram to forward, as in the plain TCP tunnel),
+``OFFER`` (followed by a digest), ``HIT`` or ``MISS`` (the server's answer
+to an offer, followed by the digest) and ``SEQUENCE`` (followed by the
+digest and the encoded sequence).
+"""
+
+from collections import OrderedDict
+from functools import partial
+import logging
+import mmap
+import os
+import time
+
+from .boot import (
+    OP_END, OP_START, boot_operation, decode_sequence, encode_sequence,
+    sequence_digest)
+from .proxies import TCPtoUDP, UDPtoTCP
+
+#: The default directory the proxy server caches boot sequences in
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "spinnaker_proxy", "boot")
+
+#: The default most bytes of boot sequences to cache
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+#: The largest boot sequence (in bytes) the proxy client will hold back
+MAX_SEQUENCE_BYTES = 1024 * 1024
+
+#: How long (in seconds) the proxy client waits for the next packet of a
+#: boot sequence before giving up on it and forwarding what it has
+SEQUENCE_TIMEOUT = 2.0
+
+MSG_DATA = 0
+MSG_OFFER = 1
+MSG_HIT = 2
+MSG_MISS = 3
+MSG_SEQUENCE = 4
+
+_DIGEST_SIZE = 32
+
+
+class BootImageCache(object):
+    """ Boot sequences, stored on disk by their digests.
+
+    When the sequences take up more than a given size, the least recently
+    used are removed. Sequences are read by memory-mapping their files.
+    """
+
+    #: The suffix of the files holding sequences
+    SUFFIX = ".boot"
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY,
+                 max_bytes=DEFAULT_CACHE_BYTES):
+        """
+        :param str directory: Where to store sequences.
+        :param int max_bytes: The most bytes of sequences to keep.
+        """
+        #: Where sequences are stored
+        self.directory = directory
+        #: The most bytes of sequences to keep
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # Sizes of the stored sequences, least recently used first
+        self._sizes = OrderedDict()
+        entries = []
+        for name in os.listdir(directory):
+            key, suffix = os.path.splitext(name)
+            if suffix != self.SUFFIX or len(key) != 2 * _DIGEST_SIZE:
+                continue
+            try:
+                st = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, key, st.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+        #: How many bytes of sequences are stored
+        self.total_bytes = sum(self._sizes.values())
+        self._evict()
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __contains__(self, digest):
+        return digest.hex() in self._sizes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, digest):
+        """ Get a stored sequence, making it the most recently used.
+
+        :param bytes digest: The digest of the sequence.
+        :return: The encoded sequence, or ``None`` if it is not stored.
+        :rtype: mmap.mmap or None
+        """
+        key = digest.hex()
+        if key not in self._sizes:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Removed (or spoiled) behind our back
+            self.total_bytes -= self._sizes.pop(key)
+            return None
+        self._sizes.move_to_end(key)
+        return data
+
+    def store(self, digest, data):
+        """ Store a sequence, removing the least recently used sequences if\
+            there is not room for it.
+
+        :param bytes digest: The digest of the sequence.
+        :param bytes data: The encoded sequence.
+        :return: Whether the sequence was stored (i.e., was not too big).
+        :rtype: bool
+        :raises OSError:
+            If the sequence could not be written (e.g., the disk is full).
+        """
+        if len(data) > self.max_bytes:
+            return False
+        key = digest.hex()
+        path = self._path(key)
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            with open(temporary, "wb") as f:
+                f.write(data)
+            # Other processes only ever see whole files
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            raise
+        self.total_bytes += len(data) - self._sizes.pop(key, 0)
+        self._sizes[key] = len(data)
+        self._evict()
+        return True
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+def _message(kind, *parts):
+    return bytes([kind]) + b"".join(parts)
+
+
+class BootCacheUDPtoTCP(UDPtoTCP):
+    """ The proxy client end of a TCP boot tunnel that boots boards from the\
+        proxy server's cache of boot sequences where it can.
+
+    Boot sequences are held back until they end (or stall, or get too big,
+    when they are forwarded as they are), so a board is booted once the
+    whole sequence has reached the proxy client. The proxy must be attached
+    to an event loop.
+    """
+
+    COUNTERS = UDPtoTCP.COUNTERS + ("boot_cache_hits", "boot_cache_misses")
+
+    #: How many boot sequences the server had cached
+    boot_cache_hits = 0
+    #: How many boot sequences had to be sent to the server
+    boot_cache_misses = 0
+
+    def __init__(self, *args, **kwargs):
+        super(BootCacheUDPtoTCP, self).__init__(*args, **kwargs)
+        # The sequence being held back: the time each packet arrived, and
+        # the packet (or None if not in a sequence)
+        self._sequence = None
+        self._sequence_bytes = 0
+        self._timer = None
+        # The encoded sequences offered to the server, by digest
+        self._offers = {}
+
+    def udp_to_tcp(self):
+        try:
+            datagram, udp_address = self.udp_sock.recvfrom(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if udp_address != self.udp_address:
+            logging.info("new UDP connection from {}".format(udp_address))
+            self.udp_address = udp_address
+        if self.on_boot is not None:
+            self.on_boot()
+        operation = boot_operation(datagram)
+        if operation == OP_START:
+            self._forward_sequence()
+            self._sequence = []
+            self._sequence_bytes = 0
+        if self._sequence is None:
+            self._send_datagram(_message(MSG_DATA, datagram))
+            return
+        self._sequence.append((time.monotonic(), datagram))
+        self._sequence_bytes += len(datagram)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if operation == OP_END:
+            self._offer()
+        elif self._sequence_bytes > MAX_SEQUENCE_BYTES:
+            self._forward_sequence()
+        else:
+            self._timer = self._loop.call_later(
+                SEQUENCE_TIMEOUT, self._forward_sequence)
+
+    def _gaps(self):
+        """ The sequence being held back, with the time between packets.
+        """
+        last = self._sequence[0][0]
+        for when, datagram in self._sequence:
+            yield when - last, datagram
+            last = when
+
+    def _offer(self):
+        digest = sequence_digest(d for _, d in self._sequence)
+        self._offers[digest] = encode_sequence(self._gaps())
+        self._sequence = None
+        self._send_datagram(_message(MSG_OFFER, digest))
+
+    def _forward_sequence(self):
+        """ Forward the packets of a sequence that is not going to be\
+            offered to the server.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._sequence is None:
+            return
+        sequence, self._sequence = self._sequence, None
+        for _, datagram in sequence:
+            self._send_datagram(_message(MSG_DATA, datagram))
+
+    def tcp_to_udp(self):
+        try:
+            if self.tcp_protocol.recv_into(self.tcp_sock, self.bufsize) == 0:
+                # A zero read means we're done
+                self._connection_lost()
+                return
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            self._connection_lost()
+            return
+        for frame in self.tcp_protocol.frames():
+            kind = frame[0]
+            if kind == MSG_DATA:
+                self._forward(frame[1:])
+                continue
+            digest = bytes(frame[1:])
+            sequence = self._offers.pop(digest, None)
+            if kind == MSG_HIT:
+                self.boot_cache_hits += 1
+                logging.info("proxy server booting from its cache")
+            elif kind == MSG_MISS and sequence is not None:
+                self.boot_cache_misses += 1
+                logging.info("sending boot sequence to proxy server")
+                self._send_datagram(_message(MSG_SEQUENCE, digest, sequence))
+        self._flush_protocol()
+
+    def _on_reconnect(self):
+        # The answers to offers made before the connection was lost may have
+        # been lost with it
+        for digest in self._offers:
+            self._send_datagram(_message(MSG_OFFER, digest))
+
+    def _forward(self, datagram):
+        if self.udp_address is None:
+            logging.warning("got TCP data before UDP 'connection' made")
+            self.data_before_connection += 1
+            return
+        try:
+            self.udp_sock.sendto(datagram, self.udp_address)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self.tcp_to_udp_packets += 1
+        self.tcp_to_udp_bytes += len(datagram)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        super(BootCacheUDPtoTCP, self).close()
+
+
+class BootCacheTCPtoUDP(TCPtoUDP):
+    """ The proxy server end of a TCP boot tunnel that boots boards from a\
+        cache of boot sequences where it can.
+
+    Sequences are replayed to the board with the timing they had when they
+    arrived at the proxy client (but no closer together than the UDP gap).
+    The proxy must be attached to an event loop.
+    """
+
+    COUNTERS = TCPtoUDP.COUNTERS + (
+        "boot_cache_hits", "boot_cache_misses", "boot_packets_replayed")
+
+    #: How many boot sequences were replayed from the cache
+    boot_cache_hits = 0
+    #: How many boot sequences were not in the cache
+    boot_cache_misses = 0
+    #: How many boot packets have been replayed to the board
+    boot_packets_replayed = 0
+
+    def __init__(self, tcp_port, udp_address, cache, **kwargs):
+        """
+        :param tcp_port:
+        :type tcp_port: int or None
+        :param tuple(str,int) udp_address:
+        :param BootImageCache cache: Where boot sequences are kept.
+        :param kwargs: As for :py:class:`~.TCPtoUDP`.
+        """
+        super(BootCacheTCPtoUDP, self).__init__(
+            tcp_port, udp_address, **kwargs)
+        #: Where boot sequences are kept
+        self.cache = cache
+        # The timers of the packets being replayed
+        self._replay_timers = []
+
+    def udp_to_tcp(self):
+        try:
+            datagram = self.udp_sock.recv(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if self.tcp_sock is None:
+            logging.warning("got UDP data when TCP connection not made")
+            self.data_before_connection += 1
+            return
+        self._send_datagram(_message(MSG_DATA, datagram))
+
+    def tcp_to_udp(self):
+        try:
+            received = self.tcp_protocol.recv_into(
+                self.tcp_sock, self.bufsize)
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            received = 0
+        if received == 0:
+            # Socket closed.
+            self._close_sock()
+            return
+        for frame in self.tcp_protocol.frames():
+            kind = frame[0]
+            if kind == MSG_DATA:
+                self._forward_udp(frame[1:])
+            elif kind == MSG_OFFER:
+                self._on_offer(bytes(frame[1:]))
+            elif kind == MSG_SEQUENCE:
+                self._on_sequence(
+                    bytes(frame[1:1 + _DIGEST_SIZE]),
+                    bytes(frame[1 + _DIGEST_SIZE:]))
+        self._flush_protocol()
+
+    def _on_offer(self, digest):
+        sequence = self.cache.get(digest)
+        if sequence is None:
+            self.boot_cache_misses += 1
+            self._send_datagram(_message(MSG_MISS, digest))
+            return
+        self.boot_cache_hits += 1
+        logging.info("booting from cached sequence {}".format(
+            digest.hex()[:16]))
+        self._send_datagram(_message(MSG_HIT, digest))
+        self._replay(sequence)
+
+    def _on_sequence(self, digest, data):
+        try:
+            packets = decode_sequence(data)
+        except ValueError as e:
+            logging.warning("bad boot sequence: {}".format(e))
+            return
+        if sequence_digest(p for _, p in packets) != digest:
+            logging.warning("boot sequence does not match its digest")
+            return
+        try:
+            self.cache.store(digest, data)
+        except OSError as e:
+            # The board can still be booted; just not from the cache
+            logging.warning("could not cache boot sequence: {}".format(e))
+        self._replay(data)
+
+    def _replay(self, sequence):
+        """ Send a sequence's packets to the board, with their timing.
+
+        :param sequence: The encoded sequence; if memory-mapped, it is
+            closed once its packets have been copied out.
+        :type sequence: bytes or mmap.mmap
+        """
+        try:
+            packets = [(gap, bytes(datagram))
+                       for gap, datagram in decode_sequence(sequence)]
+        finally:
+            if isinstance(sequence, mmap.mmap):
+                sequence.close()
+        # Forget those that have gone off
+        self._replay_timers = [
+            timer for timer in self._replay_timers if not timer.cancelled]
+        when = time.monotonic()
+        for gap, datagram in packets:
+            when += gap
+            self._replay_timers.append(self._loop.call_at(
+                when, partial(self._replay_packet, datagram)))
+
+    def _cancel_replay(self):
+        for timer in self._replay_timers:
+            timer.cancel()
+        self._replay_timers = []
+
+    def _replay_packet(self, datagram):
+        if self._pacer is not None:
+            self._pacer.call(
+                partial(self._send_replayed, datagram), len(datagram))
+        else:
+            self._send_replayed(datagram)
+
+    def _send_replayed(self, datagram):
+        if self.udp_sock is None:
+            return
+        try:
+            self.udp_sock.send(datagram)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self.boot_packets_replayed += 1
+
+    def _close_sock(self):
+        # The proxy client offers the sequence again once it reconnects, so
+        # the rest of this replay is not wanted
+        self._cancel_replay()
+        super(BootCacheTCPtoUDP, self)._close_sock()
@@ -0,0 +1,496 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Reading and writing large regions of a board's memory with the SCP\
+    transactions done by the proxy server, so that only one request (and\
+    the data) crosses the Internet, instead of a request and response for\
+    every 256 bytes.
+
+Over the TCP connection to the proxy server, each frame starts with a byte
+saying what it is: ``READ`` (followed by the operation's ID, the X and Y
+coordinates of the chip, the address and the length), ``WRITE`` (the ID,
+X, Y and address, followed by the data), ``DATA`` (from the server: the ID
+and offset, followed by data that has been read) and ``DONE`` (from the
+server: the ID and the SCP return code of the operation, which is ``0`` if
+the board stopped responding).
+"""
+
+from collections import OrderedDict, deque
+import logging
+import struct
+import time
+
+from .proxies import DEFAULT_BUFFER_SIZE, TCPtoUDP
+from .scp import RC_OK, parse_header
+from .support import TCPDatagramProtocol, tcp_socket
+
+MSG_READ = 0
+MSG_WRITE = 1
+MSG_DATA = 2
+MSG_DONE = 3
+
+_READ = struct.Struct("<BIBBII")
+_WRITE = struct.Struct("<BIBBI")
+_DATA = struct.Struct("<BII")
+_DONE = struct.Struct("<BIH")
+
+# The SDP header (to the monitor of a chip) and SCP header of a request
+_REQUEST = struct.Struct("<2xBBBBBBBBHHIII")
+
+#: The SCP command to read memory
+SCP_READ = 2
+
+#: The SCP command to write memory
+SCP_WRITE = 3
+
+#: The most bytes an SCP request reads or writes
+MAX_TRANSFER = 256
+
+#: The return code of an operation the board stopped responding to
+RC_TIMEOUT = 0
+
+#: The return code of an operation the board read the wrong amount for
+RC_LEN = 0x81
+
+#: The default most SCP requests the proxy server has outstanding at the
+#: board at once
+DEFAULT_BULK_WINDOW = 8
+
+#: The default time (in seconds) the proxy server waits for the response to
+#: an SCP request before sending it again
+DEFAULT_BULK_TIMEOUT = 0.5
+
+#: The default number of times an SCP request is sent again before the
+#: operation fails
+DEFAULT_BULK_RETRIES = 5
+
+#: The most data read (in bytes) that the proxy server gathers before
+#: sending it back
+CHUNK_SIZE = 64 * 1024
+
+
+class BulkError(Exception):
+    """ A bulk read or write failed.
+    """
+
+    def __init__(self, rc):
+        """
+        :param int rc:
+            The SCP return code the board gave, or :py:data:`RC_TIMEOUT`.
+        """
+        super(BulkError, self).__init__(
+            "board stopped responding" if rc == RC_TIMEOUT else
+            "board returned {:#x}".format(rc))
+        #: The SCP return code the board gave, or :py:data:`RC_TIMEOUT`
+        self.rc = rc
+
+
+def scp_transfer(command, seq, x, y, address, length, data=b""):
+    """ Make an SCP request to read or write memory on a chip.
+
+    :param int command: :py:data:`SCP_READ` or :py:data:`SCP_WRITE`.
+    :param int seq: The sequence number.
+    :param int x: The X coordinate of the chip.
+    :param int y: The Y coordinate of the chip.
+    :param int address: Where to read or write.
+    :param int length: How many bytes to read or write.
+    :param bytes data: What to write.
+    :rtype: bytes
+    """
+    # Move words where possible, as the board is quicker at it
+    if address % 4 == 0 and length % 4 == 0:
+        unit = 2
+    elif address % 2 == 0 and length % 2 == 0:
+        unit = 1
+    else:
+        unit = 0
+    return _REQUEST.pack(
+        0x87, 0xff, 0, 0xff, y, x, 0, 0, command, seq,
+        address, length, unit) + data
+
+
+class _Operation(object):
+    """ A bulk read or write being done by the proxy server.
+    """
+
+    __slots__ = ["ident", "command", "x", "y", "address", "length", "data",
+                 "issued", "completed", "pieces", "flushed", "failed"]
+
+    def __init__(self, ident, command, x, y, address, length, data=None):
+        self.ident = ident
+        self.command = command
+        self.x = x
+        self.y = y
+        self.address = address
+        self.length = length
+        #: What to write (or ``None`` for a read)
+        self.data = data
+        #: How many bytes have been asked for
+        self.issued = 0
+        #: How many bytes have been read or written
+        self.completed = 0
+        #: Map from offset to data read but not yet sent back
+        self.pieces = {}
+        #: How many bytes of data read have been sent back
+        self.flushed = 0
+        #: Whether the operation has failed
+        self.failed = False
+
+
+class _Transaction(object):
+    """ An SCP request done for a bulk operation.
+    """
+
+    __slots__ = ["operation", "offset", "length", "request", "retries"]
+
+    def __init__(self, operation, offset, length, request):
+        self.operation = operation
+        self.offset = offset
+        self.length = length
+        self.request = request
+        self.retries = 0
+
+
+class BulkTCPtoUDP(TCPtoUDP):
+    """ The proxy server end of a TCP connection for bulk reads and writes\
+        of a board's memory.
+
+    Each operation is split into SCP ``READ`` or ``WRITE`` requests of at
+    most :py:data:`MAX_TRANSFER` bytes, which are sent to the board with up
+    to a window of them outstanding at once, and sent again if they get no
+    response. The data read is sent back in chunks of up to
+    :py:data:`CHUNK_SIZE` bytes, in order. No new requests are sent while
+    the TCP connection is full. The proxy must be attached to an event loop.
+    """
+
+    COUNTERS = TCPtoUDP.COUNTERS + (
+        "bulk_operations", "bulk_failures", "bulk_scp_requests",
+        "bulk_scp_retries", "bulk_bytes_read", "bulk_bytes_written")
+
+    #: How many bulk operations have been asked for
+    bulk_operations = 0
+    #: How many bulk operations failed
+    bulk_failures = 0
+    #: How many SCP requests have been sent to the board
+    bulk_scp_requests = 0
+    #: How many SCP requests were sent again for want of a response
+    bulk_scp_retries = 0
+    #: How many bytes have been read from the board
+    bulk_bytes_read = 0
+    #: How many bytes have been written to the board
+    bulk_bytes_written = 0
+
+    def __init__(self, tcp_port, udp_address, window=DEFAULT_BULK_WINDOW,
+                 timeout=DEFAULT_BULK_TIMEOUT, retries=DEFAULT_BULK_RETRIES,
+                 **kwargs):
+        """
+        :param tcp_port:
+        :type tcp_port: int or None
+        :param tuple(str,int) udp_address: The board's SCP address.
+        :param int window:
+            The most SCP requests to have outstanding at the board at once.
+        :param float timeout:
+            How long (in seconds) to wait for a response before sending a
+            request again.
+        :param int retries:
+            How many times to send a request again before giving up.
+        :param kwargs: As for :py:class:`~.TCPtoUDP`.
+        """
+        super(BulkTCPtoUDP, self).__init__(tcp_port, udp_address, **kwargs)
+        #: The most SCP requests to have outstanding at the board at once
+        self.window = window
+        #: How long to wait for a response before sending a request again
+        self.timeout = timeout
+        #: How many times to send a request again before giving up
+        self.retries = retries
+        # The operations with requests still to send, oldest first
+        self._waiting = deque()
+        # Map from sequence number to (transaction, when to give up on it),
+        # in the order they will be given up on
+        self._outstanding = OrderedDict()
+        self._seq = 0
+        self._timer = None
+
+    def udp_to_tcp(self):
+        try:
+            datagram = self.udp_sock.recv(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        header = parse_header(datagram)
+        if header is None:
+            return
+        entry = self._outstanding.pop(header[2], None)
+        if entry is None:
+            # A response to a request that was sent again
+            return
+        transaction = entry[0]
+        operation = transaction.operation
+        if header[1] != RC_OK:
+            self._fail(operation, header[1])
+        elif operation.command == SCP_READ:
+            data = datagram[14:]
+            if len(data) != transaction.length:
+                logging.warning("short bulk read: {} of {} bytes".format(
+                    len(data), transaction.length))
+                self._fail(operation, RC_LEN)
+            else:
+                operation.pieces[transaction.offset] = data
+                self.bulk_bytes_read += len(data)
+                self._completed(operation, transaction.length)
+        else:
+            self.bulk_bytes_written += transaction.length
+            self._completed(operation, transaction.length)
+        self._fill()
+
+    def tcp_to_udp(self):
+        try:
+            received = self.tcp_protocol.recv_into(
+                self.tcp_sock, self.bufsize)
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            received = 0
+        if received == 0:
+            # Socket closed.
+            self._close_sock()
+            return
+        for frame in self.tcp_protocol.frames():
+            kind = frame[0]
+            if kind == MSG_READ and len(frame) == _READ.size:
+                _, ident, x, y, address, length = _READ.unpack_from(frame)
+                self._start(_Operation(
+                    ident, SCP_READ, x, y, address, length))
+            elif kind == MSG_WRITE and len(frame) >= _WRITE.size:
+                _, ident, x, y, address = _WRITE.unpack_from(frame)
+                data = bytes(frame[_WRITE.size:])
+                self._start(_Operation(
+                    ident, SCP_WRITE, x, y, address, len(data), data))
+            else:
+                logging.warning("bad bulk request")
+        self._fill()
+
+    def _start(self, operation):
+        self.bulk_operations += 1
+        if operation.length:
+            self._waiting.append(operation)
+        else:
+            self._done(operation, RC_OK)
+
+    def _fill(self):
+        """ Send requests to the board while the window allows.
+        """
+        while self._waiting and len(self._outstanding) < self.window and \
+                self.tcp_sock is not None and not self.tcp_queue.is_full:
+            operation = self._waiting[0]
+            offset = operation.issued
+            length = min(MAX_TRANSFER, operation.length - offset)
+            operation.issued += length
+            if operation.issued == operation.length:
+                self._waiting.popleft()
+            data = b""
+            if operation.data is not None:
+                data = operation.data[offset:offset + length]
+            seq = self._seq
+            self._seq = (seq + 1) & 0xFFFF
+            self._send(seq, _Transaction(
+                operation, offset, length, scp_transfer(
+                    operation.command, seq, operation.x, operation.y,
+                    operation.address + offset, length, data)))
+
+    def _send(self, seq, transaction):
+        self._outstanding[seq] = (
+            transaction, time.monotonic() + self.timeout)
+        try:
+            self.udp_sock.send(transaction.request)
+        except OSError as error:
+            # Sent again when it times out, as though it were lost
+            self._udp_error(error)
+        self.bulk_scp_requests += 1
+        if self._timer is None:
+            self._timer = self._loop.call_at(
+                next(iter(self._outstanding.values()))[1], self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        now = time.monotonic()
+        outstanding = self._outstanding
+        while outstanding:
+            seq, (transaction, expires) = next(iter(outstanding.items()))
+            if expires > now:
+                break
+            del outstanding[seq]
+            if transaction.retries < self.retries:
+                transaction.retries += 1
+                self.bulk_scp_retries += 1
+                self._send(seq, transaction)
+            else:
+                self._fail(transaction.operation, RC_TIMEOUT)
+        self._fill()
+        if outstanding and self._timer is None:
+            self._timer = self._loop.call_at(
+                next(iter(outstanding.values()))[1], self._on_timer)
+
+    def _completed(self, operation, length):
+        operation.completed += length
+        if operation.command == SCP_READ:
+            self._flush(operation)
+        if operation.completed == operation.length:
+            self._done(operation, RC_OK)
+
+    def _flush(self, operation):
+        """ Send back the data read in order, once there is enough of it.
+        """
+        pieces = operation.pieces
+        offset, size = operation.flushed, 0
+        while offset + size in pieces:
+            size += len(pieces[offset + size])
+        if size < CHUNK_SIZE and operation.completed < operation.length:
+            return
+        chunk = [_DATA.pack(MSG_DATA, operation.ident, offset)]
+        while offset in pieces:
+            piece = pieces.pop(offset)
+            chunk.append(piece)
+            offset += len(piece)
+        operation.flushed = offset
+        self._push(self.tcp_protocol.encode(b"".join(chunk)))
+
+    def _fail(self, operation, rc):
+        if operation.failed:
+            return
+        operation.failed = True
+        self.bulk_failures += 1
+        for seq in [seq for seq, (transaction, _) in self._outstanding.items()
+                    if transaction.operation is operation]:
+            del self._outstanding[seq]
+        if operation in self._waiting:
+            self._waiting.remove(operation)
+        self._done(operation, rc)
+
+    def _done(self, operation, rc):
+        if self.tcp_sock is not None:
+            self._push(self.tcp_protocol.encode(
+                _DONE.pack(MSG_DONE, operation.ident, rc)))
+
+    def _pause_reading(self):
+        # The board's responses are always read; it is the requests that
+        # stop while the TCP connection is full
+        pass
+
+    def _on_tcp_writable(self):
+        super(BulkTCPtoUDP, self)._on_tcp_writable()
+        self._fill()
+
+    def _close_sock(self):
+        # The operations die with the connection that asked for them
+        self._waiting.clear()
+        self._outstanding.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        super(BulkTCPtoUDP, self)._close_sock()
+
+    def get_stats(self):
+        stats = super(BulkTCPtoUDP, self).get_stats()
+        stats["bulk_scp_outstanding"] = len(self._outstanding)
+        return stats
+
+
+class BulkClient(object):
+    """ Reads and writes large regions of a board's memory through a proxy\
+        server's :py:class:`BulkTCPtoUDP`.
+
+    Operations are done one at a time, and block until they are done.
+    """
+
+    def __init__(self, address, bufsize=DEFAULT_BUFFER_SIZE * 16):
+        """
+        :param tuple(str,int) address: The proxy server's bulk port.
+        :param int bufsize: The most data to read from the server at once.
+        """
+        #: The most data to read from the server at once
+        self.bufsize = bufsize
+        #: The TCP connection to the proxy server
+        self.sock = tcp_socket(connect_address=address)
+        self._protocol = TCPDatagramProtocol()
+        self._ident = 0
+
+    def read(self, x, y, address, length):
+        """ Read memory on a chip.
+
+        :param int x: The X coordinate of the chip.
+        :param int y: The Y coordinate of the chip.
+        :param int address: Where to read from.
+        :param int length: How many bytes to read.
+        :rtype: bytearray
+        :raises BulkError: If the board could not do the read.
+        """
+        ident = self._next_ident()
+        self._protocol.sendmsg(self.sock, _READ.pack(
+            MSG_READ, ident, x, y, address, length))
+        data = bytearray(length)
+        self._wait(ident, data)
+        return data
+
+    def write(self, x, y, address, data):
+        """ Write memory on a chip.
+
+        :param int x: The X coordinate of the chip.
+        :param int y: The Y coordinate of the chip.
+        :param int address: Where to write to.
+        :param bytes data: What to write.
+        :raises BulkError: If the board could not do the write.
+        """
+        ident = self._next_ident()
+        self._protocol.sendmsg(self.sock, _WRITE.pack(
+            MSG_WRITE, ident, x, y, address) + bytes(data))
+        self._wait(ident)
+
+    def _next_ident(self):
+        self._ident = (self._ident + 1) & 0xFFFFFFFF
+        return self._ident
+
+    def _wait(self, ident, data=None):
+        """ Receive what the server sends until the operation is done.
+        """
+        while True:
+            if self._protocol.recv_into(self.sock, self.bufsize) == 0:
+                raise EOFError("proxy server closed the connection")
+            for frame in self._protocol.frames():
+                kind = frame[0]
+                if kind == MSG_DATA and data is not None:
+                    _, frame_ident, offset = _DATA.unpack_from(frame)
+                    if frame_ident == ident:
+                        chunk = frame[_DATA.size:]
+                        data[offset:offset + len(chunk)] = chunk
+                elif kind == MSG_DONE:
+                    _, frame_ident, rc = _DONE.unpack_from(frame)
+                    if frame_ident != ident:
+                        continue
+                    if rc != RC_OK:
+                        raise BulkError(rc)
+                    return
+
+    def close(self):
+        """ Close the connection to the proxy server.
+        """
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
@@ -0,0 +1,220 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Compressing the datagrams sent down a TCP tunnel.
+
+The proxy client offers compression by sending an ``OFFER`` frame when it
+connects. A proxy server that will compress answers with an ``ACCEPT``
+frame, and the client sends an ``ACCEPT`` frame back. Each side's frames
+after its ``ACCEPT`` start with a byte saying what they are: ``RAW``
+(followed by a datagram) or ``ZLIB`` (followed by a piece of a single zlib
+stream, ending at a sync flush, that holds one or more length-prefixed
+datagrams). Both control frames are too short to be SCP or boot packets,
+so a proxy server that does not know about compression just forwards the
+offer to the board, which ignores it, and the tunnel stays uncompressed.
+
+Datagrams are compressed in batches: whatever arrives in one pass of the
+event loop (or up to :py:data:`FLUSH_BYTES`) is flushed together. If
+compression is not paying its way, because it saves too little or costs
+too much CPU time, it is switched off for a while, and then tried again.
+"""
+
+import time
+import zlib
+
+from .support import TCPDatagramProtocol
+
+#: Sent by the proxy client to offer compression
+OFFER = b"\xffZLIB"
+
+#: Sent by each side to say that its frames are now compressed
+ACCEPT = b"\xffZLIB+"
+
+KIND_RAW = 0
+KIND_ZLIB = 1
+
+#: The default zlib compression level
+DEFAULT_LEVEL = 6
+
+#: The most datagram bytes to compress before flushing them
+FLUSH_BYTES = 16 * 1024
+
+#: How many datagram bytes to compress before judging whether it pays
+SAMPLE_BYTES = 64 * 1024
+
+#: The least fraction of the data that compression must save
+MIN_SAVING = 0.1
+
+#: The least rate (in bytes of datagrams per second of CPU time) that
+#: compression must work at; slower than this, it would cost more time than
+#: it saves on all but the slowest links
+MIN_RATE = 4 * 1024 * 1024
+
+#: How many datagram bytes to send uncompressed before trying compression
+#: again, once it has been switched off
+RETRY_BYTES = 1024 * 1024
+
+
+class CompressingDatagramProtocol(TCPDatagramProtocol):
+    """ Encodes datagrams for a TCP connection like\
+        :py:class:`~.TCPDatagramProtocol`, compressing them once the other\
+        side has agreed to it.
+
+    Compressed datagrams are held back; :py:meth:`flush` gets them (along
+    with any control frames to send). :py:attr:`pending_bytes` says how
+    much is held back.
+    """
+
+    def __init__(self, accept_offers=False, level=DEFAULT_LEVEL):
+        """
+        :param bool accept_offers:
+            Whether to accept an offer of compression (as the proxy server).
+        :param int level: The zlib compression level.
+        """
+        super(CompressingDatagramProtocol, self).__init__()
+        #: Whether to accept an offer of compression
+        self.accept_offers = accept_offers
+        #: Whether the frames sent are in the compressed format
+        self.sending_compressed = False
+        #: Whether the frames received are in the compressed format
+        self.receiving_compressed = False
+        #: Whether compression is currently paying its way
+        self.compressing = True
+        self._compressor = zlib.compressobj(level)
+        self._decompressor = zlib.decompressobj()
+        # Decodes the datagrams in the decompressed stream
+        self._inner = TCPDatagramProtocol()
+        # What to send before anything else
+        self._control = []
+        # The compressed data held back
+        self._pending = []
+        # The sample of compression being judged: bytes in, bytes out, time
+        self._sample = [0, 0, 0.0]
+        self._retry_in = 0
+        self._cpu = 0.0
+
+        #: How many datagram bytes have been compressed
+        self.compressed_input_bytes = 0
+        #: How many bytes they were compressed to
+        self.compressed_output_bytes = 0
+        #: How many datagram bytes have been sent uncompressed since
+        #: compression was agreed
+        self.uncompressed_bytes = 0
+        #: How many times compression was switched off for not paying
+        self.disabled = 0
+
+    def offer(self):
+        """ Encode an offer of compression, to send when connecting.
+
+        :rtype: list(bytes)
+        """
+        return super(CompressingDatagramProtocol, self).encode(OFFER)
+
+    def _accept(self):
+        if not self.sending_compressed:
+            self.sending_compressed = True
+            self._control.extend(
+                super(CompressingDatagramProtocol, self).encode(ACCEPT))
+
+    def frames(self):
+        for frame in super(CompressingDatagramProtocol, self).frames():
+            if self.receiving_compressed:
+                kind = frame[0]
+                if kind == KIND_RAW:
+                    yield frame[1:]
+                elif kind == KIND_ZLIB:
+                    yield from self._inner.recv(
+                        self._decompressor.decompress(frame[1:]))
+            elif frame == ACCEPT:
+                self.receiving_compressed = True
+                self._accept()
+            elif frame == OFFER and self.accept_offers:
+                self._accept()
+            else:
+                yield frame
+
+    def encode(self, datagram):
+        if not self.sending_compressed:
+            return super(CompressingDatagramProtocol, self).encode(datagram)
+        if not self.compressing:
+            self.uncompressed_bytes += len(datagram)
+            self._retry_in -= len(datagram)
+            if self._retry_in <= 0:
+                self.compressing = True
+            return self._take_control() + [
+                self._LENGTH.pack(len(datagram) + 1), bytes([KIND_RAW]),
+                datagram]
+        start = time.process_time()
+        self._pending.append(self._compressor.compress(
+            self._LENGTH.pack(len(datagram))))
+        self._pending.append(self._compressor.compress(datagram))
+        self._count_time(start)
+        self._sample[0] += len(datagram)
+        self.pending_bytes += len(datagram)
+        if self.pending_bytes >= FLUSH_BYTES:
+            return self.flush()
+        return []
+
+    def _take_control(self):
+        control, self._control = self._control, []
+        return control
+
+    def flush(self):
+        if not self.pending_bytes:
+            return self._take_control()
+        start = time.process_time()
+        self._pending.append(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        data = b"".join(self._pending)
+        self._count_time(start)
+        sample = self._sample
+        sample[1] += len(data)
+        self.compressed_input_bytes += self.pending_bytes
+        self.compressed_output_bytes += len(data)
+        self._pending = []
+        self.pending_bytes = 0
+        if sample[0] >= SAMPLE_BYTES:
+            self._judge()
+        return self._take_control() + [
+            self._LENGTH.pack(len(data) + 1), bytes([KIND_ZLIB]), data]
+
+    def _count_time(self, start):
+        elapsed = time.process_time() - start
+        self._sample[2] += elapsed
+        self._cpu += elapsed
+
+    def _judge(self):
+        """ Decide whether compression is paying its way.
+        """
+        raw, compressed, cpu = self._sample
+        self._sample = [0, 0, 0.0]
+        if compressed > raw * (1 - MIN_SAVING) or raw < cpu * MIN_RATE:
+            self.compressing = False
+            self._retry_in = RETRY_BYTES
+            self.disabled += 1
+
+    def get_stats(self):
+        """ Get the current values of the protocol's counters.
+
+        :rtype: dict(str, int)
+        """
+        return {
+            "tcp_compressed_input_bytes": self.compressed_input_bytes,
+            "tcp_compressed_output_bytes": self.compressed_output_bytes,
+            "tcp_compress_usec": int(self._cpu * 1e6),
+            "tcp_uncompressed_bytes": self.uncompressed_bytes,
+            "tcp_compression_disabled": self.disabled,
+            "tcp_compressing": int(
+                self.sending_compressed and self.compressing),
+        }
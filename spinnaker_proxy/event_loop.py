@@ -0,0 +1,266 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" A persistent, readiness-based event loop for driving proxies.
+"""
+
+import heapq
+import itertools
+import selectors
+import time
+
+
+class Timer(object):
+    """ A call scheduled with :py:meth:`EventLoop.call_later` or\
+        :py:meth:`EventLoop.call_at`.
+    """
+
+    __slots__ = ["when", "callback", "precise", "cancelled"]
+
+    def __init__(self, when, callback, precise=False):
+        #: When the call is due, in :py:func:`time.monotonic` seconds
+        self.when = when
+        #: What to call
+        self.callback = callback
+        #: Whether the call must not be made even a millisecond late
+        self.precise = precise
+        #: Whether the call has been cancelled
+        self.cancelled = False
+
+    def cancel(self):
+        """ Stop the call from happening, if it has not already.
+        """
+        self.cancelled = True
+
+
+class EventLoop(object):
+    """ An event loop built on :py:mod:`selectors` (i.e., epoll on Linux).
+
+    Unlike a plain ``select()`` loop, sockets are registered with the loop
+    once (when they are created or accepted) and unregistered once (when they
+    are closed), so the cost of each wakeup depends only on the number of
+    sockets that are actually ready, not on the total number of sockets being
+    served.
+    """
+
+    #: The maximum time (in seconds) to wait between checks for being asked
+    #: to stop.
+    POLL_INTERVAL = 0.5
+
+    #: The resolution (in seconds) of the selector's timeout. Epoll rounds a
+    #: timeout up to a whole millisecond, so the loop waits for a precise
+    #: timer by selecting until a millisecond before it is due and then
+    #: polling.
+    SELECT_RESOLUTION = 0.001
+
+    def __init__(self, selector=None):
+        """
+        :param selector:
+            The selector to use; if not provided, the best one available on
+            this platform will be used.
+        :type selector: selectors.BaseSelector or None
+        """
+        if selector is None:
+            selector = selectors.DefaultSelector()
+        self._selector = selector
+        # Map from socket to its [on_readable, on_writable] handlers
+        self._handlers = {}
+        # Heap of (when, sequence number, timer)
+        self._timers = []
+        self._sequence = itertools.count()
+
+    def register(self, sock, on_readable):
+        """ Start watching a socket for readability.
+
+        :param socket.SocketType sock: The socket to watch.
+        :param ~collections.abc.Callable on_readable:
+            What to call (with no arguments) when the socket is readable.
+        """
+        handlers = [on_readable, None]
+        self._selector.register(sock, selectors.EVENT_READ, handlers)
+        self._handlers[sock] = handlers
+
+    def _update(self, sock, handlers):
+        events = ((selectors.EVENT_READ if handlers[0] else 0) |
+                  (selectors.EVENT_WRITE if handlers[1] else 0))
+        try:
+            key = self._selector.get_key(sock)
+        except (KeyError, ValueError):
+            key = None
+        if not events:
+            if key is not None:
+                self._selector.unregister(sock)
+        elif key is None:
+            self._selector.register(sock, events, handlers)
+        elif key.events != events:
+            self._selector.modify(sock, events, handlers)
+
+    def set_reader(self, sock, on_readable):
+        """ Change what happens when a watched socket is readable.
+
+        :param socket.SocketType sock: The (watched) socket.
+        :param on_readable:
+            What to call when the socket is readable, or ``None`` to stop
+            reading from the socket for now (e.g., to apply backpressure).
+        :type on_readable: ~collections.abc.Callable or None
+        """
+        handlers = self._handlers[sock]
+        handlers[0] = on_readable
+        self._update(sock, handlers)
+
+    def set_writer(self, sock, on_writable):
+        """ Change what happens when a watched socket is writable.
+
+        :param socket.SocketType sock: The (watched) socket.
+        :param on_writable:
+            What to call when the socket is writable, or ``None`` to not
+            watch for writability.
+        :type on_writable: ~collections.abc.Callable or None
+        """
+        handlers = self._handlers[sock]
+        handlers[1] = on_writable
+        self._update(sock, handlers)
+
+    def unregister(self, sock):
+        """ Stop watching a socket. It is not an error to unregister a socket
+        that is not being watched.
+
+        :param socket.SocketType sock: The socket to stop watching.
+        """
+        if self._handlers.pop(sock, None) is None:
+            return
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+
+    def is_registered(self, sock):
+        """ Whether a socket is currently being watched.
+
+        :param socket.SocketType sock: The socket to check for.
+        :rtype: bool
+        """
+        return sock in self._handlers
+
+    def __len__(self):
+        return len(self._handlers)
+
+    def call_later(self, delay, callback, precise=False):
+        """ Arrange for something to be called (once) after a delay.
+
+        Timers do not keep the loop running on their own; see :py:meth:`run`.
+
+        :param float delay: How long to wait, in seconds.
+        :param ~collections.abc.Callable callback:
+            What to call (with no arguments).
+        :param bool precise: See :py:meth:`call_at`.
+        :return: A handle that can be used to cancel the call.
+        :rtype: Timer
+        """
+        return self.call_at(time.monotonic() + delay, callback, precise)
+
+    def call_at(self, when, callback, precise=False):
+        """ Arrange for something to be called (once) at a given time.
+
+        Calls due at the same time are made in the order they were arranged.
+
+        :param float when: When to call, in :py:func:`time.monotonic` seconds.
+        :param ~collections.abc.Callable callback:
+            What to call (with no arguments).
+        :param bool precise:
+            Whether the call must be made within a fraction of a millisecond
+            of when it is due (e.g., to pace packets); the loop polls, using
+            CPU, until such a call is due. Other calls may be made up to a
+            millisecond late.
+        :return: A handle that can be used to cancel the call.
+        :rtype: Timer
+        """
+        timer = Timer(when, callback, precise)
+        heapq.heappush(self._timers, (when, next(self._sequence), timer))
+        return timer
+
+    def _next_timer(self):
+        timers = self._timers
+        while timers and timers[0][2].cancelled:
+            heapq.heappop(timers)
+        if not timers:
+            return None
+        return timers[0][2]
+
+    def _run_timers(self):
+        timers = self._timers
+        if not timers:
+            return
+        now = time.monotonic()
+        while timers and timers[0][0] <= now:
+            timer = heapq.heappop(timers)[2]
+            if not timer.cancelled:
+                timer.cancelled = True
+                timer.callback()
+
+    def _select(self, timeout):
+        timer = self._next_timer()
+        if timer is None:
+            return self._selector.select(timeout)
+        now = time.monotonic()
+        delay = max(0.0, timer.when - now)
+        if timeout is not None and timeout <= delay:
+            return self._selector.select(timeout)
+        if not timer.precise:
+            return self._selector.select(delay)
+        # Waiting for a precise timer; do not oversleep it
+        deadline = now + delay
+        ready = self._selector.select(
+            max(0.0, delay - self.SELECT_RESOLUTION))
+        while not ready and time.monotonic() < deadline:
+            ready = self._selector.select(0)
+        return ready
+
+    def run_once(self, timeout=None):
+        """ Wait for (at most) one batch of events and dispatch them, then\
+            run any timers that are due.
+
+        :param timeout:
+            How long to wait for an event, in seconds; ``None`` means wait
+            indefinitely.
+        :type timeout: float or None
+        """
+        for key, events in self._select(timeout):
+            handlers = key.data
+            # An earlier handler in this batch may have closed this socket or
+            # changed what is wanted from it
+            if events & selectors.EVENT_READ and handlers[0] and \
+                    self._handlers.get(key.fileobj) is handlers:
+                handlers[0]()
+            if events & selectors.EVENT_WRITE and handlers[1] and \
+                    self._handlers.get(key.fileobj) is handlers:
+                handlers[1]()
+        self._run_timers()
+
+    def run(self, event):
+        """ Dispatch events until asked to stop or until nothing is left to
+        watch.
+
+        :param ~threading.Event event:
+            A way to ask the event processing loop to shut down.
+        """
+        while not event.is_set() and len(self):
+            self.run_once(self.POLL_INTERVAL)
+
+    def close(self):
+        """ Release the resources held by the loop. This does not close any
+        of the sockets registered with it.
+        """
+        self._selector.close()
@@ -0,0 +1,511 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Forward error correction for UDP tunnels, so that a lost datagram can\
+    be rebuilt by the receiver instead of waiting a round trip for the\
+    sender to send it again.
+
+The datagrams sent through the tunnel are split into groups, and after each
+group a parity packet is sent: the XOR of the group's datagrams (padded to
+the length of the longest). If one datagram of a group is lost, the receiver
+rebuilds it from the parity packet and the rest of the group. Datagrams are
+passed on as soon as they arrive; only a rebuilt one waits, for the rest of
+its group.
+
+Each receiver measures what fraction of packets is lost, and tells the
+sender from time to time. The sender makes its groups as large as it can
+(up to :py:data:`MAX_GROUP_SIZE`) while keeping the chance of a group
+losing more than one packet (which cannot be repaired) below
+:py:data:`TARGET_UNRECOVERABLE`. A group is also ended early if it is
+still incomplete :py:data:`FLUSH_DELAY` after its first datagram, so that
+a lull in the traffic does not hold up the parity packet. The receiver
+counts a group's losses once it is complete, or :py:data:`GROUP_TIMEOUT`
+after its first packet arrived if it never is; packets that arrive for
+the group after that are ignored.
+
+Every packet starts with a byte saying what it is:
+
+``DATA``
+    followed by the group number, the datagram's index in the group and the
+    datagram.
+``PARITY``
+    followed by the group number, how many datagrams were in the group, the
+    XOR of their lengths and the XOR of their contents.
+``REPORT``
+    followed by the fraction of packets the sender of the report has found
+    to be lost, in parts per million.
+"""
+
+from collections import OrderedDict
+from functools import partial
+import random
+import struct
+import time
+
+from .proxies import (
+    DEFAULT_BUFFER_SIZE, DEFAULT_MAX_SESSIONS, DEFAULT_SESSION_TIMEOUT,
+    UDPtoUDP)
+
+KIND_DATA = 0
+KIND_PARITY = 1
+KIND_REPORT = 2
+
+_DATA = struct.Struct("<BIB")
+_PARITY = struct.Struct("<BIBH")
+_REPORT = struct.Struct("<BI")
+
+#: The fewest datagrams to protect with one parity packet
+MIN_GROUP_SIZE = 2
+#: The most datagrams to protect with one parity packet
+MAX_GROUP_SIZE = 16
+
+#: The highest chance of a group losing more than one packet to aim for
+TARGET_UNRECOVERABLE = 0.001
+
+#: The fraction of packets to assume are lost until told otherwise
+INITIAL_LOSS = 0.01
+
+#: How long (in seconds) to let an incomplete group wait for more datagrams
+FLUSH_DELAY = 0.002
+
+#: How many packets to receive between reports of the loss measured
+REPORT_INTERVAL = 32
+
+#: How many groups to keep receiving at once (packets may be reordered);
+#: a group is also accounted for once a group this many later starts
+MAX_OPEN_GROUPS = 16
+
+#: How long (in seconds) after the first packet of a group arrives to wait
+#: for the rest of it, before counting what is missing as lost
+GROUP_TIMEOUT = 0.1
+
+#: How many groups that have been accounted for to remember, so that their
+#: late packets are ignored
+FINISHED_GROUPS = 64
+
+#: How much each group's losses change the loss measured
+LOSS_GAIN = 1 / 16
+
+
+def group_size(loss):
+    """ Choose how many datagrams to protect with one parity packet.
+
+    :param float loss: The fraction of packets being lost.
+    :rtype: int
+    """
+    for size in range(MAX_GROUP_SIZE, MIN_GROUP_SIZE, -1):
+        packets = size + 1
+        # The chance of losing none, or just one, of the group's packets
+        recoverable = ((1 - loss) ** packets +
+                       packets * loss * (1 - loss) ** (packets - 1))
+        if 1 - recoverable <= TARGET_UNRECOVERABLE:
+            return size
+    return MIN_GROUP_SIZE
+
+
+class _Group(object):
+    """ A group of datagrams being received.
+    """
+
+    __slots__ = ["started", "datagrams", "arrived", "size", "lengths",
+                 "parity", "recovered"]
+
+    def __init__(self, started):
+        # When the first packet arrived
+        self.started = started
+        # The datagrams that have arrived (or been rebuilt), by index
+        self.datagrams = {}
+        # How many packets have arrived
+        self.arrived = 0
+        # How many datagrams are in the group, once the parity says
+        self.size = None
+        self.lengths = 0
+        self.parity = None
+        self.recovered = False
+
+
+class FECCodec(object):
+    """ One end of a tunnel with forward error correction: sends datagrams\
+        with parity packets, and receives and repairs the other end's.
+    """
+
+    #: The names of the counters in :py:meth:`get_stats`
+    COUNTERS = ("parity_packets", "overhead_bytes", "recovered_datagrams",
+                "unrecovered_datagrams")
+
+    def __init__(self, transmit, deliver, loop=None):
+        """
+        :param ~collections.abc.Callable transmit:
+            How to send a packet to the other end.
+        :param ~collections.abc.Callable deliver:
+            What to pass each datagram received from the other end to.
+        :param loop:
+            The event loop to wait on for incomplete groups (if ``None``,
+            each group is sent complete or not at all, and an incomplete
+            group being received is only accounted for when too many
+            others are open).
+        :type loop: ~spinnaker_proxy.event_loop.EventLoop or None
+        """
+        self._transmit = transmit
+        self._deliver = deliver
+        self._loop = loop
+
+        # Sending; start at a random group, so that a receiver that has
+        # heard from an earlier life of this end is not confused
+        self._group = random.getrandbits(32)
+        self._count = 0
+        self._parity = 0
+        self._lengths = 0
+        self._longest = 0
+        self._timer = None
+        #: The fraction of packets the other end says are being lost
+        self.reported_loss = INITIAL_LOSS
+        #: How many datagrams each group protects
+        self.group_size = group_size(INITIAL_LOSS)
+
+        # Receiving
+        self._groups = OrderedDict()
+        self._finished = OrderedDict()
+        self._finish_timer = None
+        self._since_report = 0
+        #: The fraction of the other end's packets being lost
+        self.loss = 0.0
+
+        #: How many parity packets have been sent
+        self.parity_packets = 0
+        #: How many bytes have been sent other than the datagrams themselves
+        self.overhead_bytes = 0
+        #: How many lost datagrams have been rebuilt
+        self.recovered_datagrams = 0
+        #: How many datagrams were lost and could not be rebuilt
+        self.unrecovered_datagrams = 0
+
+    def send(self, datagram):
+        """ Send a datagram to the other end.
+
+        :param bytes datagram: The datagram.
+        """
+        self._transmit(_DATA.pack(KIND_DATA, self._group, self._count) +
+                       datagram)
+        self.overhead_bytes += _DATA.size
+        self._parity ^= int.from_bytes(datagram, "little")
+        self._lengths ^= len(datagram)
+        self._longest = max(self._longest, len(datagram))
+        self._count += 1
+        if self._count >= self.group_size:
+            self.flush()
+        elif self._count == 1 and self._loop is not None:
+            self._timer = self._loop.call_later(FLUSH_DELAY, self.flush)
+
+    def flush(self):
+        """ End the current group, sending its parity packet.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._count:
+            return
+        packet = _PARITY.pack(
+            KIND_PARITY, self._group, self._count, self._lengths) + \
+            self._parity.to_bytes(self._longest, "little")
+        self._transmit(packet)
+        self.parity_packets += 1
+        self.overhead_bytes += len(packet)
+        self._group = (self._group + 1) & 0xFFFFFFFF
+        self._count = self._parity = self._lengths = self._longest = 0
+        self.group_size = group_size(self.reported_loss)
+
+    def on_packet(self, packet):
+        """ Handle a packet from the other end.
+
+        :param bytes packet: The packet.
+        """
+        if not packet:
+            return
+        kind = packet[0]
+        if kind == KIND_DATA and len(packet) >= _DATA.size:
+            _, number, index = _DATA.unpack_from(packet)
+            group = self._receiving(number)
+            if group is None:
+                return
+            group.arrived += 1
+            if index in group.datagrams:
+                return
+            datagram = packet[_DATA.size:]
+            group.datagrams[index] = datagram
+            self._deliver(datagram)
+        elif kind == KIND_PARITY and len(packet) >= _PARITY.size:
+            _, number, size, lengths = _PARITY.unpack_from(packet)
+            group = self._receiving(number)
+            if group is None:
+                return
+            group.arrived += 1
+            if group.parity is not None:
+                return
+            group.size = size
+            group.lengths = lengths
+            group.parity = packet[_PARITY.size:]
+        elif kind == KIND_REPORT and len(packet) >= _REPORT.size:
+            self.reported_loss = _REPORT.unpack_from(packet)[1] / 1e6
+            return
+        else:
+            return
+        if group.parity is not None and not group.recovered and \
+                len(group.datagrams) == group.size - 1:
+            self._recover(group)
+        if group.parity is not None and len(group.datagrams) == group.size:
+            self._finish(number)
+        self._since_report += 1
+        if self._since_report >= REPORT_INTERVAL:
+            self._report()
+
+    def _receiving(self, number):
+        """ Get a group being received, starting it if needed, or ``None``\
+            if it has already been accounted for.
+        """
+        group = self._groups.get(number)
+        if group is None:
+            if number in self._finished:
+                return None
+            group = self._groups[number] = _Group(time.monotonic())
+            # Groups this far behind will not be completed now
+            behind = [old for old in self._groups if MAX_OPEN_GROUPS <=
+                      (number - old) & 0xFFFFFFFF < 0x80000000]
+            for old in behind:
+                self._finish(old)
+            if len(self._groups) > MAX_OPEN_GROUPS:
+                self._finish(next(iter(self._groups)))
+            if self._finish_timer is None and self._loop is not None:
+                self._finish_timer = self._loop.call_at(
+                    group.started + GROUP_TIMEOUT, self._on_finish_timer)
+        return group
+
+    def _on_finish_timer(self):
+        """ Account for the groups that have waited too long for the rest\
+            of their packets.
+        """
+        self._finish_timer = None
+        deadline = time.monotonic() - GROUP_TIMEOUT
+        for number, group in list(self._groups.items()):
+            if group.started > deadline:
+                self._finish_timer = self._loop.call_at(
+                    group.started + GROUP_TIMEOUT, self._on_finish_timer)
+                return
+            self._finish(number)
+
+    def _recover(self, group):
+        """ Rebuild the one datagram missing from a group.
+        """
+        group.recovered = True
+        parity = int.from_bytes(group.parity, "little")
+        length = group.lengths
+        for datagram in group.datagrams.values():
+            parity ^= int.from_bytes(datagram, "little")
+            length ^= len(datagram)
+        if length > len(group.parity):
+            # Corrupt; give up on it
+            return
+        index = next(i for i in range(group.size) if i not in group.datagrams)
+        datagram = parity.to_bytes(len(group.parity), "little")[:length]
+        group.datagrams[index] = datagram
+        self.recovered_datagrams += 1
+        self._deliver(datagram)
+
+    def _finish(self, number):
+        """ Account for what a group lost, and stop receiving it.
+        """
+        group = self._groups.pop(number)
+        self._finished[number] = True
+        if len(self._finished) > FINISHED_GROUPS:
+            self._finished.popitem(last=False)
+        if group.size is None:
+            # The parity was lost; assume the datagrams after the last that
+            # arrived were not sent
+            size = max(group.datagrams) + 1 if group.datagrams else 0
+        else:
+            size = group.size
+        self.unrecovered_datagrams += size - len(group.datagrams)
+        expected = size + 1
+        lost = max(expected - group.arrived, 0)
+        self.loss += (lost / expected - self.loss) * LOSS_GAIN
+
+    def _report(self):
+        """ Tell the other end how many of its packets are being lost.
+        """
+        self._since_report = 0
+        packet = _REPORT.pack(KIND_REPORT, int(self.loss * 1e6))
+        self._transmit(packet)
+        self.overhead_bytes += len(packet)
+
+    def close(self):
+        """ Stop waiting for the current groups to be completed.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._finish_timer is not None:
+            self._finish_timer.cancel()
+            self._finish_timer = None
+
+    def get_stats(self):
+        """ Get the current values of the codec's counters.
+
+        :rtype: dict(str, int)
+        """
+        stats = {"fec_" + key: getattr(self, key) for key in self.COUNTERS}
+        stats["fec_group_size"] = self.group_size
+        stats["fec_loss_ppm"] = int(self.loss * 1e6)
+        return stats
+
+
+class _FECProxy(UDPtoUDP):
+    """ Support for the two ends of a UDP tunnel with forward error\
+        correction. Each session has its own :py:class:`FECCodec`.
+    """
+
+    def __init__(self, ext_udp_port, int_udp_address,
+                 bufsize=DEFAULT_BUFFER_SIZE,
+                 max_sessions=DEFAULT_MAX_SESSIONS,
+                 session_timeout=DEFAULT_SESSION_TIMEOUT, reuse_port=False):
+        """
+        :param int ext_udp_port:
+        :param tuple(str,int) int_udp_address:
+        :param int bufsize:
+        :param int max_sessions:
+        :param float session_timeout:
+        :param bool reuse_port:
+        """
+        super(_FECProxy, self).__init__(
+            ext_udp_port, int_udp_address, bufsize,
+            max_sessions=max_sessions, session_timeout=session_timeout,
+            reuse_port=reuse_port)
+        # Map from external address to the codec of its session
+        self._codecs = {}
+        # The totals of the counters of the codecs of closed sessions
+        self._ended = {"fec_" + key: 0 for key in FECCodec.COUNTERS}
+
+    def _open_session(self, ext_address, now):
+        session = super(_FECProxy, self)._open_session(ext_address, now)
+        self._codecs[ext_address] = self._new_codec(session)
+        return session
+
+    def _new_codec(self, session):
+        raise NotImplementedError
+
+    def _evict(self, session, reason):
+        self._end_codec(session.address)
+        super(_FECProxy, self)._evict(session, reason)
+
+    def _end_codec(self, ext_address):
+        codec = self._codecs.pop(ext_address)
+        codec.close()
+        for key, value in codec.get_stats().items():
+            if key in self._ended:
+                self._ended[key] += value
+
+    def get_stats(self):
+        stats = super(_FECProxy, self).get_stats()
+        stats.update(self._ended)
+        stats["fec_group_size"] = stats["fec_loss_ppm"] = 0
+        for codec in self._codecs.values():
+            for key, value in codec.get_stats().items():
+                if key in self._ended:
+                    stats[key] += value
+                else:
+                    stats[key] = max(stats[key], value)
+        return stats
+
+    def close(self):
+        for ext_address in list(self._codecs):
+            self._end_codec(ext_address)
+        super(_FECProxy, self).close()
+
+
+class UDPtoFEC(_FECProxy):
+    """ The proxy client end of a UDP tunnel with forward error correction.
+
+    This is a :py:class:`~.UDPtoUDP` whose internal address is a
+    :py:class:`FECtoUDP`; each external host's datagrams go through the
+    tunnel with parity packets, and those coming back are repaired. The
+    proxy must be attached to an event loop.
+    """
+
+    def _new_codec(self, session):
+        return FECCodec(partial(self._send_tunnelled, session), partial(
+            self._forward_tunnelled, session), self._loop)
+
+    def _int_sender(self, session):
+        return self._codecs[session.address].send
+
+    def int_to_ext(self, session):
+        try:
+            packet = session.sock.recv(self.bufsize + _PARITY.size)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self._codecs[session.address].on_packet(packet)
+
+    def _send_tunnelled(self, session, packet):
+        # Parity packets are also sent from the codec's timer
+        try:
+            session.sock.send(packet)
+        except OSError as error:
+            self._udp_error(error)
+
+    def _forward_tunnelled(self, session, datagram):
+        now = time.monotonic()
+        self._session(session.address, now)
+        self._forward_response(datagram, session, now)
+
+
+class FECtoUDP(_FECProxy):
+    """ The proxy server end of a UDP tunnel with forward error correction.
+
+    This is a :py:class:`~.UDPtoUDP` whose external hosts are
+    :py:class:`UDPtoFEC` proxies; the datagrams coming through the tunnel
+    are repaired, and those going back are sent with parity packets. The
+    proxy must be attached to an event loop.
+    """
+
+    def _new_codec(self, session):
+        return FECCodec(
+            partial(self._send_tunnelled, session.address),
+            partial(self._forward_tunnelled, session.address), self._loop)
+
+    def ext_to_int(self):
+        if self.on_boot is not None:
+            self.on_boot()
+        try:
+            packet, ext_address = self.ext_sock.recvfrom(
+                self.bufsize + _PARITY.size)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self._session(ext_address, time.monotonic())
+        self._codecs[ext_address].on_packet(packet)
+
+    def _forward_tunnelled(self, ext_address, datagram):
+        self._forward_request(datagram, ext_address, time.monotonic())
+
+    def _send_ext(self, datagram, ext_address):
+        self._codecs[ext_address].send(datagram)
+
+    def _send_tunnelled(self, ext_address, packet):
+        if self.ext_sock is None:
+            return
+        try:
+            self.ext_sock.sendto(packet, ext_address)
+        except OSError as error:
+            self._udp_error(error)
@@ -0,0 +1,510 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" A simulated Internet link, to put between a proxy client and a proxy\
+    server so that they can be tried out (and compared) on one machine.
+
+The impairments (delay, jitter, loss, reordering, duplication and a
+bandwidth limit) are decided by a seeded random number generator, so the
+same traffic meets the same fate each time.
+
+Run with ``python -m spinnaker_proxy.impairment``.
+"""
+
+import argparse
+from functools import partial
+import logging
+import random
+import time
+
+from .proxies import (
+    DEFAULT_BUFFER_SIZE, DEFAULT_MAX_SESSIONS, DEFAULT_SESSION_TIMEOUT,
+    UDPtoUDP)
+from .spinnaker_proxy import run_proxies
+from .support import DatagramProxy, OutputQueue, tcp_socket
+
+#: The shortest time TCP waits before resending lost data, in seconds (as
+#: on Linux)
+MIN_RETRANSMIT_TIMEOUT = 0.2
+
+
+class Impairment(object):
+    """ What a link does to the packets crossing it in one direction.
+
+    Each packet is first sent at the link's bandwidth, waiting for those
+    before it to finish, and may then be lost. Otherwise it arrives after the
+    delay, give or take up to the jitter, but never before a packet sent
+    ahead of it, unless it is picked to be reordered, in which case it
+    arrives without being delayed at all (so overtakes the packets in
+    flight). It may also arrive twice.
+
+    On a reliable link (i.e., TCP), lost packets are instead resent after a
+    retransmission timeout, holding up everything behind them, and packets
+    are neither reordered nor duplicated.
+    """
+
+    #: The names of the counters in :py:meth:`get_stats`
+    COUNTERS = ("lost", "reordered", "duplicated")
+
+    def __init__(self, delay=0.0, jitter=0.0, loss=0.0, reorder=0.0,
+                 duplicate=0.0, bandwidth=None, seed=None):
+        """
+        :param float delay: The one-way delay, in seconds.
+        :param float jitter:
+            The most by which the delay of each packet varies, in seconds.
+        :param float loss: The probability that a packet is lost.
+        :param float reorder:
+            The probability that a packet overtakes those in flight.
+        :param float duplicate:
+            The probability that a packet arrives twice.
+        :param bandwidth:
+            The rate at which the link carries data, in bytes per second, or
+            ``None`` for no limit.
+        :type bandwidth: float or None
+        :param seed:
+            Seeds the random choices; with ``None``, they differ each time.
+        :type seed: int or str or None
+        :raises ValueError: If a setting is out of range.
+        """
+        if delay < 0 or jitter < 0:
+            raise ValueError("delay and jitter must not be negative")
+        for name, probability in (("loss", loss), ("reorder", reorder),
+                                  ("duplicate", duplicate)):
+            if not 0.0 <= probability <= 1.0:
+                raise ValueError("{} must be between 0 and 1, not {}".format(
+                    name, probability))
+        if bandwidth is not None and bandwidth <= 0:
+            raise ValueError("bandwidth must be positive")
+        #: The one-way delay, in seconds
+        self.delay = delay
+        #: The most by which the delay varies, in seconds
+        self.jitter = jitter
+        #: The probability that a packet is lost
+        self.loss = loss
+        #: The probability that a packet overtakes those in flight
+        self.reorder = reorder
+        #: The probability that a packet arrives twice
+        self.duplicate = duplicate
+        #: The rate at which data is sent, in bytes per second (or ``None``)
+        self.bandwidth = bandwidth
+        self._random = random.Random(seed)
+        # When the link will have finished sending what it has been given
+        self._busy_until = 0.0
+        # When the last packet (that was not reordered) arrives
+        self._last_arrival = 0.0
+
+        #: How many packets have been lost (or, on a reliable link, resent)
+        self.lost = 0
+        #: How many packets have overtaken those in flight
+        self.reordered = 0
+        #: How many packets have arrived twice
+        self.duplicated = 0
+
+    @property
+    def retransmit_timeout(self):
+        """ How long TCP waits before resending lost data, in seconds: about\
+            a round trip time plus four times its variation (taking the link\
+            to be as bad in both directions), but at least\
+            :py:data:`MIN_RETRANSMIT_TIMEOUT`.
+
+        :rtype: float
+        """
+        return max(MIN_RETRANSMIT_TIMEOUT, 2 * self.delay + 4 * self.jitter)
+
+    def arrivals(self, nbytes, now, reliable=False):
+        """ Decide what happens to a packet.
+
+        :param int nbytes: The size of the packet.
+        :param float now: When the packet is sent (monotonic seconds).
+        :param bool reliable:
+            Whether the link resends lost packets (and keeps them in order).
+        :return:
+            When each copy of the packet arrives (monotonic seconds), in
+            order; none if it is lost.
+        :rtype: list(float)
+        """
+        rand = self._random.random
+        sent = now
+        if self.bandwidth is not None:
+            sent = max(now, self._busy_until) + nbytes / self.bandwidth
+            self._busy_until = sent
+        if self.loss and rand() < self.loss:
+            self.lost += 1
+            if not reliable:
+                return []
+            sent += self.retransmit_timeout
+        if not reliable and self.reorder and rand() < self.reorder:
+            self.reordered += 1
+            return [sent]
+        arrival = sent + self.delay
+        if self.jitter:
+            arrival += self._random.uniform(-self.jitter, self.jitter)
+        arrival = max(arrival, sent, self._last_arrival)
+        self._last_arrival = arrival
+        if not reliable and self.duplicate and rand() < self.duplicate:
+            self.duplicated += 1
+            return [arrival, arrival]
+        return [arrival]
+
+    def get_stats(self, prefix=""):
+        """ Get the counters of what has been done to packets.
+
+        :param str prefix: What to put in front of the name of each counter.
+        :rtype: dict(str, int)
+        """
+        return {prefix + key: getattr(self, key) for key in self.COUNTERS}
+
+
+class ImpairedUDPtoUDP(UDPtoUDP):
+    """ A UDP to UDP proxy that impairs the datagrams it forwards, as though\
+        they were crossing the Internet.
+
+    Datagrams are held back on the event loop's timers, so the proxy must be
+    attached to an event loop.
+    """
+
+    def __init__(self, ext_udp_port, int_udp_address, upstream=None,
+                 downstream=None, bufsize=DEFAULT_BUFFER_SIZE,
+                 max_sessions=DEFAULT_MAX_SESSIONS,
+                 session_timeout=DEFAULT_SESSION_TIMEOUT):
+        """
+        :param int ext_udp_port:
+        :param tuple(str,int) int_udp_address:
+        :param upstream:
+            What happens to datagrams going from external hosts to the
+            internal address (by default, nothing).
+        :type upstream: Impairment or None
+        :param downstream:
+            What happens to datagrams going back to external hosts (by
+            default, nothing).
+        :type downstream: Impairment or None
+        :param int bufsize:
+        :param int max_sessions:
+        :param float session_timeout:
+        """
+        super(ImpairedUDPtoUDP, self).__init__(
+            ext_udp_port, int_udp_address, bufsize,
+            max_sessions=max_sessions, session_timeout=session_timeout)
+        #: What happens to datagrams going to the internal address
+        self.upstream = upstream if upstream is not None else Impairment()
+        #: What happens to datagrams going back to external hosts
+        self.downstream = (
+            downstream if downstream is not None else Impairment())
+
+    def ext_to_int(self):
+        try:
+            datagram, ext_address = self.ext_sock.recvfrom(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        now = time.monotonic()
+        session = self._session(ext_address, now)
+        for when in self.upstream.arrivals(len(datagram), now):
+            self._loop.call_at(when, partial(
+                self._deliver_int, session, datagram))
+
+    def int_to_ext(self, session):
+        try:
+            datagram = session.sock.recv(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        now = time.monotonic()
+        self._session(session.address, now)
+        for when in self.downstream.arrivals(len(datagram), now):
+            self._loop.call_at(when, partial(
+                self._deliver_ext, session.address, datagram))
+
+    def _deliver_int(self, session, datagram):
+        # The session may have been closed while the datagram was in flight
+        if session.sock.fileno() < 0:
+            return
+        try:
+            session.sock.send(datagram)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self.ext_to_int_packets += 1
+        self.ext_to_int_bytes += len(datagram)
+
+    def _deliver_ext(self, address, datagram):
+        if self.ext_sock is None:
+            return
+        try:
+            self.ext_sock.sendto(datagram, address)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self.int_to_ext_packets += 1
+        self.int_to_ext_bytes += len(datagram)
+
+    def get_stats(self):
+        stats = super(ImpairedUDPtoUDP, self).get_stats()
+        stats.update(self.upstream.get_stats("ext_to_int_"))
+        stats.update(self.downstream.get_stats("int_to_ext_"))
+        return stats
+
+
+class _Stream(object):
+    """ One direction of a TCP connection through an impaired TCP relay.
+    """
+
+    __slots__ = ["source", "sink", "impairment", "queue", "writing"]
+
+    def __init__(self, source, sink, impairment):
+        #: Where data comes from
+        self.source = source
+        #: Where data goes to
+        self.sink = sink
+        #: What happens to the data on the way
+        self.impairment = impairment
+        #: Data that has arrived but not yet been written to the sink
+        self.queue = OutputQueue()
+        #: Whether waiting for the sink to become writable
+        self.writing = False
+
+
+class ImpairedTCPRelay(DatagramProxy):
+    """ Relays a TCP connection, impairing the data in each direction as\
+        though it were crossing the Internet.
+
+    Each chunk of data read is treated as a packet on a reliable link (see
+    :py:class:`Impairment`), so loss shows up as stalls while data is resent.
+
+    When a connection is made to the relay, it connects onwards to the
+    target and closes any previous connection. The relay must be attached to
+    an event loop.
+    """
+
+    COUNTERS = ("ext_to_int_bytes", "int_to_ext_bytes", "tcp_connections")
+
+    #: How many bytes have been relayed to the target
+    ext_to_int_bytes = 0
+    #: How many bytes have been relayed back from the target
+    int_to_ext_bytes = 0
+    #: How many TCP connections have been relayed
+    tcp_connections = 0
+
+    def __init__(self, tcp_port, tcp_address, upstream=None, downstream=None,
+                 bufsize=DEFAULT_BUFFER_SIZE):
+        """
+        :param tcp_port:
+        :type tcp_port: int or None
+        :param tuple(str,int) tcp_address: Where to relay connections to.
+        :param upstream:
+            What happens to data going to the target (by default, nothing).
+        :type upstream: Impairment or None
+        :param downstream:
+            What happens to data coming back (by default, nothing).
+        :type downstream: Impairment or None
+        :param int bufsize: The most data to read at once.
+        """
+        #: The most data to read at once
+        self.bufsize = bufsize
+        #: Where to relay connections to
+        self.tcp_address = tcp_address
+        #: What happens to data going to the target
+        self.upstream = upstream if upstream is not None else Impairment()
+        #: What happens to data coming back
+        self.downstream = (
+            downstream if downstream is not None else Impairment())
+        #: The TCP server
+        self.tcp_listen_sock = tcp_socket(bind_port=tcp_port)
+        self.tcp_listen_sock.listen(1)
+        # The streams of the current connection (or None if not connected)
+        self._streams = None
+
+    def on_connect(self):
+        """ Callback to handle new TCP connections.
+        """
+        self._disconnect()
+        ext_sock, address = self.tcp_listen_sock.accept()
+        try:
+            int_sock = tcp_socket(connect_address=self.tcp_address)
+        except OSError as e:
+            logging.warning("could not relay connection from {}: {}".format(
+                address, e))
+            ext_sock.close()
+            return
+        ext_sock.setblocking(False)
+        int_sock.setblocking(False)
+        self._streams = (
+            _Stream(ext_sock, int_sock, self.upstream),
+            _Stream(int_sock, ext_sock, self.downstream))
+        for stream in self._streams:
+            self._watch(stream.source, partial(self._on_readable, stream))
+        self.tcp_connections += 1
+        logging.info("relaying TCP connection from {}".format(address))
+
+    def _on_readable(self, stream):
+        try:
+            data = stream.source.recv(self.bufsize)
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            data = b""
+        if not data:
+            # Pass on the close after everything sent before it
+            self._loop.set_reader(stream.source, None)
+        now = time.monotonic()
+        for when in stream.impairment.arrivals(len(data), now, True):
+            self._loop.call_at(when, partial(self._deliver, stream, data))
+
+    def _deliver(self, stream, data):
+        if self._streams is None or stream not in self._streams:
+            # Arrived after its connection was closed
+            return
+        if not data:
+            self._disconnect()
+            return
+        if stream is self._streams[0]:
+            self.ext_to_int_bytes += len(data)
+        else:
+            self.int_to_ext_bytes += len(data)
+        stream.queue.push([data])
+        if not stream.writing:
+            self._flush(stream)
+
+    def _flush(self, stream):
+        try:
+            drained = stream.queue.flush(stream.sink)
+        except ConnectionError:
+            self._disconnect()
+            return
+        if drained and stream.writing:
+            stream.writing = False
+            self._loop.set_writer(stream.sink, None)
+        elif not drained and not stream.writing:
+            stream.writing = True
+            self._loop.set_writer(stream.sink, partial(self._flush, stream))
+
+    def _disconnect(self):
+        if self._streams is not None:
+            for stream in self._streams:
+                self._close_socket(stream.source)
+            self._streams = None
+
+    def get_select_handlers(self):
+        handlers = {self.tcp_listen_sock: self.on_connect}
+        if self._streams is not None:
+            for stream in self._streams:
+                handlers[stream.source] = partial(self._on_readable, stream)
+        return handlers
+
+    def get_stats(self):
+        stats = super(ImpairedTCPRelay, self).get_stats()
+        stats.update(self.upstream.get_stats("ext_to_int_"))
+        stats.update(self.downstream.get_stats("int_to_ext_"))
+        return stats
+
+    def close(self):
+        self._disconnect()
+        if self.tcp_listen_sock:
+            self._close_socket(self.tcp_listen_sock)
+            self.tcp_listen_sock = None
+
+
+def _route(text):
+    """ Parse a ``PORT:HOST:PORT`` route.
+    """
+    try:
+        port, host, target_port = text.split(":")
+        return int(port), (host, int(target_port))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "expected PORT:HOST:PORT, not {!r}".format(text))
+
+
+def _parse_arguments(args=None):
+    parser = argparse.ArgumentParser(
+        description="Relay UDP and TCP traffic over a simulated Internet "
+        "link, to test the proxy on one machine.")
+    parser.add_argument("--udp", type=_route, action="append", default=[],
+                        metavar="PORT:HOST:PORT",
+                        help="relay UDP datagrams arriving on a port")
+    parser.add_argument("--tcp", type=_route, action="append", default=[],
+                        metavar="PORT:HOST:PORT",
+                        help="relay TCP connections made to a port")
+    parser.add_argument("--delay", type=float, default=0.0, metavar="MS",
+                        help="one-way delay in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0.0, metavar="MS",
+                        help="most by which the delay varies, in "
+                        "milliseconds")
+    parser.add_argument("--loss", type=float, default=0.0, metavar="PCT",
+                        help="percentage of packets lost")
+    parser.add_argument("--reorder", type=float, default=0.0, metavar="PCT",
+                        help="percentage of packets that overtake those in "
+                        "flight")
+    parser.add_argument("--duplicate", type=float, default=0.0,
+                        metavar="PCT",
+                        help="percentage of packets that arrive twice")
+    parser.add_argument("--bandwidth", type=float, default=None,
+                        metavar="MBIT",
+                        help="link speed in megabits per second")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the random choices, to make runs "
+                        "repeatable")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="don't print the connection log")
+    args = parser.parse_args(args)
+    if not args.udp and not args.tcp:
+        parser.error("nothing to relay: give --udp or --tcp")
+    try:
+        _impairments(args, "check")
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def _impairments(args, name):
+    """ Make the impairments for each direction of a route.
+    """
+    bandwidth = None
+    if args.bandwidth is not None:
+        bandwidth = args.bandwidth * 1e6 / 8
+    return tuple(
+        Impairment(
+            delay=args.delay / 1000, jitter=args.jitter / 1000,
+            loss=args.loss / 100, reorder=args.reorder / 100,
+            duplicate=args.duplicate / 100, bandwidth=bandwidth,
+            seed=None if args.seed is None else "{}/{}/{}".format(
+                args.seed, name, direction))
+        for direction in ("up", "down"))
+
+
+def _construct_proxies(args):
+    for port, address in args.udp:
+        upstream, downstream = _impairments(args, "udp:{}".format(port))
+        proxy = ImpairedUDPtoUDP(port, address, upstream, downstream)
+        proxy.name = "udp:{}".format(port)
+        yield proxy
+    for port, address in args.tcp:
+        upstream, downstream = _impairments(args, "tcp:{}".format(port))
+        proxy = ImpairedTCPRelay(port, address, upstream, downstream)
+        proxy.name = "tcp:{}".format(port)
+        yield proxy
+
+
+def main(args=None):
+    """ Relay traffic over a simulated link until interrupted.
+    """
+    args = _parse_arguments(args)
+    if not args.quiet:
+        logging.basicConfig(level=logging.INFO)
+    run_proxies(list(_construct_proxies(args)))
+
+
+if __name__ == "__main__":
+    main()
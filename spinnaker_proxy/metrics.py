@@ -0,0 +1,305 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Exporting the proxies' counters, in the Prometheus text format, over HTTP.
+
+The proxies only ever increment integer attributes as they forward packets;
+all the work of gathering and formatting them is done here, when the metrics
+are asked for.
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import logging
+import threading
+
+from .scp import LATENCY_BUCKETS, LatencyHistogram, command_name
+
+#: What the names of the exported metrics start with
+PREFIX = "spinnaker_proxy_"
+
+#: The statistics that are current levels, rather than running totals
+GAUGES = frozenset((
+    "udp_sessions", "tcp_queued_bytes", "udp_paced_bytes", "workers",
+    "scp_pending_requests", "scp_window_outstanding", "scp_window_queued",
+    "scp_cache_entries", "tcp_compressing", "tcp_connected",
+    "replay_queued_bytes", "arq_in_flight", "arq_window", "arq_srtt_usec",
+    "arq_queued_bytes", "fec_group_size", "fec_loss_ppm", "tcp_stripes",
+    "tcp_reorder_held"))
+
+#: The gauges that are settings or estimates, rather than amounts, so are
+#: combined across proxies by taking the largest rather than by adding up
+PEAK_GAUGES = frozenset((
+    "arq_window", "arq_srtt_usec", "fec_group_size", "fec_loss_ppm"))
+
+#: The content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def proxy_stats(proxies):
+    """ Get the counters of each of some proxies.
+
+    :param ~typing.Iterable(DatagramProxy) proxies: The proxies.
+    :return: Map from proxy name to its counters. Proxies without a name are
+        named after their type and position.
+    :rtype: dict(str, dict(str, int))
+    """
+    return {_proxy_name(proxy, index): proxy.get_stats()
+            for index, proxy in enumerate(proxies)}
+
+
+def proxy_latencies(proxies):
+    """ Get the SCP latency histograms of each of some proxies (that are\
+        tracking SCP latency).
+
+    :param ~typing.Iterable(DatagramProxy) proxies: The proxies.
+    :return: Map from proxy name to map from SCP command code to histogram.
+    :rtype: dict(str, dict(int, LatencyHistogram))
+    """
+    # Copied, as the proxies may be adding to them in another thread
+    return {_proxy_name(proxy, index): dict(proxy.scp_latency.histograms)
+            for index, proxy in enumerate(proxies)
+            if proxy.scp_latency is not None}
+
+
+def _proxy_name(proxy, index):
+    if proxy.name is None:
+        return "{}-{}".format(type(proxy).__name__, index)
+    return proxy.name
+
+
+def merge_stats(totals, stats):
+    """ Add counters into running totals; those in :py:data:`PEAK_GAUGES`\
+        are combined by taking the largest instead.
+
+    :param dict(str,int) totals: The totals, which are updated.
+    :param dict(str,int) stats: The counters to add.
+    """
+    for key, value in stats.items():
+        if key not in totals:
+            totals[key] = value
+        elif key in PEAK_GAUGES:
+            totals[key] = max(totals[key], value)
+        else:
+            totals[key] += value
+
+
+def merge_proxy_stats(all_stats):
+    """ Combine the counters of proxies from several processes, adding up\
+        those for proxies with the same name (see :py:func:`merge_stats`).
+
+    :param ~typing.Iterable(dict(str,dict(str,int))) all_stats:
+        The counters from each process, as from :py:func:`proxy_stats`.
+    :rtype: dict(str, dict(str, int))
+    """
+    merged = {}
+    for stats in all_stats:
+        for name, counters in stats.items():
+            merge_stats(merged.setdefault(name, {}), counters)
+    return merged
+
+
+def merge_proxy_latencies(all_latencies):
+    """ Combine the SCP latency histograms of proxies from several\
+        processes, adding up those for proxies with the same name.
+
+    :param ~typing.Iterable(dict(str,dict(int,LatencyHistogram))) \
+            all_latencies:
+        The histograms from each process, as from :py:func:`proxy_latencies`.
+    :rtype: dict(str, dict(int, LatencyHistogram))
+    """
+    merged = {}
+    for latencies in all_latencies:
+        for name, histograms in latencies.items():
+            totals = merged.setdefault(name, {})
+            for command, histogram in histograms.items():
+                if command not in totals:
+                    totals[command] = LatencyHistogram()
+                totals[command].merge(histogram)
+    return merged
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n")
+
+
+def _metric_name(key):
+    if key in GAUGES:
+        return PREFIX + key
+    return PREFIX + key + "_total"
+
+
+def format_metrics(stats, process_stats=None, latencies=None):
+    """ Describe counters in the Prometheus text format.
+
+    :param dict(str,dict(str,int)) stats:
+        Map from proxy name to its counters; each is labelled with the
+        proxy's name.
+    :param process_stats:
+        Counters that belong to the whole process (e.g., of its workers),
+        which are not labelled.
+    :type process_stats: dict(str, int) or None
+    :param latencies:
+        Map from proxy name to its SCP latency histograms, as from
+        :py:func:`proxy_latencies`; each is labelled with the proxy's name
+        and the command.
+    :type latencies: dict(str, dict(int, LatencyHistogram)) or None
+    :rtype: str
+    """
+    lines = []
+    for key, value in sorted((process_stats or {}).items()):
+        name = _metric_name(key)
+        lines.append("# TYPE {} {}".format(
+            name, "gauge" if key in GAUGES else "counter"))
+        lines.append("{} {}".format(name, value))
+    keys = sorted(set(key for counters in stats.values() for key in counters))
+    for key in keys:
+        name = _metric_name(key)
+        lines.append("# TYPE {} {}".format(
+            name, "gauge" if key in GAUGES else "counter"))
+        for proxy, counters in sorted(stats.items()):
+            if key in counters:
+                lines.append('{}{{proxy="{}"}} {}'.format(
+                    name, _escape(proxy), counters[key]))
+    if latencies:
+        lines.extend(_format_latencies(latencies))
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _format_latencies(latencies):
+    name = PREFIX + "scp_latency_seconds"
+    yield "# TYPE {} histogram".format(name)
+    bounds = ["{:g}".format(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+    for proxy, histograms in sorted(latencies.items()):
+        for command, histogram in sorted(histograms.items()):
+            labels = 'proxy="{}",command="{}"'.format(
+                _escape(proxy), command_name(command))
+            seen = 0
+            for bound, count in zip(bounds, histogram.counts):
+                seen += count
+                yield '{}_bucket{{{},le="{}"}} {}'.format(
+                    name, labels, bound, seen)
+            yield "{}_sum{{{}}} {!r}".format(name, labels, histogram.total)
+            yield "{}_count{{{}}} {}".format(name, labels, seen)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """ Answers requests for ``/metrics``.
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logging.debug("metrics request: " + fmt % args)
+
+
+class MetricsServer(object):
+    """ A small HTTP server that serves the proxies' counters at\
+        ``/metrics``.
+
+    It either runs in a thread of its own (see :py:meth:`start`), or is
+    polled by something else that waits for it to be readable (see
+    :py:meth:`fileno` and :py:meth:`handle_request`). In a thread, answering
+    a request reads the counters while the proxies may be forwarding; as each
+    counter is a plain integer, the worst that can happen is that a scrape
+    sees some counters slightly before others.
+    """
+
+    def __init__(self, port, get_stats, get_process_stats=None,
+                 get_latencies=None, address="127.0.0.1"):
+        """
+        :param int port: The port to listen on (0 for any free port).
+        :param get_stats:
+            Gets the proxies' counters, as :py:func:`proxy_stats` does.
+        :type get_stats:
+            ~collections.abc.Callable([], dict(str, dict(str, int)))
+        :param get_process_stats:
+            Gets counters for the whole process.
+        :type get_process_stats:
+            ~collections.abc.Callable([], dict(str, int)) or None
+        :param get_latencies:
+            Gets the proxies' SCP latency histograms, as
+            :py:func:`proxy_latencies` does.
+        :type get_latencies: ~collections.abc.Callable(
+            [], dict(str, dict(int, LatencyHistogram))) or None
+        :param str address: The address to listen on.
+        """
+        self._get_stats = get_stats
+        self._get_process_stats = get_process_stats
+        self._get_latencies = get_latencies
+        self._server = HTTPServer((address, port), _MetricsHandler)
+        self._server.render = self.render
+        # So that handle_request() never waits for a request
+        self._server.timeout = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        """ The port being listened on.
+
+        :rtype: int
+        """
+        return self._server.server_address[1]
+
+    def render(self):
+        """ Describe the current counters in the Prometheus text format.
+
+        :rtype: str
+        """
+        process_stats = latencies = None
+        if self._get_process_stats is not None:
+            process_stats = self._get_process_stats()
+        if self._get_latencies is not None:
+            latencies = self._get_latencies()
+        return format_metrics(self._get_stats(), process_stats, latencies)
+
+    def fileno(self):
+        """ The file descriptor to wait to be readable before calling\
+            :py:meth:`handle_request`.
+
+        :rtype: int
+        """
+        return self._server.fileno()
+
+    def handle_request(self):
+        """ Answer a waiting request.
+        """
+        self._server.handle_request()
+
+    def start(self):
+        """ Start serving requests, in a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """ Stop serving requests.
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
@@ -15,81 +15,662 @@
 """ The implementations of the proxy classes.
 """
 
+from abc import abstractmethod
+from collections import OrderedDict, deque
+import errno
+from functools import partial
 import logging
+import os
+import select
+import selectors
+import socket
+import time
 
-from .support import DatagramProxy, TCPDatagramProtocol, tcp_socket, udp_socket
+from .compression import CompressingDatagramProtocol
+from .support import (
+    DEFAULT_HIGH_WATERMARK, OVERFLOW_BLOCK, OVERFLOW_PAUSE, OVERFLOW_POLICIES,
+    DatagramProxy, FairOutputQueue, MuxDatagramProtocol, OutputQueue, Pacer,
+    TCPDatagramProtocol, resolve_address, tcp_socket, udp_socket)
+from .udp_batch import datagram_batch
 
 DEFAULT_BUFFER_SIZE = 4096
 
+#: The default most external hosts a UDP to UDP proxy tracks at once
+DEFAULT_MAX_SESSIONS = 256
+
+#: The default time (in seconds) after which an idle UDP session is closed
+DEFAULT_SESSION_TIMEOUT = 300.0
+
+#: The default most bytes of datagrams a UDP to TCP proxy holds while it
+#: reconnects
+DEFAULT_REPLAY_BYTES = 256 * 1024
+
+#: The default time (in seconds) to wait before trying to reconnect again;
+#: this doubles with each failed attempt, up to the maximum
+DEFAULT_MIN_BACKOFF = 0.1
+
+#: The default longest time (in seconds) to wait between attempts to
+#: reconnect
+DEFAULT_MAX_BACKOFF = 10.0
+
+#: The default time (in seconds) to let an attempt to reconnect take
+DEFAULT_CONNECT_TIMEOUT = 5.0
+
+#: The default number of bytes of datagrams held back to be written to a TCP
+#: connection together at which they are written straight away
+DEFAULT_COALESCE_BYTES = 16 * 1024
+
+#: Flag to make a receive call not wait for data, where supported
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+
+class _UDPSession(object):
+    """ What a UDP to UDP proxy knows about one external host.
+    """
+
+    __slots__ = ["address", "sock", "last_used"]
+
+    def __init__(self, address, sock, last_used):
+        #: The external host's address
+        self.address = address
+        #: The internal socket used on the external host's behalf
+        self.sock = sock
+        #: When the session last carried a datagram (monotonic seconds)
+        self.last_used = last_used
+
 
 class UDPtoUDP(DatagramProxy):
     """ A UDP to UDP proxy.
 
     This proxy listens on an "external" UDP port and awaits the arrival of
     UDP datagrams. These datagrams are transparently forwarded to the
-    "internal" UDP address upon arrival. If any UDP datagrams are received
-    back from the internal connection, these are forwarded to the most recent
-    external host to send a UDP datagram to the external UDP port.
+    "internal" UDP address upon arrival.
+
+    Like a NAT, each external host (i.e., each address datagrams arrive from)
+    is given a session with its own internal socket, so any UDP datagrams
+    received back on that socket are forwarded to the external host that
+    the session belongs to. Sessions that have not carried a datagram for a
+    while are closed, as are the least recently used ones when there would
+    otherwise be too many.
 
     This proxy essentially allows port numbers to be changed.
+
+    Several processes may each run a proxy on the same external port if they
+    all ask to reuse the port; the kernel then consistently sends each
+    external host's datagrams to the same one of them, so its session stays
+    in one place.
+
+    With a batch size greater than one, each readiness event drains (up to)
+    that many waiting datagrams at once and forwards them together (with
+    ``recvmmsg()`` and ``sendmmsg()`` where available), which greatly reduces
+    the per-datagram cost at high packet rates.
+
+    Datagrams from external hosts are taken to be SCP requests (and those
+    going back to be their responses) if :py:attr:`scp_latency`,
+    :py:attr:`scp_window`, :py:attr:`scp_dedup` or :py:attr:`scp_cache` is
+    set.
     """
 
+    COUNTERS = ("ext_to_int_packets", "ext_to_int_bytes",
+                "int_to_ext_packets", "int_to_ext_bytes", "udp_errors")
+
+    #: How many datagrams have been forwarded from external hosts
+    ext_to_int_packets = 0
+    #: How many bytes have been forwarded from external hosts
+    ext_to_int_bytes = 0
+    #: How many datagrams have been forwarded to external hosts
+    int_to_ext_packets = 0
+    #: How many bytes have been forwarded to external hosts
+    int_to_ext_bytes = 0
+
     def __init__(self, ext_udp_port, int_udp_address,
-                 bufsize=DEFAULT_BUFFER_SIZE):
+                 bufsize=DEFAULT_BUFFER_SIZE, batch_size=1,
+                 max_sessions=DEFAULT_MAX_SESSIONS,
+                 session_timeout=DEFAULT_SESSION_TIMEOUT, reuse_port=False):
         #: The buffer size (usually 4kB)
         self.bufsize = bufsize
+        #: The most datagrams to forward per readiness event
+        self.batch_size = batch_size
+        # Batch buffers, allocated when first needed
+        self._ext_batch = self._int_batch = None
+
+        #: The most external hosts to have sessions for at once
+        self.max_sessions = max_sessions
+        #: How long (in seconds) a session may be idle before it is closed
+        self.session_timeout = session_timeout
+        #: How many sessions have been opened
+        self.sessions_created = 0
+        #: How many sessions have been closed for being idle or to make room
+        self.sessions_evicted = 0
+        # Map from external address to session, least recently used first
+        self._sessions = OrderedDict()
+        self._sweeper = None
 
         #: The external socket
-        self.ext_sock = udp_socket(bind_port=ext_udp_port)
-        #: The address associated with the external socket
-        self.ext_address = None
+        self.ext_sock = udp_socket(
+            bind_port=ext_udp_port, reuse_port=reuse_port)
+        #: Where internal sockets send to
+        self.int_address = int_udp_address
 
-        #: The internal socket
-        self.int_sock = udp_socket(connect_address=int_udp_address)
+    def _session(self, ext_address, now):
+        """ Get the session for an external host, opening it if needed.
+        """
+        session = self._sessions.get(ext_address)
+        if session is None:
+            return self._open_session(ext_address, now)
+        self._sessions.move_to_end(ext_address)
+        session.last_used = now
+        return session
+
+    def _open_session(self, ext_address, now):
+        self._expire_sessions(now)
+        if len(self._sessions) >= self.max_sessions:
+            self._evict(next(iter(self._sessions.values())), "too many")
+        sock = udp_socket(connect_address=self.int_address)
+        session = _UDPSession(ext_address, sock, now)
+        self._sessions[ext_address] = session
+        self._watch(sock, partial(self.int_to_ext, session))
+        self.sessions_created += 1
+        logging.info("new UDP connection from {}".format(ext_address))
+        return session
+
+    def _evict(self, session, reason):
+        del self._sessions[session.address]
+        self._close_socket(session.sock)
+        self.sessions_evicted += 1
+        logging.info("closed UDP connection from {} ({})".format(
+            session.address, reason))
+
+    def _expire_sessions(self, now):
+        """ Close the sessions that have been idle for too long.
+        """
+        deadline = now - self.session_timeout
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used > deadline:
+                break
+            self._evict(session, "idle")
+
+    def _sweep(self):
+        self._expire_sessions(time.monotonic())
+        self._sweeper = self._loop.call_later(
+            self.session_timeout / 2, self._sweep)
 
     def ext_to_int(self):
         """ Forward a UDP datagram arriving from the external socket to the\
             internal socket."""
-        # Receive the external datagram, recording the originating address of
-        # the packet (to allow directing of return packets)
-        datagram, ext_address = self.ext_sock.recvfrom(self.bufsize)
-        if ext_address != self.ext_address:
-            logging.info("new UDP connection from {}".format(ext_address))
-            self.ext_address = ext_address
+        if self.on_boot is not None:
+            self.on_boot()
+        try:
+            if self.batch_size > 1:
+                self._ext_to_int_batched()
+                return
+            # Receive the external datagram, recording the originating
+            # address of the packet (to allow directing of return packets)
+            datagram, ext_address = self.ext_sock.recvfrom(self.bufsize)
+            self._forward_request(datagram, ext_address, time.monotonic())
+        except OSError as error:
+            self._udp_error(error)
+
+    def _forward_request(self, datagram, ext_address, now):
+        """ Forward a datagram from an external host to the internal socket\
+            of its session, unless it is a retried SCP request that has\
+            been dealt with already or one that can be answered from the\
+            cache.
+        """
+        session = self._session(ext_address, now)
+        if self.scp_dedup is not None and not self.scp_dedup.request(
+                datagram, partial(self._reply, ext_address), ext_address):
+            return
+        if self.scp_cache is not None and not self.scp_cache.request(
+                datagram, partial(self._reply, ext_address), ext_address):
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.request(datagram, ext_address, now)
 
         # Forward the datagram to the internal socket
-        self.int_sock.send(datagram)
+        if self.scp_window is not None:
+            self.scp_window.request(
+                datagram, self._int_sender(session), ext_address)
+        else:
+            self._int_sender(session)(datagram)
+        self.ext_to_int_packets += 1
+        self.ext_to_int_bytes += len(datagram)
+
+    def _int_sender(self, session):
+        """ Get what sends a datagram to the internal address for a session.
+        """
+        return session.sock.send
+
+    def _send_ext(self, datagram, ext_address):
+        """ Send a datagram to an external host.
+        """
+        self.ext_sock.sendto(datagram, ext_address)
+
+    def _reply(self, ext_address, datagram):
+        """ Answer an external host directly, with a remembered response.
+        """
+        self._send_ext(datagram, ext_address)
+        self.int_to_ext_packets += 1
+        self.int_to_ext_bytes += len(datagram)
 
-    def int_to_ext(self):
+    def int_to_ext(self, session):
         """ Forward a UDP datagram arriving from the internal socket to the\
-            external socket."""
-        # Receive the internal datagram
-        datagram = self.int_sock.recv(self.bufsize)
-
-        # Forward to the external socket at the address most recently received
-        # from
-        if self.ext_address is None:
-            logging.warning("got UDP data before UDP 'connection' made")
+            external socket.
+
+        :param _UDPSession session: The session whose socket is readable.
+        """
+        try:
+            if self.batch_size > 1:
+                self._int_to_ext_batched(session)
+                return
+            # Receive the internal datagram
+            datagram = session.sock.recv(self.bufsize)
+            now = time.monotonic()
+            self._session(session.address, now)
+            self._forward_response(datagram, session, now)
+        except OSError as error:
+            self._udp_error(error)
+
+    def _forward_response(self, datagram, session, now):
+        """ Forward a datagram from the internal socket of a session to the\
+            external host it belongs to.
+        """
+        if self.scp_latency is not None:
+            self.scp_latency.response(datagram, session.address, now)
+        if self.scp_window is not None:
+            self.scp_window.response(datagram, session.address)
+        if self.scp_dedup is not None:
+            self.scp_dedup.response(datagram, session.address)
+        if self.scp_cache is not None:
+            self.scp_cache.response(datagram, session.address)
+
+        # Forward to the external host the session belongs to
+        self._send_ext(datagram, session.address)
+        self.int_to_ext_packets += 1
+        self.int_to_ext_bytes += len(datagram)
+
+    def _ext_to_int_batched(self):
+        batch = self._ext_batch
+        if batch is None:
+            batch = self._ext_batch = datagram_batch(
+                self.batch_size, self.bufsize)
+        count = batch.recv(self.ext_sock)
+        now = time.monotonic()
+        if self.scp_dedup is not None or self.scp_cache is not None:
+            # Each request must be checked for being answered already
+            for i in range(count):
+                self._forward_request(batch.datagram(i), batch.address(i), now)
+            return
+        addresses = [batch.address(i) for i in range(count)]
+        if self.scp_latency is not None:
+            for i in range(count):
+                self.scp_latency.request(batch.datagram(i), addresses[i], now)
+        if self.scp_window is not None:
+            # Each request must wait its turn
+            for i in range(count):
+                session = self._session(addresses[i], now)
+                self.scp_window.request(
+                    batch.datagram(i), session.sock.send, addresses[i])
+        else:
+            self._forward_runs(batch, count, addresses, now)
+        self.ext_to_int_packets += count
+        self.ext_to_int_bytes += batch.nbytes(count)
+
+    def _forward_runs(self, batch, count, addresses, now):
+        """ Forward each run of datagrams from the same host together.
+        """
+        start = 0
+        while start < count:
+            ext_address = addresses[start]
+            end = start + 1
+            while end < count and addresses[end] == ext_address:
+                end += 1
+            session = self._session(ext_address, now)
+            batch.forward(session.sock, end - start, start=start)
+            start = end
+
+    def _int_to_ext_batched(self, session):
+        batch = self._int_batch
+        if batch is None:
+            batch = self._int_batch = datagram_batch(
+                self.batch_size, self.bufsize)
+        count = batch.recv(session.sock)
+        if not count:
             return
+        now = time.monotonic()
+        self._session(session.address, now)
+        if self.scp_latency is not None:
+            for i in range(count):
+                self.scp_latency.response(
+                    batch.datagram(i), session.address, now)
+        if self.scp_window is not None:
+            for i in range(count):
+                self.scp_window.response(batch.datagram(i), session.address)
+        if self.scp_dedup is not None:
+            for i in range(count):
+                self.scp_dedup.response(batch.datagram(i), session.address)
+        if self.scp_cache is not None:
+            for i in range(count):
+                self.scp_cache.response(batch.datagram(i), session.address)
+        batch.forward(self.ext_sock, count, session.address)
+        self.int_to_ext_packets += count
+        self.int_to_ext_bytes += batch.nbytes(count)
 
-        self.ext_sock.sendto(datagram, self.ext_address)
+    def attach(self, loop):
+        super(UDPtoUDP, self).attach(loop)
+        self._sweeper = loop.call_later(self.session_timeout / 2, self._sweep)
 
     def get_select_handlers(self):
-        return {
-            self.ext_sock: self.ext_to_int,
-            self.int_sock: self.int_to_ext,
-        }
+        handlers = {self.ext_sock: self.ext_to_int}
+        for session in self._sessions.values():
+            handlers[session.sock] = partial(self.int_to_ext, session)
+        return handlers
+
+    def get_stats(self):
+        stats = super(UDPtoUDP, self).get_stats()
+        stats["udp_sessions"] = len(self._sessions)
+        stats["udp_sessions_created"] = self.sessions_created
+        stats["udp_sessions_evicted"] = self.sessions_evicted
+        return stats
 
     def close(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self.scp_window is not None:
+            self.scp_window.close()
         if self.ext_sock:
-            self.ext_sock.close()
+            self._close_socket(self.ext_sock)
             self.ext_sock = None
-        if self.int_sock:
-            self.int_sock.close()
-            self.int_sock = None
+        for session in self._sessions.values():
+            self._close_socket(session.sock)
+        self._sessions.clear()
+
+
+class _TCPOutputProxy(DatagramProxy):
+    """ Support for proxies which forward datagrams arriving on a UDP socket,
+    :py:attr:`udp_sock`, down a non-blocking TCP socket, :py:attr:`tcp_sock`,
+    through a bounded output queue.
+
+    The overflow policy says what happens to arriving datagrams when the queue
+    is full (i.e., when the TCP connection cannot keep up):
+
+    ``drop``
+        The datagrams are discarded.
+    ``pause``
+        Datagrams are not read from the UDP socket (so they accumulate in, and
+        eventually overflow, the kernel's buffers) until the queue has
+        drained to its low watermark.
+    ``block``
+        Everything waits until the queue has drained to its low watermark.
+
+    Given a coalescing delay, datagrams are not written as they arrive, but
+    held back so that several are written at once, in fewer system calls and
+    TCP segments: until the end of the current pass of the event loop, and
+    no sooner than that delay after the last write. A connection that has
+    been quiet for that long is thus written to without waiting (beyond the
+    end of the pass). Each readiness event of the UDP socket then drains all
+    the datagrams waiting on it, and once the coalescing byte budget is held
+    back, they are written without waiting at all.
+    """
+
+    #: The UDP socket
+    udp_sock = None
+    #: The TCP socket
+    tcp_sock = None
+    #: How datagrams are framed on the TCP connection
+    tcp_protocol = None
+    #: The buffer size (usually 4kB)
+    bufsize = DEFAULT_BUFFER_SIZE
 
+    COUNTERS = ("udp_to_tcp_packets", "udp_to_tcp_bytes",
+                "tcp_to_udp_packets", "tcp_to_udp_bytes", "tcp_connections",
+                "data_before_connection", "udp_errors")
 
-class UDPtoTCP(DatagramProxy):
+    #: How many datagrams have arrived to go down the TCP connection
+    #: (including any that were dropped)
+    udp_to_tcp_packets = 0
+    #: How many bytes have arrived to go down the TCP connection
+    udp_to_tcp_bytes = 0
+    #: How many datagrams have been forwarded from the TCP connection
+    tcp_to_udp_packets = 0
+    #: How many bytes have been forwarded from the TCP connection
+    tcp_to_udp_bytes = 0
+    #: How many TCP connections have been made
+    tcp_connections = 0
+    #: How many datagrams were discarded because the other side of the proxy
+    #: was not connected yet
+    data_before_connection = 0
+
+    def _init_output(self, high_watermark, low_watermark, overflow,
+                     coalesce_delay=None,
+                     coalesce_bytes=DEFAULT_COALESCE_BYTES):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("unknown overflow policy: {}".format(overflow))
+        #: What to do with datagrams when the TCP output queue is full
+        self.overflow = overflow
+        #: Data waiting to be written to the TCP connection
+        self.tcp_queue = OutputQueue(high_watermark, low_watermark)
+        #: The longest time (in seconds) to hold back datagrams to write them
+        #: together, or ``None`` to write each as it arrives
+        self.coalesce_delay = coalesce_delay
+        #: The number of bytes held back at which they are written at once
+        self.coalesce_bytes = coalesce_bytes
+        self._writing = False
+        self._paused = False
+        self._flush_timer = None
+        self._coalesce_timer = None
+        self._last_write = float("-inf")
+
+    @abstractmethod
+    def udp_to_tcp(self):
+        """ Forward received UDP datagrams over TCP.
+        """
+        raise NotImplementedError
+
+    def _udp_datagrams(self):
+        """ Receive the datagrams waiting on the UDP socket: just one, unless
+        coalescing writes, when all that are waiting (up to the coalescing
+        byte budget) are received, so as to be written together.
+
+        :rtype: ~typing.Iterable(tuple(bytes, tuple(str, int)))
+        """
+        try:
+            received = self.udp_sock.recvfrom(self.bufsize)
+        except BlockingIOError:
+            return
+        except OSError as error:
+            self._udp_error(error)
+            return
+        yield received
+        if self.coalesce_delay is None or not _MSG_DONTWAIT:
+            return
+        budget = self.coalesce_bytes
+        while budget > 0 and self.udp_sock is not None and not self._paused:
+            try:
+                datagram, address = self.udp_sock.recvfrom(
+                    self.bufsize, _MSG_DONTWAIT)
+            except BlockingIOError:
+                return
+            except OSError as error:
+                self._udp_error(error)
+                return
+            budget -= len(datagram)
+            yield datagram, address
+
+    def _send_datagram(self, datagram):
+        """ Queue a datagram to go down the TCP connection, and send as much
+        of the queue as can be sent right now.
+        """
+        self.udp_to_tcp_packets += 1
+        self.udp_to_tcp_bytes += len(datagram)
+        self._queue_datagram(datagram)
+
+    def _queue_datagram(self, datagram):
+        """ Encode a datagram and add it to the queue for the TCP connection,\
+            unless the queue is full.
+        """
+        queue = self.tcp_queue
+        if queue.is_full:
+            if self.overflow != OVERFLOW_BLOCK:
+                queue.drop(len(datagram))
+                return
+            if not self._wait_until_drained():
+                return
+        buffers = self.tcp_protocol.encode(datagram)
+        if buffers:
+            self._push(buffers)
+        if self.tcp_protocol.pending_bytes:
+            # Send what the protocol holds back once this pass of the loop
+            # has added all it will
+            if self._loop is None:
+                self._flush_protocol()
+            elif self._flush_timer is None:
+                self._flush_timer = self._loop.call_later(
+                    0, self._on_flush_timer)
+
+    def _flush_protocol(self):
+        """ Send whatever the protocol has held back (e.g., to compress it).
+        """
+        if self.tcp_sock is None:
+            # Lost while the datagrams that came with this were handled
+            return
+        buffers = self.tcp_protocol.flush()
+        if buffers:
+            self._push(buffers)
+
+    def _on_flush_timer(self):
+        self._flush_timer = None
+        if self.tcp_sock is not None:
+            self._flush_protocol()
+
+    def _push(self, buffers):
+        """ Queue buffers to go down the TCP connection, however full it is,\
+            and send as much of the queue as can be sent right now.
+        """
+        queue = self.tcp_queue
+        queue.push(buffers)
+        if self._writing:
+            # Already waiting for the socket to become writable
+            pass
+        elif self._loop is None:
+            if not self._wait_until_drained(0):
+                return
+        elif self.coalesce_delay is not None and \
+                queue.queued_bytes < self.coalesce_bytes:
+            # Hold it back, to be written with those that follow
+            if self._coalesce_timer is None:
+                self._coalesce_timer = self._loop.call_at(
+                    max(time.monotonic(),
+                        self._last_write + self.coalesce_delay),
+                    self._on_coalesce_timer, precise=True)
+        elif not self._flush_queue():
+            return
+        if queue.is_full and self.overflow == OVERFLOW_PAUSE:
+            self._pause_reading()
+
+    def _flush_queue(self):
+        """ Send as much of the queue as can be sent right now, and wait for\
+            the TCP connection to become writable if that is not all of it.
+
+        :return: Whether the TCP connection is still open.
+        :rtype: bool
+        """
+        if self._coalesce_timer is not None:
+            self._coalesce_timer.cancel()
+            self._coalesce_timer = None
+        self._last_write = time.monotonic()
+        try:
+            flushed = self.tcp_queue.flush(self.tcp_sock)
+        except ConnectionError:
+            self._connection_lost()
+            return False
+        if not flushed:
+            self._writing = True
+            self._loop.set_writer(self.tcp_sock, self._on_tcp_writable)
+        return True
+
+    def _on_coalesce_timer(self):
+        self._coalesce_timer = None
+        if self.tcp_sock is None or self._writing:
+            return
+        if self._flush_queue() and self._paused and \
+                self.tcp_queue.is_drained:
+            self._resume_reading()
+
+    def _wait_until_drained(self, low_watermark=None):
+        """ Block until the queue is at (or below) a level.
+
+        :return: Whether the TCP connection is still open.
+        :rtype: bool
+        """
+        if low_watermark is None:
+            low_watermark = self.tcp_queue.low_watermark
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.tcp_sock, selectors.EVENT_WRITE)
+                while not self.tcp_queue.flush(self.tcp_sock) and \
+                        self.tcp_queue.queued_bytes > low_watermark:
+                    selector.select()
+        except ConnectionError:
+            self._connection_lost()
+            return False
+        return True
+
+    def _on_tcp_writable(self):
+        try:
+            flushed = self.tcp_queue.flush(self.tcp_sock)
+        except ConnectionError:
+            self._connection_lost()
+            return
+        if flushed:
+            self._writing = False
+            self._loop.set_writer(self.tcp_sock, None)
+        if self._paused and self.tcp_queue.is_drained:
+            self._resume_reading()
+
+    def _pause_reading(self):
+        if not self._paused and self._loop is not None:
+            self._paused = True
+            self._loop.set_reader(self.udp_sock, None)
+
+    def _resume_reading(self):
+        if self._paused:
+            self._paused = False
+            if self.udp_sock is not None:
+                self._loop.set_reader(self.udp_sock, self.udp_to_tcp)
+
+    def _connection_lost(self):
+        """ Handle the TCP connection failing.
+        """
+        self.close()
+
+    def _reset_output(self):
+        """ Discard anything queued for the TCP connection, which has gone.
+        """
+        self.tcp_queue.clear()
+        self._writing = False
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._coalesce_timer is not None:
+            self._coalesce_timer.cancel()
+            self._coalesce_timer = None
+        self._resume_reading()
+
+    def get_stats(self):
+        stats = super(_TCPOutputProxy, self).get_stats()
+        stats["tcp_queued_bytes"] = self.tcp_queue.queued_bytes
+        stats["tcp_dropped_datagrams"] = self.tcp_queue.dropped_datagrams
+        stats["tcp_dropped_bytes"] = self.tcp_queue.dropped_bytes
+        stats["tcp_writes"] = self.tcp_queue.writes
+        if isinstance(self.tcp_protocol, CompressingDatagramProtocol):
+            stats.update(self.tcp_protocol.get_stats())
+        return stats
+
+
+class UDPtoTCP(_TCPOutputProxy):
     """ Forward UDP datagrams over a TCP connection.
 
     This proxy listens on a UDP port and connects to a TCP server. When a UDP
@@ -100,20 +681,117 @@ class UDPtoTCP(DatagramProxy):
     Since TCP is stream-based not datagram-based, each datagram is prefixed
     with a 32-bit number indicating the datagram's length in bytes.
 
-    If the TCP connection is closed, this proxy will raise an exception when
-    it next attempts to forward a datagram.
+    If the TCP connection is closed, this proxy closes, unless it was asked
+    to reconnect (which needs it to be attached to an event loop). Then it
+    keeps trying to reconnect, waiting longer after each failure, and holds
+    the datagrams that arrive meanwhile (up to a limit, dropping the oldest)
+    to send once it has.
+
+    Datagrams waiting to go down the TCP connection are held in a bounded
+    queue; see :py:class:`_TCPOutputProxy` for what happens when it is full.
+
+    UDP datagrams are taken to be SCP requests (and those coming back over
+    TCP to be their responses) if :py:attr:`scp_latency` or
+    :py:attr:`scp_cache` is set.
     """
 
+    COUNTERS = _TCPOutputProxy.COUNTERS + (
+        "tcp_connect_failures", "tcp_connect_usec", "tcp_outage_usec",
+        "replayed_datagrams", "replay_dropped_datagrams")
+
+    #: How many attempts to reconnect failed
+    tcp_connect_failures = 0
+    #: How long (in microseconds) the successful connections took to make
+    tcp_connect_usec = 0
+    #: How long (in microseconds) the proxy has spent reconnecting
+    tcp_outage_usec = 0
+    #: How many datagrams were held while reconnecting and then sent
+    replayed_datagrams = 0
+    #: How many datagrams held while reconnecting were dropped for lack of
+    #: room
+    replay_dropped_datagrams = 0
+
     def __init__(self, udp_port, tcp_address,
-                 bufsize=DEFAULT_BUFFER_SIZE):
+                 bufsize=DEFAULT_BUFFER_SIZE,
+                 high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=None,
+                 overflow=OVERFLOW_PAUSE, compress=False, reconnect=False,
+                 replay_bytes=DEFAULT_REPLAY_BYTES,
+                 min_backoff=DEFAULT_MIN_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 coalesce_delay=None, coalesce_bytes=DEFAULT_COALESCE_BYTES):
         """
         :param udp_port:
         :type udp_port: int or None
         :param str tcp_address:
         :param int bufsize:
+        :param int high_watermark:
+            How many bytes may be queued for the TCP connection before it
+            counts as full.
+        :param low_watermark:
+            How few bytes must be queued for a full TCP connection to count
+            as drained (by default, a quarter of the high watermark).
+        :type low_watermark: int or None
+        :param str overflow:
+            What to do when the TCP connection is full: ``drop``, ``pause``
+            or ``block``.
+        :param bool compress:
+            Whether to offer to compress the TCP connection.
+        :param bool reconnect:
+            Whether to reconnect when the TCP connection is lost, instead of
+            closing.
+        :param int replay_bytes:
+            The most bytes of datagrams to hold while reconnecting.
+        :param float min_backoff:
+            How long (in seconds) to wait after the first failed attempt to
+            reconnect; this doubles with each further failure.
+        :param float max_backoff:
+            The longest time (in seconds) to wait between attempts.
+        :param float connect_timeout:
+            How long (in seconds) to let an attempt take.
+        :param coalesce_delay:
+            The longest time (in seconds) to hold back datagrams so as to
+            write several to the TCP connection at once (zero: until the end
+            of the current pass of the event loop), or ``None`` to write
+            each as it arrives.
+        :type coalesce_delay: float or None
+        :param int coalesce_bytes:
+            How many bytes of datagrams may be held back before they are
+            written without waiting.
         """
+        self._init_output(high_watermark, low_watermark, overflow,
+                          coalesce_delay, coalesce_bytes)
         #: The buffer size (usually 4kB)
         self.bufsize = bufsize
+        #: Where the TCP server is
+        self.tcp_address = tcp_address
+        # Its numeric address, looked up once: looking it up again each time
+        # the connection is remade would block the event loop
+        self._tcp_peer = None
+        #: Whether to offer to compress the TCP connection
+        self.compress = compress
+        #: Whether to reconnect when the TCP connection is lost
+        self.reconnect = reconnect
+        #: The most bytes of datagrams to hold while reconnecting
+        self.replay_bytes = replay_bytes
+        #: How long (in seconds) to first wait before reconnecting again
+        self.min_backoff = min_backoff
+        #: The longest time (in seconds) to wait before reconnecting again
+        self.max_backoff = max_backoff
+        #: How long (in seconds) to let an attempt to reconnect take
+        self.connect_timeout = connect_timeout
+        # The datagrams held while reconnecting
+        self._replay = deque()
+        #: How many bytes of datagrams are held while reconnecting
+        self.replay_queued_bytes = 0
+        # When the connection was lost (or None if connected)
+        self._lost_at = None
+        # When the current attempt to connect started
+        self._connect_started = None
+        self._backoff = min_backoff
+        # Either the timeout of an attempt to connect, or the wait before
+        # the next one
+        self._connect_timer = None
 
         #: The UDP socket
         self.udp_sock = udp_socket(bind_port=udp_port)
@@ -121,42 +799,181 @@ class UDPtoTCP(DatagramProxy):
         self.udp_address = None
 
         # The TCP (client) socket
+        start = time.monotonic()
         try:
-            self.tcp_sock = tcp_socket(connect_address=tcp_address)
+            self._tcp_peer = resolve_address(tcp_address)
+            self.tcp_sock = tcp_socket(connect_address=self._tcp_peer)
         except Exception as e:
             self.udp_sock.close()
             raise e
+        self.tcp_connect_usec += int((time.monotonic() - start) * 1e6)
+        self.tcp_sock.setblocking(False)
+        self.tcp_connections += 1
+        self._new_protocol()
 
+    def _new_protocol(self):
+        """ Start speaking the proxy protocol on a new TCP connection.
+        """
         #: How to handle messages in the proxy protocol
-        self.tcp_protocol = TCPDatagramProtocol()
+        if self.compress:
+            self.tcp_protocol = CompressingDatagramProtocol()
+            # The offer goes with the first datagram
+            self.tcp_queue.push(self.tcp_protocol.offer())
+        else:
+            self.tcp_protocol = TCPDatagramProtocol()
 
     def udp_to_tcp(self):
         """ Forward received UDP datagrams over TCP.
         """
-        # Receive the datagram, recording the originating address of the packet
+        # Receive the datagrams, recording the originating address of each
         # (to allow directing of return packets)
-        datagram, udp_address = self.udp_sock.recvfrom(self.bufsize)
-        if udp_address != self.udp_address:
-            logging.info("new UDP connection from {}".format(udp_address))
-            self.udp_address = udp_address
+        for datagram, udp_address in self._udp_datagrams():
+            if udp_address != self.udp_address:
+                logging.info("new UDP connection from {}".format(
+                    udp_address))
+                self.udp_address = udp_address
+            if self.on_boot is not None:
+                self.on_boot()
+            if self.scp_cache is not None and not self.scp_cache.request(
+                    datagram, partial(self._reply, udp_address)):
+                continue
+            if self.scp_latency is not None:
+                self.scp_latency.request(datagram)
+
+            # Forward the datagram over TCP (prepending with its length)
+            self._send_datagram(datagram)
+
+    def _reply(self, udp_address, datagram):
+        """ Answer the UDP sender directly, with a cached response.
+        """
+        try:
+            self.udp_sock.sendto(datagram, udp_address)
+        except OSError as error:
+            self._udp_error(error)
 
-        # Forward the datagram over TCP (prepending with the datagram length)
-        self.tcp_sock.send(self.tcp_protocol.send(datagram))
+    def _queue_datagram(self, datagram):
+        if self._lost_at is None:
+            super(UDPtoTCP, self)._queue_datagram(datagram)
+            return
+        # Hold it until reconnected, making room by dropping the oldest
+        self._replay.append(bytes(datagram))
+        self.replay_queued_bytes += len(datagram)
+        while self.replay_queued_bytes > self.replay_bytes:
+            self.replay_queued_bytes -= len(self._replay.popleft())
+            self.replay_dropped_datagrams += 1
 
     def tcp_to_udp(self):
         """ Unpack received TCP data and forward any datagrams over UDP.
         """
-        data = self.tcp_sock.recv(self.bufsize)
-        if len(data) == 0:
-            # A zero read means we're done
-            self.close()
+        try:
+            if self.tcp_protocol.recv_into(self.tcp_sock, self.bufsize) == 0:
+                # A zero read means we're done
+                self._connection_lost()
+                return
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            self._connection_lost()
             return
-        for datagram in self.tcp_protocol.recv(data):
+        for datagram in self.tcp_protocol.frames():
             # Forward the datagram to the last UDP address received from
             if self.udp_address is None:
                 logging.warning("got TCP data before UDP 'connection' made")
+                self.data_before_connection += 1
                 continue
-            self.udp_sock.sendto(datagram, self.udp_address)
+            try:
+                self.udp_sock.sendto(datagram, self.udp_address)
+            except OSError as error:
+                self._udp_error(error)
+                continue
+            if self.scp_latency is not None:
+                self.scp_latency.response(datagram)
+            if self.scp_cache is not None:
+                self.scp_cache.response(datagram)
+            self.tcp_to_udp_packets += 1
+            self.tcp_to_udp_bytes += len(datagram)
+        self._flush_protocol()
+
+    def _connection_lost(self):
+        if not self.reconnect or self._loop is None:
+            self.close()
+            return
+        logging.warning("TCP connection to {} lost; reconnecting".format(
+            self.tcp_address))
+        self._close_socket(self.tcp_sock)
+        self.tcp_sock = None
+        self._reset_output()
+        self._lost_at = time.monotonic()
+        self._backoff = self.min_backoff
+        self._connect()
+
+    def _connect(self):
+        """ Start an attempt to reconnect.
+        """
+        self._connect_timer = None
+        self._connect_started = time.monotonic()
+        sock = tcp_socket()
+        sock.setblocking(False)
+        try:
+            error = sock.connect_ex(self._tcp_peer)
+        except OSError as e:
+            sock.close()
+            self._connect_failed(e)
+            return
+        if error not in (0, errno.EINPROGRESS):
+            sock.close()
+            self._connect_failed(os.strerror(error))
+            return
+        self.tcp_sock = sock
+        self._loop.register(sock, None)
+        self._loop.set_writer(sock, self._on_connect_done)
+        self._connect_timer = self._loop.call_later(
+            self.connect_timeout,
+            partial(self._connect_failed, "timed out"))
+
+    def _on_connect_done(self):
+        error = self.tcp_sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            self._connect_failed(os.strerror(error))
+            return
+        self._connect_timer.cancel()
+        self._connect_timer = None
+        now = time.monotonic()
+        self.tcp_connect_usec += int((now - self._connect_started) * 1e6)
+        self.tcp_outage_usec += int((now - self._lost_at) * 1e6)
+        self._lost_at = None
+        self.tcp_connections += 1
+        logging.info("reconnected to {}".format(self.tcp_address))
+        self._loop.set_writer(self.tcp_sock, None)
+        self._loop.set_reader(self.tcp_sock, self.tcp_to_udp)
+        self._new_protocol()
+        self._on_reconnect()
+        replay, self._replay = self._replay, deque()
+        self.replay_queued_bytes = 0
+        while replay:
+            if self._lost_at is None:
+                self.replayed_datagrams += 1
+            # If lost again already, this holds it for the next time
+            self._queue_datagram(replay.popleft())
+
+    def _on_reconnect(self):
+        """ Called once reconnected, before the held datagrams are sent.
+        """
+
+    def _connect_failed(self, reason):
+        """ Give up on an attempt to reconnect, and wait before the next.
+        """
+        logging.warning("could not reconnect to {}: {}".format(
+            self.tcp_address, reason))
+        self.tcp_connect_failures += 1
+        if self._connect_timer is not None:
+            self._connect_timer.cancel()
+        if self.tcp_sock is not None:
+            self._close_socket(self.tcp_sock)
+            self.tcp_sock = None
+        self._connect_timer = self._loop.call_later(
+            self._backoff, self._connect)
+        self._backoff = min(self._backoff * 2, self.max_backoff)
 
     def get_select_handlers(self):
         return {
@@ -164,16 +981,27 @@ class UDPtoTCP(DatagramProxy):
             self.tcp_sock: self.tcp_to_udp,
         }
 
+    def get_stats(self):
+        stats = super(UDPtoTCP, self).get_stats()
+        stats["tcp_connected"] = int(self._lost_at is None)
+        stats["replay_queued_bytes"] = self.replay_queued_bytes
+        return stats
+
     def close(self):
+        if self._connect_timer is not None:
+            self._connect_timer.cancel()
+            self._connect_timer = None
+        self._replay.clear()
+        self.replay_queued_bytes = 0
         if self.udp_sock:
-            self.udp_sock.close()
+            self._close_socket(self.udp_sock)
             self.udp_sock = None
         if self.tcp_sock:
-            self.tcp_sock.close()
+            self._close_socket(self.tcp_sock)
             self.tcp_sock = None
 
 
-class TCPtoUDP(DatagramProxy):
+class TCPtoUDP(_TCPOutputProxy):
     """ Unpack datagrams sent over a TCP connection into UDP datagrams.
 
     This proxy sets up a TCP server and 'connects' to a specified UDP
@@ -186,18 +1014,66 @@ class TCPtoUDP(DatagramProxy):
 
     When a connection is made to the TCP server, all previous TCP connections
     are closed.
+
+    Datagrams waiting to go down the TCP connection are held in a bounded
+    queue; see :py:class:`_TCPOutputProxy` for what happens when it is full.
+
+    Datagrams from the TCP connection are taken to be SCP requests (and
+    those coming back over UDP to be their responses) if
+    :py:attr:`scp_latency`, :py:attr:`scp_window` or :py:attr:`scp_dedup` is
+    set.
+
+    Datagrams from the TCP connection arrive in bursts, as TCP's windowing
+    allows. Given a UDP gap, they are instead sent on at least that far
+    apart (so as not to overrun a board being booted); the TCP connection
+    is not read while too many are waiting.
     """
 
     def __init__(self, tcp_port, udp_address,
-                 bufsize=DEFAULT_BUFFER_SIZE):
+                 bufsize=DEFAULT_BUFFER_SIZE,
+                 high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=None,
+                 overflow=OVERFLOW_PAUSE, udp_gap=0.0, compress=False,
+                 coalesce_delay=None, coalesce_bytes=DEFAULT_COALESCE_BYTES):
         """
         :param tcp_port:
         :type tcp_port: int or None
         :param str udp_address:
         :param int bufsize:
+        :param int high_watermark:
+            How many bytes may be queued for the TCP connection before it
+            counts as full.
+        :param low_watermark:
+            How few bytes must be queued for a full TCP connection to count
+            as drained (by default, a quarter of the high watermark).
+        :type low_watermark: int or None
+        :param str overflow:
+            What to do when the TCP connection is full: ``drop``, ``pause``
+            or ``block``.
+        :param float udp_gap:
+            The least time (in seconds) between datagrams sent over UDP, or
+            zero to send them as soon as they arrive.
+        :param bool compress:
+            Whether to accept an offer to compress the TCP connection.
+        :param coalesce_delay:
+            The longest time (in seconds) to hold back datagrams so as to
+            write several to the TCP connection at once (zero: until the end
+            of the current pass of the event loop), or ``None`` to write
+            each as it arrives.
+        :type coalesce_delay: float or None
+        :param int coalesce_bytes:
+            How many bytes of datagrams may be held back before they are
+            written without waiting.
         """
+        self._init_output(high_watermark, low_watermark, overflow,
+                          coalesce_delay, coalesce_bytes)
         #: The buffer size (usually 4kB)
         self.bufsize = bufsize
+        #: The least time (in seconds) between datagrams sent over UDP
+        self.udp_gap = udp_gap
+        #: Whether to accept an offer to compress the TCP connection
+        self.compress = compress
+        # Spaces out the datagrams sent over UDP (once attached to a loop)
+        self._pacer = None
 
         #: The TCP server
         self.tcp_listen_sock = tcp_socket(bind_port=tcp_port)
@@ -218,36 +1094,105 @@ class TCPtoUDP(DatagramProxy):
 
     def _close_sock(self):
         if self.tcp_sock is not None:
-            self.tcp_sock.close()
+            self._close_socket(self.tcp_sock)
             self.tcp_sock = None
+            self._reset_output()
+
+    def _connection_lost(self):
+        # Wait for the client to connect again
+        self._close_sock()
 
     def on_connect(self):
         """ Callback to handle new TCP connections.
         """
         self._close_sock()
         self.tcp_sock, address = self.tcp_listen_sock.accept()
-        self.tcp_protocol = TCPDatagramProtocol()
+        self.tcp_sock.setblocking(False)
+        if self.compress:
+            self.tcp_protocol = CompressingDatagramProtocol(
+                accept_offers=True)
+        else:
+            self.tcp_protocol = TCPDatagramProtocol()
+        self._watch(self.tcp_sock, self.tcp_to_udp)
+        self.tcp_connections += 1
         logging.info("new TCP connection from {}".format(address))
 
     def udp_to_tcp(self):
         """ Forward received UDP datagrams over TCP.
         """
-        datagram = self.udp_sock.recv(self.bufsize)
-        if self.tcp_sock is None:
-            logging.warning("got UDP data when TCP connection not made")
-            return
-        self.tcp_sock.send(self.tcp_protocol.send(datagram))
+        for datagram, _ in self._udp_datagrams():
+            if self.scp_window is not None:
+                self.scp_window.response(datagram)
+            if self.scp_dedup is not None:
+                self.scp_dedup.response(datagram)
+            if self.tcp_sock is None:
+                logging.warning("got UDP data when TCP connection not made")
+                self.data_before_connection += 1
+                continue
+            if self.scp_latency is not None:
+                self.scp_latency.response(datagram)
+            self._send_datagram(datagram)
 
     def tcp_to_udp(self):
         """ Unpack received TCP data and forward any datagrams over UDP.
         """
-        data = self.tcp_sock.recv(self.bufsize)
-        if data == b"":
+        try:
+            received = self.tcp_protocol.recv_into(
+                self.tcp_sock, self.bufsize)
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            received = 0
+        if received == 0:
             # Socket closed.
             self._close_sock()
         else:
-            for datagram in self.tcp_protocol.recv(data):
-                self.udp_sock.send(datagram)
+            for datagram in self.tcp_protocol.frames():
+                if self.scp_dedup is not None and not self.scp_dedup.request(
+                        datagram, self._send_datagram):
+                    continue
+                if self.scp_latency is not None:
+                    self.scp_latency.request(datagram)
+                if self.scp_window is not None:
+                    self.scp_window.request(datagram, self._forward_udp)
+                else:
+                    self._forward_udp(datagram)
+            self._flush_protocol()
+
+    def _forward_udp(self, datagram):
+        """ Send a datagram from the TCP connection over UDP, when the UDP gap\
+            allows.
+        """
+        if self._pacer is None:
+            self._send_udp(datagram)
+            return
+        self._pacer.call(
+            partial(self._send_udp, bytes(datagram)), len(datagram))
+        if self._pacer.is_full and self.tcp_sock is not None:
+            self._loop.set_reader(self.tcp_sock, None)
+
+    def _send_udp(self, datagram):
+        if self.udp_sock is None:
+            return
+        try:
+            self.udp_sock.send(datagram)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self.tcp_to_udp_packets += 1
+        self.tcp_to_udp_bytes += len(datagram)
+
+    def _on_paced(self):
+        """ Resume reading the TCP connection once the paced datagrams have\
+            all been sent.
+        """
+        if self.tcp_sock is not None:
+            self._loop.set_reader(self.tcp_sock, self.tcp_to_udp)
+
+    def attach(self, loop):
+        super(TCPtoUDP, self).attach(loop)
+        if self.udp_gap > 0:
+            self._pacer = Pacer(loop, self.udp_gap, on_drained=self._on_paced)
 
     def get_select_handlers(self):
         return {
@@ -256,12 +1201,412 @@ class TCPtoUDP(DatagramProxy):
             self.tcp_sock: self.tcp_to_udp
         }
 
+    def get_stats(self):
+        stats = super(TCPtoUDP, self).get_stats()
+        stats["udp_paced_bytes"] = (
+            self._pacer.queued_bytes if self._pacer is not None else 0)
+        return stats
+
     def close(self):
+        if self._pacer is not None:
+            self._pacer.clear()
+        if self.scp_window is not None:
+            self.scp_window.close()
         if self.udp_sock:
-            self.udp_sock.close()
+            self._close_socket(self.udp_sock)
             self.udp_sock = None
         if self.tcp_listen_sock:
-            self.tcp_listen_sock.close()
+            self._close_socket(self.tcp_listen_sock)
+            self.tcp_listen_sock = None
+        if self.tcp_sock:
+            self._close_sock()
+
+
+class _MuxChannel(object):
+    """ One of the UDP "ends" of a multiplexed TCP tunnel.
+    """
+
+    __slots__ = ["channel", "udp_sock", "udp_address", "paused"]
+
+    def __init__(self, channel, udp_sock):
+        #: The channel ID
+        self.channel = channel
+        #: The UDP socket
+        self.udp_sock = udp_sock
+        #: The address most recently received from (if not connected)
+        self.udp_address = None
+        #: Whether reading from the UDP socket is paused
+        self.paused = False
+
+
+class _MuxProxy(_TCPOutputProxy):
+    """ Support for proxies which carry several channels of datagrams, each\
+        with its own UDP socket, over one TCP connection.
+
+    Datagrams are framed with :py:class:`~.MuxDatagramProtocol`, and queued
+    for the TCP connection in a :py:class:`~.FairOutputQueue`, so that a busy
+    channel (e.g., a boot transfer) cannot starve the others (e.g., SCP).
+    The overflow policy is applied to each channel separately.
+    """
+
+    def _init_mux_output(self, high_watermark, low_watermark, overflow):
+        self._init_output(high_watermark, low_watermark, overflow)
+        self.tcp_queue = FairOutputQueue(high_watermark, low_watermark)
+        #: Map from channel ID to channel
+        self.channels = {}
+
+    def _open_channels(self, sockets):
+        try:
+            for channel, make_socket in sockets.items():
+                self.channels[channel] = _MuxChannel(channel, make_socket())
+        except Exception as e:
+            for c in self.channels.values():
+                c.udp_sock.close()
+            raise e
+
+    def udp_to_tcp(self):
+        """ Forward a received UDP datagram over TCP from each channel that\
+            has one waiting.
+
+        The event loop instead calls :py:meth:`channel_to_tcp` for just the
+        channel whose socket is readable.
+        """
+        socks = {c.udp_sock: c for c in self.channels.values() if not c.paused}
+        readable, _, _ = select.select(list(socks), [], [], 0)
+        for sock in readable:
+            self.channel_to_tcp(socks[sock])
+
+    @abstractmethod
+    def channel_to_tcp(self, channel):
+        """ Forward a datagram received on a channel over TCP.
+
+        :param _MuxChannel channel: The channel whose socket is readable.
+        """
+        raise NotImplementedError
+
+    def _send_on_channel(self, datagram, channel):
+        self.udp_to_tcp_packets += 1
+        self.udp_to_tcp_bytes += len(datagram)
+        queue = self.tcp_queue
+        if queue.channel_is_full(channel.channel):
+            if self.overflow != OVERFLOW_BLOCK:
+                queue.drop(len(datagram))
+                return
+            if not self._wait_until_drained():
+                return
+        queue.push(self.tcp_protocol.encode(datagram, channel.channel),
+                   channel.channel)
+        if self._writing:
+            pass
+        elif self._loop is None:
+            if not self._wait_until_drained(0):
+                return
+        else:
+            try:
+                flushed = queue.flush(self.tcp_sock)
+            except ConnectionError:
+                self._connection_lost()
+                return
+            if not flushed:
+                self._writing = True
+                self._loop.set_writer(self.tcp_sock, self._on_tcp_writable)
+        if queue.channel_is_full(channel.channel) and \
+                self.overflow == OVERFLOW_PAUSE and self._loop is not None:
+            channel.paused = self._paused = True
+            self._loop.set_reader(channel.udp_sock, None)
+
+    def _resume_reading(self):
+        if not self._paused:
+            return
+        self._paused = False
+        for channel in self.channels.values():
+            if not channel.paused:
+                continue
+            if self.tcp_queue.channel_is_drained(channel.channel):
+                channel.paused = False
+                self._loop.set_reader(
+                    channel.udp_sock, partial(self.channel_to_tcp, channel))
+            else:
+                self._paused = True
+
+    def _on_tcp_writable(self):
+        try:
+            flushed = self.tcp_queue.flush(self.tcp_sock)
+        except ConnectionError:
+            self._connection_lost()
+            return
+        if flushed:
+            self._writing = False
+            self._loop.set_writer(self.tcp_sock, None)
+        self._resume_reading()
+
+    def _forward_frames(self):
+        """ Forward the datagrams received over TCP to their channels.
+        """
+        for channel_id, datagram in self.tcp_protocol.frames():
+            channel = self.channels.get(channel_id)
+            if channel is None:
+                logging.warning(
+                    "got TCP data for unknown channel {}".format(channel_id))
+            elif self._tcp_to_channel(datagram, channel):
+                self.tcp_to_udp_packets += 1
+                self.tcp_to_udp_bytes += len(datagram)
+
+    @abstractmethod
+    def _tcp_to_channel(self, datagram, channel):
+        """ Forward a datagram received over TCP to its channel's UDP socket.
+
+        :return: Whether the datagram was forwarded.
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def _channel_handlers(self):
+        return {
+            c.udp_sock: partial(self.channel_to_tcp, c)
+            for c in self.channels.values()}
+
+    def _close_channels(self):
+        for channel in self.channels.values():
+            self._close_socket(channel.udp_sock)
+        self.channels.clear()
+
+
+class MuxUDPtoTCP(_MuxProxy):
+    """ Forward UDP datagrams arriving on several ports over one multiplexed\
+        TCP connection.
+
+    This is the multiplexed equivalent of :py:class:`UDPtoTCP`: each channel
+    has a UDP port to listen on, and datagrams received from the TCP
+    connection on a channel are sent to the last address a UDP datagram was
+    received from on that channel's port.
+    """
+
+    def __init__(self, udp_ports, tcp_address,
+                 bufsize=DEFAULT_BUFFER_SIZE,
+                 high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=None,
+                 overflow=OVERFLOW_PAUSE):
+        """
+        :param udp_ports:
+            Map from channel ID to the UDP port to listen on for it.
+        :type udp_ports: dict(int, int or None)
+        :param str tcp_address:
+        :param int bufsize:
+        :param int high_watermark:
+            How many bytes may be queued for each channel before it counts as
+            full.
+        :param low_watermark:
+            How few bytes must be queued for a full channel to count as
+            drained (by default, a quarter of the high watermark).
+        :type low_watermark: int or None
+        :param str overflow:
+            What to do when a channel is full: ``drop``, ``pause`` or
+            ``block``.
+        """
+        self._init_mux_output(high_watermark, low_watermark, overflow)
+        #: The buffer size (usually 4kB)
+        self.bufsize = bufsize
+
+        self._open_channels({
+            channel: partial(udp_socket, bind_port=port)
+            for channel, port in udp_ports.items()})
+
+        # The TCP (client) socket
+        try:
+            self.tcp_sock = tcp_socket(connect_address=tcp_address)
+        except Exception as e:
+            for channel in self.channels.values():
+                channel.udp_sock.close()
+            raise e
+        self.tcp_sock.setblocking(False)
+        self.tcp_connections += 1
+
+        #: How to handle messages in the proxy protocol
+        self.tcp_protocol = MuxDatagramProtocol()
+
+    def channel_to_tcp(self, channel):
+        """ Forward a datagram received on a channel over TCP.
+
+        :param _MuxChannel channel: The channel whose socket is readable.
+        """
+        try:
+            datagram, udp_address = channel.udp_sock.recvfrom(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if udp_address != channel.udp_address:
+            logging.info("new UDP connection from {} on channel {}".format(
+                udp_address, channel.channel))
+            channel.udp_address = udp_address
+        self._send_on_channel(datagram, channel)
+
+    def _tcp_to_channel(self, datagram, channel):
+        # Forward to the last UDP address received from on the channel
+        if channel.udp_address is None:
+            logging.warning("got TCP data before UDP 'connection' made")
+            self.data_before_connection += 1
+            return False
+        try:
+            channel.udp_sock.sendto(datagram, channel.udp_address)
+        except OSError as error:
+            self._udp_error(error)
+            return False
+        return True
+
+    def tcp_to_udp(self):
+        """ Unpack received TCP data and forward any datagrams over UDP.
+        """
+        try:
+            if self.tcp_protocol.recv_into(self.tcp_sock, self.bufsize) == 0:
+                # A zero read means we're done
+                self.close()
+                return
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            self._connection_lost()
+            return
+        self._forward_frames()
+
+    def get_select_handlers(self):
+        handlers = self._channel_handlers()
+        handlers[self.tcp_sock] = self.tcp_to_udp
+        return handlers
+
+    def close(self):
+        self._close_channels()
+        if self.tcp_sock:
+            self._close_socket(self.tcp_sock)
+            self.tcp_sock = None
+
+
+class MuxTCPtoUDP(_MuxProxy):
+    """ Unpack datagrams sent over a multiplexed TCP connection into UDP\
+        datagrams for several addresses.
+
+    This is the multiplexed equivalent of :py:class:`TCPtoUDP`: each channel
+    has a UDP address that datagrams received on it are sent to, and UDP
+    datagrams received back from that address are sent down the TCP
+    connection on the same channel.
+    """
+
+    def __init__(self, tcp_port, udp_addresses,
+                 bufsize=DEFAULT_BUFFER_SIZE,
+                 high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=None,
+                 overflow=OVERFLOW_PAUSE):
+        """
+        :param tcp_port:
+        :type tcp_port: int or None
+        :param udp_addresses:
+            Map from channel ID to the UDP address to forward it to.
+        :type udp_addresses: dict(int, tuple(str, int))
+        :param int bufsize:
+        :param int high_watermark:
+            How many bytes may be queued for each channel before it counts as
+            full.
+        :param low_watermark:
+            How few bytes must be queued for a full channel to count as
+            drained (by default, a quarter of the high watermark).
+        :type low_watermark: int or None
+        :param str overflow:
+            What to do when a channel is full: ``drop``, ``pause`` or
+            ``block``.
+        """
+        self._init_mux_output(high_watermark, low_watermark, overflow)
+        #: The buffer size (usually 4kB)
+        self.bufsize = bufsize
+
+        self._open_channels({
+            channel: partial(udp_socket, connect_address=address)
+            for channel, address in udp_addresses.items()})
+
+        #: The TCP server
+        try:
+            self.tcp_listen_sock = tcp_socket(bind_port=tcp_port)
+        except Exception as e:
+            for channel in self.channels.values():
+                channel.udp_sock.close()
+            raise e
+        self.tcp_listen_sock.listen(1)
+
+        #: The most recently connected socket to the server (or ``None`` if not
+        #: connected)
+        self.tcp_sock = None
+
+        #: How to handle messages in the proxy protocol
+        self.tcp_protocol = None
+
+    def _close_sock(self):
+        if self.tcp_sock is not None:
+            self._close_socket(self.tcp_sock)
+            self.tcp_sock = None
+            self._reset_output()
+
+    def _connection_lost(self):
+        # Wait for the client to connect again
+        self._close_sock()
+
+    def on_connect(self):
+        """ Callback to handle new TCP connections.
+        """
+        self._close_sock()
+        self.tcp_sock, address = self.tcp_listen_sock.accept()
+        self.tcp_sock.setblocking(False)
+        self.tcp_protocol = MuxDatagramProtocol()
+        self._watch(self.tcp_sock, self.tcp_to_udp)
+        self.tcp_connections += 1
+        logging.info("new multiplexed TCP connection from {}".format(address))
+
+    def channel_to_tcp(self, channel):
+        """ Forward a datagram received on a channel over TCP.
+
+        :param _MuxChannel channel: The channel whose socket is readable.
+        """
+        try:
+            datagram = channel.udp_sock.recv(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if self.tcp_sock is None:
+            logging.warning("got UDP data when TCP connection not made")
+            self.data_before_connection += 1
+            return
+        self._send_on_channel(datagram, channel)
+
+    def _tcp_to_channel(self, datagram, channel):
+        try:
+            channel.udp_sock.send(datagram)
+        except OSError as error:
+            self._udp_error(error)
+            return False
+        return True
+
+    def tcp_to_udp(self):
+        """ Unpack received TCP data and forward any datagrams over UDP.
+        """
+        try:
+            received = self.tcp_protocol.recv_into(
+                self.tcp_sock, self.bufsize)
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            received = 0
+        if received == 0:
+            # Socket closed.
+            self._close_sock()
+        else:
+            self._forward_frames()
+
+    def get_select_handlers(self):
+        handlers = self._channel_handlers()
+        handlers[self.tcp_listen_sock] = self.on_connect
+        handlers[self.tcp_sock] = self.tcp_to_udp
+        return handlers
+
+    def close(self):
+        self._close_channels()
+        if self.tcp_listen_sock:
+            self._close_socket(self.tcp_listen_sock)
             self.tcp_listen_sock = None
         if self.tcp_sock:
             self._close_sock()
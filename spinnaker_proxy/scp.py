@@ -0,0 +1,811 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Understanding just enough of the SpiNNaker Command Protocol (SCP) to\
+    watch it go by.
+
+An SCP packet, as sent over UDP, is two bytes of padding, an eight byte SDP
+header (whose first byte is the flags), and then the SCP header: a
+little-endian 16-bit command (or, in responses, return code) and a
+little-endian 16-bit sequence number, followed by the arguments and data.
+Requests which expect a response have the "reply expected" bit set in their
+flags; the response carries the same sequence number.
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict, deque
+import logging
+import struct
+import time
+
+_SCP_HEADER = struct.Struct("<2xB7xHH")
+_SCP_ADDRESS = struct.Struct("<14xII")
+
+#: Where the sequence number is in an SCP packet, as sent over UDP
+_SEQUENCE = slice(12, 14)
+
+#: The SDP flag saying that a response is expected
+FLAG_REPLY_EXPECTED = 0x80
+
+#: The return code of a successful SCP command
+RC_OK = 0x80
+
+#: The names of the (commonly used) SCP commands, by command code
+COMMAND_NAMES = {
+    0: "VER", 1: "RUN", 2: "READ", 3: "WRITE", 4: "APLX", 5: "FILL",
+    16: "REMAP", 17: "LINK_READ", 18: "LINK_WRITE", 19: "AR", 20: "NNP",
+    22: "SIG", 23: "FFD", 24: "AS", 25: "LED", 26: "IPTAG", 27: "SROM",
+    28: "ALLOC", 29: "RTR", 30: "DPRI", 31: "INFO", 48: "BMP_INFO",
+    49: "FLASH_COPY", 50: "FLASH_ERASE", 51: "FLASH_WRITE", 55: "RESET",
+    57: "BMP_POWER", 64: "TUBE",
+}
+
+#: The upper bounds (in seconds) of the buckets of the latency histograms;
+#: there is also a final bucket for anything slower
+LATENCY_BUCKETS = (
+    0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1,
+    0.2, 0.5, 1.0, 2.0, 5.0)
+
+#: The default most requests to remember while awaiting their responses
+DEFAULT_MAX_PENDING = 1024
+
+#: The default time (in seconds) after which a request sent to a board is
+#: given up on, freeing its place in the window
+DEFAULT_WINDOW_TIMEOUT = 0.5
+
+#: The default most requests to queue waiting for a place in the window
+DEFAULT_MAX_QUEUED = 1024
+
+#: The default time (in seconds) for which responses are kept to answer
+#: retried requests with
+DEFAULT_RESPONSE_TTL = 5.0
+
+#: The default time (in seconds) for which a retried request is absorbed
+#: while the original is still awaiting its response
+DEFAULT_IN_FLIGHT_TIMEOUT = 0.5
+
+#: The default most requests and responses to remember for deduplication
+DEFAULT_MAX_REMEMBERED = 1024
+
+#: The default time (in seconds) for which cached responses are used
+DEFAULT_CACHE_TTL = 5.0
+
+#: The default most responses to cache
+DEFAULT_MAX_CACHED = 1024
+
+#: Where a chip's system variables are; reading them is how host software
+#: discovers the machine
+SYSTEM_VARIABLES = (0xf5007f00, 0xf5008000)
+
+
+def command_name(command):
+    """ Get the name of an SCP command.
+
+    :param int command: The command code.
+    :rtype: str
+    """
+    return COMMAND_NAMES.get(command, str(command))
+
+
+def parse_header(datagram):
+    """ Get the interesting parts of the header of an SCP packet.
+
+    :param datagram: The packet, as sent over UDP.
+    :type datagram: bytes or memoryview
+    :return: The SDP flags, the command (or return code) and the sequence
+        number, or ``None`` if the datagram is too short to be SCP.
+    :rtype: tuple(int, int, int) or None
+    """
+    if len(datagram) < _SCP_HEADER.size:
+        return None
+    return _SCP_HEADER.unpack_from(datagram)
+
+
+class LatencyHistogram(object):
+    """ Counts of latencies, in the fixed buckets of\
+        :py:data:`LATENCY_BUCKETS`.
+    """
+
+    __slots__ = ["counts", "total"]
+
+    def __init__(self):
+        #: How many latencies fell in each bucket (the last being for those
+        #: slower than every bound)
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        #: The sum of the latencies, in seconds
+        self.total = 0.0
+
+    def observe(self, latency):
+        """ Count a latency.
+
+        :param float latency: The latency, in seconds.
+        """
+        self.counts[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.total += latency
+
+    def merge(self, other):
+        """ Add another histogram's counts to this one's.
+
+        :param LatencyHistogram other: The histogram to add.
+        """
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+
+    @property
+    def count(self):
+        """ How many latencies have been counted.
+
+        :rtype: int
+        """
+        return sum(self.counts)
+
+    def quantile(self, q):
+        """ Estimate a quantile of the latencies, as the upper bound of the\
+            bucket it falls in.
+
+        :param float q: The quantile, between 0 and 1.
+        :return: The estimate, in seconds; infinity if it is beyond the last
+            bound, or ``None`` if nothing has been counted.
+        :rtype: float or None
+        """
+        count = self.count
+        if not count:
+            return None
+        seen = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, self.counts):
+            seen += bucket
+            if seen >= q * count:
+                return bound
+        return float("inf")
+
+
+class SCPLatencyTracker(object):
+    """ Matches SCP requests to their responses as they pass through a proxy,\
+        and keeps histograms of the time between them for each command.
+
+    Requests are matched by sequence number and by a key saying who sent
+    them (as several hosts may use the same sequence numbers). Only a bounded
+    number of requests are remembered while awaiting responses; the oldest
+    are forgotten to make room.
+    """
+
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING):
+        """
+        :param int max_pending:
+            The most requests to remember while awaiting their responses.
+        """
+        #: The most requests to remember while awaiting their responses
+        self.max_pending = max_pending
+        #: Map from command code to histogram of its latencies
+        self.histograms = {}
+        #: How many requests have been seen
+        self.requests = 0
+        #: How many requests were sent again before their response came
+        self.retransmits = 0
+        #: How many responses have been matched to requests
+        self.responses = 0
+        #: How many responses were not OK
+        self.errors = 0
+        #: How many responses did not match a remembered request
+        self.unmatched = 0
+        #: How many requests were forgotten to make room for others
+        self.abandoned = 0
+        # Map from (key, sequence) to (command, time sent), oldest first
+        self._pending = OrderedDict()
+
+    def request(self, datagram, key=None, now=None):
+        """ Note an SCP request passing through.
+
+        :param datagram: The request.
+        :type datagram: bytes or memoryview
+        :param key: Who sent the request.
+        :param now: When the request was sent (by default, now).
+        :type now: float or None
+        """
+        header = parse_header(datagram)
+        if header is None or not header[0] & FLAG_REPLY_EXPECTED:
+            return
+        self.requests += 1
+        pending_key = (key, header[2])
+        if pending_key in self._pending:
+            # Time from the first attempt, as that is what the sender sees
+            self.retransmits += 1
+            return
+        if len(self._pending) >= self.max_pending:
+            self._pending.popitem(last=False)
+            self.abandoned += 1
+        self._pending[pending_key] = (
+            header[1], time.monotonic() if now is None else now)
+
+    def response(self, datagram, key=None, now=None):
+        """ Note an SCP response passing through.
+
+        :param datagram: The response.
+        :type datagram: bytes or memoryview
+        :param key: Who the response is for.
+        :param now: When the response arrived (by default, now).
+        :type now: float or None
+        """
+        header = parse_header(datagram)
+        if header is None:
+            return
+        sent = self._pending.pop((key, header[2]), None)
+        if sent is None:
+            self.unmatched += 1
+            return
+        command, when = sent
+        self.responses += 1
+        if header[1] != RC_OK:
+            self.errors += 1
+        histogram = self.histograms.get(command)
+        if histogram is None:
+            histogram = self.histograms[command] = LatencyHistogram()
+        histogram.observe((time.monotonic() if now is None else now) - when)
+
+    def get_stats(self):
+        """ Get the current values of the tracker's counters.
+
+        :rtype: dict(str, int)
+        """
+        return {
+            "scp_requests": self.requests,
+            "scp_retransmits": self.retransmits,
+            "scp_responses": self.responses,
+            "scp_errors": self.errors,
+            "scp_unmatched_responses": self.unmatched,
+            "scp_abandoned_requests": self.abandoned,
+            "scp_pending_requests": len(self._pending),
+        }
+
+
+class SCPWindow(object):
+    """ Limits how many SCP requests are outstanding at a board at once.
+
+    Requests (that expect a response) beyond the limit are queued, and sent
+    on in order as responses come back, matched by sequence number and by a
+    key saying who sent them. A request that gets no response within a
+    timeout stops counting as outstanding. A request sent again while it is
+    outstanding (i.e., retried by its sender) is passed on at once; one sent
+    again while it is still queued is dropped, as the queued copy will go.
+    """
+
+    def __init__(self, max_outstanding, timeout=DEFAULT_WINDOW_TIMEOUT,
+                 max_queued=DEFAULT_MAX_QUEUED):
+        """
+        :param int max_outstanding:
+            The most requests to have outstanding at the board at once.
+        :param float timeout:
+            How long (in seconds) to wait for a response before giving up on
+            a request.
+        :param int max_queued:
+            The most requests to queue; any more are dropped (so their
+            senders retry them).
+        """
+        if max_outstanding < 1:
+            raise ValueError("the window must allow at least one request")
+        #: The most requests to have outstanding at the board at once
+        self.max_outstanding = max_outstanding
+        #: How long to wait for a response before giving up on a request
+        self.timeout = timeout
+        #: The most requests to queue
+        self.max_queued = max_queued
+        # Map from (key, sequence) to when to give up on it, oldest first
+        self._outstanding = OrderedDict()
+        # The requests waiting: (key, sequence), the request, how to send it
+        self._queue = deque()
+        self._queued = set()
+        self._loop = None
+        self._timer = None
+
+        #: How many requests were given up on for want of a response
+        self.timeouts = 0
+        #: How many requests were dropped because the queue was full
+        self.dropped = 0
+        #: How many requests were sent again by their sender
+        self.resent = 0
+
+    def attach(self, loop):
+        """ Use an event loop's timers to give up on requests on time.
+
+        :param ~spinnaker_proxy.event_loop.EventLoop loop: The loop.
+        """
+        self._loop = loop
+
+    def request(self, datagram, send, key=None):
+        """ Send an SCP request on when the window allows.
+
+        :param datagram: The request.
+        :type datagram: bytes or memoryview
+        :param ~collections.abc.Callable send:
+            How to send the request to the board (called with the request).
+        :param key: Who sent the request.
+        """
+        header = parse_header(datagram)
+        if header is None or not header[0] & FLAG_REPLY_EXPECTED:
+            send(datagram)
+            return
+        ident = (key, header[2])
+        now = time.monotonic()
+        self._expire(now)
+        if ident in self._outstanding:
+            # Restart its clock, keeping the oldest first
+            self.resent += 1
+            del self._outstanding[ident]
+            self._issue(ident, datagram, send, now)
+        elif ident in self._queued:
+            self.resent += 1
+        elif not self._queue and \
+                len(self._outstanding) < self.max_outstanding:
+            self._issue(ident, datagram, send, now)
+        elif len(self._queue) >= self.max_queued:
+            self.dropped += 1
+        else:
+            self._queue.append((ident, bytes(datagram), send))
+            self._queued.add(ident)
+
+    def response(self, datagram, key=None):
+        """ Note an SCP response coming back from the board, letting the\
+            next request go if there is room.
+
+        :param datagram: The response.
+        :type datagram: bytes or memoryview
+        :param key: Who the response is for.
+        """
+        header = parse_header(datagram)
+        if header is not None and \
+                self._outstanding.pop((key, header[2]), None) is not None:
+            self._release(time.monotonic())
+
+    def _issue(self, ident, datagram, send, now):
+        self._outstanding[ident] = now + self.timeout
+        try:
+            send(datagram)
+        except OSError as e:
+            # Its sender has gone away (e.g., its session has closed)
+            logging.debug("could not send SCP request: {}".format(e))
+            del self._outstanding[ident]
+            return
+        if self._timer is None and self._loop is not None:
+            self._timer = self._loop.call_at(
+                next(iter(self._outstanding.values())), self._on_timer)
+
+    def _release(self, now):
+        while self._queue and len(self._outstanding) < self.max_outstanding:
+            ident, datagram, send = self._queue.popleft()
+            self._queued.discard(ident)
+            self._issue(ident, datagram, send, now)
+
+    def _expire(self, now):
+        outstanding = self._outstanding
+        expired = False
+        while outstanding and next(iter(outstanding.values())) <= now:
+            outstanding.popitem(last=False)
+            self.timeouts += 1
+            expired = True
+        if expired:
+            self._release(now)
+
+    def _on_timer(self):
+        self._timer = None
+        self._expire(time.monotonic())
+        if self._outstanding and self._timer is None:
+            self._timer = self._loop.call_at(
+                next(iter(self._outstanding.values())), self._on_timer)
+
+    def close(self):
+        """ Abandon the queued requests.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._queue.clear()
+        self._queued.clear()
+        self._outstanding.clear()
+
+    def get_stats(self):
+        """ Get the current values of the window's counters.
+
+        :rtype: dict(str, int)
+        """
+        return {
+            "scp_window_outstanding": len(self._outstanding),
+            "scp_window_queued": len(self._queue),
+            "scp_window_timeouts": self.timeouts,
+            "scp_window_dropped": self.dropped,
+            "scp_window_resent": self.resent,
+        }
+
+
+class _Remembered(object):
+    """ A request remembered for deduplication, and its response if known.
+    """
+
+    __slots__ = ["request", "response", "expires"]
+
+    def __init__(self, request, expires):
+        #: The request
+        self.request = request
+        #: The response (or ``None`` while it is awaited)
+        self.response = None
+        #: When to forget the request (or stop waiting for its response)
+        self.expires = expires
+
+
+class SCPDeduplicator(object):
+    """ Stops SCP requests retried by their senders from reaching a board\
+        again.
+
+    Requests are remembered by who sent them, their sequence number and
+    their command. A retry (i.e., an identical request) whose response is
+    known is answered with that response; one whose response is still
+    awaited is absorbed, unless it has been awaited for so long that the
+    original must have been lost. Responses are forgotten after a while, as
+    are the oldest requests when too many are remembered.
+    """
+
+    def __init__(self, ttl=DEFAULT_RESPONSE_TTL,
+                 in_flight_timeout=DEFAULT_IN_FLIGHT_TIMEOUT,
+                 max_remembered=DEFAULT_MAX_REMEMBERED):
+        """
+        :param float ttl:
+            How long (in seconds) to keep responses to answer retries with.
+        :param float in_flight_timeout:
+            How long (in seconds) to absorb retries for while awaiting the
+            response.
+        :param int max_remembered: The most requests to remember.
+        """
+        #: How long to keep responses for
+        self.ttl = ttl
+        #: How long to absorb retries for while awaiting the response
+        self.in_flight_timeout = in_flight_timeout
+        #: The most requests to remember
+        self.max_remembered = max_remembered
+        # Map from (key, sequence, command) to what is remembered, in the
+        # order they will be forgotten
+        self._remembered = OrderedDict()
+        # Map from (key, sequence) to the command of requests in flight
+        self._in_flight = {}
+
+        #: How many retries were answered with a remembered response
+        self.hits = 0
+        #: How many retries were absorbed while awaiting the response
+        self.absorbed = 0
+        #: How many requests were passed on to the board
+        self.misses = 0
+
+    def _forget(self, now):
+        remembered = self._remembered
+        while remembered:
+            ident, entry = next(iter(remembered.items()))
+            if entry.expires > now and len(remembered) <= self.max_remembered:
+                break
+            del remembered[ident]
+            if self._in_flight.get(ident[:2]) == ident[2]:
+                del self._in_flight[ident[:2]]
+
+    def request(self, datagram, reply, key=None):
+        """ Look at an SCP request on its way to the board.
+
+        :param datagram: The request.
+        :type datagram: bytes or memoryview
+        :param ~collections.abc.Callable reply:
+            How to answer the request (called with the response), if it has
+            been answered before.
+        :param key: Who sent the request.
+        :return: Whether to pass the request on to the board.
+        :rtype: bool
+        """
+        header = parse_header(datagram)
+        if header is None or not header[0] & FLAG_REPLY_EXPECTED:
+            return True
+        now = time.monotonic()
+        self._forget(now)
+        ident = (key, header[2], header[1])
+        entry = self._remembered.get(ident)
+        if entry is not None and entry.request == datagram:
+            if entry.response is not None:
+                self.hits += 1
+                reply(entry.response)
+                return False
+            if entry.expires > now:
+                self.absorbed += 1
+                return False
+        self.misses += 1
+        self._remembered.pop(ident, None)
+        self._remembered[ident] = _Remembered(
+            bytes(datagram), now + self.in_flight_timeout)
+        self._in_flight[ident[:2]] = ident[2]
+        self._forget(now)
+        return True
+
+    def response(self, datagram, key=None):
+        """ Remember an SCP response coming back from the board.
+
+        :param datagram: The response.
+        :type datagram: bytes or memoryview
+        :param key: Who the response is for.
+        """
+        header = parse_header(datagram)
+        if header is None:
+            return
+        command = self._in_flight.pop((key, header[2]), None)
+        if command is None:
+            return
+        ident = (key, header[2], command)
+        entry = self._remembered.pop(ident, None)
+        if entry is None:
+            return
+        entry.response = bytes(datagram)
+        entry.expires = time.monotonic() + self.ttl
+        self._remembered[ident] = entry
+
+    def get_stats(self):
+        """ Get the current values of the deduplicator's counters.
+
+        :rtype: dict(str, int)
+        """
+        return {
+            "scp_dedup_hits": self.hits,
+            "scp_dedup_absorbed": self.absorbed,
+            "scp_dedup_misses": self.misses,
+        }
+
+
+class CacheRule(object):
+    """ Says which SCP requests may be answered from a cache, and for how\
+        long.
+    """
+
+    __slots__ = ["command", "start", "end", "ttl"]
+
+    def __init__(self, command, start=None, end=None, ttl=DEFAULT_CACHE_TTL):
+        """
+        :param int command: The command code of the requests.
+        :param start:
+            The lowest address the requests may access (or ``None`` for the
+            requests to be allowed whatever their arguments).
+        :type start: int or None
+        :param end:
+            The address after the highest the requests may access.
+        :type end: int or None
+        :param float ttl: How long (in seconds) to use a cached response.
+        """
+        #: The command code of the requests
+        self.command = command
+        #: The lowest address the requests may access (or ``None`` for any)
+        self.start = start
+        #: The address after the highest the requests may access
+        self.end = end
+        #: How long to use a cached response
+        self.ttl = ttl
+
+    def matches(self, datagram, command):
+        """ Whether the rule allows a request to be answered from a cache.
+
+        The address and length of the data are taken to be the request's
+        first and second arguments, as they are for ``READ``.
+
+        :param datagram: The request.
+        :type datagram: bytes or memoryview
+        :param int command: The request's command code.
+        :rtype: bool
+        """
+        if command != self.command:
+            return False
+        if self.start is None:
+            return True
+        if len(datagram) < _SCP_ADDRESS.size:
+            return False
+        address, length = _SCP_ADDRESS.unpack_from(datagram)
+        return self.start <= address and address + length <= self.end
+
+    def __repr__(self):
+        where = "" if self.start is None else "@{:#x}-{:#x}".format(
+            self.start, self.end)
+        return "{}{}={:g}".format(command_name(self.command), where, self.ttl)
+
+
+def parse_cache_rule(text):
+    """ Parse a description of a :py:class:`CacheRule`.
+
+    The description is ``COMMAND[@START-END][=TTL]``, where the command is
+    a name (e.g., ``READ``) or code, the addresses may be in hexadecimal,
+    and the TTL is in seconds.
+
+    :param str text: The description.
+    :rtype: CacheRule
+    :raises ValueError: If the description cannot be understood.
+    """
+    rule, ttl = text, DEFAULT_CACHE_TTL
+    if "=" in rule:
+        rule, ttl = rule.split("=", 1)
+        ttl = float(ttl)
+        if ttl <= 0:
+            raise ValueError("cache TTL must be positive: {}".format(text))
+    start = end = None
+    if "@" in rule:
+        rule, addresses = rule.split("@", 1)
+        try:
+            start, end = (int(a, 0) for a in addresses.split("-"))
+        except ValueError:
+            raise ValueError("bad address range: {}".format(text))
+        if start >= end:
+            raise ValueError("empty address range: {}".format(text))
+    codes = {name: code for code, name in COMMAND_NAMES.items()}
+    command = codes.get(rule.upper())
+    if command is None:
+        try:
+            command = int(rule, 0)
+        except ValueError:
+            raise ValueError("unknown SCP command: {}".format(rule))
+    return CacheRule(command, start, end, ttl)
+
+
+#: The requests answered from the cache by default: version queries, and
+#: reads of the system variables
+DEFAULT_CACHE_RULES = (
+    CacheRule(0),
+    CacheRule(2, *SYSTEM_VARIABLES),
+)
+
+
+class SCPResponseCache(object):
+    """ Answers idempotent SCP requests with responses to earlier identical\
+        requests.
+
+    Only requests allowed by a :py:class:`CacheRule` are answered from the
+    cache, and only with successful responses. Requests are identical if
+    they differ only in their sequence number; the cached response is given
+    the sequence number of the request it answers. The least recently used
+    responses are forgotten when too many are cached. Booting the board
+    makes every cached response stale, so :py:meth:`invalidate` should be
+    called when boot traffic passes.
+    """
+
+    def __init__(self, rules=DEFAULT_CACHE_RULES,
+                 max_entries=DEFAULT_MAX_CACHED):
+        """
+        :param list(CacheRule) rules:
+            Which requests may be answered from the cache.
+        :param int max_entries: The most responses to cache.
+        """
+        #: Which requests may be answered from the cache
+        self.rules = list(rules)
+        #: The most responses to cache
+        self.max_entries = max_entries
+        # Map from request (less sequence number) to the response and when
+        # it goes stale, least recently used first
+        self._entries = OrderedDict()
+        # Map from (key, sequence) to the request (less sequence number) and
+        # its TTL, for the requests whose responses are awaited
+        self._pending = OrderedDict()
+
+        #: How many requests were answered from the cache
+        self.hits = 0
+        #: How many requests that could have been were not
+        self.misses = 0
+        #: How many times the cache was emptied by boot traffic
+        self.invalidations = 0
+
+    def _ttl(self, datagram, command):
+        for rule in self.rules:
+            if rule.matches(datagram, command):
+                return rule.ttl
+        return None
+
+    def request(self, datagram, reply, key=None):
+        """ Answer an SCP request from the cache, if possible.
+
+        :param datagram: The request.
+        :type datagram: bytes or memoryview
+        :param ~collections.abc.Callable reply:
+            How to answer the request (called with the response).
+        :param key: Who sent the request.
+        :return: Whether to pass the request on to the board.
+        :rtype: bool
+        """
+        header = parse_header(datagram)
+        if header is None or not header[0] & FLAG_REPLY_EXPECTED:
+            return True
+        ttl = self._ttl(datagram, header[1])
+        if ttl is None:
+            return True
+        request = bytes(datagram)
+        ident = request[:_SEQUENCE.start] + request[_SEQUENCE.stop:]
+        entry = self._entries.get(ident)
+        if entry is not None:
+            response, expires = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(ident)
+                self.hits += 1
+                reply(response[:_SEQUENCE.start] + request[_SEQUENCE] +
+                      response[_SEQUENCE.stop:])
+                return False
+            del self._entries[ident]
+        self.misses += 1
+        pending = self._pending
+        pending.pop((key, header[2]), None)
+        if len(pending) >= self.max_entries:
+            pending.popitem(last=False)
+        pending[key, header[2]] = (ident, ttl)
+        return True
+
+    def response(self, datagram, key=None):
+        """ Cache an SCP response coming back from the board, if its\
+            request may be answered from the cache.
+
+        :param datagram: The response.
+        :type datagram: bytes or memoryview
+        :param key: Who the response is for.
+        """
+        header = parse_header(datagram)
+        if header is None:
+            return
+        pending = self._pending.pop((key, header[2]), None)
+        if pending is None or header[1] != RC_OK:
+            return
+        ident, ttl = pending
+        self._entries.pop(ident, None)
+        self._entries[ident] = (bytes(datagram), time.monotonic() + ttl)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """ Forget every cached response, as the board is being booted.
+        """
+        if self._entries or self._pending:
+            self.invalidations += 1
+            self._entries.clear()
+            self._pending.clear()
+
+    def get_stats(self):
+        """ Get the current values of the cache's counters.
+
+        :rtype: dict(str, int)
+        """
+        return {
+            "scp_cache_hits": self.hits,
+            "scp_cache_misses": self.misses,
+            "scp_cache_invalidations": self.invalidations,
+            "scp_cache_entries": len(self._entries),
+        }
+
+
+def summarise_latencies(histograms):
+    """ Describe latency histograms, one line per command.
+
+    :param dict(int,LatencyHistogram) histograms:
+        Map from command code to histogram.
+    :rtype: list(str)
+    """
+    lines = []
+    for command, histogram in sorted(histograms.items()):
+        count = histogram.count
+        if not count:
+            continue
+        lines.append(
+            "{}: {} responses, mean {:.2f}ms, p50 {}, p99 {}".format(
+                command_name(command), count,
+                histogram.total * 1000 / count,
+                _format_bound(histogram.quantile(0.5)),
+                _format_bound(histogram.quantile(0.99))))
+    return lines
+
+
+def _format_bound(bound):
+    if bound == float("inf"):
+        return "> {:g}ms".format(LATENCY_BUCKETS[-1] * 1000)
+    return "<= {:g}ms".format(bound * 1000)
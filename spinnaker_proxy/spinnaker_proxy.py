@@ -19,11 +19,33 @@
 """
 
 import argparse
+from functools import partial
 import logging
-import select
+import socket
 import threading
 
-from .proxies import TCPtoUDP, UDPtoTCP, UDPtoUDP
+from .arq import DEFAULT_QUEUE_BYTES, ARQtoUDP, UDPtoARQ
+from .boot_cache import (
+    DEFAULT_CACHE_BYTES, DEFAULT_CACHE_DIRECTORY, BootCacheTCPtoUDP,
+    BootCacheUDPtoTCP, BootImageCache)
+from .bulk import BulkTCPtoUDP
+from .event_loop import EventLoop
+from .fec import FECtoUDP, UDPtoFEC
+from .metrics import MetricsServer, proxy_latencies, proxy_stats
+from .proxies import (
+    DEFAULT_COALESCE_BYTES, DEFAULT_MAX_SESSIONS, DEFAULT_REPLAY_BYTES,
+    DEFAULT_SESSION_TIMEOUT, MuxTCPtoUDP, MuxUDPtoTCP, TCPtoUDP, UDPtoTCP,
+    UDPtoUDP)
+from .scp import (
+    DEFAULT_CACHE_RULES, SCPDeduplicator, SCPLatencyTracker, SCPResponseCache,
+    SCPWindow, parse_cache_rule, summarise_latencies)
+from .striping import (
+    STRIPE_LEAST_QUEUED, STRIPE_POLICIES, StripedTCPtoUDP, StripedUDPtoTCP)
+from .support import DEFAULT_HIGH_WATERMARK, OVERFLOW_PAUSE, OVERFLOW_POLICIES
+from .topology import (
+    BOOT_CHANNEL, SCP_CHANNEL, Board, TRANSPORT_ARQ, TRANSPORT_TCP,
+    TRANSPORT_UDP, check_ports, read_topology)
+from .workers import Supervisor
 
 
 SCP_PORT = 17893
@@ -42,41 +64,59 @@ BOOT_TUNNEL_PORT = 17895
 """ Port used for tunnelling boot packets.
 """
 
+MUX_TUNNEL_PORT = 17896
+""" Port used for the multiplexed tunnel.
+"""
+
 
-def run_proxies(datagram_proxies, event=None):
+def run_proxies(datagram_proxies, event=None, loop=None):
     """ Run a given set of proxy servers.
 
+    The proxies' sockets are registered with a single persistent event loop,
+    so the cost of forwarding a packet does not depend on how many proxies
+    are being run.
+
     :param ~typing.Iterable(DatagramProxy) datagram_proxies:
         The proxies to run.
     :param event: A way to ask the event processing loop to shut down.
         Set the event and things will stop within a second.
         If not provided, will loop indefinitely.
     :type event: ~threading.Event or None
+    :param loop:
+        The event loop to run the proxies on (which will be closed
+        afterwards). If not provided, a new one will be used.
+    :type loop: EventLoop or None
     """
     if not event:
         event = threading.Event()
         event.clear()
+    if loop is None:
+        loop = EventLoop()
     try:
-        while not event.is_set():
-            # Find out which sockets to select on
-            select_handlers = {}
-            for p in datagram_proxies:
-                select_handlers.update(p.get_select_handlers())
-            fds = list(s for s in select_handlers if s and s.fileno() >= 0)
-
-            # Nothing to do, so stop
-            if not fds:
-                break
-
-            # Wait for data to arrive on any socket
-            readers, _writers, errs = select.select(fds, [], fds, 0.5)
-
-            # Handle the data
-            for sock in set(readers + errs):
-                select_handlers[sock]()
+        for p in datagram_proxies:
+            p.attach(loop)
+
+        # Stops when asked to, or when there is nothing left to do
+        loop.run(event)
     finally:
         for p in datagram_proxies:
             p.close()
+        loop.close()
+
+
+def _topology(filename):
+    try:
+        return read_topology(filename)
+    except (OSError, ValueError) as e:
+        raise argparse.ArgumentTypeError(
+            "bad topology file {}: {}".format(filename, e))
+
+
+def _cache_rule(text):
+    try:
+        return parse_cache_rule(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 def _parse_arguments(args=None):
@@ -84,9 +124,13 @@ def _parse_arguments(args=None):
         description="A 'tunnel' proxy for connecting to remote SpiNNaker "
         "boards.")
 
-    parser.add_argument("target", type=str,
+    parser.add_argument("target", type=str, nargs="?",
                         help="target hostname (i.e. SpiNNaker board or "
                         "another proxy)")
+    parser.add_argument("--config", type=_topology, metavar="FILE",
+                        help="topology file describing the boards to proxy "
+                        "(settings it does not give are taken from the "
+                        "command line)")
 
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("-s", "--server", action="store_true",
@@ -100,6 +144,22 @@ def _parse_arguments(args=None):
 
     parser.add_argument("-T", "--sdp-via-tcp", action="store_true",
                         help="tunnel SDP packets via a TCP connection")
+    parser.add_argument("--boot-via-arq", action="store_true",
+                        help="tunnel boot packets via a reliable UDP tunnel")
+    parser.add_argument("--sdp-via-arq", action="store_true",
+                        help="tunnel SDP packets via a reliable UDP tunnel")
+    parser.add_argument("--arq-queue-bytes", type=int,
+                        default=DEFAULT_QUEUE_BYTES, metavar="BYTES",
+                        help="most bytes of datagrams a reliable UDP tunnel "
+                        "queues while its congestion window is full")
+
+    parser.add_argument("-m", "--multiplex", action="store_true",
+                        help="tunnel SCP, boot and any extra packets via a "
+                        "single multiplexed TCP connection")
+    parser.add_argument("--extra-port", type=int, action="append",
+                        default=[], metavar="PORT",
+                        help="also tunnel this UDP port (multiplexed tunnel "
+                        "only; may be repeated)")
 
     parser.add_argument("--scp-port", type=int, default=SCP_PORT,
                         help="SCP port number used by SpiNNaker boards")
@@ -111,26 +171,376 @@ def _parse_arguments(args=None):
     parser.add_argument("--boot-tunnel-port", type=int,
                         default=BOOT_TUNNEL_PORT,
                         help="Port number for tunnelling boot data")
+    parser.add_argument("--mux-tunnel-port", type=int,
+                        default=MUX_TUNNEL_PORT,
+                        help="Port number for the multiplexed tunnel")
+
+    parser.add_argument("--tcp-high-watermark", type=int,
+                        default=DEFAULT_HIGH_WATERMARK,
+                        help="bytes queued for a TCP tunnel at which it "
+                        "counts as full")
+    parser.add_argument("--tcp-low-watermark", type=int, default=None,
+                        help="bytes queued for a full TCP tunnel at which it "
+                        "counts as drained (default: a quarter of the high "
+                        "watermark)")
+    parser.add_argument("--tcp-overflow", choices=OVERFLOW_POLICIES,
+                        default=OVERFLOW_PAUSE,
+                        help="what to do with UDP datagrams when a TCP tunnel "
+                        "is full")
+    parser.add_argument("--tcp-reconnect", action="store_true",
+                        help="have a proxy client reconnect its TCP tunnels "
+                        "when they are lost, holding the datagrams that "
+                        "arrive meanwhile (not when multiplexed)")
+    parser.add_argument("--tcp-replay-bytes", type=int,
+                        default=DEFAULT_REPLAY_BYTES, metavar="BYTES",
+                        help="most bytes of datagrams to hold while "
+                        "reconnecting")
+    parser.add_argument("--compress", action="store_true",
+                        help="compress TCP tunnels with zlib while it pays "
+                        "(give to both server and client; not when "
+                        "multiplexed)")
+    parser.add_argument("--tcp-coalesce-us", type=float, default=None,
+                        metavar="US",
+                        help="hold back datagrams going down a TCP tunnel "
+                        "for up to this many microseconds, to write several "
+                        "at once (0: until the end of each pass of the "
+                        "event loop; default: write each as it arrives; not "
+                        "when multiplexed or striped)")
+    parser.add_argument("--tcp-coalesce-bytes", type=int,
+                        default=DEFAULT_COALESCE_BYTES, metavar="BYTES",
+                        help="bytes of datagrams held back at which they are "
+                        "written without waiting")
+    parser.add_argument("--tcp-stripes", type=int, default=1, metavar="N",
+                        help="have a proxy client spread each TCP tunnel "
+                        "over N connections (give to both server and "
+                        "client; not when multiplexed, compressed or "
+                        "reconnecting, nor with --boot-cache)")
+    parser.add_argument("--tcp-stripe-policy", choices=STRIPE_POLICIES,
+                        default=STRIPE_LEAST_QUEUED,
+                        help="how to choose the connection of a striped TCP "
+                        "tunnel to send each datagram on")
+
+    parser.add_argument("--udp-batch-size", type=int, default=1,
+                        help="most UDP datagrams to forward per wakeup of "
+                        "a UDP to UDP proxy (1 disables batching)")
+    parser.add_argument("--fec", action="store_true",
+                        help="send parity packets through UDP tunnels, so "
+                        "lost datagrams can be rebuilt without being sent "
+                        "again (give to both server and client; not with "
+                        "--udp-batch-size)")
+    parser.add_argument("--udp-max-sessions", type=int,
+                        default=DEFAULT_MAX_SESSIONS,
+                        help="most hosts a UDP to UDP proxy serves at once")
+    parser.add_argument("--udp-session-timeout", type=float,
+                        default=DEFAULT_SESSION_TIMEOUT,
+                        help="seconds after which a host's idle UDP session "
+                        "is closed")
+
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes to forward with "
+                        "(UDP tunnels are shared by all of them; each "
+                        "board's TCP tunnels are served by one of them)")
+
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        metavar="PORT",
+                        help="serve the proxies' counters to Prometheus on "
+                        "this local port")
+
+    parser.add_argument("--trace-scp", action="store_true",
+                        help="time SCP requests against their responses "
+                        "(not when multiplexed), and report the latencies "
+                        "in the metrics and on shutdown")
+
+    parser.add_argument("--scp-window", type=int, default=None, metavar="N",
+                        help="most SCP requests a proxy server lets be "
+                        "outstanding at a board at once, queueing the rest "
+                        "(default: no limit)")
+    parser.add_argument("--scp-dedup", action="store_true",
+                        help="have a proxy server answer SCP requests "
+                        "retried by host software from the responses it has "
+                        "already seen, instead of sending them to the board "
+                        "again")
+    parser.add_argument("--scp-cache", action="store_true",
+                        help="have a proxy client answer idempotent SCP "
+                        "requests (by default, version queries and reads "
+                        "of the system variables) from the responses to "
+                        "earlier ones, until the board is booted (not when "
+                        "multiplexed)")
+    parser.add_argument("--scp-cache-rule", action="append", default=[],
+                        type=_cache_rule, metavar="RULE",
+                        help="a request the proxy client may answer from its "
+                        "cache, as COMMAND[@START-END][=TTL], e.g. "
+                        "READ@0xf5007f00-0xf5008000=5 (may be repeated; "
+                        "replaces the defaults)")
+    parser.add_argument("--bulk-port", type=int, default=None,
+                        metavar="PORT",
+                        help="have a proxy server do bulk reads and writes "
+                        "of the board's memory for BulkClients connecting "
+                        "to this TCP port")
+    parser.add_argument("--boot-gap", type=float, default=0.0, metavar="MS",
+                        help="milliseconds between the boot packets "
+                        "a proxy server sends to a board from a TCP boot "
+                        "tunnel (default: send them as they arrive)")
+    parser.add_argument("--boot-cache", action="store_true",
+                        help="boot boards from a cache of boot images kept "
+                        "by the proxy server, so each image only crosses "
+                        "the network once (TCP boot tunnels only; give to "
+                        "both server and client)")
+    parser.add_argument("--boot-cache-dir", default=DEFAULT_CACHE_DIRECTORY,
+                        metavar="DIR",
+                        help="where the proxy server keeps boot images")
+    parser.add_argument("--boot-cache-size", type=int,
+                        default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        metavar="MB",
+                        help="most megabytes of boot images to keep")
 
     parser.add_argument("-q", "--quiet", action="store_true",
                         help="don't print the connection log")
 
-    return parser.parse_args(args=args)
-
-
-def _construct_proxies(args):
-    if args.server:
-        sdp_proxy = TCPtoUDP if args.sdp_via_tcp else UDPtoUDP
-        yield sdp_proxy(args.scp_tunnel_port, (args.target, args.scp_port))
-
-        boot_proxy = TCPtoUDP if args.boot_via_tcp else UDPtoUDP
-        yield boot_proxy(args.boot_tunnel_port, (args.target, args.boot_port))
-    elif args.client:
-        sdp_proxy = UDPtoTCP if args.sdp_via_tcp else UDPtoUDP
-        yield sdp_proxy(args.scp_port, (args.target, args.scp_tunnel_port))
-
-        boot_proxy = UDPtoTCP if args.boot_via_tcp else UDPtoUDP
-        yield boot_proxy(args.boot_port, (args.target, args.boot_tunnel_port))
+    args = parser.parse_args(args=args)
+    if args.target is None and args.config is None:
+        parser.error("the following arguments are required: target")
+    if args.config is not None:
+        try:
+            defaults = _board_defaults(args)
+            check_ports([board.resolve(defaults) for board in args.config],
+                        args.server)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("--workers needs SO_REUSEPORT, which this system lacks")
+    if args.scp_window is not None and args.scp_window < 1:
+        parser.error("--scp-window must be at least 1")
+    if args.scp_cache_rule and not args.scp_cache:
+        parser.error("--scp-cache-rule requires --scp-cache")
+    if args.scp_cache and args.workers > 1:
+        parser.error("--scp-cache cannot be shared by several workers")
+    if args.bulk_port is not None and not args.server:
+        parser.error("--bulk-port is only for proxy servers")
+    if args.bulk_port is not None and args.config is not None:
+        parser.error("--bulk-port cannot be used with --config")
+    if args.boot_gap < 0:
+        parser.error("--boot-gap must not be negative")
+    if args.boot_cache and not args.boot_via_tcp and args.config is None:
+        parser.error("--boot-cache requires --boot-via-tcp")
+    if args.tcp_reconnect and not args.client:
+        parser.error("--tcp-reconnect is only for proxy clients")
+    if args.tcp_replay_bytes < 0:
+        parser.error("--tcp-replay-bytes must not be negative")
+    if args.boot_via_arq and args.boot_via_tcp:
+        parser.error("--boot-via-arq cannot be used with --boot-via-tcp")
+    if args.sdp_via_arq and args.sdp_via_tcp:
+        parser.error("--sdp-via-arq cannot be used with --sdp-via-tcp")
+    if args.arq_queue_bytes < 0:
+        parser.error("--arq-queue-bytes must not be negative")
+    if args.compress and args.multiplex:
+        parser.error("--compress cannot be used with --multiplex")
+    if args.tcp_coalesce_us is not None and args.tcp_coalesce_us < 0:
+        parser.error("--tcp-coalesce-us must not be negative")
+    if args.tcp_coalesce_bytes < 1:
+        parser.error("--tcp-coalesce-bytes must be at least 1")
+    if args.tcp_coalesce_us is not None and args.multiplex:
+        parser.error("--tcp-coalesce-us cannot be used with --multiplex")
+    if args.tcp_stripes < 1:
+        parser.error("--tcp-stripes must be at least 1")
+    if args.tcp_stripes > 1:
+        for option, given in (("--multiplex", args.multiplex),
+                              ("--compress", args.compress),
+                              ("--tcp-reconnect", args.tcp_reconnect),
+                              ("--boot-cache", args.boot_cache),
+                              ("--tcp-coalesce-us",
+                               args.tcp_coalesce_us is not None)):
+            if given:
+                parser.error(
+                    "--tcp-stripes cannot be used with {}".format(option))
+    if args.fec and args.udp_batch_size > 1:
+        parser.error("--fec cannot be used with --udp-batch-size")
+    if args.extra_port and not args.multiplex:
+        parser.error("--extra-port requires --multiplex")
+    if any(port <= BOOT_CHANNEL for port in args.extra_port):
+        parser.error("--extra-port must be greater than {}".format(
+            BOOT_CHANNEL))
+    return args
+
+
+def _transport(via_tcp, via_arq):
+    if via_tcp:
+        return TRANSPORT_TCP
+    if via_arq:
+        return TRANSPORT_ARQ
+    return TRANSPORT_UDP
+
+
+def _board_defaults(args):
+    """ The settings for boards that come from the command line.
+    """
+    return {
+        "name": args.target,
+        "target": args.target,
+        "scp": _transport(args.sdp_via_tcp, args.sdp_via_arq),
+        "boot": _transport(args.boot_via_tcp, args.boot_via_arq),
+        "multiplex": args.multiplex,
+        "extra_ports": args.extra_port,
+        "scp_port": args.scp_port,
+        "boot_port": args.boot_port,
+        "scp_tunnel_port": args.scp_tunnel_port,
+        "boot_tunnel_port": args.boot_tunnel_port,
+        "mux_tunnel_port": args.mux_tunnel_port,
+    }
+
+
+def _construct_proxies(args, worker=0, workers=1):
+    """ Make the proxies to run.
+
+    :param args: The parsed command line arguments.
+    :param int worker: Which worker process the proxies are for.
+    :param int workers:
+        How many worker processes there are. The UDP to UDP proxies are made
+        for every worker, sharing their ports; the other proxies for a board
+        are only made for one of the workers.
+    """
+    defaults = _board_defaults(args)
+    boards = [board.resolve(defaults) for board in args.config or [Board()]]
+
+    tcp_options = dict(
+        high_watermark=args.tcp_high_watermark,
+        low_watermark=args.tcp_low_watermark,
+        overflow=args.tcp_overflow)
+    udp_options = dict(
+        max_sessions=args.udp_max_sessions,
+        session_timeout=args.udp_session_timeout,
+        reuse_port=workers > 1)
+    udp_proxy = UDPtoUDP
+    if args.fec:
+        udp_proxy = UDPtoFEC if args.client else FECtoUDP
+    else:
+        udp_options["batch_size"] = args.udp_batch_size
+
+    def proxy(transport, tcp_proxy, port, address, ordered=False):
+        if transport == TRANSPORT_TCP and args.tcp_stripes > 1:
+            return tcp_proxy(port, address, ordered=ordered, **tcp_options)
+        if transport == TRANSPORT_TCP:
+            return tcp_proxy(
+                port, address, compress=args.compress, **tcp_options)
+        if transport == TRANSPORT_ARQ:
+            arq_proxy = ARQtoUDP if args.server else UDPtoARQ
+            return arq_proxy(port, address, ordered=ordered,
+                             queue_bytes=args.arq_queue_bytes)
+        return udp_proxy(port, address, **udp_options)
+
+    server_scp_proxy, client_scp_proxy = TCPtoUDP, UDPtoTCP
+    server_boot_proxy, client_boot_proxy = TCPtoUDP, UDPtoTCP
+    if args.tcp_stripes > 1:
+        server_scp_proxy = server_boot_proxy = partial(
+            StripedTCPtoUDP, policy=args.tcp_stripe_policy)
+        client_scp_proxy = client_boot_proxy = partial(
+            StripedUDPtoTCP, stripes=args.tcp_stripes,
+            policy=args.tcp_stripe_policy)
+    if args.boot_cache:
+        client_boot_proxy = BootCacheUDPtoTCP
+        if args.server:
+            cache = BootImageCache(
+                args.boot_cache_dir, args.boot_cache_size * 1024 * 1024)
+            server_boot_proxy = partial(BootCacheTCPtoUDP, cache=cache)
+    if args.boot_gap:
+        server_boot_proxy = partial(
+            server_boot_proxy, udp_gap=args.boot_gap / 1000)
+    if args.tcp_coalesce_us is not None:
+        coalesce = dict(coalesce_delay=args.tcp_coalesce_us / 1e6,
+                        coalesce_bytes=args.tcp_coalesce_bytes)
+        server_scp_proxy = partial(server_scp_proxy, **coalesce)
+        client_scp_proxy = partial(client_scp_proxy, **coalesce)
+        server_boot_proxy = partial(server_boot_proxy, **coalesce)
+        client_boot_proxy = partial(client_boot_proxy, **coalesce)
+    if args.tcp_reconnect:
+        client_scp_proxy = partial(
+            client_scp_proxy, reconnect=True,
+            replay_bytes=args.tcp_replay_bytes)
+        client_boot_proxy = partial(
+            client_boot_proxy, reconnect=True,
+            replay_bytes=args.tcp_replay_bytes)
+
+    def named(proxy, board, what, scp_cache=None):
+        proxy.name = "{}/{}".format(board.name, what)
+        if scp_cache is not None:
+            # Booting the board makes its cached responses stale
+            if what == "scp":
+                proxy.scp_cache = scp_cache
+            elif what == "boot":
+                proxy.on_boot = scp_cache.invalidate
+        if what == "scp" and args.trace_scp:
+            proxy.scp_latency = SCPLatencyTracker()
+        if what == "scp" and args.server and args.scp_window:
+            proxy.scp_window = SCPWindow(args.scp_window)
+        if what == "scp" and args.server and args.scp_dedup:
+            proxy.scp_dedup = SCPDeduplicator()
+        return proxy
+
+    for index, board in enumerate(boards):
+        # Only one worker serves each board's TCP tunnels
+        mine = index % workers == worker
+        if board.multiplex:
+            if not mine:
+                continue
+            ports = {SCP_CHANNEL: board.scp_port,
+                     BOOT_CHANNEL: board.boot_port}
+            ports.update((port, port) for port in board.extra_ports)
+            if args.server:
+                yield named(MuxTCPtoUDP(board.mux_tunnel_port, {
+                    channel: (board.target, port)
+                    for channel, port in ports.items()}, **tcp_options),
+                    board, "mux")
+            elif args.client:
+                yield named(MuxUDPtoTCP(
+                    ports, (board.target, board.mux_tunnel_port),
+                    **tcp_options), board, "mux")
+        elif args.server:
+            if mine or board.scp == TRANSPORT_UDP:
+                yield named(proxy(board.scp, server_scp_proxy,
+                                  board.scp_tunnel_port,
+                                  (board.target, board.scp_port)),
+                            board, "scp")
+            if mine or board.boot == TRANSPORT_UDP:
+                yield named(proxy(board.boot, server_boot_proxy,
+                                  board.boot_tunnel_port,
+                                  (board.target, board.boot_port),
+                                  ordered=True),
+                            board, "boot")
+        elif args.client:
+            scp_cache = None
+            if args.scp_cache:
+                scp_cache = SCPResponseCache(
+                    args.scp_cache_rule or DEFAULT_CACHE_RULES)
+            if mine or board.scp == TRANSPORT_UDP:
+                yield named(proxy(board.scp, client_scp_proxy, board.scp_port,
+                                  (board.target, board.scp_tunnel_port)),
+                            board, "scp", scp_cache)
+            if mine or board.boot == TRANSPORT_UDP:
+                yield named(proxy(board.boot, client_boot_proxy,
+                                  board.boot_port,
+                                  (board.target, board.boot_tunnel_port),
+                                  ordered=True),
+                            board, "boot", scp_cache)
+        if args.server and mine and args.bulk_port is not None:
+            yield named(BulkTCPtoUDP(
+                args.bulk_port, (board.target, board.scp_port),
+                **tcp_options), board, "bulk")
+
+
+def _metrics_server(args, get_stats, get_process_stats=None,
+                    get_latencies=None):
+    """ Make the server for metrics, if asked to.
+
+    :rtype: MetricsServer or None
+    """
+    if args.metrics_port is None:
+        return None
+    server = MetricsServer(
+        args.metrics_port, get_stats, get_process_stats, get_latencies)
+    logging.info("serving metrics on port {}".format(server.port))
+    return server
 
 
 def _main_program():
@@ -141,9 +551,42 @@ def _main_program():
     if not args.quiet:
         logging.basicConfig(level=logging.INFO)
 
-    datagram_proxies = list(_construct_proxies(args))
+    if args.workers > 1:
+        supervisor = Supervisor(
+            partial(_construct_proxies, args, workers=args.workers),
+            args.workers)
+        get_latencies = supervisor.get_proxy_latencies
+        metrics = _metrics_server(
+            args, supervisor.get_proxy_stats, supervisor.get_process_stats,
+            get_latencies)
+        if metrics is not None:
+            # Polled by the supervisor, so no thread is running when it forks
+            supervisor.watch(metrics, metrics.handle_request)
+        run = supervisor.run
+    else:
+        proxies = list(_construct_proxies(args))
+        get_latencies = partial(proxy_latencies, proxies)
+        metrics = _metrics_server(
+            args, partial(proxy_stats, proxies), None, get_latencies)
+        if metrics is not None:
+            metrics.start()
+        run = partial(run_proxies, proxies)
+    try:
+        run()
+    finally:
+        if metrics is not None:
+            metrics.close()
+        if args.trace_scp:
+            _log_latencies(get_latencies())
 
-    run_proxies(datagram_proxies)
+
+def _log_latencies(latencies):
+    """ Log a summary of SCP latencies, such as on shutdown.
+    """
+    for name, histograms in sorted(latencies.items()):
+        logging.info("SCP latency through {}:".format(name))
+        for line in summarise_latencies(histograms) or ["no responses"]:
+            logging.info("    " + line)
 
 
 if __name__ == "__main__":
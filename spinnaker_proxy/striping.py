@@ -0,0 +1,791 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" TCP tunnels striped across several connections, so that one\
+    connection's congestion window does not cap the throughput, and a loss\
+    on one connection does not stall the datagrams on the others.
+
+The proxy client opens a pool of connections to the proxy server, and
+spreads the datagrams it sends across them, either taking turns
+(``round-robin``) or choosing the connection with the least waiting to be
+sent (``least-queued``). The server sends its datagrams back the same way,
+over all of the connections the client has opened.
+
+Each datagram is tagged with a sequence number (counting from zero in each
+direction), so that a tunnel that must keep its datagrams in order (e.g.,
+for booting) can put them back in order at the receiver; other tunnels pass
+datagrams on as soon as they arrive.
+
+The first datagram on each connection introduces it: it has the sequence
+number :py:data:`HELLO`, and gives the client's randomly chosen ID and the
+connection's index and the number of connections in the pool. Connections
+with the same ID belong together; a connection with a new ID means a new
+client, and the server closes the connections of the old one. If any
+connection of a pool is lost, the whole pool is closed, as datagrams may
+have been lost with it.
+"""
+
+from abc import abstractmethod
+from functools import partial
+import logging
+import random
+import selectors
+import struct
+
+from .proxies import DEFAULT_BUFFER_SIZE
+from .support import (
+    DEFAULT_HIGH_WATERMARK, OVERFLOW_BLOCK, OVERFLOW_PAUSE, OVERFLOW_POLICIES,
+    DatagramProxy, OutputQueue, Pacer, TCPDatagramProtocol, tcp_socket,
+    udp_socket)
+
+#: Spread datagrams over the connections by taking turns
+STRIPE_ROUND_ROBIN = "round-robin"
+#: Spread datagrams over the connections by choosing the one with the least
+#: waiting to be sent
+STRIPE_LEAST_QUEUED = "least-queued"
+#: The ways of spreading datagrams over the connections
+STRIPE_POLICIES = (STRIPE_ROUND_ROBIN, STRIPE_LEAST_QUEUED)
+
+#: The default number of connections for a proxy client to open
+DEFAULT_STRIPES = 4
+
+#: The sequence number that marks the datagram introducing a connection
+HELLO = 0xFFFFFFFFFFFFFFFF
+
+_HELLO = struct.Struct("!QHH")
+
+
+class StripedDatagramProtocol(TCPDatagramProtocol):
+    """ A variant of :py:class:`~.TCPDatagramProtocol` that tags each\
+        datagram with a sequence number.
+
+    Each datagram is preceded by a 64-bit sequence number and a 32-bit
+    length (both unsigned and in network order). Where the base protocol
+    deals in datagrams, this deals in (sequence number, datagram) pairs.
+    """
+
+    _HEADER = struct.Struct("!QI")
+
+    def frames(self):
+        """ Generate the complete datagrams in the buffer, with their\
+            sequence numbers.
+
+        Each datagram is a view onto the buffer, not a copy; it is only valid
+        until the next datagram is requested, and must not be kept beyond
+        that.
+
+        :rtype: ~typing.Iterable(tuple(int, memoryview))
+        """
+        unpack_from = self._HEADER.unpack_from
+        size = self._HEADER.size
+        buf, view = self.buf, self._view
+        start, end = self._start, self._end
+        while end - start >= size:
+            seq, length = unpack_from(buf, start)
+            datagram_start = start + size
+            datagram_end = datagram_start + length
+            if datagram_end > end:
+                break
+            start = self._start = datagram_end
+            yield seq, view[datagram_start:datagram_end]
+        if start == end:
+            self._start = self._end = 0
+
+    def recv(self, tcp_data):
+        """ Generate packets in incoming TCP data.
+
+        :param bytes tcp_data:
+            Raw data read from a TCP socket.
+        :return:
+            A series of (sequence number, datagram) pairs (possibly none)
+            received from the connection.
+        :rtype: ~typing.Iterable(tuple(int, bytes))
+        """
+        self.get_buffer(len(tcp_data))[:len(tcp_data)] = tcp_data
+        self._end += len(tcp_data)
+
+        for seq, datagram in self.frames():
+            yield seq, bytes(datagram)
+
+    def encode(self, datagram, seq=0):
+        """ Encode a datagram for transmission down a TCP socket, without
+        copying it.
+
+        :param bytes datagram: The datagram to encode.
+        :param int seq: The datagram's sequence number.
+        :return:
+            The buffers to send (in order) down the TCP socket.
+        :rtype: list(bytes)
+        """
+        return [self._HEADER.pack(seq, len(datagram)), datagram]
+
+    def hello(self, client_id, index, count):
+        """ Encode the datagram that introduces a connection.
+
+        :param int client_id: The ID of the client the connection is from.
+        :param int index: Which of the client's connections it is.
+        :param int count: How many connections the client has.
+        :rtype: list(bytes)
+        """
+        return self.encode(_HELLO.pack(client_id, index, count), HELLO)
+
+
+class _Stripe(object):
+    """ One of the connections of a striped tunnel.
+    """
+
+    __slots__ = ["sock", "protocol", "queue", "writing"]
+
+    def __init__(self, sock, high_watermark, low_watermark):
+        #: The TCP socket
+        self.sock = sock
+        #: How to handle messages on the connection
+        self.protocol = StripedDatagramProtocol()
+        #: Data waiting to be written to the connection
+        self.queue = OutputQueue(high_watermark, low_watermark)
+        #: Whether waiting for the socket to become writable
+        self.writing = False
+
+
+class _StripedProxy(DatagramProxy):
+    """ Support for the two ends of a striped TCP tunnel, which forward\
+        datagrams arriving on a UDP socket, :py:attr:`udp_sock`, over the\
+        connections in :py:attr:`stripes`.
+
+    Each connection has its own bounded output queue; the tunnel is full
+    when the connection chosen for a datagram is, and then the overflow
+    policy applies as it does for :py:class:`~._TCPOutputProxy`.
+    """
+
+    #: The UDP socket
+    udp_sock = None
+
+    COUNTERS = ("udp_to_tcp_packets", "udp_to_tcp_bytes",
+                "tcp_to_udp_packets", "tcp_to_udp_bytes", "tcp_connections",
+                "data_before_connection", "reordered_datagrams", "udp_errors")
+
+    #: How many datagrams have arrived to go down the tunnel (including any
+    #: that were dropped)
+    udp_to_tcp_packets = 0
+    #: How many bytes have arrived to go down the tunnel
+    udp_to_tcp_bytes = 0
+    #: How many datagrams have been forwarded from the tunnel
+    tcp_to_udp_packets = 0
+    #: How many bytes have been forwarded from the tunnel
+    tcp_to_udp_bytes = 0
+    #: How many TCP connections have been made
+    tcp_connections = 0
+    #: How many datagrams were discarded because the other side of the proxy
+    #: was not connected yet
+    data_before_connection = 0
+    #: How many datagrams arrived ahead of their turn and were held back
+    reordered_datagrams = 0
+
+    def _init_stripes(self, bufsize, high_watermark, low_watermark, overflow,
+                      policy, ordered):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("unknown overflow policy: {}".format(overflow))
+        if policy not in STRIPE_POLICIES:
+            raise ValueError("unknown striping policy: {}".format(policy))
+        #: The buffer size (usually 4kB)
+        self.bufsize = bufsize
+        #: The number of bytes queued for a connection at which it is full
+        self.high_watermark = high_watermark
+        #: The number of bytes queued for a full connection at which it
+        #: counts as drained
+        self.low_watermark = low_watermark
+        #: What to do with datagrams when the tunnel is full
+        self.overflow = overflow
+        #: How to spread datagrams over the connections
+        self.policy = policy
+        #: Whether datagrams from the tunnel are passed on in order
+        self.ordered = ordered
+        #: The connections of the tunnel
+        self.stripes = []
+        # Where to start looking for the next connection to send on
+        self._next = 0
+        self._paused = False
+        self._reset_sequences()
+        # What was dropped by connections that have closed
+        self._dropped_datagrams = 0
+        self._dropped_bytes = 0
+
+    def _reset_sequences(self):
+        """ Start numbering datagrams afresh (for a new client).
+        """
+        self._send_seq = 0
+        self._expected = 0
+        # Datagrams that arrived ahead of their turn, by sequence number
+        self._held = {}
+
+    def _new_stripe(self, sock):
+        sock.setblocking(False)
+        self.tcp_connections += 1
+        return _Stripe(sock, self.high_watermark, self.low_watermark)
+
+    def _close_stripe(self, stripe):
+        queue = stripe.queue
+        queue.clear()
+        self._dropped_datagrams += queue.dropped_datagrams
+        self._dropped_bytes += queue.dropped_bytes
+        if stripe.sock is not None:
+            self._close_socket(stripe.sock)
+            stripe.sock = None
+
+    def _choose_stripe(self):
+        """ Choose the connection to send the next datagram on.
+        """
+        stripes = self.stripes
+        count = len(stripes)
+        start = self._next
+        chosen = start % count
+        if self.policy == STRIPE_ROUND_ROBIN:
+            # Skip over those that are full, unless all are
+            for i in range(count):
+                if not stripes[(start + i) % count].queue.is_full:
+                    chosen = (start + i) % count
+                    break
+        else:
+            # Ties go to the connection after the one chosen last
+            least = None
+            for i in range(count):
+                queued = stripes[(start + i) % count].queue.queued_bytes
+                if least is None or queued < least:
+                    least, chosen = queued, (start + i) % count
+        self._next = chosen + 1
+        return stripes[chosen]
+
+    def _send_datagram(self, datagram):
+        """ Send a datagram down the tunnel, tagged with its sequence number.
+        """
+        self.udp_to_tcp_packets += 1
+        self.udp_to_tcp_bytes += len(datagram)
+        stripe = self._choose_stripe()
+        if stripe.queue.is_full:
+            if self.overflow != OVERFLOW_BLOCK:
+                stripe.queue.drop(len(datagram))
+                return
+            self._wait_until_drained()
+            stripe = self._choose_stripe()
+        # Numbered only once sure to be sent, so there are no gaps
+        seq = self._send_seq
+        self._send_seq += 1
+        self._push(stripe, stripe.protocol.encode(datagram, seq))
+
+    def _push(self, stripe, buffers):
+        """ Queue buffers to go down a connection, and send as much of its\
+            queue as can be sent right now.
+        """
+        queue = stripe.queue
+        queue.push(buffers)
+        if stripe.writing:
+            pass
+        elif self._loop is None:
+            with selectors.DefaultSelector() as selector:
+                selector.register(stripe.sock, selectors.EVENT_WRITE)
+                while not queue.flush(stripe.sock):
+                    selector.select()
+        else:
+            try:
+                flushed = queue.flush(stripe.sock)
+            except ConnectionError:
+                self._stripe_lost(stripe)
+                return
+            if not flushed:
+                stripe.writing = True
+                self._loop.set_writer(
+                    stripe.sock, partial(self._on_tcp_writable, stripe))
+        if self.overflow == OVERFLOW_PAUSE and self._is_full():
+            self._pause_reading()
+
+    def _is_full(self):
+        """ Whether every connection is full.
+        """
+        return all(stripe.queue.is_full for stripe in self.stripes)
+
+    def _wait_until_drained(self):
+        """ Block until some connection has drained.
+        """
+        with selectors.DefaultSelector() as selector:
+            for stripe in self.stripes:
+                selector.register(stripe.sock, selectors.EVENT_WRITE, stripe)
+            while not any(s.queue.is_drained for s in self.stripes):
+                for key, _ in selector.select():
+                    key.data.queue.flush(key.data.sock)
+
+    def _on_tcp_writable(self, stripe):
+        try:
+            flushed = stripe.queue.flush(stripe.sock)
+        except ConnectionError:
+            self._stripe_lost(stripe)
+            return
+        if flushed:
+            stripe.writing = False
+            self._loop.set_writer(stripe.sock, None)
+        if self._paused and stripe.queue.is_drained:
+            self._resume_reading()
+
+    def _pause_reading(self):
+        if not self._paused and self._loop is not None:
+            self._paused = True
+            self._loop.set_reader(self.udp_sock, None)
+
+    def _resume_reading(self):
+        if self._paused:
+            self._paused = False
+            if self.udp_sock is not None:
+                self._loop.set_reader(self.udp_sock, self.udp_to_tcp)
+
+    @staticmethod
+    def _read(stripe, bufsize):
+        """ Read what has arrived on a connection.
+
+        :return: Whether the connection is still open.
+        """
+        try:
+            return stripe.protocol.recv_into(stripe.sock, bufsize) != 0
+        except BlockingIOError:
+            return True
+        except ConnectionError:
+            return False
+
+    def _receive(self, seq, datagram):
+        """ Pass on a datagram from the tunnel, in order if need be.
+        """
+        if not self.ordered:
+            self._forward(datagram)
+            return
+        if seq != self._expected:
+            if seq > self._expected:
+                self._held[seq] = bytes(datagram)
+                self.reordered_datagrams += 1
+            return
+        self._forward(datagram)
+        self._expected += 1
+        held = self._held
+        while self._expected in held:
+            self._forward(held.pop(self._expected))
+            self._expected += 1
+
+    @abstractmethod
+    def _forward(self, datagram):
+        """ Forward a datagram from the tunnel over UDP.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def _stripe_lost(self, stripe):
+        """ Handle a connection failing.
+        """
+        raise NotImplementedError
+
+    def get_stats(self):
+        stats = super(_StripedProxy, self).get_stats()
+        queues = [stripe.queue for stripe in self.stripes]
+        stats["tcp_stripes"] = len(queues)
+        stats["tcp_queued_bytes"] = sum(q.queued_bytes for q in queues)
+        stats["tcp_dropped_datagrams"] = self._dropped_datagrams + sum(
+            q.dropped_datagrams for q in queues)
+        stats["tcp_dropped_bytes"] = self._dropped_bytes + sum(
+            q.dropped_bytes for q in queues)
+        stats["tcp_reorder_held"] = len(self._held)
+        return stats
+
+
+class StripedUDPtoTCP(_StripedProxy):
+    """ The proxy client end of a striped TCP tunnel.
+
+    This proxy listens on a UDP port and opens a pool of connections to a
+    :py:class:`StripedTCPtoUDP`. UDP datagrams received are spread over the
+    connections. Datagrams received from them are sent to the last address
+    a UDP datagram was received from. If any of the connections is closed,
+    this proxy closes.
+
+    UDP datagrams are taken to be SCP requests (and those coming back to be
+    their responses) if :py:attr:`scp_latency` or :py:attr:`scp_cache` is
+    set.
+    """
+
+    def __init__(self, udp_port, tcp_address, bufsize=DEFAULT_BUFFER_SIZE,
+                 high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=None,
+                 overflow=OVERFLOW_PAUSE, stripes=DEFAULT_STRIPES,
+                 policy=STRIPE_LEAST_QUEUED, ordered=False):
+        """
+        :param udp_port:
+        :type udp_port: int or None
+        :param tuple(str,int) tcp_address:
+        :param int bufsize:
+        :param int high_watermark:
+            How many bytes may be queued for each connection before it
+            counts as full.
+        :param low_watermark:
+            How few bytes must be queued for a full connection to count as
+            drained (by default, a quarter of the high watermark).
+        :type low_watermark: int or None
+        :param str overflow:
+            What to do when the tunnel is full: ``drop``, ``pause`` or
+            ``block``.
+        :param int stripes: How many connections to open.
+        :param str policy:
+            How to spread datagrams over the connections: ``round-robin``
+            or ``least-queued``.
+        :param bool ordered:
+            Whether to pass on datagrams from the tunnel in the order they
+            were sent.
+        """
+        if stripes < 1:
+            raise ValueError("need at least one connection")
+        if low_watermark is None:
+            low_watermark = high_watermark // 4
+        self._init_stripes(bufsize, high_watermark, low_watermark, overflow,
+                           policy, ordered)
+        #: Where the proxy server is
+        self.tcp_address = tcp_address
+        #: The ID the proxy server knows this client by
+        self.client_id = random.getrandbits(64)
+
+        #: The UDP socket
+        self.udp_sock = udp_socket(bind_port=udp_port)
+        #: The address associated with the UDP socket
+        self.udp_address = None
+
+        try:
+            for index in range(stripes):
+                stripe = self._new_stripe(
+                    tcp_socket(connect_address=tcp_address))
+                self.stripes.append(stripe)
+                # Sent once attached to a loop, or with the first datagram
+                stripe.queue.push(stripe.protocol.hello(
+                    self.client_id, index, stripes))
+        except Exception as e:
+            self.close()
+            raise e
+
+    def attach(self, loop):
+        super(StripedUDPtoTCP, self).attach(loop)
+        for stripe in list(self.stripes):
+            # Introduce the connection to the server
+            if stripe.sock is not None:
+                self._push(stripe, [])
+
+    def udp_to_tcp(self):
+        """ Forward a received UDP datagram down the tunnel.
+        """
+        try:
+            datagram, udp_address = self.udp_sock.recvfrom(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if udp_address != self.udp_address:
+            logging.info("new UDP connection from {}".format(udp_address))
+            self.udp_address = udp_address
+        if self.on_boot is not None:
+            self.on_boot()
+        if self.scp_cache is not None and not self.scp_cache.request(
+                datagram, partial(self._reply, udp_address)):
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.request(datagram)
+        self._send_datagram(datagram)
+
+    def _reply(self, udp_address, datagram):
+        """ Answer the UDP sender directly, with a cached response.
+        """
+        try:
+            self.udp_sock.sendto(datagram, udp_address)
+        except OSError as error:
+            self._udp_error(error)
+
+    def tcp_to_udp(self, stripe):
+        """ Unpack data received on a connection and forward any datagrams\
+            over UDP.
+        """
+        if not self._read(stripe, self.bufsize):
+            self._stripe_lost(stripe)
+            return
+        for seq, datagram in stripe.protocol.frames():
+            self._receive(seq, datagram)
+
+    def _forward(self, datagram):
+        # Forward the datagram to the last UDP address received from
+        if self.udp_address is None:
+            logging.warning("got TCP data before UDP 'connection' made")
+            self.data_before_connection += 1
+            return
+        try:
+            self.udp_sock.sendto(datagram, self.udp_address)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.response(datagram)
+        if self.scp_cache is not None:
+            self.scp_cache.response(datagram)
+        self.tcp_to_udp_packets += 1
+        self.tcp_to_udp_bytes += len(datagram)
+
+    def _stripe_lost(self, stripe):
+        logging.warning("a TCP connection to {} was lost".format(
+            self.tcp_address))
+        self.close()
+
+    def get_select_handlers(self):
+        handlers = {self.udp_sock: self.udp_to_tcp}
+        for stripe in self.stripes:
+            handlers[stripe.sock] = partial(self.tcp_to_udp, stripe)
+        return handlers
+
+    def close(self):
+        if self.udp_sock:
+            self._close_socket(self.udp_sock)
+            self.udp_sock = None
+        for stripe in self.stripes:
+            self._close_stripe(stripe)
+        self.stripes = []
+
+
+class StripedTCPtoUDP(_StripedProxy):
+    """ The proxy server end of a striped TCP tunnel.
+
+    This proxy sets up a TCP server and 'connects' to a specified UDP
+    address. Datagrams arriving over the connections of a
+    :py:class:`StripedUDPtoTCP` are forwarded as UDP datagrams to the
+    specified destination, and UDP datagrams received are spread over those
+    connections. When a new client connects, the connections of the
+    previous one are closed, as they are if any of them is lost.
+
+    Datagrams from the tunnel are taken to be SCP requests (and those coming
+    back over UDP to be their responses) if :py:attr:`scp_latency`,
+    :py:attr:`scp_window` or :py:attr:`scp_dedup` is set. Given a UDP gap,
+    they are sent on at least that far apart, as by :py:class:`~.TCPtoUDP`.
+    """
+
+    def __init__(self, tcp_port, udp_address, bufsize=DEFAULT_BUFFER_SIZE,
+                 high_watermark=DEFAULT_HIGH_WATERMARK, low_watermark=None,
+                 overflow=OVERFLOW_PAUSE, policy=STRIPE_LEAST_QUEUED,
+                 ordered=False, udp_gap=0.0):
+        """
+        :param tcp_port:
+        :type tcp_port: int or None
+        :param tuple(str,int) udp_address:
+        :param int bufsize:
+        :param int high_watermark:
+            How many bytes may be queued for each connection before it
+            counts as full.
+        :param low_watermark:
+            How few bytes must be queued for a full connection to count as
+            drained (by default, a quarter of the high watermark).
+        :type low_watermark: int or None
+        :param str overflow:
+            What to do when the tunnel is full: ``drop``, ``pause`` or
+            ``block``.
+        :param str policy:
+            How to spread datagrams over the connections: ``round-robin``
+            or ``least-queued``.
+        :param bool ordered:
+            Whether to pass on datagrams from the tunnel in the order they
+            were sent.
+        :param float udp_gap:
+            The least time (in seconds) between datagrams sent over UDP, or
+            zero to send them as soon as they arrive.
+        """
+        if low_watermark is None:
+            low_watermark = high_watermark // 4
+        self._init_stripes(bufsize, high_watermark, low_watermark, overflow,
+                           policy, ordered)
+        #: The least time (in seconds) between datagrams sent over UDP
+        self.udp_gap = udp_gap
+        # Spaces out the datagrams sent over UDP (once attached to a loop)
+        self._pacer = None
+        #: The ID of the client whose connections are in :py:attr:`stripes`
+        self.client_id = None
+        # Connections that have not yet said which client they are from
+        self._introducing = []
+
+        #: The TCP server
+        self.tcp_listen_sock = tcp_socket(bind_port=tcp_port)
+        self.tcp_listen_sock.listen(16)
+        #: The UDP socket
+        try:
+            self.udp_sock = udp_socket(connect_address=udp_address)
+        except Exception as e:
+            self.tcp_listen_sock.close()
+            raise e
+
+    def on_connect(self):
+        """ Callback to handle new TCP connections.
+        """
+        sock, address = self.tcp_listen_sock.accept()
+        stripe = self._new_stripe(sock)
+        self._introducing.append(stripe)
+        self._watch(sock, partial(self.tcp_to_udp, stripe))
+        logging.info("new TCP connection from {}".format(address))
+
+    def _join(self, stripe, hello):
+        """ Add a connection that has introduced itself to its client's.
+        """
+        self._introducing.remove(stripe)
+        if len(hello) != _HELLO.size:
+            logging.warning("bad introduction on a TCP connection")
+            self._close_stripe(stripe)
+            return
+        client_id, index, count = _HELLO.unpack(hello)
+        if client_id != self.client_id:
+            if self.client_id is not None:
+                logging.info("new client; closing the old connections")
+            self._end_client()
+            self.client_id = client_id
+        logging.info("TCP connection {} of {} joined".format(
+            index + 1, count))
+        self.stripes.append(stripe)
+
+    def _end_client(self):
+        """ Close all the connections of the current client.
+        """
+        for stripe in self.stripes:
+            self._close_stripe(stripe)
+        self.stripes = []
+        self.client_id = None
+        self._reset_sequences()
+        if self._pacer is not None:
+            self._pacer.clear()
+        self._resume_reading()
+
+    def _stripe_lost(self, stripe):
+        if stripe in self._introducing:
+            self._introducing.remove(stripe)
+            self._close_stripe(stripe)
+            return
+        logging.warning("a TCP connection was lost; closing the others")
+        self._end_client()
+
+    def udp_to_tcp(self):
+        """ Forward a received UDP datagram down the tunnel.
+        """
+        try:
+            datagram = self.udp_sock.recv(self.bufsize)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        if self.scp_window is not None:
+            self.scp_window.response(datagram)
+        if self.scp_dedup is not None:
+            self.scp_dedup.response(datagram)
+        if not self.stripes:
+            logging.warning("got UDP data when TCP connection not made")
+            self.data_before_connection += 1
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.response(datagram)
+        self._send_datagram(datagram)
+
+    def tcp_to_udp(self, stripe):
+        """ Unpack data received on a connection and forward any datagrams\
+            over UDP.
+        """
+        if not self._read(stripe, self.bufsize):
+            self._stripe_lost(stripe)
+            return
+        for seq, datagram in stripe.protocol.frames():
+            if stripe.sock is None:
+                # Closed by a new client taking over
+                return
+            if stripe in self._introducing:
+                if seq == HELLO:
+                    self._join(stripe, datagram)
+                else:
+                    logging.warning("TCP connection did not introduce itself")
+                    self._stripe_lost(stripe)
+                continue
+            self._receive(seq, datagram)
+
+    def _forward(self, datagram):
+        if self.scp_dedup is not None and not self.scp_dedup.request(
+                datagram, self._send_datagram):
+            return
+        if self.scp_latency is not None:
+            self.scp_latency.request(datagram)
+        if self.scp_window is not None:
+            self.scp_window.request(datagram, self._forward_udp)
+        else:
+            self._forward_udp(datagram)
+
+    def _forward_udp(self, datagram):
+        """ Send a datagram from the tunnel over UDP, when the UDP gap\
+            allows.
+        """
+        if self._pacer is None:
+            self._send_udp(datagram)
+            return
+        self._pacer.call(
+            partial(self._send_udp, bytes(datagram)), len(datagram))
+        if self._pacer.is_full:
+            for stripe in self.stripes:
+                self._loop.set_reader(stripe.sock, None)
+
+    def _send_udp(self, datagram):
+        if self.udp_sock is None:
+            return
+        try:
+            self.udp_sock.send(datagram)
+        except OSError as error:
+            self._udp_error(error)
+            return
+        self.tcp_to_udp_packets += 1
+        self.tcp_to_udp_bytes += len(datagram)
+
+    def _on_paced(self):
+        """ Resume reading the connections once the paced datagrams have all\
+            been sent.
+        """
+        for stripe in self.stripes:
+            self._loop.set_reader(
+                stripe.sock, partial(self.tcp_to_udp, stripe))
+
+    def attach(self, loop):
+        super(StripedTCPtoUDP, self).attach(loop)
+        if self.udp_gap > 0:
+            self._pacer = Pacer(loop, self.udp_gap, on_drained=self._on_paced)
+
+    def get_select_handlers(self):
+        handlers = {
+            self.udp_sock: self.udp_to_tcp,
+            self.tcp_listen_sock: self.on_connect,
+        }
+        for stripe in self.stripes + self._introducing:
+            handlers[stripe.sock] = partial(self.tcp_to_udp, stripe)
+        return handlers
+
+    def get_stats(self):
+        stats = super(StripedTCPtoUDP, self).get_stats()
+        stats["udp_paced_bytes"] = (
+            self._pacer.queued_bytes if self._pacer is not None else 0)
+        return stats
+
+    def close(self):
+        if self._pacer is not None:
+            self._pacer.clear()
+        if self.scp_window is not None:
+            self.scp_window.close()
+        for stripe in self._introducing:
+            self._close_stripe(stripe)
+        self._introducing = []
+        self._end_client()
+        if self.udp_sock:
+            self._close_socket(self.udp_sock)
+            self.udp_sock = None
+        if self.tcp_listen_sock:
+            self._close_socket(self.tcp_listen_sock)
+            self.tcp_listen_sock = None
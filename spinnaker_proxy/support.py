@@ -17,14 +17,32 @@
 """
 
 from abc import abstractmethod, ABCMeta as Abstract
+from collections import deque
+from itertools import islice
+import logging
 import socket
 import struct
+import time
 
 #: Whether to skip doing a TCP connect, for testing only
 _SKIP_TCP_CONNECT = False
 
+#: Overflow policy: drop datagrams that arrive when the output queue is full
+OVERFLOW_DROP = "drop"
+#: Overflow policy: stop reading datagrams while the output queue is full
+OVERFLOW_PAUSE = "pause"
+#: Overflow policy: wait (stalling everything else) for the output queue to
+#: drain
+OVERFLOW_BLOCK = "block"
+#: All the overflow policies
+OVERFLOW_POLICIES = (OVERFLOW_DROP, OVERFLOW_PAUSE, OVERFLOW_BLOCK)
 
-def udp_socket(bind_port=None, connect_address=None):
+#: The default number of bytes queued for a TCP connection at which the queue
+#: is considered full
+DEFAULT_HIGH_WATERMARK = 1024 * 1024
+
+
+def udp_socket(bind_port=None, connect_address=None, reuse_port=False):
     """ How to make a UDP socket.
 
     :param int bind_port:
@@ -32,11 +50,17 @@ def udp_socket(bind_port=None, connect_address=None):
     :param tuple(str,int) connect_address:
         If provided, what remote IP address/port to send packets to and
         receive them from.
+    :param bool reuse_port:
+        Whether to let other sockets (e.g., in other processes) bind to the
+        same port, with the kernel sharing the arriving packets out between
+        them by sender (``SO_REUSEPORT``).
     :return: The configured socket.
     :rtype: socket.SocketType
     """
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         if bind_port is not None:
             sock.bind(("", bind_port))
         if connect_address is not None:
@@ -55,11 +79,14 @@ def tcp_socket(bind_port=None, connect_address=None):
     :param tuple(str,int) connect_address:
         If provided, what remote IP address/port to send data to and
         receive it from.
-    :return: The configured socket.
+    :return: The configured socket, with Nagle's algorithm turned off (as it
+        is for the connections a listening socket accepts), so that the
+        proxies decide how writes are batched.
     :rtype: socket.SocketType
     """
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         if bind_port is not None:
             sock.setsockopt(
                 socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -72,19 +99,136 @@ def tcp_socket(bind_port=None, connect_address=None):
     return sock
 
 
+def resolve_address(address):
+    """ Look up the numeric IP address of a host, so that connecting to it
+    (again) does not have to.
+
+    :param tuple(str,int) address: The host's name (or address) and port.
+    :return: The host's IP address and the port.
+    :rtype: tuple(str,int)
+    :raises OSError: If the name cannot be resolved.
+    """
+    host, port = address
+    return socket.gethostbyname(host), port
+
+
+def _consume(buffers, nbytes):
+    """ Drop the first ``nbytes`` bytes from a list of buffers, in place, as
+    after a partial scatter/gather write.
+
+    :param list(bytes or memoryview) buffers: The buffers.
+    :param int nbytes: How many bytes were written.
+    """
+    while nbytes:
+        size = len(buffers[0])
+        if nbytes < size:
+            buffers[0] = memoryview(buffers[0])[nbytes:]
+            return
+        nbytes -= size
+        del buffers[0]
+
+
 class TCPDatagramProtocol(object):
     """ A simple TCP-based protocol for transmitting/receiving datagrams.
 
     The protocol simply sends datagrams down the TCP connection proceeded by
     a 32-bit (network-order) unsigned integer which gives the length of the
     datagram (in bytes) that follows.
+
+    Received data is accumulated in a single growable buffer with a read
+    offset, so that decoding many small datagrams from one read does not
+    repeatedly copy the remainder of the data; the buffer is only compacted
+    when it runs out of space at the end.
     """
 
     _LENGTH = struct.Struct("!I")
 
-    def __init__(self):
-        # Buffer to hold incomplete datagrams received over TCP
-        self.buf = b""
+    #: The initial size of the receive buffer
+    INITIAL_CAPACITY = 16384
+
+    #: How many bytes of datagrams encoding has held back, to be got with
+    #: :py:meth:`flush`; there are never any with this protocol
+    pending_bytes = 0
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        #: Buffer to hold incomplete datagrams received over TCP
+        self.buf = bytearray(capacity)
+        # A long-lived view of the buffer, to slice without copying
+        self._view = memoryview(self.buf)
+        # The data not yet decoded is self.buf[self._start:self._end]
+        self._start = 0
+        self._end = 0
+
+    def _reserve(self, nbytes):
+        """ Ensure that there are at least ``nbytes`` free at the end of the\
+            buffer, compacting or growing it if necessary.
+        """
+        if len(self.buf) - self._end >= nbytes:
+            return
+        pending = self._end - self._start
+        if self._start:
+            self._view[:pending] = self._view[self._start:self._end]
+            self._start, self._end = 0, pending
+        if len(self.buf) - pending < nbytes:
+            self._view.release()
+            self.buf.extend(bytes(max(len(self.buf), nbytes)))
+            self._view = memoryview(self.buf)
+
+    def get_buffer(self, sizehint=-1):
+        """ Get a buffer to read TCP data directly into. Once data has been
+        written into it, call :py:meth:`buffer_updated`.
+
+        :param int sizehint:
+            How much space is wanted; non-positive values mean any amount.
+        :rtype: memoryview
+        """
+        if sizehint > len(self.buf) - self._end or self._end == len(self.buf):
+            self._reserve(max(sizehint, 1))
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes):
+        """ Note that data has been written to the buffer returned by
+        :py:meth:`get_buffer`.
+
+        :param int nbytes: How many bytes were written.
+        """
+        self._end += nbytes
+
+    def recv_into(self, sock, nbytes):
+        """ Read data from a TCP socket directly into the buffer.
+
+        :param socket.SocketType sock: The socket to read from.
+        :param int nbytes: The most data to read.
+        :return: The number of bytes read; zero means the connection closed.
+        :rtype: int
+        """
+        n = sock.recv_into(self.get_buffer(nbytes), nbytes)
+        self._end += n
+        return n
+
+    def frames(self):
+        """ Generate the complete datagrams in the buffer.
+
+        Each datagram is a view onto the buffer, not a copy; it is only valid
+        until the next datagram is requested, and must not be kept beyond
+        that.
+
+        :rtype: ~typing.Iterable(memoryview)
+        """
+        unpack_from = self._LENGTH.unpack_from
+        buf, view = self.buf, self._view
+        start, end = self._start, self._end
+        while end - start >= 4:
+            datagram_start = start + 4
+            datagram_end = datagram_start + unpack_from(buf, start)[0]
+            if datagram_end > end:
+                break
+            # A complete datagram has arrived, yield it
+            start = self._start = datagram_end
+            yield view[datagram_start:datagram_end]
+        if start == end:
+            # Nothing left over; start again at the beginning of the buffer
+            self._start = self._end = 0
 
     def recv(self, tcp_data):
         """ Generate packets in incoming TCP data.
@@ -96,18 +240,11 @@ class TCPDatagramProtocol(object):
         :rtype: ~typing.Iterable(bytes)
         """
         # Accumulate received data
-        self.buf += tcp_data
+        self.get_buffer(len(tcp_data))[:len(tcp_data)] = tcp_data
+        self._end += len(tcp_data)
 
-        while len(self.buf) >= 4:
-            datagram_length = self._LENGTH.unpack(self.buf[:4])[0]
-            if len(self.buf) < 4 + datagram_length:
-                break
-            # A complete datagram has arrived, yield it
-            datagram, self.buf = (
-                self.buf[4:4 + datagram_length],
-                self.buf[4 + datagram_length:]
-            )
-            yield datagram
+        for datagram in self.frames():
+            yield bytes(datagram)
 
     def send(self, datagram):
         """ Encode a datagram for transmission down a TCP socket.
@@ -120,11 +257,446 @@ class TCPDatagramProtocol(object):
         """
         return self._LENGTH.pack(len(datagram)) + datagram
 
+    def encode(self, datagram):
+        """ Encode a datagram for transmission down a TCP socket, without
+        copying it.
+
+        :param bytes datagram:
+            The datagram to encode.
+        :return:
+            The buffers to send (in order) down the TCP socket.
+        :rtype: list(bytes)
+        """
+        return [self._LENGTH.pack(len(datagram)), datagram]
+
+    def flush(self):
+        """ Get whatever encoding has held back, to send down the TCP socket.
+
+        :return: The buffers to send (in order) down the TCP socket.
+        :rtype: list(bytes)
+        """
+        return []
+
+    def sendmsg(self, sock, datagram):
+        """ Send a datagram down a (blocking) TCP socket using scatter/gather
+        I/O, so that the length and the datagram are never concatenated.
+
+        :param socket.SocketType sock: The socket to send via.
+        :param bytes datagram: The datagram to send.
+        """
+        self._sendall(sock, self.encode(datagram))
+
+    @staticmethod
+    def _sendall(sock, buffers):
+        remaining = sum(len(buf) for buf in buffers)
+        while remaining:
+            sent = sock.sendmsg(buffers)
+            remaining -= sent
+            _consume(buffers, sent)
+
+
+class MuxDatagramProtocol(TCPDatagramProtocol):
+    """ A variant of :py:class:`TCPDatagramProtocol` that carries several\
+        channels of datagrams over one TCP connection.
+
+    Each datagram is preceded by a 16-bit channel ID and a 32-bit length
+    (both unsigned and in network order). Where the base protocol deals in
+    datagrams, this deals in (channel ID, datagram) pairs.
+    """
+
+    _HEADER = struct.Struct("!HI")
+
+    def frames(self):
+        """ Generate the complete datagrams in the buffer, with the channels\
+            they were sent on.
+
+        Each datagram is a view onto the buffer, not a copy; it is only valid
+        until the next datagram is requested, and must not be kept beyond
+        that.
+
+        :rtype: ~typing.Iterable(tuple(int, memoryview))
+        """
+        unpack_from = self._HEADER.unpack_from
+        size = self._HEADER.size
+        buf, view = self.buf, self._view
+        start, end = self._start, self._end
+        while end - start >= size:
+            channel, length = unpack_from(buf, start)
+            datagram_start = start + size
+            datagram_end = datagram_start + length
+            if datagram_end > end:
+                break
+            start = self._start = datagram_end
+            yield channel, view[datagram_start:datagram_end]
+        if start == end:
+            self._start = self._end = 0
+
+    def recv(self, tcp_data):
+        """ Generate packets in incoming TCP data.
+
+        :param bytes tcp_data:
+            Raw data read from a TCP socket.
+        :return:
+            A series of (channel ID, datagram) pairs (possibly none) received
+            from the connection.
+        :rtype: ~typing.Iterable(tuple(int, bytes))
+        """
+        self.get_buffer(len(tcp_data))[:len(tcp_data)] = tcp_data
+        self._end += len(tcp_data)
+
+        for channel, datagram in self.frames():
+            yield channel, bytes(datagram)
+
+    def send(self, datagram, channel=0):
+        """ Encode a datagram for transmission down a TCP socket.
+
+        :param bytes datagram: The datagram to encode.
+        :param int channel: The channel to send the datagram on.
+        :rtype: bytes
+        """
+        return self._HEADER.pack(channel, len(datagram)) + datagram
+
+    def encode(self, datagram, channel=0):
+        """ Encode a datagram for transmission down a TCP socket, without
+        copying it.
+
+        :param bytes datagram: The datagram to encode.
+        :param int channel: The channel to send the datagram on.
+        :return:
+            The buffers to send (in order) down the TCP socket.
+        :rtype: list(bytes)
+        """
+        return [self._HEADER.pack(channel, len(datagram)), datagram]
+
+    def sendmsg(self, sock, datagram, channel=0):
+        """ Send a datagram down a (blocking) TCP socket using scatter/gather
+        I/O.
+
+        :param socket.SocketType sock: The socket to send via.
+        :param bytes datagram: The datagram to send.
+        :param int channel: The channel to send the datagram on.
+        """
+        self._sendall(sock, self.encode(datagram, channel))
+
+
+class OutputQueue(object):
+    """ A bounded queue of data waiting to be written to a non-blocking TCP
+    socket.
+
+    Data is added and dropped a whole datagram at a time, and a partial write
+    just leaves the rest of the data at the head of the queue, so the
+    length-prefixed stream is never corrupted.
+    """
+
+    #: The most buffers to pass to a single ``sendmsg`` call
+    MAX_BUFFERS = 64
+
+    def __init__(self, high_watermark=DEFAULT_HIGH_WATERMARK,
+                 low_watermark=None):
+        """
+        :param int high_watermark:
+            The number of bytes queued at which the queue counts as full.
+        :param low_watermark:
+            The number of bytes queued at which a full queue counts as having
+            drained; by default, a quarter of the high watermark.
+        :type low_watermark: int or None
+        """
+        if low_watermark is None:
+            low_watermark = high_watermark // 4
+        if not 0 <= low_watermark <= high_watermark:
+            raise ValueError(
+                "need 0 <= low watermark ({}) <= high watermark ({})".format(
+                    low_watermark, high_watermark))
+        #: The number of bytes queued at which the queue counts as full
+        self.high_watermark = high_watermark
+        #: The number of bytes queued at which the queue counts as drained
+        self.low_watermark = low_watermark
+        self._buffers = deque()
+        #: The number of bytes waiting to be written
+        self.queued_bytes = 0
+        #: The number of datagrams dropped because the queue was full
+        self.dropped_datagrams = 0
+        #: The number of bytes dropped, either because the queue was full or
+        #: because the connection was closed with data still queued
+        self.dropped_bytes = 0
+        #: The number of writes made to the socket
+        self.writes = 0
+
+    @property
+    def is_full(self):
+        """ Whether the queue has reached its high watermark.
+
+        :rtype: bool
+        """
+        return self.queued_bytes >= self.high_watermark
+
+    @property
+    def is_drained(self):
+        """ Whether the queue is at or below its low watermark.
+
+        :rtype: bool
+        """
+        return self.queued_bytes <= self.low_watermark
+
+    def push(self, buffers):
+        """ Add an encoded datagram to the queue.
+
+        :param list(bytes) buffers: The data to send for the datagram.
+        """
+        for buf in buffers:
+            self._buffers.append(buf)
+            self.queued_bytes += len(buf)
+
+    def drop(self, nbytes):
+        """ Record that a datagram was dropped instead of being queued.
+
+        :param int nbytes: The size of the datagram.
+        """
+        self.dropped_datagrams += 1
+        self.dropped_bytes += nbytes
+
+    def flush(self, sock):
+        """ Write as much of the queue to a non-blocking socket as it will
+        accept.
+
+        :param socket.SocketType sock: The socket to write to.
+        :return: Whether the queue is now empty.
+        :rtype: bool
+        """
+        buffers = self._buffers
+        while buffers:
+            batch = list(islice(buffers, self.MAX_BUFFERS))
+            try:
+                sent = sock.sendmsg(batch)
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.writes += 1
+            self.queued_bytes -= sent
+            _consume(buffers, sent)
+            if sent < sum(len(buf) for buf in batch):
+                # The socket's buffer is full
+                return not buffers
+        return True
+
+    def clear(self):
+        """ Discard everything in the queue (e.g., because the connection it
+        was for has closed), counting it as dropped.
+        """
+        self.dropped_bytes += self.queued_bytes
+        self._buffers.clear()
+        self.queued_bytes = 0
+
+
+class FairOutputQueue(OutputQueue):
+    """ An output queue shared by several channels.
+
+    Each channel's datagrams wait in their own queue, and are moved onto the
+    stream one from each channel in turn, a bounded number at a time, so a
+    busy channel cannot hold up the others for long. The watermarks apply to
+    each channel separately.
+    """
+
+    def __init__(self, high_watermark=DEFAULT_HIGH_WATERMARK,
+                 low_watermark=None):
+        super(FairOutputQueue, self).__init__(high_watermark, low_watermark)
+        # Map from channel to the datagrams (lists of buffers) it has waiting
+        self._channels = {}
+        # Map from channel to the number of bytes it has waiting
+        self._channel_bytes = {}
+
+    def channel_is_full(self, channel):
+        """ Whether a channel has reached the high watermark.
+
+        :param int channel: The channel to check.
+        :rtype: bool
+        """
+        return self._channel_bytes.get(channel, 0) >= self.high_watermark
+
+    def channel_is_drained(self, channel):
+        """ Whether a channel is at or below the low watermark.
+
+        :param int channel: The channel to check.
+        :rtype: bool
+        """
+        return self._channel_bytes.get(channel, 0) <= self.low_watermark
+
+    def push(self, buffers, channel=0):
+        """ Add an encoded datagram to a channel's queue.
+
+        :param list(bytes) buffers: The data to send for the datagram.
+        :param int channel: The channel the datagram belongs to.
+        """
+        if channel not in self._channels:
+            self._channels[channel] = deque()
+            self._channel_bytes[channel] = 0
+        nbytes = sum(len(buf) for buf in buffers)
+        self._channels[channel].append((buffers, nbytes))
+        self._channel_bytes[channel] += nbytes
+        self.queued_bytes += nbytes
+
+    def _refill(self):
+        """ Move datagrams onto the stream, one from each channel in turn.
+        """
+        buffers = self._buffers
+        waiting = True
+        while waiting and len(buffers) < self.MAX_BUFFERS:
+            waiting = False
+            for channel, datagrams in self._channels.items():
+                if datagrams:
+                    datagram, nbytes = datagrams.popleft()
+                    buffers.extend(datagram)
+                    self._channel_bytes[channel] -= nbytes
+                    waiting = waiting or bool(datagrams)
+
+    def flush(self, sock):
+        while True:
+            if not self._buffers:
+                self._refill()
+                if not self._buffers:
+                    return True
+            if not super(FairOutputQueue, self).flush(sock):
+                return False
+
+    def clear(self):
+        super(FairOutputQueue, self).clear()
+        for channel in self._channels:
+            self._channels[channel].clear()
+            self._channel_bytes[channel] = 0
+
+
+class Pacer(object):
+    """ Spaces out calls (such as sending datagrams) by a given gap, making\
+        them from an event loop's timers.
+
+    Each call is due a gap after the call before was due, and is made by a
+    timer set for exactly then, so a timer that goes off slightly late does
+    not push back all the calls after it. A call made more than a gap late
+    delays the calls after it, rather than letting them bunch up to catch up.
+    """
+
+    def __init__(self, loop, gap, high_watermark=DEFAULT_HIGH_WATERMARK,
+                 on_drained=None):
+        """
+        :param ~spinnaker_proxy.event_loop.EventLoop loop:
+            The loop whose timers make the calls.
+        :param float gap: The least time between calls, in seconds.
+        :param int high_watermark:
+            The number of bytes waiting at which the pacer counts as full.
+        :param on_drained:
+            What to call when the pacer has been full and has now emptied.
+        :type on_drained: ~collections.abc.Callable or None
+        """
+        self._loop = loop
+        #: The least time between calls, in seconds
+        self.gap = gap
+        #: The number of bytes waiting at which the pacer counts as full
+        self.high_watermark = high_watermark
+        self._on_drained = on_drained
+        # The calls waiting to be made: the callback and the number of bytes
+        # it sends
+        self._calls = deque()
+        # The earliest time the next call may be made
+        self._next_time = float("-inf")
+        self._timer = None
+        self._was_full = False
+        #: The number of bytes waiting to be sent
+        self.queued_bytes = 0
+
+    @property
+    def is_full(self):
+        """ Whether the pacer has reached its high watermark.
+
+        :rtype: bool
+        """
+        return self.queued_bytes >= self.high_watermark
+
+    def call(self, callback, nbytes=0):
+        """ Make a call as soon as the gap after the call before allows.
+
+        :param ~collections.abc.Callable callback:
+            What to call (with no arguments).
+        :param int nbytes: How many bytes the call sends.
+        """
+        self._calls.append((callback, nbytes))
+        self.queued_bytes += nbytes
+        if self.is_full:
+            self._was_full = True
+        if self._timer is None:
+            self._run()
+
+    def _run(self):
+        self._timer = None
+        now = time.monotonic()
+        if now < self._next_time:
+            self._timer = self._loop.call_at(
+                self._next_time, self._run, precise=True)
+            return
+        calls = self._calls
+        callback, nbytes = calls.popleft()
+        self.queued_bytes -= nbytes
+        if now - self._next_time > self.gap:
+            # Too late (or too long since the last call) to keep to time
+            self._next_time = now
+        self._next_time += self.gap
+        callback()
+        if calls:
+            self._timer = self._loop.call_at(
+                self._next_time, self._run, precise=True)
+        elif self._was_full:
+            self._was_full = False
+            if self._on_drained is not None:
+                self._on_drained()
+
+    def clear(self):
+        """ Abandon the calls not yet made.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._calls.clear()
+        self.queued_bytes = 0
+        self._was_full = False
+
 
 class DatagramProxy(object, metaclass=Abstract):
     """ A simple proxy server which transparently forwards datagram-based\
         communications."""
 
+    #: The event loop this proxy is attached to (or ``None`` if not attached)
+    _loop = None
+
+    #: What to call the proxy when exporting its metrics (or ``None`` to
+    #: number it instead)
+    name = None
+
+    #: The names of the proxy's counters, each of which is an integer
+    #: attribute that the proxy increments as it goes
+    COUNTERS = ()
+
+    #: What times the SCP requests that pass through the proxy (or ``None``
+    #: to not look at them); see :py:class:`~.SCPLatencyTracker`
+    scp_latency = None
+
+    #: What limits the SCP requests outstanding at the board behind the
+    #: proxy (or ``None`` for no limit); see :py:class:`~.SCPWindow`
+    scp_window = None
+
+    #: What answers or absorbs SCP requests retried by their senders (or
+    #: ``None`` to pass them all on); see :py:class:`~.SCPDeduplicator`
+    scp_dedup = None
+
+    #: What answers idempotent SCP requests from earlier responses (or
+    #: ``None`` to pass them all on); see :py:class:`~.SCPResponseCache`
+    scp_cache = None
+
+    #: What to call when boot traffic passes through the proxy (or ``None``);
+    #: this is how a board's :py:attr:`scp_cache` is emptied when it boots
+    on_boot = None
+
+    #: How many datagrams were dropped because a UDP socket reported an
+    #: error (such as the target refusing them)
+    udp_errors = 0
+
     @abstractmethod
     def get_select_handlers(self):
         """ List the file descriptors of sockets to select on and their\
@@ -137,6 +709,62 @@ class DatagramProxy(object, metaclass=Abstract):
         """
         raise NotImplementedError
 
+    def get_stats(self):
+        """ Get the current values of the proxy's counters.
+
+        :rtype: dict(str, int)
+        """
+        stats = {key: getattr(self, key) for key in self.COUNTERS}
+        if self.scp_latency is not None:
+            stats.update(self.scp_latency.get_stats())
+        if self.scp_window is not None:
+            stats.update(self.scp_window.get_stats())
+        if self.scp_dedup is not None:
+            stats.update(self.scp_dedup.get_stats())
+        if self.scp_cache is not None:
+            stats.update(self.scp_cache.get_stats())
+        return stats
+
+    def attach(self, loop):
+        """ Register this proxy's sockets with an event loop.
+
+        After this, the proxy is responsible for keeping the loop up to date
+        as sockets are opened (e.g., accepted) and closed.
+
+        :param ~spinnaker_proxy.event_loop.EventLoop loop:
+            The event loop to attach to.
+        """
+        self._loop = loop
+        if self.scp_window is not None:
+            self.scp_window.attach(loop)
+        for sock, handler in self.get_select_handlers().items():
+            if sock is not None:
+                loop.register(sock, handler)
+
+    def _watch(self, sock, handler):
+        """ Start watching a newly opened socket, if attached to a loop.
+        """
+        if self._loop is not None:
+            self._loop.register(sock, handler)
+
+    def _udp_error(self, error):
+        """ Count (and drop) a datagram that a UDP socket could not send or\
+            receive. On a connected socket, an ICMP "port unreachable" from
+            the target turns up as an error of a later send or receive; it
+            must not stop the loop serving every other proxy.
+
+        :param OSError error: What went wrong.
+        """
+        self.udp_errors += 1
+        logging.warning("UDP error, datagram dropped: {}".format(error))
+
+    def _close_socket(self, sock):
+        """ Stop watching a socket, if attached to a loop, and close it.
+        """
+        if self._loop is not None:
+            self._loop.unregister(sock)
+        sock.close()
+
     @abstractmethod
     def close(self):
         """ Close all open connections.
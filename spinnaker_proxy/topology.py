@@ -0,0 +1,236 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Topology files, which describe many boards to be proxied by one process.
+
+A topology file is a JSON object with a list of ``boards`` and, optionally,
+some ``defaults`` that apply to every board. For example::
+
+    {
+        "defaults": {"boot": "tcp"},
+        "boards": [
+            {"name": "b0", "target": "10.11.192.1",
+             "scp_tunnel_port": 20000, "boot_tunnel_port": 20001},
+            {"name": "b1", "target": "10.11.192.9",
+             "multiplex": true, "mux_tunnel_port": 20002}
+        ]
+    }
+
+Each board may have the settings that :py:class:`Board` accepts. Anything
+not set for a board is taken from the command line.
+"""
+
+import json
+
+#: Carry a class of traffic over UDP
+TRANSPORT_UDP = "udp"
+#: Carry a class of traffic over TCP
+TRANSPORT_TCP = "tcp"
+#: Carry a class of traffic over a reliable UDP tunnel
+TRANSPORT_ARQ = "arq"
+#: The ways of carrying a class of traffic
+TRANSPORTS = (TRANSPORT_UDP, TRANSPORT_TCP, TRANSPORT_ARQ)
+
+SCP_CHANNEL = 0
+""" Multiplexed tunnel channel carrying SCP packets. (Extra ports are carried
+on channels numbered the same as the ports.)
+"""
+
+BOOT_CHANNEL = 1
+""" Multiplexed tunnel channel carrying boot packets.
+"""
+
+
+class Board(object):
+    """ The settings for proxying one board. Settings that are ``None`` are\
+        yet to be filled in from defaults; see :py:meth:`resolve`.
+    """
+
+    #: The names of the settings
+    SETTINGS = ("name", "target", "scp", "boot", "multiplex", "extra_ports",
+                "scp_port", "boot_port", "scp_tunnel_port",
+                "boot_tunnel_port", "mux_tunnel_port")
+
+    def __init__(self, name=None, target=None, scp=None, boot=None,
+                 multiplex=None, extra_ports=None, scp_port=None,
+                 boot_port=None, scp_tunnel_port=None, boot_tunnel_port=None,
+                 mux_tunnel_port=None):
+        """
+        :param str name: What to call the board in messages.
+        :param str target:
+            The hostname of the board (for a proxy server) or of the proxy
+            server (for a proxy client).
+        :param str scp: How to tunnel SCP: ``udp``, ``tcp`` or ``arq``.
+        :param str boot:
+            How to tunnel boot packets: ``udp``, ``tcp`` or ``arq``.
+        :param bool multiplex:
+            Whether to tunnel everything over one multiplexed TCP connection
+            (instead of as ``scp`` and ``boot`` say).
+        :param list(int) extra_ports:
+            Other UDP ports to carry over the multiplexed tunnel; each is
+            carried on the channel of the same number, so must be greater
+            than :py:data:`BOOT_CHANNEL`.
+        :param int scp_port: The board's SCP port.
+        :param int boot_port: The board's boot port.
+        :param int scp_tunnel_port: The port to tunnel SCP via.
+        :param int boot_tunnel_port: The port to tunnel boot packets via.
+        :param int mux_tunnel_port: The port for the multiplexed tunnel.
+        :raises ValueError: If a setting is not valid.
+        """
+        for key, value in (("scp", scp), ("boot", boot)):
+            if value is not None and value not in TRANSPORTS:
+                raise ValueError("{} must be one of {}, not {!r}".format(
+                    key, ", ".join(TRANSPORTS), value))
+        if multiplex is not None and not isinstance(multiplex, bool):
+            raise ValueError("multiplex must be true or false")
+        for key, value in (("scp_port", scp_port), ("boot_port", boot_port),
+                           ("scp_tunnel_port", scp_tunnel_port),
+                           ("boot_tunnel_port", boot_tunnel_port),
+                           ("mux_tunnel_port", mux_tunnel_port)):
+            _check_port(key, value)
+        if extra_ports is not None:
+            if not isinstance(extra_ports, list):
+                raise ValueError("extra_ports must be a list")
+            for port in extra_ports:
+                _check_port("extra_ports", port)
+                _check_extra_port(port)
+        self.name = name
+        self.target = target
+        self.scp = scp
+        self.boot = boot
+        self.multiplex = multiplex
+        self.extra_ports = extra_ports
+        self.scp_port = scp_port
+        self.boot_port = boot_port
+        self.scp_tunnel_port = scp_tunnel_port
+        self.boot_tunnel_port = boot_tunnel_port
+        self.mux_tunnel_port = mux_tunnel_port
+
+    def resolve(self, defaults):
+        """ Fill in the settings that are not set.
+
+        :param dict(str,object) defaults: Map from setting name to value.
+        :return: A copy of the board with every setting filled in.
+        :rtype: Board
+        :raises ValueError: If the board has no target.
+        """
+        settings = {}
+        for key in self.SETTINGS:
+            value = getattr(self, key)
+            settings[key] = defaults.get(key) if value is None else value
+        if settings["target"] is None:
+            raise ValueError("board {} has no target".format(
+                settings["name"]))
+        return Board(**settings)
+
+    def listening_ports(self, server):
+        """ List the ports a proxy for the board listens on.
+
+        :param bool server: Whether the proxy is a proxy server.
+        :rtype: list(int)
+        """
+        if server:
+            if self.multiplex:
+                return [self.mux_tunnel_port]
+            return [self.scp_tunnel_port, self.boot_tunnel_port]
+        ports = [self.scp_port, self.boot_port]
+        if self.multiplex:
+            ports.extend(self.extra_ports)
+        return ports
+
+
+def _check_port(key, port):
+    if port is not None and (
+            isinstance(port, bool) or not isinstance(port, int) or
+            not 0 <= port <= 65535):
+        raise ValueError("{} must be a port number, not {!r}".format(
+            key, port))
+
+
+def _check_extra_port(port):
+    if port <= BOOT_CHANNEL:
+        raise ValueError("extra_ports must be greater than {}, not {}".format(
+            BOOT_CHANNEL, port))
+
+
+def parse_topology(data):
+    """ Interpret a decoded topology file.
+
+    :param dict data: The contents of the topology file.
+    :return: The boards, with any defaults from the file applied.
+    :rtype: list(Board)
+    :raises ValueError: If the topology is not valid.
+    """
+    if not isinstance(data, dict) or \
+            not isinstance(data.get("boards"), list):
+        raise ValueError("a topology must be an object with a boards list")
+    unknown = set(data) - {"boards", "defaults"}
+    if unknown:
+        raise ValueError("unknown topology keys: {}".format(
+            ", ".join(sorted(unknown))))
+    defaults = data.get("defaults", {})
+    boards = []
+    names = set()
+    for index, entry in enumerate(data["boards"]):
+        if not isinstance(entry, dict):
+            raise ValueError("board {} is not an object".format(index))
+        settings = dict(defaults)
+        settings.update(entry)
+        settings.setdefault("name", str(index))
+        unknown = set(settings) - set(Board.SETTINGS)
+        if unknown:
+            raise ValueError("unknown settings for board {}: {}".format(
+                settings["name"], ", ".join(sorted(unknown))))
+        if settings["name"] in names:
+            raise ValueError("more than one board is called {}".format(
+                settings["name"]))
+        names.add(settings["name"])
+        try:
+            boards.append(Board(**settings))
+        except ValueError as e:
+            raise ValueError("board {}: {}".format(settings["name"], e))
+    return boards
+
+
+def read_topology(filename):
+    """ Read a topology file.
+
+    :param str filename: The name of the file.
+    :rtype: list(Board)
+    :raises OSError: If the file cannot be read.
+    :raises ValueError: If the file is not a valid topology.
+    """
+    with open(filename, encoding="utf-8") as f:
+        return parse_topology(json.load(f))
+
+
+def check_ports(boards, server):
+    """ Check that no two (resolved) boards would listen on the same port.
+
+    :param list(Board) boards: The boards.
+    :param bool server: Whether the proxies are proxy servers.
+    :raises ValueError: If a port would be used more than once.
+    """
+    owners = {}
+    for board in boards:
+        for port in board.listening_ports(server):
+            if port == 0:
+                # Any free port
+                continue
+            if port in owners:
+                raise ValueError(
+                    "boards {} and {} would both use port {}".format(
+                        owners[port], board.name, port))
+            owners[port] = board.name
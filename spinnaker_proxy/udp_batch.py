@@ -0,0 +1,319 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Batched UDP I/O: receiving and forwarding several datagrams per system\
+    call.
+
+On Linux this uses ``recvmmsg()`` and ``sendmmsg()`` (through
+:py:mod:`ctypes`), receiving into preallocated buffers and sending straight
+from them. Elsewhere, a portable (but slower) equivalent built from ordinary
+socket calls is used.
+"""
+
+import ctypes
+import errno
+import os
+import socket
+import struct
+
+#: Flag to make a receive call not wait for data, where supported
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0)
+
+# Layout of struct sockaddr_in: family (native order), port, IPv4 address
+_SOCKADDR_IN = struct.Struct("=H2s4s8x")
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", _MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        recvmmsg, sendmmsg = libc.recvmmsg, libc.sendmmsg
+    except (OSError, AttributeError):
+        return None, None
+    recvmmsg.argtypes = [
+        ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int,
+        ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    sendmmsg.argtypes = [
+        ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return recvmmsg, sendmmsg
+
+
+_recvmmsg, _sendmmsg = _load_libc()
+
+#: Whether ``recvmmsg()`` and ``sendmmsg()`` are available
+HAVE_MMSG = _recvmmsg is not None and hasattr(socket, "MSG_DONTWAIT")
+
+
+def _raise_errno():
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
+
+
+class MMsgDatagramBatch(object):
+    """ A batch of datagram buffers, received into with ``recvmmsg()`` and\
+        forwarded from with ``sendmmsg()``.
+
+    Only IPv4 (``AF_INET``) sockets are supported, as those are all the
+    proxy uses.
+    """
+
+    def __init__(self, size, bufsize):
+        """
+        :param int size: The most datagrams to handle in one batch.
+        :param int bufsize: The most bytes per datagram.
+        """
+        self.size = size
+        self.bufsize = bufsize
+        self._buf = bytearray(size * bufsize)
+        self._view = memoryview(self._buf)
+        self._names = bytearray(size * _SOCKADDR_IN.size)
+        self._dest = ctypes.create_string_buffer(_SOCKADDR_IN.size)
+        self._dest_address = None
+        self._lengths = [0] * size
+        # How many of the receive headers have had their name length changed
+        self._received = 0
+
+        # Holding these keeps the buffers from moving
+        self._c_buf = (ctypes.c_char * len(self._buf)).from_buffer(self._buf)
+        self._c_names = (ctypes.c_char * len(self._names)).from_buffer(
+            self._names)
+        base = ctypes.addressof(self._c_buf)
+        names = ctypes.addressof(self._c_names)
+
+        # Separate headers for receiving and sending, so that each only needs
+        # the fields the kernel (or the last send) changed resetting
+        self._recv_iovs = (_IOVec * size)()
+        self._recv_msgs = (_MMsgHdr * size)()
+        self._send_iovs = (_IOVec * size)()
+        self._send_msgs = (_MMsgHdr * size)()
+        for i in range(size):
+            self._recv_iovs[i].iov_base = base + i * bufsize
+            self._recv_iovs[i].iov_len = bufsize
+            hdr = self._recv_msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._recv_iovs[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_name = names + i * _SOCKADDR_IN.size
+            hdr.msg_namelen = _SOCKADDR_IN.size
+            self._send_iovs[i].iov_base = base + i * bufsize
+            hdr = self._send_msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._send_iovs[i])
+            hdr.msg_iovlen = 1
+
+    def recv(self, sock):
+        """ Receive as many datagrams as are waiting (up to the batch size)\
+            without blocking.
+
+        :param socket.SocketType sock: The (readable) socket to receive from.
+        :return: The number of datagrams received.
+        :rtype: int
+        """
+        msgs = self._recv_msgs
+        for i in range(self._received):
+            msgs[i].msg_hdr.msg_namelen = _SOCKADDR_IN.size
+        self._received = 0
+        n = _recvmmsg(sock.fileno(), msgs, self.size, _MSG_DONTWAIT, None)
+        if n < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return 0
+            _raise_errno()
+        self._received = n
+        lengths = self._lengths
+        for i in range(n):
+            lengths[i] = msgs[i].msg_len
+        return n
+
+    def datagram(self, i):
+        """ Get a received datagram.
+
+        :param int i: Which datagram in the batch.
+        :return: A view of the datagram, valid until the next receive.
+        :rtype: memoryview
+        """
+        start = i * self.bufsize
+        return self._view[start:start + self._lengths[i]]
+
+    def address(self, i):
+        """ Get the address a received datagram came from.
+
+        :param int i: Which datagram in the batch.
+        :rtype: tuple(str, int)
+        """
+        _family, port, addr = _SOCKADDR_IN.unpack_from(
+            self._names, i * _SOCKADDR_IN.size)
+        return socket.inet_ntoa(addr), int.from_bytes(port, "big")
+
+    def nbytes(self, count, start=0):
+        """ Get the total size of some received datagrams.
+
+        :param int count: How many datagrams to count.
+        :param int start: The first datagram of the batch to count.
+        :rtype: int
+        """
+        return sum(self._lengths[start:start + count])
+
+    def forward(self, sock, count, address=None, start=0):
+        """ Send received datagrams (without copying them) to a socket.
+
+        :param socket.SocketType sock: The socket to send via.
+        :param int count: How many datagrams to send.
+        :param address:
+            Where to send them, if the socket is not connected.
+        :type address: tuple(str, int) or None
+        :param int start: The first datagram of the batch to send.
+        """
+        if address is not None and address != self._dest_address:
+            _SOCKADDR_IN.pack_into(
+                self._dest, 0, socket.AF_INET,
+                address[1].to_bytes(2, "big"),
+                socket.inet_aton(socket.gethostbyname(address[0])))
+            self._dest_address = address
+        dest = ctypes.addressof(self._dest) if address is not None else None
+        namelen = _SOCKADDR_IN.size if dest else 0
+        iovs, msgs, lengths = self._send_iovs, self._send_msgs, self._lengths
+        for i in range(start, start + count):
+            iovs[i].iov_len = lengths[i]
+            hdr = msgs[i].msg_hdr
+            hdr.msg_name = dest
+            hdr.msg_namelen = namelen
+        fd = sock.fileno()
+        sent = 0
+        while sent < count:
+            n = _sendmmsg(
+                fd, ctypes.byref(msgs[start + sent]), count - sent, 0)
+            if n < 0:
+                _raise_errno()
+            sent += n
+
+
+class PortableDatagramBatch(object):
+    """ The same interface as :py:class:`MMsgDatagramBatch`, built from\
+        ordinary socket calls.
+    """
+
+    def __init__(self, size, bufsize):
+        """
+        :param int size: The most datagrams to handle in one batch.
+        :param int bufsize: The most bytes per datagram.
+        """
+        self.size = size
+        self.bufsize = bufsize
+        self._buf = bytearray(size * bufsize)
+        self._view = memoryview(self._buf)
+        self._lengths = [0] * size
+        self._addresses = [None] * size
+
+    def recv(self, sock):
+        """ Receive as many datagrams as are waiting (up to the batch size)\
+            without blocking.
+
+        :param socket.SocketType sock: The (readable) socket to receive from.
+        :return: The number of datagrams received.
+        :rtype: int
+        """
+        for i in range(self.size):
+            start = i * self.bufsize
+            try:
+                self._lengths[i], self._addresses[i] = sock.recvfrom_into(
+                    self._view[start:start + self.bufsize], self.bufsize,
+                    _MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return i
+            if not _MSG_DONTWAIT:
+                # Can't check for more without risking blocking
+                return i + 1
+        return self.size
+
+    def datagram(self, i):
+        """ Get a received datagram.
+
+        :param int i: Which datagram in the batch.
+        :return: A view of the datagram, valid until the next receive.
+        :rtype: memoryview
+        """
+        start = i * self.bufsize
+        return self._view[start:start + self._lengths[i]]
+
+    def address(self, i):
+        """ Get the address a received datagram came from.
+
+        :param int i: Which datagram in the batch.
+        :rtype: tuple(str, int)
+        """
+        return self._addresses[i]
+
+    def nbytes(self, count, start=0):
+        """ Get the total size of some received datagrams.
+
+        :param int count: How many datagrams to count.
+        :param int start: The first datagram of the batch to count.
+        :rtype: int
+        """
+        return sum(self._lengths[start:start + count])
+
+    def forward(self, sock, count, address=None, start=0):
+        """ Send received datagrams to a socket.
+
+        :param socket.SocketType sock: The socket to send via.
+        :param int count: How many datagrams to send.
+        :param address:
+            Where to send them, if the socket is not connected.
+        :type address: tuple(str, int) or None
+        :param int start: The first datagram of the batch to send.
+        """
+        for i in range(start, start + count):
+            if address is None:
+                sock.send(self.datagram(i))
+            else:
+                sock.sendto(self.datagram(i), address)
+
+
+def datagram_batch(size, bufsize):
+    """ Make the best available kind of datagram batch.
+
+    :param int size: The most datagrams to handle in one batch.
+    :param int bufsize: The most bytes per datagram.
+    :rtype: MMsgDatagramBatch or PortableDatagramBatch
+    """
+    if HAVE_MMSG:
+        return MMsgDatagramBatch(size, bufsize)
+    return PortableDatagramBatch(size, bufsize)
@@ -0,0 +1,246 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Running proxies in several worker processes, to use several cores.
+"""
+
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+import threading
+import time
+
+from .event_loop import EventLoop
+from .metrics import (
+    merge_proxy_latencies, merge_proxy_stats, merge_stats, proxy_latencies,
+    proxy_stats)
+
+
+def sum_stats(all_stats):
+    """ Add up sets of counters (see :py:func:`~.metrics.merge_stats`).
+
+    :param ~typing.Iterable(dict(str,int)) all_stats: The counters to add.
+    :rtype: dict(str, int)
+    """
+    totals = {}
+    for stats in all_stats:
+        merge_stats(totals, stats)
+    return totals
+
+
+def _worker_main(make_proxies, index, conn, stats_interval):
+    """ The body of a worker process.
+    """
+    # Imported here as the main module imports this one
+    from .spinnaker_proxy import run_proxies
+
+    stop = threading.Event()
+    loop = EventLoop()
+    proxies = list(make_proxies(index))
+
+    def report():
+        try:
+            conn.send((proxy_stats(proxies), proxy_latencies(proxies)))
+        except OSError:
+            # The supervisor has gone away
+            stop.set()
+            return
+        loop.call_later(stats_interval, report)
+
+    loop.call_later(0, report)
+    run_proxies(proxies, stop, loop)
+
+
+class Supervisor(object):
+    """ Runs proxies in several (forked) worker processes, restarting any\
+        worker that dies, and collecting the workers' statistics.
+
+    Each worker makes its own proxies (and hence its own sockets), so where
+    workers share a port (see ``reuse_port`` on :py:class:`~.UDPtoUDP`) the
+    kernel keeps each flow going to the same worker.
+    """
+
+    #: How long (in seconds) to wait before restarting a worker that died
+    RESTART_DELAY = 1.0
+
+    #: The maximum time (in seconds) to wait between checks for being asked
+    #: to stop.
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, make_proxies, workers, stats_interval=1.0):
+        """
+        :param make_proxies:
+            Called (in the worker) with the worker's index to make the
+            proxies that the worker runs.
+        :type make_proxies:
+            ~collections.abc.Callable(int, ~typing.Iterable(DatagramProxy))
+        :param int workers: How many worker processes to run.
+        :param float stats_interval:
+            How often (in seconds) workers report their statistics.
+        """
+        self._context = multiprocessing.get_context("fork")
+        self._make_proxies = make_proxies
+        #: How many worker processes to run
+        self.workers = workers
+        self._stats_interval = stats_interval
+        #: How many times workers have been restarted
+        self.restarts = 0
+        self._processes = [None] * workers
+        self._conns = [None] * workers
+        self._stats = [{} for _ in range(workers)]
+        self._latencies = [{} for _ in range(workers)]
+        # Map from worker index to when to restart it
+        self._restart_at = {}
+        # Map from other things to wait for to their on-readable handlers
+        self._watched = {}
+
+    def watch(self, fileobj, handler):
+        """ Have the supervisor call a handler whenever something (e.g., a\
+            server socket) is readable, while it runs.
+
+        :param fileobj: What to wait for; anything with a ``fileno()``.
+        :param ~collections.abc.Callable handler: What to call.
+        """
+        self._watched[fileobj] = handler
+
+    def _start(self, index):
+        reader, writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main, name="proxy-worker-{}".format(index),
+            args=(self._make_proxies, index, writer, self._stats_interval))
+        process.daemon = True
+        process.start()
+        writer.close()
+        self._processes[index] = process
+        self._conns[index] = reader
+
+    def _on_exit(self, index):
+        process = self._processes[index]
+        process.join()
+        self._processes[index] = None
+        # Any replacement will start counting from zero
+        self._stats[index] = {}
+        self._latencies[index] = {}
+        if self._conns[index] is not None:
+            self._conns[index].close()
+            self._conns[index] = None
+        if process.exitcode == 0:
+            # Ran out of things to do, just like run_proxies() can
+            logging.info("worker {} finished".format(index))
+            return
+        logging.warning("worker {} exited with code {}; restarting".format(
+            index, process.exitcode))
+        self._restart_at[index] = time.monotonic() + self.RESTART_DELAY
+
+    def _on_report(self, index):
+        conn = self._conns[index]
+        if conn is None:
+            return
+        try:
+            self._stats[index], self._latencies[index] = conn.recv()
+        except EOFError:
+            # The worker is going; its exit is dealt with separately
+            conn.close()
+            self._conns[index] = None
+
+    def _restart_due(self):
+        now = time.monotonic()
+        for index, when in list(self._restart_at.items()):
+            if when <= now:
+                del self._restart_at[index]
+                self.restarts += 1
+                self._start(index)
+
+    def get_stats(self):
+        """ Get the totals of the workers' (most recently reported) counters.
+
+        :rtype: dict(str, int)
+        """
+        stats = sum_stats(
+            counters for worker in self._stats for counters in worker.values())
+        stats.update(self.get_process_stats())
+        return stats
+
+    def get_proxy_stats(self):
+        """ Get the (most recently reported) counters of each proxy, added up\
+            over the workers that run a proxy of that name.
+
+        :rtype: dict(str, dict(str, int))
+        """
+        return merge_proxy_stats(self._stats)
+
+    def get_proxy_latencies(self):
+        """ Get the (most recently reported) SCP latency histograms of each\
+            proxy, added up over the workers that run a proxy of that name.
+
+        :rtype: dict(str, dict(int, LatencyHistogram))
+        """
+        return merge_proxy_latencies(self._latencies)
+
+    def get_process_stats(self):
+        """ Get the counters that describe the workers themselves.
+
+        :rtype: dict(str, int)
+        """
+        return {
+            "workers": sum(1 for p in self._processes if p is not None),
+            "worker_restarts": self.restarts,
+        }
+
+    def run(self, event=None):
+        """ Run the workers until asked to stop, or until they have all\
+            finished.
+
+        :param event: A way to ask the supervisor to shut down (along with
+            the workers). If not provided, will run indefinitely.
+        :type event: ~threading.Event or None
+        """
+        if not event:
+            event = threading.Event()
+        try:
+            for index in range(self.workers):
+                self._start(index)
+            while not event.is_set() and (
+                    self._restart_at or
+                    any(p is not None for p in self._processes)):
+                waiting = {
+                    fileobj: (handler, )
+                    for fileobj, handler in self._watched.items()}
+                for index, process in enumerate(self._processes):
+                    if process is not None:
+                        waiting[process.sentinel] = (self._on_exit, index)
+                    if self._conns[index] is not None:
+                        waiting[self._conns[index]] = (self._on_report, index)
+                for ready in wait(list(waiting), self.POLL_INTERVAL):
+                    handler, *args = waiting[ready]
+                    handler(*args)
+                self._restart_due()
+        finally:
+            self.close()
+
+    def close(self):
+        """ Stop all the workers.
+        """
+        for process in self._processes:
+            if process is not None:
+                process.terminate()
+        for index, process in enumerate(self._processes):
+            if process is not None:
+                process.join()
+                self._processes[index] = None
+            if self._conns[index] is not None:
+                self._conns[index].close()
+                self._conns[index] = None
+        self._restart_at.clear()
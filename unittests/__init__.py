@@ -13,4 +13,26 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
+
 __version__ = "2.0.4"
+
+
+def wait_for(condition, timeout=5.0):
+    """ Wait for something being done by another thread or process to\
+        happen, failing the test if it does not happen in time.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def spin_until(loop, condition, timeout=2.0, interval=0.01):
+    """ Run an event loop until something happens, failing the test if it\
+        does not happen in time.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        loop.run_once(interval)
@@ -0,0 +1,31 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+import spinnaker_proxy.support as support
+# pylint: disable=protected-access
+
+
+@pytest.fixture
+def do_not_connect():
+    """
+    Disables doing the TCP connection step; we don't want to have to care about
+    configuring dummy servers to receive connections here.
+    """
+    value = support._SKIP_TCP_CONNECT
+    support._SKIP_TCP_CONNECT = True
+    yield None
+    support._SKIP_TCP_CONNECT = value
@@ -0,0 +1,209 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+import spinnaker_proxy.arq as arq
+from spinnaker_proxy.arq import (
+    KIND_DATA, ARQConnection, ARQtoUDP, UDPtoARQ, packet_session)
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.impairment import Impairment, ImpairedUDPtoUDP
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import udp_socket
+from unittests import spin_until
+# pylint: disable=protected-access
+
+
+class _Link(object):
+    """ Two connections joined by a link that loses the packets it is told\
+        to.
+    """
+
+    def __init__(self, ordered=False, queue_bytes=arq.DEFAULT_QUEUE_BYTES):
+        self.loop = EventLoop()
+        self.wire = []
+        self.delivered = []
+        #: DATA packets (by sequence number) to lose the first time each
+        self.lose = set()
+        self.sender = ARQConnection(
+            1, self.wire.append, None, queue_bytes=queue_bytes)
+        self.receiver = ARQConnection(
+            1, self.wire.append, self.delivered.append, ordered)
+        self.sender.attach(self.loop)
+        self.receiver.attach(self.loop)
+
+    def deliver(self):
+        """ Pass on what is on the wire, losing what is to be lost.
+        """
+        packets, self.wire[:] = list(self.wire), []
+        for packet in packets:
+            if packet[0] == KIND_DATA:
+                seq = arq._DATA.unpack_from(packet)[3]
+                if seq in self.lose:
+                    self.lose.remove(seq)
+                    continue
+                self.receiver.on_packet(packet)
+            else:
+                self.sender.on_packet(packet)
+
+    def run(self, until, timeout=2):
+        def done():
+            if until():
+                return True
+            self.deliver()
+            return False
+        spin_until(self.loop, done, timeout, interval=0.001)
+
+
+def _datagrams(count):
+    return [b"%d" % i for i in range(count)]
+
+
+def test_lossless():
+    link = _Link()
+    for datagram in _datagrams(100):
+        link.sender.send(datagram)
+    link.run(lambda: len(link.delivered) == 100)
+    link.run(lambda: not link.sender._unacked)
+    assert link.delivered == _datagrams(100)
+    stats = link.sender.get_stats()
+    assert stats["arq_sent"] == 100
+    assert stats["arq_retransmits"] == 0
+    # The window grew
+    assert stats["arq_window"] > arq.INITIAL_WINDOW
+    assert link.receiver.get_stats()["arq_received"] == 100
+
+
+def test_fast_retransmit():
+    link = _Link()
+    link.lose = {2, 20}
+    for datagram in _datagrams(50):
+        link.sender.send(datagram)
+    link.run(lambda: len(link.delivered) == 50)
+    # Delivered as soon as they arrive, not held for the lost ones
+    assert link.delivered != _datagrams(50)
+    assert sorted(link.delivered) == sorted(_datagrams(50))
+    assert link.delivered.index(b"2") > link.delivered.index(b"5")
+    assert link.sender.retransmits == 2
+    # Recovered without waiting for a timeout
+    assert link.sender.timeouts == 0
+    assert link.sender._window < arq.MAX_WINDOW
+
+
+def test_ordered_delivery():
+    link = _Link(ordered=True)
+    link.lose = {2, 3, 20}
+    for datagram in _datagrams(50):
+        link.sender.send(datagram)
+    link.run(lambda: len(link.delivered) == 50)
+    assert link.delivered == _datagrams(50)
+
+
+def test_timeout(monkeypatch):
+    monkeypatch.setattr(arq, "INITIAL_RTO", 0.05)
+    link = _Link()
+    # Nothing sent after it to show that it was lost
+    link.lose = {0}
+    link.sender.send(b"only")
+    link.run(lambda: link.delivered == [b"only"])
+    assert link.sender.timeouts == 1
+    assert link.sender.retransmits == 1
+    link.run(lambda: not link.sender._unacked)
+    link.sender.close()
+
+
+def test_duplicates_are_acknowledged():
+    link = _Link()
+    link.sender.send(b"x")
+    link.run(lambda: link.delivered == [b"x"])
+    # As though the acknowledgement were lost, and the datagram sent again
+    link.receiver.on_packet(arq._DATA.pack(
+        KIND_DATA, 1, link.sender._stream, 0, 0) + b"x")
+    assert link.delivered == [b"x"]
+    assert link.receiver.duplicates == 1
+    link.run(lambda: link.receiver.acks_sent == 2)
+
+
+def test_restarted_sender():
+    link = _Link()
+    for datagram in _datagrams(5):
+        link.sender.send(datagram)
+    link.run(lambda: len(link.delivered) == 5)
+    # A new sender starts numbering again, in a new stream
+    link.sender = ARQConnection(1, link.wire.append, None)
+    link.sender.attach(link.loop)
+    link.sender.send(b"again")
+    link.run(lambda: len(link.delivered) == 6)
+    assert link.delivered[-1] == b"again"
+    link.run(lambda: not link.sender._unacked)
+
+
+def test_queue_is_bounded():
+    link = _Link(queue_bytes=10)
+    for datagram in (b"1", b"2", b"3", b"4", b"12345", b"67890", b"x"):
+        link.sender.send(datagram)
+    # The first four fill the window; the next two the queue
+    assert link.sender.queued_bytes == 10
+    assert link.sender.dropped == 1
+    link.run(lambda: len(link.delivered) == 6)
+    assert link.sender.get_stats()["arq_queued_bytes"] == 0
+
+
+def test_packet_session():
+    assert packet_session(arq._ACK.pack(arq.KIND_ACK, 7, 1, 0, 0)) == 7
+    assert packet_session(b"\x05" + bytes(20)) is None
+    assert packet_session(b"\0") is None
+
+
+def test_tunnel_across_lossy_link():
+    link = Impairment(delay=0.005, loss=0.2, seed=3)
+    with udp_socket(bind_port=0) as target:
+        server = ARQtoUDP(0, ("localhost", target.getsockname()[1]))
+        impaired = ImpairedUDPtoUDP(
+            0, ("localhost", server.arq_sock.getsockname()[1]),
+            upstream=link, downstream=link)
+        client = UDPtoARQ(
+            0, ("localhost", impaired.ext_sock.getsockname()[1]))
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=run_proxies, args=([server, impaired, client], stop))
+        thread.start()
+        try:
+            with udp_socket(connect_address=(
+                    "localhost", client.udp_sock.getsockname()[1])) as host:
+                host.settimeout(5)
+                target.settimeout(5)
+                datagrams = _datagrams(100)
+                for datagram in datagrams:
+                    host.send(datagram)
+                received = []
+                for _ in datagrams:
+                    datagram, address = target.recvfrom(100)
+                    received.append(datagram)
+                    target.sendto(datagram + b"!", address)
+                assert sorted(received) == sorted(datagrams)
+                replies = [host.recv(100) for _ in datagrams]
+                assert sorted(replies) == sorted(d + b"!" for d in datagrams)
+        finally:
+            stop.set()
+            thread.join(2)
+    assert link.lost > 0
+    client_stats = client.get_stats()
+    assert client_stats["arq_retransmits"] > 0
+    assert client_stats["udp_to_arq_packets"] == 100
+    assert client_stats["arq_to_udp_packets"] == 100
+    server_stats = server.get_stats()
+    assert server_stats["arq_connections"] == 1
+    assert server_stats["arq_received"] == 100
@@ -0,0 +1,172 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from functools import partial
+import threading
+
+from spinnaker_proxy.async_proxies import (
+    AsyncTCPtoUDP, AsyncUDPtoTCP, AsyncUDPtoUDP, run_proxies_async)
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import tcp_socket, udp_socket
+from .test_proxy_chain import Runner, TCP_FORMAT, UDP_FORMAT
+
+
+class AsyncRunner:
+    """
+    Runs asynchronous proxies on their own event loop in a background thread.
+    """
+    __slots__ = ["_proxies", "_loop", "_stop", "_thread", "_started"]
+
+    def __init__(self, proxies):
+        self._proxies = proxies
+        self._loop = asyncio.new_event_loop()
+        self._stop = None
+        self._thread = None
+        self._started = threading.Event()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._stop = asyncio.Event()
+        self._loop.call_soon(self._started.set)
+        self._loop.run_until_complete(
+            run_proxies_async(self._proxies, self._stop))
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.start()
+        self._started.wait(1)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(1)
+        self._loop.close()
+        return False
+
+
+def test_async_tcp_to_udp_proxy():
+    proxy = AsyncTCPtoUDP(12369, ("localhost", 12370))
+    with AsyncRunner([proxy]):
+        with tcp_socket(connect_address=("localhost", 12369)) as s:
+            with udp_socket(bind_port=12370) as r:
+                s.send(TCP_FORMAT.pack(4, 0, 1, 2, 3))
+                m, a = r.recvfrom(32)
+                assert UDP_FORMAT.unpack(m) == (0, 1, 2, 3)
+                r.sendto(UDP_FORMAT.pack(3, 2, 1, 0), a)
+                assert TCP_FORMAT.unpack(s.recv(32)) == (4, 3, 2, 1, 0)
+
+
+def test_async_udp_to_udp_proxy():
+    proxy = AsyncUDPtoUDP(12370, ("localhost", 12371))
+    with AsyncRunner([proxy]):
+        with udp_socket(connect_address=("localhost", 12370)) as s:
+            with udp_socket(bind_port=12371) as r:
+                s.send(UDP_FORMAT.pack(3, 5, 7, 9))
+                m, a = r.recvfrom(32)
+                assert UDP_FORMAT.unpack(m) == (3, 5, 7, 9)
+                r.sendto(UDP_FORMAT.pack(9, 7, 5, 3), a)
+                assert UDP_FORMAT.unpack(s.recv(32)) == (9, 7, 5, 3)
+
+
+def _round_trip(client_port, board_port):
+    with udp_socket(connect_address=("localhost", client_port)) as s:
+        with udp_socket(bind_port=board_port) as r:
+            s.send(UDP_FORMAT.pack(11, 13, 17, 19))
+            m, a = r.recvfrom(32)
+            assert UDP_FORMAT.unpack(m) == (11, 13, 17, 19)
+            r.sendto(b"OK", a)
+            assert s.recv(32) == b"OK"
+
+
+def test_async_client_sync_server():
+    server = TCPtoUDP(12369, ("localhost", 12371))
+    with Runner(partial(run_proxies, [server])):
+        client = AsyncUDPtoTCP(12368, ("localhost", 12369))
+        with AsyncRunner([client]):
+            _round_trip(12368, 12371)
+
+
+def test_sync_client_async_server():
+    server = AsyncTCPtoUDP(12369, ("localhost", 12371))
+    with AsyncRunner([server]):
+        client = UDPtoTCP(12368, ("localhost", 12369))
+        with Runner(partial(run_proxies, [client])):
+            _round_trip(12368, 12371)
+
+
+def test_async_proxy_chain():
+    p1 = AsyncUDPtoUDP(12370, ("localhost", 12371))
+    p2 = AsyncTCPtoUDP(12369, ("localhost", 12370))
+    p3 = AsyncUDPtoTCP(12368, ("localhost", 12369))
+    with AsyncRunner([p1, p2, p3]):
+        _round_trip(12368, 12371)
+
+
+def test_async_stops_when_all_closed():
+    loop = asyncio.new_event_loop()
+    proxy = AsyncUDPtoUDP(None, ("localhost", 12371))
+
+    async def go():
+        loop.call_later(0.1, proxy.close)
+        await run_proxies_async([proxy])
+
+    loop.run_until_complete(asyncio.wait_for(go(), 1))
+    loop.close()
+
+
+def test_async_reading_paused_while_tcp_full():
+    loop = asyncio.new_event_loop()
+    with tcp_socket(bind_port=0) as listener:
+        listener.listen(1)
+        proxy = AsyncUDPtoTCP(0, ("localhost", listener.getsockname()[1]))
+        host = udp_socket(connect_address=(
+            "localhost", proxy.udp_sock.getsockname()[1]))
+
+        async def go():
+            await proxy.start()
+            endpoint = proxy.tcp_transport.get_protocol()
+            # The TCP transport's buffer fills up...
+            endpoint.pause_writing()
+            host.send(b"held")
+            await asyncio.sleep(0.05)
+            assert proxy.udp_address is None
+            # ... and drains
+            endpoint.resume_writing()
+            await asyncio.sleep(0.05)
+            assert proxy.udp_address == host.getsockname()
+
+        try:
+            loop.run_until_complete(asyncio.wait_for(go(), 1))
+        finally:
+            proxy.close()
+            host.close()
+            loop.close()
+
+
+def test_async_close_outside_loop():
+    proxy = AsyncUDPtoUDP(None, ("localhost", 12371))
+    errors = []
+
+    def close():
+        try:
+            proxy.close()
+        except RuntimeError as e:
+            errors.append(e)
+    # e.g., from a thread with no event loop of its own
+    thread = threading.Thread(target=close)
+    thread.start()
+    thread.join(1)
+    assert errors == []
@@ -0,0 +1,221 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import struct
+import pytest
+
+from spinnaker_proxy.boot import (
+    OP_BLOCK, OP_END, OP_START, boot_operation, decode_sequence,
+    encode_sequence, sequence_digest)
+from spinnaker_proxy.boot_cache import (
+    BootCacheTCPtoUDP, BootCacheUDPtoTCP, BootImageCache)
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.support import udp_socket
+from unittests import spin_until
+
+# pylint: disable=protected-access
+
+
+def _boot_packet(operation, arg1=0, data=b""):
+    return struct.pack("!H4I", 1, operation, arg1, 0, 0) + data
+
+
+def _boot_sequence(image):
+    blocks = [image[i:i + 1024] for i in range(0, len(image), 1024)]
+    return ([_boot_packet(OP_START, 0)] +
+            [_boot_packet(OP_BLOCK, i, block)
+             for i, block in enumerate(blocks)] +
+            [_boot_packet(OP_END, 1)])
+
+
+def test_sequences():
+    packets = _boot_sequence(bytes(range(256)) * 12)
+    assert [boot_operation(p) for p in packets] == [
+        OP_START, OP_BLOCK, OP_BLOCK, OP_BLOCK, OP_END]
+    assert boot_operation(b"short") is None
+
+    data = encode_sequence(zip([0.0, 0.05, 0.1, 0.05, 0.05], packets))
+    decoded = decode_sequence(data)
+    assert [bytes(p) for _, p in decoded] == packets
+    assert [g for g, _ in decoded] == pytest.approx(
+        [0.0, 0.05, 0.1, 0.05, 0.05])
+    # The digest depends on the content, not the timing
+    assert sequence_digest(p for _, p in decoded) == sequence_digest(packets)
+    assert sequence_digest(packets[:-1]) != sequence_digest(packets)
+    with pytest.raises(ValueError):
+        decode_sequence(data[:-1])
+
+
+def test_cache(tmp_path):
+    cache = BootImageCache(str(tmp_path), max_bytes=250)
+    digests = [bytes([i]) * 32 for i in range(4)]
+    assert cache.get(digests[0]) is None
+    assert cache.store(digests[0], b"a" * 100)
+    assert cache.store(digests[1], b"b" * 100)
+    assert bytes(cache.get(digests[0])) == b"a" * 100
+    # Storing a third evicts the least recently used
+    assert cache.store(digests[2], b"c" * 100)
+    assert digests[1] not in cache
+    assert digests[0] in cache and digests[2] in cache
+    assert cache.total_bytes == 200
+    assert not cache.store(digests[3], b"d" * 300)
+    assert len(os.listdir(str(tmp_path))) == 2
+
+    # What is stored survives a restart
+    cache = BootImageCache(str(tmp_path), max_bytes=250)
+    assert len(cache) == 2
+    assert bytes(cache.get(digests[2])) == b"c" * 100
+
+    # Files removed behind the cache's back are misses
+    os.unlink(os.path.join(str(tmp_path), digests[2].hex() + ".boot"))
+    assert cache.get(digests[2]) is None
+    assert cache.total_bytes == 100
+
+
+class _Tunnel(object):
+    """ A caching boot tunnel to a "board", on one loop.
+    """
+
+    def __init__(self, directory):
+        self.board = udp_socket(bind_port=0)
+        self.board.settimeout(2)
+        self.loop = EventLoop()
+        self.server = BootCacheTCPtoUDP(
+            0, ("localhost", self.board.getsockname()[1]),
+            BootImageCache(directory))
+        self.client = BootCacheUDPtoTCP(0, (
+            "localhost", self.server.tcp_listen_sock.getsockname()[1]))
+        self.server.attach(self.loop)
+        self.client.attach(self.loop)
+        self.spin(lambda: self.server.tcp_sock is not None)
+        self.host = udp_socket(connect_address=(
+            "localhost", self.client.udp_sock.getsockname()[1]))
+        self.host.settimeout(2)
+
+    def spin(self, condition):
+        spin_until(self.loop, condition)
+
+    def boot(self, packets):
+        replayed = self.server.boot_packets_replayed
+        for packet in packets:
+            self.host.send(packet)
+        self.spin(lambda: self.server.boot_packets_replayed ==
+                  replayed + len(packets))
+        return [self.board.recv(2048) for _ in packets]
+
+    def close(self):
+        self.client.close()
+        self.server.close()
+        self.loop.close()
+        self.board.close()
+        self.host.close()
+
+
+def test_boot_from_cache(tmp_path):
+    tunnel = _Tunnel(str(tmp_path))
+    try:
+        packets = _boot_sequence(os.urandom(3000))
+        # Other packets pass straight through
+        tunnel.host.send(b"not boot")
+        tunnel.spin(lambda: tunnel.server.tcp_to_udp_packets == 1)
+        assert tunnel.board.recv(2048) == b"not boot"
+
+        # The first boot misses, and the sequence is sent and stored
+        assert tunnel.boot(packets) == packets
+        assert tunnel.client.boot_cache_misses == 1
+        assert tunnel.server.boot_cache_misses == 1
+        sent = tunnel.client.udp_to_tcp_bytes
+        assert sent > 3000
+
+        # The second is replayed from the cache without being sent
+        assert tunnel.boot(packets) == packets
+        tunnel.spin(lambda: tunnel.client.boot_cache_hits == 1)
+        assert tunnel.server.boot_cache_hits == 1
+        assert tunnel.client.udp_to_tcp_bytes - sent < 100
+        assert tunnel.server.get_stats()["boot_packets_replayed"] == 10
+
+        # A changed image misses again
+        changed = _boot_sequence(os.urandom(3000))
+        assert tunnel.boot(changed) == changed
+        assert tunnel.server.boot_cache_misses == 2
+        assert len(tunnel.server.cache) == 2
+    finally:
+        tunnel.close()
+
+
+def test_unfinished_sequence_is_forwarded(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "spinnaker_proxy.boot_cache.SEQUENCE_TIMEOUT", 0.05)
+    tunnel = _Tunnel(str(tmp_path))
+    try:
+        packets = _boot_sequence(b"x" * 2000)[:-1]
+        for packet in packets:
+            tunnel.host.send(packet)
+        tunnel.spin(lambda: tunnel.server.tcp_to_udp_packets == len(packets))
+        assert [tunnel.board.recv(2048) for _ in packets] == packets
+        assert tunnel.server.boot_cache_misses == 0
+    finally:
+        tunnel.close()
+
+
+def test_failed_store_still_boots(tmp_path, monkeypatch):
+    def disk_full(*args):
+        raise OSError("disk full")
+    tunnel = _Tunnel(str(tmp_path))
+    try:
+        monkeypatch.setattr("spinnaker_proxy.boot_cache.os.replace",
+                            disk_full)
+        packets = _boot_sequence(os.urandom(3000))
+        assert tunnel.boot(packets) == packets
+        assert len(tunnel.server.cache) == 0
+        # Nothing half-written is left behind
+        assert os.listdir(str(tmp_path)) == []
+    finally:
+        tunnel.close()
+
+
+def test_replay_closes_cached_sequence(tmp_path):
+    tunnel = _Tunnel(str(tmp_path))
+    try:
+        packets = _boot_sequence(os.urandom(3000))
+        tunnel.boot(packets)
+        cache = tunnel.server.cache
+        mapped = []
+
+        def get(digest):
+            mapped.append(BootImageCache.get(cache, digest))
+            return mapped[-1]
+        cache.get = get
+        assert tunnel.boot(packets) == packets
+        assert mapped[0].closed
+    finally:
+        tunnel.close()
+
+
+def test_replay_stops_when_connection_lost(tmp_path):
+    tunnel = _Tunnel(str(tmp_path))
+    try:
+        packets = _boot_sequence(os.urandom(3000))
+        tunnel.server._replay(encode_sequence(
+            (10.0, packet) for packet in packets))
+        timers = list(tunnel.server._replay_timers)
+        assert len(timers) == len(packets)
+        tunnel.client.close()
+        tunnel.spin(lambda: tunnel.server.tcp_sock is None)
+        assert all(timer.cancelled for timer in timers)
+        assert tunnel.server._replay_timers == []
+    finally:
+        tunnel.close()
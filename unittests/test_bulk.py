@@ -0,0 +1,154 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import struct
+import threading
+import pytest
+
+from spinnaker_proxy.bulk import (
+    RC_TIMEOUT, SCP_READ, SCP_WRITE, BulkClient, BulkError, BulkTCPtoUDP)
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import udp_socket
+
+_REQUEST = struct.Struct("<2xB3xBB2xHHIII")
+
+#: The board refuses to touch memory from here on
+FORBIDDEN = 0x20000
+
+
+class Board(object):
+    """ Answers SCP reads and writes of its memory, in a thread.
+    """
+
+    def __init__(self, drop=0, silent=False):
+        self.sock = udp_socket(bind_port=0)
+        self.sock.settimeout(0.1)
+        self.memory = bytearray(range(256)) * 1024
+        self.requests = []
+        self._drop = drop
+        self._silent = silent
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve)
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                datagram, address = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            _, y, x, command, seq, start, length, _ = \
+                _REQUEST.unpack_from(datagram)
+            self.requests.append((x, y, command, start, length))
+            if self._silent or len(self.requests) <= self._drop:
+                continue
+            header = datagram[:10] + struct.pack("<H", 0x80) + datagram[12:14]
+            if start + length > FORBIDDEN:
+                header = header[:10] + struct.pack("<H", 0x84) + header[12:]
+                self.sock.sendto(header, address)
+            elif command == SCP_READ:
+                self.sock.sendto(
+                    header + self.memory[start:start + length], address)
+            elif command == SCP_WRITE:
+                self.memory[start:start + length] = datagram[26:]
+                self.sock.sendto(header, address)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join(1)
+        self.sock.close()
+        return False
+
+
+def _serve(board, **kwargs):
+    proxy = BulkTCPtoUDP(
+        0, ("localhost", board.sock.getsockname()[1]), **kwargs)
+    stop = threading.Event()
+    thread = threading.Thread(target=run_proxies, args=([proxy], stop))
+    thread.start()
+    return proxy, stop, thread
+
+
+@pytest.mark.parametrize("length", [0, 10, 256, 70000])
+def test_read_and_write(length):
+    with Board() as board:
+        proxy, stop, thread = _serve(board)
+        port = proxy.tcp_listen_sock.getsockname()[1]
+        try:
+            with BulkClient(("localhost", port)) as client:
+                assert client.read(1, 2, 6, length) == board.memory[
+                    6:6 + length]
+                data = bytes(reversed(board.memory[:length]))
+                client.write(1, 2, 6, data)
+                assert board.memory[6:6 + length] == data
+                assert client.read(1, 2, 6, length) == data
+        finally:
+            stop.set()
+            thread.join(2)
+    transfers = -(-length // 256)
+    assert len(board.requests) == 3 * transfers
+    assert all(r[:2] == (1, 2) for r in board.requests)
+    assert max(r[4] for r in board.requests or [(0, 0, 0, 0, 0)]) <= 256
+    stats = proxy.get_stats()
+    assert stats["bulk_operations"] == 3
+    assert stats["bulk_bytes_read"] == 2 * length
+    assert stats["bulk_bytes_written"] == length
+
+
+def test_lost_requests_are_retried():
+    with Board(drop=3) as board:
+        proxy, stop, thread = _serve(board, timeout=0.05)
+        port = proxy.tcp_listen_sock.getsockname()[1]
+        try:
+            with BulkClient(("localhost", port)) as client:
+                assert client.read(0, 0, 0, 1024) == board.memory[:1024]
+        finally:
+            stop.set()
+            thread.join(2)
+    assert proxy.bulk_scp_retries == 3
+
+
+def test_failures():
+    with Board() as board:
+        proxy, stop, thread = _serve(board)
+        port = proxy.tcp_listen_sock.getsockname()[1]
+        try:
+            with BulkClient(("localhost", port)) as client:
+                with pytest.raises(BulkError) as e:
+                    client.read(0, 0, FORBIDDEN - 1024, 2048)
+                assert e.value.rc == 0x84
+                # The connection is still usable afterwards
+                assert client.read(0, 0, 0, 4) == board.memory[:4]
+        finally:
+            stop.set()
+            thread.join(2)
+    assert proxy.bulk_failures == 1
+
+    with Board(silent=True) as board:
+        proxy, stop, thread = _serve(board, timeout=0.01, retries=2)
+        port = proxy.tcp_listen_sock.getsockname()[1]
+        try:
+            with BulkClient(("localhost", port)) as client:
+                with pytest.raises(BulkError) as e:
+                    client.write(0, 0, 0, b"data")
+                assert e.value.rc == RC_TIMEOUT
+        finally:
+            stop.set()
+            thread.join(2)
+    assert len(board.requests) == 3
@@ -0,0 +1,124 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import threading
+
+from spinnaker_proxy.compression import (
+    OFFER, RETRY_BYTES, SAMPLE_BYTES, CompressingDatagramProtocol)
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import TCPDatagramProtocol, udp_socket
+
+
+def _deliver(sender, receiver, buffers):
+    """ Pass what one protocol encoded to another, returning the datagrams.
+    """
+    return [bytes(d) for d in receiver.recv(b"".join(
+        bytes(b) for b in buffers + sender.flush()))]
+
+
+def _negotiate():
+    client = CompressingDatagramProtocol()
+    server = CompressingDatagramProtocol(accept_offers=True)
+    assert _deliver(client, server, client.offer()) == []
+    assert _deliver(server, client, []) == []
+    assert _deliver(client, server, []) == []
+    assert client.sending_compressed and client.receiving_compressed
+    assert server.sending_compressed and server.receiving_compressed
+    return client, server
+
+
+def test_round_trip():
+    client, server = _negotiate()
+    datagrams = [bytes(100), b"abc" * 50, b"", bytes(range(256))]
+    buffers = []
+    for datagram in datagrams:
+        buffers += client.encode(datagram)
+    # Held back until flushed
+    assert buffers == []
+    assert client.pending_bytes == sum(len(d) for d in datagrams)
+    assert _deliver(client, server, buffers) == datagrams
+    assert client.pending_bytes == 0
+    assert _deliver(server, client, server.encode(b"reply")) == [b"reply"]
+    stats = client.get_stats()
+    assert stats["tcp_compressing"] == 1
+    assert stats["tcp_compressed_input_bytes"] == sum(
+        len(d) for d in datagrams)
+    assert 0 < stats["tcp_compressed_output_bytes"] < sum(
+        len(d) for d in datagrams)
+
+
+def test_offer_refused():
+    client = CompressingDatagramProtocol()
+    server = CompressingDatagramProtocol()
+    plain = TCPDatagramProtocol()
+    # A server that does not compress (or knows nothing of compression) sees
+    # the offer as just another datagram
+    assert _deliver(client, server, client.offer()) == [OFFER]
+    assert _deliver(client, plain, client.offer()) == [OFFER]
+    assert client.encode(b"data") == plain.encode(b"data")
+    assert client.get_stats()["tcp_compressing"] == 0
+
+
+def test_switched_off_when_not_paying():
+    client, server = _negotiate()
+    received = []
+    sent = 0
+    # Random data does not compress
+    while client.compressing:
+        datagram = os.urandom(1024)
+        sent += len(datagram)
+        received += _deliver(client, server, client.encode(datagram))
+    assert sent >= SAMPLE_BYTES
+    assert client.disabled == 1
+    datagram = os.urandom(1024)
+    assert _deliver(client, server, client.encode(datagram)) == [datagram]
+    assert client.pending_bytes == 0
+    # Tried again after a while
+    while not client.compressing:
+        received += _deliver(client, server, client.encode(bytes(1024)))
+    assert client.uncompressed_bytes >= RETRY_BYTES
+    assert _deliver(client, server, client.encode(bytes(10))) == [bytes(10)]
+
+
+def test_compressed_tunnel():
+    with udp_socket(bind_port=0) as target:
+        server = TCPtoUDP(
+            0, ("localhost", target.getsockname()[1]), compress=True)
+        client = UDPtoTCP(
+            0, ("localhost", server.tcp_listen_sock.getsockname()[1]),
+            compress=True)
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=run_proxies, args=([server, client], stop))
+        thread.start()
+        try:
+            with udp_socket(connect_address=(
+                    "localhost", client.udp_sock.getsockname()[1])) as host:
+                host.settimeout(2)
+                target.settimeout(2)
+                for i in range(1, 21):
+                    host.send(bytes(i * 50))
+                    datagram, address = target.recvfrom(2048)
+                    assert datagram == bytes(i * 50)
+                    target.sendto(datagram + b"!", address)
+                    assert host.recv(2048) == bytes(i * 50) + b"!"
+        finally:
+            stop.set()
+            thread.join(2)
+    assert client.get_stats()["tcp_compressing"] == 1
+    assert server.get_stats()["tcp_compressed_input_bytes"] == \
+        50 * 20 * 21 // 2 + 20
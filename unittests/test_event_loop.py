@@ -0,0 +1,173 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import selectors
+import threading
+import time
+
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoUDP
+from spinnaker_proxy.support import tcp_socket, udp_socket
+
+
+def test_register_and_dispatch():
+    loop = EventLoop()
+    with udp_socket(bind_port=0) as r, udp_socket() as s:
+        seen = []
+        loop.register(r, lambda: seen.append(r.recv(32)))
+        assert loop.is_registered(r)
+        assert len(loop) == 1
+        s.sendto(b"hi", ("localhost", r.getsockname()[1]))
+        loop.run_once(1.0)
+        assert seen == [b"hi"]
+
+        loop.unregister(r)
+        assert not loop.is_registered(r)
+        assert len(loop) == 0
+        # Unregistering twice is harmless
+        loop.unregister(r)
+    loop.close()
+
+
+def test_run_stops_when_empty():
+    loop = EventLoop()
+    # Would block forever if the loop didn't notice it has nothing to do
+    loop.run(threading.Event())
+    loop.close()
+
+
+def test_handler_closing_other_socket():
+    # A handler which closes another ready socket must not cause that
+    # socket's (stale) handler to be run in the same batch
+    loop = EventLoop()
+    a = udp_socket(bind_port=0)
+    b = udp_socket(bind_port=0)
+    seen = []
+
+    def on_a():
+        seen.append("a")
+        loop.unregister(b)
+        b.close()
+        a.recv(32)
+
+    def on_b():
+        seen.append("b")
+        loop.unregister(a)
+        a.close()
+        b.recv(32)
+
+    loop.register(a, on_a)
+    loop.register(b, on_b)
+    with udp_socket() as s:
+        s.sendto(b"x", ("localhost", a.getsockname()[1]))
+        s.sendto(b"x", ("localhost", b.getsockname()[1]))
+        while not seen:
+            loop.run_once(1.0)
+    assert len(seen) == 1
+    a.close()
+    b.close()
+    loop.close()
+
+
+def test_timers():
+    loop = EventLoop()
+    calls = []
+    loop.call_later(0.05, lambda: calls.append("later"))
+    loop.call_later(0.0, lambda: calls.append("soon"))
+    loop.call_later(0.0, lambda: calls.append("cancelled")).cancel()
+    # Waiting is cut short by timers that are due
+    start = time.monotonic()
+    while len(calls) < 2:
+        loop.run_once(10)
+    assert time.monotonic() - start < 1
+    assert calls == ["soon", "later"]
+
+    # Calls due at the same time happen in the order they were arranged
+    when = time.monotonic()
+    for i in range(5):
+        loop.call_at(when, lambda i=i: calls.append(i))
+    loop.run_once(0)
+    assert calls[2:] == [0, 1, 2, 3, 4]
+    loop.close()
+
+
+def test_timers_are_not_overslept():
+    # Epoll rounds its timeout up to a millisecond; precise timers are finer
+    # than that
+    loop = EventLoop()
+    lateness = []
+    for _ in range(20):
+        due = time.monotonic() + 0.0003
+        loop.call_at(due, lambda due=due: lateness.append(
+            time.monotonic() - due), precise=True)
+        loop.run_once(1)
+    loop.close()
+    assert len(lateness) == 20
+    assert min(lateness) >= 0
+    assert sorted(lateness)[10] < 0.0002
+
+
+def test_only_precise_timers_poll():
+    selects = []
+
+    class Selector(selectors.DefaultSelector):
+        def select(self, timeout=None):
+            selects.append(timeout)
+            return super(Selector, self).select(timeout)
+    loop = EventLoop(Selector())
+    fired = []
+    loop.call_later(0.005, lambda: fired.append(True))
+    loop.run_once(1)
+    assert fired
+    # One wait, for the whole delay
+    assert len(selects) == 1 and selects[0] > 0.004
+    loop.close()
+
+
+def test_proxy_attach_and_close():
+    loop = EventLoop()
+    proxy = UDPtoUDP(None, ("localhost", 12371))
+    proxy.attach(loop)
+    assert loop.is_registered(proxy.ext_sock)
+    # Internal sockets are only opened once external hosts appear
+    assert len(loop) == 1
+    proxy.close()
+    assert len(loop) == 0
+    loop.close()
+
+
+def test_tcp_connections_registered_once():
+    loop = EventLoop()
+    proxy = TCPtoUDP(12372, ("localhost", 12373))
+    proxy.attach(loop)
+    # Just the listening and UDP sockets to begin with
+    assert len(loop) == 2
+
+    with tcp_socket(connect_address=("localhost", 12372)):
+        loop.run_once(1.0)
+        first = proxy.tcp_sock
+        assert loop.is_registered(first)
+        assert len(loop) == 3
+
+        # A new connection replaces (and unregisters) the old one
+        with tcp_socket(connect_address=("localhost", 12372)):
+            loop.run_once(1.0)
+            assert proxy.tcp_sock is not first
+            assert loop.is_registered(proxy.tcp_sock)
+            assert len(loop) == 3
+
+    proxy.close()
+    assert len(loop) == 0
+    loop.close()
@@ -0,0 +1,235 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import threading
+import time
+import pytest
+
+import spinnaker_proxy.fec as fec
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.fec import (
+    KIND_DATA, KIND_PARITY, MAX_GROUP_SIZE, MIN_GROUP_SIZE, FECCodec,
+    FECtoUDP, UDPtoFEC, group_size)
+from spinnaker_proxy.impairment import Impairment, ImpairedUDPtoUDP
+from spinnaker_proxy.proxies import DEFAULT_BUFFER_SIZE
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import udp_socket
+from unittests import spin_until
+# pylint: disable=protected-access
+
+
+def _pair(loop=None):
+    """ Make a sender and receiver, returning the packets the sender sends\
+        and the datagrams the receiver delivers.
+    """
+    packets = []
+    delivered = []
+    sender = FECCodec(packets.append, None, loop)
+    receiver = FECCodec([].append, delivered.append)
+    return sender, receiver, packets, delivered
+
+
+def _datagrams(count):
+    # Of differing lengths
+    return [b"x" * i + bytes([i]) for i in range(count)]
+
+
+def test_group_size():
+    assert group_size(0.0) == MAX_GROUP_SIZE
+    assert group_size(0.5) == MIN_GROUP_SIZE
+    sizes = [group_size(loss) for loss in (0.0, 0.002, 0.005, 0.01, 0.02)]
+    assert sizes == sorted(sizes, reverse=True)
+
+
+def test_recover_one_loss():
+    sender, receiver, packets, delivered = _pair()
+    sender.group_size = 4
+    datagrams = _datagrams(8)
+    for datagram in datagrams:
+        sender.send(datagram)
+    assert [p[0] for p in packets] == [KIND_DATA] * 4 + [KIND_PARITY] + \
+        [KIND_DATA] * 4 + [KIND_PARITY]
+    # Lose a datagram from each group
+    for i, packet in enumerate(packets):
+        if i not in (1, 8):
+            receiver.on_packet(packet)
+    assert sorted(delivered) == sorted(datagrams)
+    # The rebuilt ones come once the rest of their group has arrived
+    assert delivered[3] == datagrams[1]
+    assert receiver.recovered_datagrams == 2
+    assert sender.parity_packets == 2
+    # A late original is not delivered again
+    receiver.on_packet(packets[1])
+    assert len(delivered) == 8
+
+
+def test_two_losses_are_not_recovered():
+    sender, receiver, packets, delivered = _pair()
+    sender.group_size = 4
+    for datagram in _datagrams(4):
+        sender.send(datagram)
+    for packet in packets[2:]:
+        receiver.on_packet(packet)
+    assert len(delivered) == 2
+    # Accounted for once later groups push the group out
+    for datagram in _datagrams(4 * fec.MAX_OPEN_GROUPS):
+        sender.send(datagram)
+    for packet in packets[5:]:
+        receiver.on_packet(packet)
+    assert receiver.recovered_datagrams == 0
+    assert receiver.unrecovered_datagrams == 2
+    assert receiver.loss > 0
+
+
+def test_incomplete_group_is_flushed():
+    loop = EventLoop()
+    sender, receiver, packets, delivered = _pair(loop)
+    sender.send(b"alone")
+    assert len(packets) == 1
+    spin_until(loop, lambda: len(packets) == 2, timeout=1)
+    # A group of one; its parity is a copy
+    receiver.on_packet(packets[1])
+    assert delivered == [b"alone"]
+
+
+def test_losses_counted_without_waiting_for_later_groups():
+    loop = EventLoop()
+    packets = []
+    delivered = []
+    sender = FECCodec(packets.append, None)
+    receiver = FECCodec([].append, delivered.append, loop)
+    sender.group_size = 4
+    try:
+        for datagram in _datagrams(8):
+            sender.send(datagram)
+        # A complete group is counted at once
+        for packet in packets[5:]:
+            receiver.on_packet(packet)
+        assert receiver.loss == 0 and not receiver._groups
+        # One that loses two of its five packets is counted once it has
+        # waited long enough, with no more groups arriving
+        for packet in packets[2:5]:
+            receiver.on_packet(packet)
+        spin_until(loop, lambda: receiver.unrecovered_datagrams == 2)
+        loss = receiver.loss
+        assert loss == pytest.approx(2 / 5 * fec.LOSS_GAIN)
+        # Packets arriving after that change nothing
+        for packet in packets[:2]:
+            receiver.on_packet(packet)
+        receiver.on_packet(packets[6])
+        assert len(delivered) == 6
+        assert receiver.unrecovered_datagrams == 2
+        assert receiver.loss == loss
+        assert receiver.get_stats()["fec_loss_ppm"] == int(loss * 1e6)
+    finally:
+        receiver.close()
+        loop.close()
+
+
+def test_loss_is_reported():
+    sender, receiver, packets, _ = _pair()
+    reports = []
+    receiver._transmit = reports.append
+    sender.group_size = 2
+    for datagram in _datagrams(200):
+        sender.send(datagram)
+    # Lose a third of the packets
+    for i, packet in enumerate(packets):
+        if i % 3:
+            receiver.on_packet(packet)
+    assert reports
+    assert 0.2 < receiver.loss < 0.4
+    for report in reports:
+        sender.on_packet(report)
+    assert sender.reported_loss == pytest.approx(receiver.loss, abs=0.01)
+    sender.flush()
+    assert sender.group_size == MIN_GROUP_SIZE
+    # Told that nothing is lost, groups grow
+    sender.on_packet(fec._REPORT.pack(fec.KIND_REPORT, 0))
+    sender.send(b"x")
+    sender.flush()
+    assert sender.group_size == MAX_GROUP_SIZE
+    assert receiver.get_stats()["fec_loss_ppm"] == int(receiver.loss * 1e6)
+
+
+def test_tunnel_across_lossy_link():
+    link = Impairment(loss=0.05, seed=5)
+    with udp_socket(bind_port=0) as target:
+        server = FECtoUDP(0, ("localhost", target.getsockname()[1]))
+        impaired = ImpairedUDPtoUDP(
+            0, ("localhost", server.ext_sock.getsockname()[1]),
+            upstream=link, downstream=link)
+        client = UDPtoFEC(
+            0, ("localhost", impaired.ext_sock.getsockname()[1]))
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=run_proxies, args=([server, impaired, client], stop))
+        thread.start()
+        try:
+            with udp_socket(connect_address=(
+                    "localhost", client.ext_sock.getsockname()[1])) as host:
+                target.settimeout(0.5)
+                datagrams = _datagrams(200)
+                for datagram in datagrams:
+                    host.send(datagram)
+                    time.sleep(0.0005)
+                received = set()
+                try:
+                    while True:
+                        datagram, address = target.recvfrom(1000)
+                        received.add(datagram)
+                except socket.timeout:
+                    pass
+                # Far fewer lost than the link lost
+                assert len(received) >= 195
+                assert received <= set(datagrams)
+                # Replies come back through the tunnel
+                target.sendto(b"reply", address)
+                host.settimeout(2)
+                assert host.recv(100) == b"reply"
+        finally:
+            stop.set()
+            thread.join(2)
+    assert link.lost > 0
+    stats = server.get_stats()
+    assert stats["fec_recovered_datagrams"] > 0
+    assert stats["ext_to_int_packets"] == len(received)
+    assert client.get_stats()["fec_parity_packets"] > 0
+
+
+def test_full_size_datagrams():
+    with udp_socket(bind_port=0) as target:
+        server = FECtoUDP(0, ("localhost", target.getsockname()[1]))
+        client = UDPtoFEC(0, ("localhost", server.ext_sock.getsockname()[1]))
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=run_proxies, args=([server, client], stop))
+        thread.start()
+        try:
+            with udp_socket(connect_address=(
+                    "localhost", client.ext_sock.getsockname()[1])) as host:
+                # As large as the proxies' buffers, before the FEC header
+                request = bytes(range(256)) * (DEFAULT_BUFFER_SIZE // 256)
+                host.send(request)
+                target.settimeout(2)
+                datagram, address = target.recvfrom(2 * DEFAULT_BUFFER_SIZE)
+                assert datagram == request
+                target.sendto(request[::-1], address)
+                host.settimeout(2)
+                assert host.recv(2 * DEFAULT_BUFFER_SIZE) == request[::-1]
+        finally:
+            stop.set()
+            thread.join(2)
@@ -0,0 +1,194 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import time
+import pytest
+
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.impairment import (
+    MIN_RETRANSMIT_TIMEOUT, Impairment, ImpairedTCPRelay, ImpairedUDPtoUDP,
+    _parse_arguments)
+from spinnaker_proxy.support import tcp_socket, udp_socket
+from unittests import spin_until
+
+
+def _fates(impairment, count=1000, nbytes=100, reliable=False):
+    return [impairment.arrivals(nbytes, i * 0.001, reliable)
+            for i in range(count)]
+
+
+def test_perfect_link():
+    assert _fates(Impairment(), 3) == [[0.0], [0.001], [0.002]]
+
+
+def test_delay_and_bandwidth():
+    link = Impairment(delay=0.05, bandwidth=1000.0)
+    # Each 100 byte packet takes 0.1s to send, so they queue
+    assert link.arrivals(100, 0.0) == [pytest.approx(0.15)]
+    assert link.arrivals(100, 0.0) == [pytest.approx(0.25)]
+    assert link.arrivals(100, 1.0) == [pytest.approx(1.15)]
+
+
+def test_seeded_links_are_repeatable():
+    def make(seed):
+        return Impairment(delay=0.01, jitter=0.005, loss=0.1, reorder=0.1,
+                          duplicate=0.1, seed=seed)
+    assert _fates(make(1)) == _fates(make(1))
+    assert _fates(make(1)) != _fates(make(2))
+
+
+def test_loss_reorder_and_duplicate_rates():
+    link = Impairment(delay=0.01, loss=0.2, reorder=0.1, duplicate=0.05,
+                      seed=42)
+    fates = _fates(link, 10000)
+    assert sum(not f for f in fates) == link.lost
+    assert sum(len(f) == 2 for f in fates) == link.duplicated
+    assert 1800 < link.lost < 2200
+    assert 600 < link.reordered < 1000
+    assert 250 < link.duplicated < 550
+    assert link.get_stats("up_") == {
+        "up_lost": link.lost, "up_reordered": link.reordered,
+        "up_duplicated": link.duplicated}
+
+
+def test_jitter_keeps_order_but_reordering_overtakes():
+    arrivals = [f[0] for f in _fates(Impairment(
+        delay=0.05, jitter=0.04, seed=3))]
+    assert arrivals == sorted(arrivals)
+    assert 0.01 <= min(b - a for a, b in zip(
+        [i * 0.001 for i in range(1000)], arrivals))
+
+    arrivals = [f[0] for f in _fates(Impairment(
+        delay=0.05, reorder=0.1, seed=3))]
+    assert arrivals != sorted(arrivals)
+
+
+def test_reliable_link_resends_instead_of_losing():
+    link = Impairment(delay=0.01, loss=0.1, reorder=0.5, duplicate=0.5,
+                      seed=7)
+    fates = _fates(link, reliable=True)
+    assert all(len(f) == 1 for f in fates)
+    arrivals = [f[0] for f in fates]
+    assert arrivals == sorted(arrivals)
+    assert link.lost > 50
+    assert link.reordered == link.duplicated == 0
+    # Nothing arrives sooner than a lost packet's retransmission
+    assert max(arrivals) >= MIN_RETRANSMIT_TIMEOUT
+
+
+@pytest.mark.parametrize("settings", [
+    {"delay": -1}, {"loss": 1.5}, {"reorder": -0.1}, {"bandwidth": 0}])
+def test_bad_settings(settings):
+    with pytest.raises(ValueError):
+        Impairment(**settings)
+
+
+def test_impaired_udp():
+    board = udp_socket(bind_port=0)
+    board.settimeout(2)
+    loop = EventLoop()
+    proxy = ImpairedUDPtoUDP(
+        0, ("localhost", board.getsockname()[1]),
+        upstream=Impairment(delay=0.05, loss=0.5, seed=1),
+        downstream=Impairment(delay=0.05))
+    host = udp_socket(connect_address=(
+        "localhost", proxy.ext_sock.getsockname()[1]))
+    host.settimeout(2)
+    try:
+        proxy.attach(loop)
+        start = time.monotonic()
+        for i in range(20):
+            host.send(bytes([i]))
+        spin_until(loop, lambda: proxy.ext_to_int_packets == 20 - (
+            proxy.upstream.lost))
+        assert time.monotonic() - start >= 0.05
+        received = [board.recvfrom(10) for _ in range(
+            proxy.ext_to_int_packets)]
+        assert 0 < len(received) < 20
+        assert [d for d, _ in received] == sorted(d for d, _ in received)
+
+        start = time.monotonic()
+        board.sendto(b"reply", received[0][1])
+        spin_until(loop, lambda: proxy.int_to_ext_packets == 1)
+        assert host.recv(10) == b"reply"
+        assert time.monotonic() - start >= 0.05
+        stats = proxy.get_stats()
+        assert stats["ext_to_int_lost"] == 20 - len(received)
+        assert stats["int_to_ext_lost"] == 0
+    finally:
+        proxy.close()
+        loop.close()
+        board.close()
+        host.close()
+
+
+def test_impaired_tcp_relay():
+    server = tcp_socket(bind_port=0)
+    server.listen(1)
+    loop = EventLoop()
+    relay = ImpairedTCPRelay(
+        0, ("localhost", server.getsockname()[1]),
+        upstream=Impairment(delay=0.02, loss=0.2, seed=5),
+        downstream=Impairment(delay=0.02))
+    client = socket.create_connection(
+        ("localhost", relay.tcp_listen_sock.getsockname()[1]))
+    client.settimeout(2)
+    try:
+        relay.attach(loop)
+        spin_until(loop, lambda: relay.tcp_connections)
+        accepted, _ = server.accept()
+        accepted.settimeout(2)
+        message = bytes(range(256)) * 4
+        for i in range(0, len(message), 64):
+            client.send(message[i:i + 64])
+            loop.run_once(0.001)
+        spin_until(loop, lambda: relay.ext_to_int_bytes == len(message))
+        received = b""
+        while len(received) < len(message):
+            received += accepted.recv(4096)
+        # Everything arrives, in order, however much was "lost"
+        assert received == message
+
+        accepted.sendall(b"back")
+        spin_until(loop, lambda: relay.int_to_ext_bytes == 4)
+        assert client.recv(10) == b"back"
+
+        # Closing one end closes the other, once the close has crossed
+        client.close()
+        spin_until(loop, lambda: relay.get_select_handlers().keys() == {
+            relay.tcp_listen_sock})
+        assert accepted.recv(10) == b""
+        accepted.close()
+    finally:
+        relay.close()
+        loop.close()
+        server.close()
+        client.close()
+
+
+def test_arguments():
+    args = _parse_arguments([
+        "--udp", "17894:example.com:17894", "--tcp", "17895:localhost:80",
+        "--delay", "50", "--loss", "1", "--seed", "3"])
+    assert args.udp == [(17894, ("example.com", 17894))]
+    assert args.tcp == [(17895, ("localhost", 80))]
+    assert args.delay == 50
+    with pytest.raises(SystemExit):
+        _parse_arguments(["--udp", "17894"])
+    with pytest.raises(SystemExit):
+        _parse_arguments(["--delay", "10"])
+    with pytest.raises(SystemExit):
+        _parse_arguments(["--udp", "1:a:2", "--loss", "200"])
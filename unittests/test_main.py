@@ -13,7 +13,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import pytest
+from spinnaker_proxy.compression import CompressingDatagramProtocol
 import spinnaker_proxy.spinnaker_proxy as main
 import spinnaker_proxy.support as support
 # pylint: disable=protected-access, attribute-defined-outside-init
@@ -22,7 +24,7 @@ import spinnaker_proxy.support as support
 
 def test_argument_parsing():
     args = main._parse_arguments(["-s", "a"])
-    assert len(sorted(x for x in dir(args) if not x.startswith("_"))) == 10
+    assert len(sorted(x for x in dir(args) if not x.startswith("_"))) == 43
     assert args.server
     assert not args.client
     assert args.target == "a"
@@ -38,7 +40,38 @@ def test_argument_parsing():
     assert args.boot_tunnel_port == 17895
     assert not args.sdp_via_tcp
     assert not args.boot_via_tcp
+    assert not args.sdp_via_arq
+    assert not args.boot_via_arq
+    assert args.arq_queue_bytes == 1024 * 1024
     assert not args.quiet
+    assert args.metrics_port is None
+    assert not args.trace_scp
+    assert not args.boot_cache
+    assert args.boot_gap == 0
+    assert args.scp_window is None
+    assert not args.scp_dedup
+    assert not args.scp_cache
+    assert args.scp_cache_rule == []
+    assert args.bulk_port is None
+    assert args.tcp_high_watermark == 1024 * 1024
+    assert args.tcp_low_watermark is None
+    assert args.tcp_overflow == "pause"
+    assert not args.compress
+    assert not args.tcp_reconnect
+    assert args.tcp_replay_bytes == 256 * 1024
+    assert args.tcp_coalesce_us is None
+    assert args.tcp_coalesce_bytes == 16 * 1024
+    assert args.tcp_stripes == 1
+    assert args.tcp_stripe_policy == "least-queued"
+    assert args.udp_batch_size == 1
+    assert not args.fec
+    assert args.udp_max_sessions == 256
+    assert args.udp_session_timeout == 300.0
+    assert not args.multiplex
+    assert args.extra_port == []
+    assert args.mux_tunnel_port == 17896
+    assert args.config is None
+    assert args.workers == 1
 
     args = main._parse_arguments([
         "-q",
@@ -48,6 +81,17 @@ def test_argument_parsing():
         "--boot-tunnel-port", "13",
         "--sdp-via-tcp",
         "--boot-via-tcp",
+        "--tcp-high-watermark", "1000",
+        "--tcp-low-watermark", "100",
+        "--tcp-overflow", "drop",
+        "--udp-batch-size", "32",
+        "--udp-max-sessions", "4",
+        "--udp-session-timeout", "2.5",
+        "--multiplex",
+        "--extra-port", "17900",
+        "--extra-port", "17901",
+        "--mux-tunnel-port", "14",
+        "--workers", "4",
         "-c", "abc"])
     assert args.target == "abc"
     assert args.boot_port == 12
@@ -57,6 +101,16 @@ def test_argument_parsing():
     assert args.sdp_via_tcp is True
     assert args.boot_via_tcp is True
     assert args.quiet is True
+    assert args.tcp_high_watermark == 1000
+    assert args.tcp_low_watermark == 100
+    assert args.tcp_overflow == "drop"
+    assert args.udp_batch_size == 32
+    assert args.udp_max_sessions == 4
+    assert args.udp_session_timeout == 2.5
+    assert args.multiplex is True
+    assert args.extra_port == [17900, 17901]
+    assert args.mux_tunnel_port == 14
+    assert args.workers == 4
 
 
 def test_argument_errors(capsys):
@@ -79,33 +133,71 @@ def test_argument_errors(capsys):
         main._parse_arguments(["-h"])
     captured = capsys.readouterr()
     assert "usage:" in captured.out
-
-
-@pytest.fixture
-def do_not_connect():
-    """
-    Disables doing the TCP connection step; we don't want to have to care about
-    configuring dummy servers to receive connections here.
-    """
-    value = support._SKIP_TCP_CONNECT
-    support._SKIP_TCP_CONNECT = True
-    yield None
-    support._SKIP_TCP_CONNECT = value
+    # Verify that extra ports need (and fit in) a multiplexed tunnel
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "--extra-port", "17900", "a"])
+    captured = capsys.readouterr()
+    assert "--extra-port requires --multiplex" in captured.err
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "-m", "--extra-port", "1", "a"])
+    captured = capsys.readouterr()
+    assert "--extra-port must be greater than 1" in captured.err
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "--workers", "0", "a"])
+    captured = capsys.readouterr()
+    assert "--workers must be at least 1" in captured.err
+    # Verify that a topology file can stand in for the target, but must be
+    # valid
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-s", "--config", "/nonexistent.json"])
+    captured = capsys.readouterr()
+    assert "bad topology file /nonexistent.json" in captured.err
 
 
 class MockArgs():
     """ A mock of the arguments out of arg parsing
     """
-    def __init__(self, client, sdp, boot):
+    def __init__(self, client, sdp, boot, multiplex=False):
         self.client = client
         self.server = not client
         self.target = "localhost"
         self.sdp_via_tcp = sdp
         self.boot_via_tcp = boot
+        self.sdp_via_arq = False
+        self.boot_via_arq = False
+        self.arq_queue_bytes = 4096
         self.scp_port = 13530
         self.boot_port = 13531
         self.scp_tunnel_port = 13532
         self.boot_tunnel_port = 13533
+        self.tcp_high_watermark = 65536
+        self.tcp_low_watermark = None
+        self.tcp_overflow = "pause"
+        self.compress = False
+        self.tcp_reconnect = False
+        self.tcp_replay_bytes = 1024
+        self.tcp_coalesce_us = None
+        self.tcp_coalesce_bytes = 4096
+        self.tcp_stripes = 1
+        self.tcp_stripe_policy = "least-queued"
+        self.udp_batch_size = 8
+        self.fec = False
+        self.udp_max_sessions = 16
+        self.udp_session_timeout = 60.0
+        self.multiplex = multiplex
+        self.extra_port = [13535] if multiplex else []
+        self.mux_tunnel_port = 13534
+        self.config = None
+        self.trace_scp = True
+        self.scp_window = None
+        self.scp_dedup = False
+        self.scp_cache = False
+        self.scp_cache_rule = []
+        self.bulk_port = None
+        self.boot_gap = 0.0
+        self.boot_cache = False
+        self.boot_cache_dir = None
+        self.boot_cache_size = 1
 
 
 @pytest.mark.parametrize("client", [True, False])
@@ -114,6 +206,238 @@ class MockArgs():
 def test_proxy_construction(client, sdp, boot, do_not_connect):
     proxies = list(main._construct_proxies(MockArgs(client, sdp, boot)))
     assert len(proxies) == 2
+    # Only SCP is traced
+    assert [p.scp_latency is not None for p in proxies] == [True, False]
     for p in proxies:
         assert isinstance(p, support.DatagramProxy)
         p.close()
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_boot_cache_construction(client, tmp_path, do_not_connect):
+    args = MockArgs(client, False, True)
+    args.boot_cache = True
+    args.boot_cache_dir = str(tmp_path)
+    proxies = list(main._construct_proxies(args))
+    assert [type(p).__name__ for p in proxies] == [
+        "UDPtoUDP",
+        "BootCacheUDPtoTCP" if client else "BootCacheTCPtoUDP"]
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-s", "--boot-cache", "a"])
+
+
+@pytest.mark.parametrize("client", [True, False])
+@pytest.mark.parametrize("sdp", [True, False])
+def test_scp_window_construction(client, sdp, do_not_connect):
+    args = MockArgs(client, sdp, False)
+    args.scp_window = 4
+    proxies = list(main._construct_proxies(args))
+    # Only the server's SCP proxy limits the requests at the board
+    assert [p.scp_window is not None for p in proxies] == [not client, False]
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-s", "--scp-window", "0", "a"])
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_scp_dedup_construction(client, do_not_connect):
+    args = MockArgs(client, False, False)
+    args.scp_dedup = True
+    proxies = list(main._construct_proxies(args))
+    # Only the server's SCP proxy answers retries
+    assert [p.scp_dedup is not None for p in proxies] == [not client, False]
+    for p in proxies:
+        p.close()
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_scp_cache_construction(client, do_not_connect):
+    args = MockArgs(client, True, True)
+    args.scp_cache = True
+    proxies = list(main._construct_proxies(args))
+    # Only the client caches, and its boot traffic empties the cache
+    assert [p.scp_cache is not None for p in proxies] == [client, False]
+    if client:
+        assert proxies[1].on_boot == proxies[0].scp_cache.invalidate
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "--scp-cache-rule", "VER", "a"])
+    with pytest.raises(SystemExit):
+        main._parse_arguments(
+            ["-c", "--scp-cache", "--scp-cache-rule", "NOPE", "a"])
+
+
+def test_bulk_construction(do_not_connect):
+    args = MockArgs(False, False, False)
+    args.bulk_port = 0
+    proxies = list(main._construct_proxies(args))
+    assert [type(p).__name__ for p in proxies] == [
+        "UDPtoUDP", "UDPtoUDP", "BulkTCPtoUDP"]
+    assert proxies[2].name == "localhost/bulk"
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "--bulk-port", "1234", "a"])
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_compress_construction(client, do_not_connect):
+    args = MockArgs(client, True, False)
+    args.compress = True
+    proxies = list(main._construct_proxies(args))
+    # Only the TCP tunnel is compressed
+    assert [type(p).__name__ for p in proxies] == [
+        "UDPtoTCP" if client else "TCPtoUDP", "UDPtoUDP"]
+    if client:
+        assert isinstance(
+            proxies[0].tcp_protocol, CompressingDatagramProtocol)
+    else:
+        assert proxies[0].compress
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "--compress", "--multiplex", "a"])
+
+
+def test_reconnect_construction(do_not_connect):
+    args = MockArgs(True, True, True)
+    args.tcp_reconnect = True
+    proxies = list(main._construct_proxies(args))
+    assert [p.reconnect for p in proxies] == [True, True]
+    assert [p.replay_bytes for p in proxies] == [1024, 1024]
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-s", "--tcp-reconnect", "a"])
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_arq_construction(client):
+    args = MockArgs(client, False, False)
+    args.sdp_via_arq = True
+    args.boot_via_arq = True
+    proxies = list(main._construct_proxies(args))
+    assert [type(p).__name__ for p in proxies] == (
+        ["UDPtoARQ"] * 2 if client else ["ARQtoUDP"] * 2)
+    # Only boot packets are delivered in order
+    assert [p.ordered for p in proxies] == [False, True]
+    assert [p.queue_bytes for p in proxies] == [4096, 4096]
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "-T", "--sdp-via-arq", "a"])
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "-t", "--boot-via-arq", "a"])
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_coalesce_construction(client, do_not_connect):
+    args = MockArgs(client, True, True)
+    args.tcp_coalesce_us = 200
+    proxies = list(main._construct_proxies(args))
+    assert [p.coalesce_delay for p in proxies] == [pytest.approx(0.0002)] * 2
+    assert [p.coalesce_bytes for p in proxies] == [4096, 4096]
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "--tcp-coalesce-us", "-1", "a"])
+    with pytest.raises(SystemExit):
+        main._parse_arguments(
+            ["-c", "--tcp-coalesce-us", "200", "--multiplex", "a"])
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_striped_construction(client, do_not_connect):
+    args = MockArgs(client, True, True)
+    args.tcp_stripes = 3
+    args.tcp_stripe_policy = "round-robin"
+    proxies = list(main._construct_proxies(args))
+    assert [type(p).__name__ for p in proxies] == (
+        ["StripedUDPtoTCP"] * 2 if client else ["StripedTCPtoUDP"] * 2)
+    # Only boot packets are put back in order
+    assert [p.ordered for p in proxies] == [False, True]
+    assert [p.policy for p in proxies] == ["round-robin"] * 2
+    if client:
+        assert [len(p.stripes) for p in proxies] == [3, 3]
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "--tcp-stripes", "0", "a"])
+    with pytest.raises(SystemExit):
+        main._parse_arguments(
+            ["-c", "--tcp-stripes", "2", "--tcp-reconnect", "a"])
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_fec_construction(client, do_not_connect):
+    args = MockArgs(client, True, False)
+    args.fec = True
+    proxies = list(main._construct_proxies(args))
+    # Only the UDP tunnel has parity packets
+    assert [type(p).__name__ for p in proxies] == [
+        "UDPtoTCP" if client else "TCPtoUDP",
+        "UDPtoFEC" if client else "FECtoUDP"]
+    for p in proxies:
+        p.close()
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-c", "--fec", "--udp-batch-size", "8", "a"])
+
+
+def test_boot_gap_construction(do_not_connect):
+    args = MockArgs(False, False, True)
+    args.boot_gap = 10.0
+    proxies = list(main._construct_proxies(args))
+    assert proxies[1].udp_gap == pytest.approx(0.01)
+    for p in proxies:
+        p.close()
+
+
+@pytest.mark.parametrize("client", [True, False])
+def test_multiplexed_proxy_construction(client, do_not_connect):
+    proxies = list(main._construct_proxies(
+        MockArgs(client, False, False, multiplex=True)))
+    assert len(proxies) == 1
+    assert sorted(proxies[0].channels) == [
+        main.SCP_CHANNEL, main.BOOT_CHANNEL, 13535]
+    proxies[0].close()
+
+
+def test_topology_construction(tmp_path, do_not_connect):
+    path = tmp_path / "topology.json"
+    path.write_text(json.dumps({"boards": [
+        {"target": "localhost", "scp_tunnel_port": 0, "boot_tunnel_port": 0,
+         "boot": "tcp"},
+        {"target": "localhost", "scp_tunnel_port": 0, "boot_tunnel_port": 0},
+        {"target": "localhost", "multiplex": True, "mux_tunnel_port": 0},
+    ]}))
+    args = main._parse_arguments(["-s", "--config", str(path)])
+    assert args.target is None
+    proxies = list(main._construct_proxies(args))
+    assert [type(p).__name__ for p in proxies] == [
+        "UDPtoUDP", "TCPtoUDP", "UDPtoUDP", "UDPtoUDP", "MuxTCPtoUDP"]
+    # Proxies are named after their boards, for their metrics
+    assert [p.name for p in proxies] == [
+        "0/scp", "0/boot", "1/scp", "1/boot", "2/mux"]
+    for p in proxies:
+        p.close()
+
+    # Clashing ports are reported
+    path.write_text(json.dumps({"boards": [
+        {"target": "a", "scp_tunnel_port": 1},
+        {"target": "b", "scp_tunnel_port": 1}]}))
+    with pytest.raises(SystemExit):
+        main._parse_arguments(["-s", "--config", str(path)])
+
+
+def test_worker_proxy_construction(do_not_connect):
+    # UDP tunnels are in every worker; TCP ones in just one
+    args = MockArgs(False, False, True)
+    for worker, expected in ((0, ["UDPtoUDP", "TCPtoUDP"]), (1, ["UDPtoUDP"])):
+        proxies = list(main._construct_proxies(args, worker, workers=2))
+        assert [type(p).__name__ for p in proxies] == expected
+        for p in proxies:
+            p.close()
@@ -0,0 +1,132 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import pytest
+
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.metrics import (
+    MetricsServer, format_metrics, merge_proxy_latencies, merge_proxy_stats,
+    proxy_stats)
+from spinnaker_proxy.proxies import UDPtoUDP
+from spinnaker_proxy.scp import LatencyHistogram
+from spinnaker_proxy.support import udp_socket
+
+
+def test_format_metrics():
+    text = format_metrics(
+        {"b/scp": {"ext_to_int_packets": 3, "udp_sessions": 1},
+         'odd"name': {"ext_to_int_packets": 4}},
+        {"workers": 2})
+    assert text.split("\n") == [
+        "# TYPE spinnaker_proxy_workers gauge",
+        "spinnaker_proxy_workers 2",
+        "# TYPE spinnaker_proxy_ext_to_int_packets_total counter",
+        'spinnaker_proxy_ext_to_int_packets_total{proxy="b/scp"} 3',
+        'spinnaker_proxy_ext_to_int_packets_total{proxy="odd\\"name"} 4',
+        "# TYPE spinnaker_proxy_udp_sessions gauge",
+        'spinnaker_proxy_udp_sessions{proxy="b/scp"} 1',
+        "",
+    ]
+
+
+def test_format_latencies():
+    histogram = LatencyHistogram()
+    histogram.observe(0.0003)
+    histogram.observe(7.0)
+    lines = format_metrics({}, latencies={"b/scp": {2: histogram}}).split(
+        "\n")
+    name = "spinnaker_proxy_scp_latency_seconds"
+    labels = 'proxy="b/scp",command="READ"'
+    assert lines[0] == "# TYPE {} histogram".format(name)
+    assert '{}_bucket{{{},le="0.0002"}} 0'.format(name, labels) in lines
+    assert '{}_bucket{{{},le="0.0005"}} 1'.format(name, labels) in lines
+    assert '{}_bucket{{{},le="5"}} 1'.format(name, labels) in lines
+    assert '{}_bucket{{{},le="+Inf"}} 2'.format(name, labels) in lines
+    assert '{}_sum{{{}}} 7.0003'.format(name, labels) in lines
+    assert '{}_count{{{}}} 2'.format(name, labels) in lines
+
+    merged = merge_proxy_latencies([{"b/scp": {2: histogram}}] * 2)
+    assert merged["b/scp"][2].count == 4
+    # Merging does not change what was merged
+    assert histogram.count == 2
+
+
+def test_merge_proxy_stats():
+    assert merge_proxy_stats([
+        {"a": {"x": 1, "y": 2}, "b": {"x": 5}},
+        {"a": {"x": 3}},
+    ]) == {"a": {"x": 4, "y": 2}, "b": {"x": 5}}
+    # Estimates and settings are not added up
+    assert merge_proxy_stats([
+        {"a": {"arq_srtt_usec": 300, "arq_in_flight": 2}},
+        {"a": {"arq_srtt_usec": 500, "arq_in_flight": 3}},
+        {"a": {"arq_srtt_usec": 400}},
+    ]) == {"a": {"arq_srtt_usec": 500, "arq_in_flight": 5}}
+
+
+@pytest.mark.parametrize("batch_size", [1, 8])
+def test_udp_counters_served(batch_size):
+    loop = EventLoop()
+    with udp_socket(bind_port=0) as board:
+        board.settimeout(2)
+        proxy = UDPtoUDP(0, ("localhost", board.getsockname()[1]),
+                         batch_size=batch_size)
+        proxy.name = "board/scp"
+        unnamed = UDPtoUDP(0, ("localhost", board.getsockname()[1]))
+        proxies = [proxy, unnamed]
+        server = MetricsServer(0, partial(proxy_stats, proxies))
+        server.start()
+        try:
+            proxy.attach(loop)
+            address = ("localhost", proxy.ext_sock.getsockname()[1])
+            with udp_socket(connect_address=address) as host:
+                host.settimeout(2)
+                host.send(b"hello")
+                host.send(b"hi")
+                for _ in range(5):
+                    loop.run_once(0.1)
+                for expected in (b"hello", b"hi"):
+                    datagram, reply_to = board.recvfrom(32)
+                    assert datagram == expected
+                board.sendto(b"yes", reply_to)
+                loop.run_once(2)
+                assert host.recv(32) == b"yes"
+
+            url = "http://127.0.0.1:{}/metrics".format(server.port)
+            with urlopen(url, timeout=5) as response:
+                assert response.headers["Content-Type"].startswith(
+                    "text/plain")
+                lines = response.read().decode("utf-8").split("\n")
+            for line in [
+                    'spinnaker_proxy_ext_to_int_packets_total'
+                    '{proxy="board/scp"} 2',
+                    'spinnaker_proxy_ext_to_int_bytes_total'
+                    '{proxy="board/scp"} 7',
+                    'spinnaker_proxy_int_to_ext_packets_total'
+                    '{proxy="board/scp"} 1',
+                    'spinnaker_proxy_udp_sessions{proxy="board/scp"} 1',
+                    'spinnaker_proxy_udp_sessions{proxy="UDPtoUDP-1"} 0']:
+                assert line in lines
+
+            with pytest.raises(HTTPError):
+                urlopen(url.replace("metrics", "other"), timeout=5)
+        finally:
+            server.close()
+            for p in proxies:
+                p.close()
+            loop.close()
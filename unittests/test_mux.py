@@ -0,0 +1,88 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+from spinnaker_proxy.proxies import MuxTCPtoUDP, MuxUDPtoTCP
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import tcp_socket, udp_socket
+from unittests import wait_for
+from .test_proxy_chain import Runner
+
+
+def _port(sock):
+    return sock.getsockname()[1]
+
+
+def test_multiplexed_chain():
+    # Two "board" ports, carried over one TCP connection
+    with udp_socket(bind_port=0) as scp, udp_socket(bind_port=0) as boot:
+        scp.settimeout(2)
+        boot.settimeout(2)
+        server = MuxTCPtoUDP(0, {
+            0: ("localhost", _port(scp)),
+            1: ("localhost", _port(boot))})
+        client = MuxUDPtoTCP(
+            {0: 0, 1: 0}, ("localhost", _port(server.tcp_listen_sock)))
+        scp_port = _port(client.channels[0].udp_sock)
+        boot_port = _port(client.channels[1].udp_sock)
+        with Runner(partial(run_proxies, [server, client])):
+            with udp_socket(connect_address=("localhost", scp_port)) as s, \
+                    udp_socket(connect_address=("localhost", boot_port)) as b:
+                s.settimeout(2)
+                b.settimeout(2)
+                b.send(b"boot 1")
+                s.send(b"scp 1")
+                b.send(b"boot 2")
+                assert boot.recvfrom(32)[0] == b"boot 1"
+                m, scp_address = scp.recvfrom(32)
+                assert m == b"scp 1"
+                m, boot_address = boot.recvfrom(32)
+                assert m == b"boot 2"
+
+                # Replies come back on the right channels
+                boot.sendto(b"boot reply", boot_address)
+                scp.sendto(b"scp reply", scp_address)
+                assert s.recv(32) == b"scp reply"
+                assert b.recv(32) == b"boot reply"
+                stats = client.get_stats()
+                assert stats["tcp_dropped_datagrams"] == 0
+                assert stats["udp_to_tcp_packets"] == 3
+                assert stats["udp_to_tcp_bytes"] == 17
+                assert stats["tcp_connections"] == 1
+                stats = server.get_stats()
+                assert stats["udp_to_tcp_packets"] == 2
+                assert stats["tcp_connections"] == 1
+
+
+def test_forward_from_every_channel():
+    with tcp_socket(bind_port=0) as listener:
+        listener.listen(1)
+        client = MuxUDPtoTCP({0: 0, 1: 0}, ("localhost", _port(listener)))
+        scp_port = _port(client.channels[0].udp_sock)
+        boot_port = _port(client.channels[1].udp_sock)
+
+        def forwarded():
+            client.udp_to_tcp()
+            return client.udp_to_tcp_packets == 2
+        try:
+            with udp_socket(connect_address=("localhost", scp_port)) as s, \
+                    udp_socket(connect_address=("localhost", boot_port)) as b:
+                s.send(b"scp")
+                b.send(b"boot")
+                # Without an event loop, every channel is read together
+                wait_for(forwarded)
+        finally:
+            client.close()
@@ -0,0 +1,279 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import threading
+import time
+import pytest
+
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.proxies import UDPtoTCP
+from spinnaker_proxy.support import (
+    FairOutputQueue, MuxDatagramProtocol, OutputQueue, TCPDatagramProtocol,
+    tcp_socket, udp_socket)
+from unittests import spin_until
+# pylint: disable=protected-access
+
+DATAGRAM_SIZE = 1000
+COUNT = 60
+
+
+def test_watermark_validation():
+    q = OutputQueue(1000)
+    assert q.low_watermark == 250
+    with pytest.raises(ValueError):
+        OutputQueue(100, 200)
+
+
+def test_partial_flush_keeps_stream_intact():
+    a, b = socket.socketpair()
+    with a, b:
+        a.setblocking(False)
+        a.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        protocol = TCPDatagramProtocol()
+        q = OutputQueue(1 << 30)
+        datagrams = [bytes([i % 256]) * DATAGRAM_SIZE for i in range(COUNT)]
+        for d in datagrams:
+            q.push(protocol.encode(d))
+        # The socket can't take it all at once
+        assert not q.flush(a)
+        assert 0 < q.queued_bytes < COUNT * (DATAGRAM_SIZE + 4)
+
+        received = []
+        while len(received) < COUNT:
+            q.flush(a)
+            protocol.recv_into(b, 65536)
+            received.extend(bytes(f) for f in protocol.frames())
+        assert received == datagrams
+        assert q.queued_bytes == 0
+
+
+def test_fair_queue_interleaves_channels():
+    a, b = socket.socketpair()
+    with a, b:
+        protocol = MuxDatagramProtocol()
+        q = FairOutputQueue(1 << 20, 0)
+        for i in range(COUNT):
+            q.push(protocol.encode(b"bulk", 1), 1)
+        assert q.channel_is_full(1) is False
+        assert q.channel_is_drained(0)
+        q.push(protocol.encode(b"urgent", 0), 0)
+        q.flush(a)
+        received = []
+        while len(received) < COUNT + 1:
+            protocol.recv_into(b, 65536)
+            received.extend((c, bytes(f)) for c, f in protocol.frames())
+        # The one datagram on the quiet channel is not held up behind all
+        # of those on the busy one
+        assert received.index((0, b"urgent")) <= 1
+        assert received.count((1, b"bulk")) == COUNT
+        assert q.queued_bytes == 0
+
+
+def test_fair_queue_watermarks_per_channel():
+    protocol = MuxDatagramProtocol()
+    q = FairOutputQueue(100, 50)
+    q.push(protocol.encode(bytes(100), 1), 1)
+    assert q.channel_is_full(1)
+    assert not q.channel_is_full(0)
+    q.clear()
+    assert q.channel_is_drained(1)
+    assert q.dropped_bytes == 106
+
+
+class _Fixture(object):
+    """ A UDPtoTCP proxy whose TCP peer does not read until told to.
+    """
+
+    def __init__(self, overflow, **kwargs):
+        self.listener = tcp_socket(bind_port=0)
+        self.listener.listen(1)
+        self.loop = EventLoop()
+        self.proxy = UDPtoTCP(
+            0, ("localhost", self.listener.getsockname()[1]),
+            high_watermark=4096, low_watermark=1024, overflow=overflow,
+            **kwargs)
+        self.proxy.tcp_sock.setsockopt(
+            socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        self.proxy.attach(self.loop)
+        self.peer, _ = self.listener.accept()
+        self.peer.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.host = udp_socket(connect_address=(
+            "localhost", self.proxy.udp_sock.getsockname()[1]))
+        self.host.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+
+    def send(self, count, size=DATAGRAM_SIZE):
+        for i in range(count):
+            self.host.send(bytes([i % 256]) * size)
+
+    def spin(self, times=200):
+        for _ in range(times):
+            self.loop.run_once(0)
+
+    def spin_until(self, condition):
+        spin_until(self.loop, condition, timeout=1.0, interval=0.001)
+
+    def drain_peer(self, count):
+        protocol = TCPDatagramProtocol()
+        received = []
+        self.peer.settimeout(1)
+        while len(received) < count:
+            protocol.recv_into(self.peer, 65536)
+            received.extend(bytes(f) for f in protocol.frames())
+        return received
+
+    def close(self):
+        self.proxy.close()
+        self.loop.close()
+        for s in (self.peer, self.listener, self.host):
+            s.close()
+
+
+def test_drop_when_full():
+    f = _Fixture("drop")
+    try:
+        f.send(COUNT)
+        f.spin()
+        stats = f.proxy.get_stats()
+        assert stats["tcp_dropped_datagrams"] > 0
+        assert stats["tcp_dropped_bytes"] == \
+            stats["tcp_dropped_datagrams"] * DATAGRAM_SIZE
+        assert stats["tcp_queued_bytes"] <= 4096 + DATAGRAM_SIZE + 4
+        # The UDP side is never paused under this policy
+        assert f.loop._handlers[f.proxy.udp_sock][0] is not None
+    finally:
+        f.close()
+
+
+def test_pause_when_full():
+    f = _Fixture("pause")
+    try:
+        f.send(COUNT)
+        f.spin()
+        assert f.proxy.tcp_queue.is_full
+        assert f.proxy._paused
+        assert f.loop._handlers[f.proxy.udp_sock][0] is None
+        assert f.proxy.get_stats()["tcp_dropped_datagrams"] == 0
+
+        # Let the peer read; everything sent (that the kernel kept) arrives
+        # in order and intact, and reading resumes
+        received = []
+        reader = threading.Thread(
+            target=lambda: received.extend(f.drain_peer(COUNT)))
+        reader.start()
+        while reader.is_alive():
+            f.spin(1)
+        assert not f.proxy._paused
+        assert received == [
+            bytes([i % 256]) * DATAGRAM_SIZE for i in range(COUNT)]
+    finally:
+        f.close()
+
+
+def test_block_when_full():
+    f = _Fixture("block")
+    try:
+        received = []
+        reader = threading.Thread(
+            target=lambda: received.extend(f.drain_peer(COUNT)))
+        reader.start()
+        f.send(COUNT)
+        while reader.is_alive():
+            f.spin(1)
+        assert f.proxy.get_stats()["tcp_dropped_datagrams"] == 0
+        assert received == [
+            bytes([i % 256]) * DATAGRAM_SIZE for i in range(COUNT)]
+    finally:
+        f.close()
+
+
+def test_nagle_is_off():
+    with tcp_socket(bind_port=0) as listener:
+        listener.listen(1)
+        with tcp_socket(connect_address=(
+                "localhost", listener.getsockname()[1])) as client:
+            server, _ = listener.accept()
+            with server:
+                for sock in (client, server):
+                    assert sock.getsockopt(
+                        socket.IPPROTO_TCP, socket.TCP_NODELAY)
+
+
+def test_coalesced_writes():
+    f = _Fixture("pause", coalesce_delay=0.05)
+    try:
+        # After a quiet spell, written without waiting
+        f.send(1, 100)
+        f.spin_until(lambda: f.proxy.get_stats()["tcp_writes"] == 1)
+        f.send(10, 100)
+        f.spin_until(lambda: f.proxy.udp_to_tcp_packets == 11)
+        # Held back, until the delay since the last write is up
+        assert f.proxy.get_stats()["tcp_writes"] == 1
+        assert f.proxy.tcp_queue.queued_bytes == 10 * 104
+        f.spin_until(lambda: f.proxy.tcp_queue.queued_bytes == 0)
+        assert f.proxy.get_stats()["tcp_writes"] == 2
+        assert f.drain_peer(11) == [bytes([0]) * 100] + [
+            bytes([i]) * 100 for i in range(10)]
+    finally:
+        f.close()
+
+
+def test_coalesced_writes_hold_is_kept():
+    # Shorter than the selector's timeout can express
+    hold = 0.0005
+    f = _Fixture("pause", coalesce_delay=hold)
+    try:
+        latencies = []
+        for i in range(20):
+            f.send(1, 100)
+            f.spin_until(lambda: f.proxy.tcp_queue.queued_bytes == 0)
+            # Follows a write, so is held back
+            writes = f.proxy.get_stats()["tcp_writes"]
+            sent = time.monotonic()
+            f.send(1, 100)
+            f.spin_until(
+                lambda: f.proxy.get_stats()["tcp_writes"] > writes)
+            latencies.append(time.monotonic() - sent)
+            f.drain_peer(2)
+        assert sorted(latencies)[10] <= hold
+    finally:
+        f.close()
+
+
+def test_coalesced_writes_byte_budget():
+    f = _Fixture("pause", coalesce_delay=10.0, coalesce_bytes=500)
+    try:
+        f.send(1, 100)
+        f.spin_until(lambda: f.proxy.get_stats()["tcp_writes"] == 1)
+        f.send(10, 100)
+        f.spin_until(lambda: f.proxy.udp_to_tcp_packets == 11)
+        # Written five at a time, without waiting
+        assert f.proxy.get_stats()["tcp_writes"] == 3
+        assert len(f.drain_peer(11)) == 11
+    finally:
+        f.close()
+
+
+def test_coalesced_writes_per_pass():
+    f = _Fixture("pause", coalesce_delay=0)
+    try:
+        f.send(10, 100)
+        f.spin_until(lambda: f.proxy.udp_to_tcp_packets == 10)
+        # All that was waiting is read in one pass, and written at its end
+        assert f.proxy.tcp_queue.queued_bytes == 0
+        assert f.proxy.get_stats()["tcp_writes"] == 1
+        assert f.drain_peer(10) == [bytes([i]) * 100 for i in range(10)]
+    finally:
+        f.close()
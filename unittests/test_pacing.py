@@ -0,0 +1,134 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import time
+
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.proxies import TCPtoUDP
+from spinnaker_proxy.support import Pacer, TCPDatagramProtocol, udp_socket
+from unittests import spin_until
+# pylint: disable=protected-access
+
+GAP = 0.005
+
+
+def test_pacer_spaces_calls():
+    loop = EventLoop()
+    times = []
+    drained = []
+    pacer = Pacer(loop, GAP, high_watermark=300,
+                  on_drained=lambda: drained.append(True))
+    try:
+        start = time.monotonic()
+        for _ in range(10):
+            pacer.call(lambda: times.append(time.monotonic()), 100)
+        # The first call is made at once; the others wait their turn
+        assert len(times) == 1
+        assert pacer.is_full and pacer.queued_bytes == 900
+        spin_until(loop, lambda: len(times) == 10)
+        assert len(times) == 10
+        assert pacer.queued_bytes == 0
+        assert drained == [True]
+        # Each call is made no sooner than a gap after the one before was due
+        assert all(t - start >= i * GAP for i, t in enumerate(times))
+
+        # After a pause, the next call is made at once
+        time.sleep(2 * GAP)
+        pacer.call(lambda: times.append(time.monotonic()))
+        assert len(times) == 11
+
+        pacer.call(lambda: times.append(time.monotonic()))
+        pacer.clear()
+        loop.run_once(2 * GAP)
+        assert len(times) == 11
+    finally:
+        loop.close()
+
+
+def test_pacer_sub_millisecond_gap():
+    # Finer than the selector's timeout, so the timers must not oversleep
+    gap = 0.0002
+    loop = EventLoop()
+    times = []
+    pacer = Pacer(loop, gap)
+    try:
+        start = time.monotonic()
+        for _ in range(100):
+            pacer.call(lambda: times.append(time.monotonic()))
+        spin_until(loop, lambda: len(times) == 100)
+        assert len(times) == 100
+        assert all(t - start >= i * gap for i, t in enumerate(times))
+        spacing = (times[-1] - start) / 99
+        assert spacing < 2 * gap
+    finally:
+        loop.close()
+
+
+def test_paced_tcp_to_udp():
+    board = udp_socket(bind_port=0)
+    board.settimeout(2)
+    loop = EventLoop()
+    proxy = TCPtoUDP(0, ("localhost", board.getsockname()[1]), udp_gap=GAP)
+    proxy.attach(loop)
+    client = socket.create_connection(
+        ("localhost", proxy.tcp_listen_sock.getsockname()[1]))
+    try:
+        spin_until(loop, lambda: proxy.tcp_sock is not None)
+        protocol = TCPDatagramProtocol()
+        client.sendall(b"".join(
+            protocol.send(bytes([i]) * 100) for i in range(20)))
+        spin_until(loop, lambda: proxy.get_stats()["udp_paced_bytes"])
+        assert proxy.tcp_to_udp_packets < 20
+        start = time.monotonic()
+        spin_until(loop, lambda: proxy.tcp_to_udp_packets == 20)
+        assert time.monotonic() - start >= 15 * GAP
+        assert [board.recv(200) for _ in range(20)] == [
+            bytes([i]) * 100 for i in range(20)]
+        assert proxy.get_stats()["udp_paced_bytes"] == 0
+    finally:
+        proxy.close()
+        loop.close()
+        board.close()
+        client.close()
+
+
+def test_pacing_holds_back_tcp():
+    board = udp_socket(bind_port=0)
+    board.settimeout(2)
+    loop = EventLoop()
+    proxy = TCPtoUDP(0, ("localhost", board.getsockname()[1]), udp_gap=GAP,
+                     bufsize=1000)
+    proxy.attach(loop)
+    proxy._pacer.high_watermark = 500
+    client = socket.create_connection(
+        ("localhost", proxy.tcp_listen_sock.getsockname()[1]))
+    try:
+        spin_until(loop, lambda: proxy.tcp_sock is not None)
+        protocol = TCPDatagramProtocol()
+        client.sendall(b"".join(
+            protocol.send(bytes([i]) * 100) for i in range(30)))
+        spin_until(loop, lambda: proxy._pacer.is_full)
+        # While full, the TCP connection is not read
+        assert loop._handlers[proxy.tcp_sock][0] is None
+        spin_until(loop, lambda: proxy.tcp_to_udp_packets == 30)
+        assert [board.recv(200) for _ in range(30)] == [
+            bytes([i]) * 100 for i in range(30)]
+        assert loop._handlers[proxy.tcp_sock][0] is not None
+    finally:
+        proxy.close()
+        loop.close()
+        board.close()
+        client.close()
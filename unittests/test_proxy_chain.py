@@ -14,13 +14,19 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from functools import partial
+import socket
 import struct
 import threading
+import time
 import pytest
 
-from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP, UDPtoUDP
+from spinnaker_proxy.arq import ARQtoUDP, UDPtoARQ
+from spinnaker_proxy.fec import FECtoUDP, UDPtoFEC
+from spinnaker_proxy.proxies import MuxTCPtoUDP, TCPtoUDP, UDPtoTCP, UDPtoUDP
 from spinnaker_proxy.spinnaker_proxy import run_proxies
-from spinnaker_proxy.support import tcp_socket, udp_socket
+from spinnaker_proxy.support import (
+    MuxDatagramProtocol, TCPDatagramProtocol, tcp_socket, udp_socket)
+from unittests import wait_for
 # pylint: disable=redefined-outer-name
 
 # We're using 4 byte messages to test with
@@ -129,3 +135,97 @@ def test_proxy_chain():
                 # Check that we can sling a non-4-byte message too
                 r.sendto(b"OK", a)
                 assert s.recv(32) == b'OK'
+
+
+def _reset(sock):
+    """ Close a TCP socket abortively, so that its peer sees a reset.
+    """
+    sock.setsockopt(
+        socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    sock.close()
+
+
+@pytest.mark.parametrize("multiplex", [False, True])
+def test_reset_tunnel_spares_other_boards(multiplex):
+    with udp_socket(bind_port=0) as board_a, \
+            udp_socket(bind_port=0) as board_b:
+        board_a.settimeout(2)
+        board_b.settimeout(2)
+        if multiplex:
+            protocol = MuxDatagramProtocol()
+            proxy_a = MuxTCPtoUDP(
+                0, {0: ("localhost", board_a.getsockname()[1])})
+        else:
+            protocol = TCPDatagramProtocol()
+            proxy_a = TCPtoUDP(0, ("localhost", board_a.getsockname()[1]))
+        proxy_b = TCPtoUDP(0, ("localhost", board_b.getsockname()[1]))
+        port_a = proxy_a.tcp_listen_sock.getsockname()[1]
+        port_b = proxy_b.tcp_listen_sock.getsockname()[1]
+        with Runner(partial(run_proxies, [proxy_a, proxy_b])):
+            with tcp_socket(connect_address=("localhost", port_b)) as b:
+                client = tcp_socket(connect_address=("localhost", port_a))
+                client.sendall(b"".join(protocol.encode(b"before")))
+                assert board_a.recv(32) == b"before"
+                _reset(client)
+                # The board's proxy takes a new connection...
+                with tcp_socket(
+                        connect_address=("localhost", port_a)) as client:
+                    client.sendall(b"".join(protocol.encode(b"after")))
+                    assert board_a.recv(32) == b"after"
+                # ... and the other board's is untouched
+                b.sendall(TCP_FORMAT.pack(4, 1, 2, 3, 4))
+                assert UDP_FORMAT.unpack(board_b.recv(32)) == (1, 2, 3, 4)
+
+
+@pytest.mark.parametrize("kind", ["udp", "tcp", "mux", "fec", "arq"])
+def test_refusing_board_spares_other_boards(kind):
+    with udp_socket(bind_port=0) as closed:
+        # Nothing listens here once closed, so the host answers with ICMP
+        refusing = ("localhost", closed.getsockname()[1])
+    with udp_socket(bind_port=0) as board_b:
+        board_b.settimeout(2)
+        # Where datagrams for the board go in (if not over TCP); tunnels
+        # are reached through their proxy clients
+        entry = None
+        clients = []
+        if kind == "udp":
+            proxy_a = UDPtoUDP(0, refusing)
+            entry = proxy_a.ext_sock
+        elif kind == "tcp":
+            proxy_a = TCPtoUDP(0, refusing)
+        elif kind == "mux":
+            proxy_a = MuxTCPtoUDP(0, {0: refusing})
+        elif kind == "fec":
+            proxy_a = FECtoUDP(0, refusing)
+            clients.append(UDPtoFEC(0, (
+                "localhost", proxy_a.ext_sock.getsockname()[1])))
+            entry = clients[0].ext_sock
+        else:
+            proxy_a = ARQtoUDP(0, refusing)
+            clients.append(UDPtoARQ(0, (
+                "localhost", proxy_a.arq_sock.getsockname()[1])))
+            entry = clients[0].udp_sock
+        proxy_b = UDPtoUDP(0, ("localhost", board_b.getsockname()[1]))
+        with Runner(partial(
+                run_proxies, [proxy_a, proxy_b] + clients)), \
+                udp_socket(connect_address=(
+                    "localhost", proxy_b.ext_sock.getsockname()[1])) as b:
+            if entry is not None:
+                a = udp_socket(connect_address=(
+                    "localhost", entry.getsockname()[1]))
+                send = a.send
+            else:
+                a = tcp_socket(connect_address=(
+                    "localhost", proxy_a.tcp_listen_sock.getsockname()[1]))
+                protocol = MuxDatagramProtocol() if kind == "mux" \
+                    else TCPDatagramProtocol()
+                send = (lambda data: a.sendall(
+                    b"".join(protocol.encode(data))))
+            with a:
+                for _ in range(5):
+                    send(b"hello")
+                    time.sleep(0.01)
+                wait_for(lambda: proxy_a.get_stats()["udp_errors"])
+                # The other board's proxy is still running
+                b.send(b"still there")
+                assert board_b.recv(32) == b"still there"
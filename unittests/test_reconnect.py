@@ -0,0 +1,153 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import threading
+
+from spinnaker_proxy.proxies import UDPtoTCP
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import (
+    TCPDatagramProtocol, tcp_socket, udp_socket)
+from unittests import wait_for
+
+
+def _receive(sock, count):
+    protocol = TCPDatagramProtocol()
+    received = []
+    while len(received) < count:
+        received += [bytes(d) for d in protocol.recv(sock.recv(4096))]
+    return received
+
+
+def _start(proxy):
+    stop = threading.Event()
+    thread = threading.Thread(target=run_proxies, args=([proxy], stop))
+    thread.start()
+    return stop, thread
+
+
+def test_reconnect_and_replay():
+    listener = tcp_socket(bind_port=0)
+    listener.listen(1)
+    port = listener.getsockname()[1]
+    proxy = UDPtoTCP(0, ("localhost", port), reconnect=True,
+                     min_backoff=0.01)
+    stop, thread = _start(proxy)
+    try:
+        with udp_socket(connect_address=(
+                "localhost", proxy.udp_sock.getsockname()[1])) as host:
+            server, _ = listener.accept()
+            server.settimeout(2)
+            host.send(b"one")
+            assert _receive(server, 1) == [b"one"]
+
+            # The server goes away altogether for a while
+            server.close()
+            listener.close()
+            wait_for(lambda: proxy.tcp_connect_failures >= 2)
+            for datagram in (b"two", b"three"):
+                host.send(datagram)
+            wait_for(lambda: proxy.replay_queued_bytes == 8)
+            assert not proxy.get_stats()["tcp_connected"]
+
+            listener = tcp_socket(bind_port=port)
+            listener.listen(1)
+            server, _ = listener.accept()
+            server.settimeout(2)
+            assert _receive(server, 2) == [b"two", b"three"]
+            server.send(b"\0\0\0\x04four")
+            host.settimeout(2)
+            assert host.recv(100) == b"four"
+            server.close()
+    finally:
+        stop.set()
+        thread.join(2)
+        listener.close()
+    assert proxy.tcp_connections >= 2
+    assert proxy.replayed_datagrams == 2
+    assert proxy.tcp_outage_usec > 0
+
+
+def test_replay_is_bounded():
+    listener = tcp_socket(bind_port=0)
+    listener.listen(1)
+    proxy = UDPtoTCP(0, ("localhost", listener.getsockname()[1]),
+                     reconnect=True, replay_bytes=10, min_backoff=10)
+    stop, thread = _start(proxy)
+    try:
+        with udp_socket(connect_address=(
+                "localhost", proxy.udp_sock.getsockname()[1])) as host:
+            server, _ = listener.accept()
+            listener.close()
+            server.close()
+            wait_for(lambda: proxy.tcp_connect_failures == 1)
+            for datagram in (b"1234", b"5678", b"90ab"):
+                host.send(datagram)
+            # The oldest is dropped to make room
+            wait_for(lambda: proxy.replay_dropped_datagrams == 1)
+            assert list(proxy._replay) == [b"5678", b"90ab"]
+    finally:
+        stop.set()
+        thread.join(2)
+
+
+def test_no_reconnect():
+    listener = tcp_socket(bind_port=0)
+    listener.listen(1)
+    proxy = UDPtoTCP(0, ("localhost", listener.getsockname()[1]))
+    stop, thread = _start(proxy)
+    try:
+        server, _ = listener.accept()
+        server.close()
+        # The proxy closes, and so stops the loop
+        thread.join(2)
+        assert not thread.is_alive()
+        assert proxy.udp_sock is None
+    finally:
+        stop.set()
+        thread.join(2)
+        listener.close()
+
+
+class _RecordingSocket(socket.socket):
+    """ A socket that records where it is asked to connect to.
+    """
+    addresses = []
+
+    def connect_ex(self, address):
+        self.addresses.append(address)
+        return super(_RecordingSocket, self).connect_ex(address)
+
+
+def test_reconnect_does_not_look_up_server(monkeypatch):
+    listener = tcp_socket(bind_port=0)
+    listener.listen(1)
+    port = listener.getsockname()[1]
+    proxy = UDPtoTCP(0, ("localhost", port), reconnect=True, min_backoff=0.01)
+    monkeypatch.setattr(
+        "spinnaker_proxy.proxies.tcp_socket",
+        lambda: _RecordingSocket(socket.AF_INET, socket.SOCK_STREAM))
+    stop, thread = _start(proxy)
+    try:
+        server, _ = listener.accept()
+        server.close()
+        server, _ = listener.accept()
+        server.close()
+    finally:
+        stop.set()
+        thread.join(2)
+        listener.close()
+    # The name was looked up when the proxy was made, and not again
+    assert _RecordingSocket.addresses[0] == ("127.0.0.1", port)
@@ -0,0 +1,400 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import struct
+import time
+import pytest
+
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.proxies import TCPtoUDP, UDPtoTCP, UDPtoUDP
+from spinnaker_proxy.scp import (
+    CacheRule, LatencyHistogram, SCPDeduplicator, SCPLatencyTracker,
+    SCPResponseCache, SCPWindow, parse_cache_rule, parse_header,
+    summarise_latencies)
+from spinnaker_proxy.support import TCPDatagramProtocol, udp_socket
+from unittests import spin_until
+
+READ = 2
+WRITE = 3
+
+
+def scp(command, seq, flags=0x87, data=b""):
+    """ Make an SCP packet, as sent over UDP.
+    """
+    return struct.pack("<2xB7xHH", flags, command, seq) + data
+
+
+def test_parse_header():
+    assert parse_header(scp(READ, 1234, data=b"args")) == (0x87, READ, 1234)
+    assert parse_header(b"short") is None
+
+
+def test_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+    for latency in (0.00005, 0.0003, 0.0003, 0.0003, 10.0):
+        histogram.observe(latency)
+    assert histogram.count == 5
+    assert histogram.quantile(0.5) == 0.0005
+    assert histogram.quantile(0.99) == float("inf")
+    other = LatencyHistogram()
+    other.observe(0.0003)
+    histogram.merge(other)
+    assert histogram.count == 6
+    assert histogram.total == pytest.approx(10.00125)
+
+
+def test_requests_matched_to_responses():
+    tracker = SCPLatencyTracker()
+    tracker.request(scp(READ, 1), "a", now=10.0)
+    tracker.request(scp(READ, 1), "b", now=10.5)
+    tracker.request(scp(WRITE, 2), "a", now=11.0)
+    # A retransmission is timed from the first attempt
+    tracker.request(scp(WRITE, 2), "a", now=11.5)
+    # No reply expected, so not tracked
+    tracker.request(scp(READ, 3, flags=0x07), "a", now=12.0)
+
+    tracker.response(scp(0x80, 1), "b", now=10.5015)
+    tracker.response(scp(0x80, 1), "a", now=10.015)
+    tracker.response(scp(0x83, 2), "a", now=12.5)
+    tracker.response(scp(0x80, 3), "a", now=12.6)
+    assert tracker.get_stats() == {
+        "scp_requests": 4,
+        "scp_retransmits": 1,
+        "scp_responses": 3,
+        "scp_errors": 1,
+        "scp_unmatched_responses": 1,
+        "scp_abandoned_requests": 0,
+        "scp_pending_requests": 0,
+    }
+    assert tracker.histograms[READ].count == 2
+    assert tracker.histograms[READ].quantile(0.5) == 0.002
+    assert tracker.histograms[READ].quantile(1) == 0.02
+    assert tracker.histograms[WRITE].quantile(1) == 2.0
+    assert summarise_latencies(tracker.histograms) == [
+        "READ: 2 responses, mean 8.25ms, p50 <= 2ms, p99 <= 20ms",
+        "WRITE: 1 responses, mean 1500.00ms, p50 <= 2000ms, p99 <= 2000ms",
+    ]
+
+
+def test_pending_requests_bounded():
+    tracker = SCPLatencyTracker(max_pending=4)
+    for seq in range(10):
+        tracker.request(scp(READ, seq), now=0.0)
+    stats = tracker.get_stats()
+    assert stats["scp_pending_requests"] == 4
+    assert stats["scp_abandoned_requests"] == 6
+    # The newest are the ones remembered
+    tracker.response(scp(0x80, 9), now=0.001)
+    tracker.response(scp(0x80, 0), now=0.001)
+    assert tracker.responses == 1
+    assert tracker.unmatched == 1
+
+
+@pytest.mark.parametrize("batch_size", [1, 8])
+def test_udp_proxy_traces(batch_size):
+    loop = EventLoop()
+    with udp_socket(bind_port=0) as board:
+        board.settimeout(2)
+        proxy = UDPtoUDP(0, ("localhost", board.getsockname()[1]),
+                         batch_size=batch_size)
+        proxy.scp_latency = SCPLatencyTracker()
+        proxy.attach(loop)
+        address = ("localhost", proxy.ext_sock.getsockname()[1])
+        try:
+            with udp_socket(connect_address=address) as host:
+                host.settimeout(2)
+                for seq in range(3):
+                    host.send(scp(READ, seq))
+                    loop.run_once(1)
+                    request, reply_to = board.recvfrom(64)
+                    board.sendto(scp(0x80, seq, data=b"result"), reply_to)
+                    loop.run_once(1)
+                    assert host.recv(64) == scp(0x80, seq, data=b"result")
+        finally:
+            proxy.close()
+            loop.close()
+    stats = proxy.get_stats()
+    assert stats["scp_responses"] == 3
+    assert stats["scp_pending_requests"] == 0
+    assert proxy.scp_latency.histograms[READ].count == 3
+
+
+def test_window_limits_outstanding():
+    sent = []
+    window = SCPWindow(2, max_queued=3)
+    for seq in range(6):
+        window.request(scp(READ, seq), sent.append, "a")
+    # Requests that want no response are not held up
+    window.request(scp(READ, 9, flags=0x07), sent.append, "a")
+    assert [parse_header(d)[2] for d in sent] == [0, 1, 9]
+    stats = window.get_stats()
+    assert stats["scp_window_outstanding"] == 2
+    assert stats["scp_window_queued"] == 3
+    assert stats["scp_window_dropped"] == 1
+
+    # A retry of an outstanding request goes at once; of a queued one, not
+    window.request(scp(READ, 0), sent.append, "a")
+    window.request(scp(READ, 3), sent.append, "a")
+    assert [parse_header(d)[2] for d in sent] == [0, 1, 9, 0]
+    assert window.resent == 2
+
+    # Each response lets the next request go
+    window.response(scp(0x80, 1), "b")
+    assert len(sent) == 4
+    window.response(scp(0x80, 1), "a")
+    window.response(scp(0x80, 0), "a")
+    assert [parse_header(d)[2] for d in sent] == [0, 1, 9, 0, 2, 3]
+    window.response(scp(0x80, 2), "a")
+    window.response(scp(0x80, 3), "a")
+    window.response(scp(0x80, 4), "a")
+    assert [parse_header(d)[2] for d in sent[6:]] == [4]
+    assert window.get_stats()["scp_window_outstanding"] == 0
+
+
+def test_window_times_out_requests():
+    loop = EventLoop()
+    sent = []
+    window = SCPWindow(1, timeout=0.02)
+    window.attach(loop)
+    try:
+        window.request(scp(READ, 1), sent.append)
+        window.request(scp(READ, 2), sent.append)
+        assert len(sent) == 1
+        # No response comes, so the next request goes after the timeout
+        spin_until(loop, lambda: len(sent) == 2, timeout=1, interval=0.1)
+        assert [parse_header(d)[2] for d in sent] == [1, 2]
+        assert window.timeouts == 1
+    finally:
+        window.close()
+        loop.close()
+
+
+@pytest.mark.parametrize("batch_size", [1, 8])
+def test_udp_proxy_window(batch_size):
+    loop = EventLoop()
+    with udp_socket(bind_port=0) as board:
+        board.settimeout(2)
+        proxy = UDPtoUDP(0, ("localhost", board.getsockname()[1]),
+                         batch_size=batch_size)
+        proxy.scp_window = SCPWindow(2)
+        proxy.attach(loop)
+        address = ("localhost", proxy.ext_sock.getsockname()[1])
+        try:
+            with udp_socket(connect_address=address) as host:
+                host.settimeout(2)
+                for seq in range(5):
+                    host.send(scp(READ, seq))
+                for _ in range(5):
+                    loop.run_once(0.01)
+                assert proxy.get_stats()["scp_window_queued"] == 3
+                for seq in range(5):
+                    request, reply_to = board.recvfrom(64)
+                    assert parse_header(request)[2] == seq
+                    board.sendto(scp(0x80, seq), reply_to)
+                    loop.run_once(1)
+                    assert parse_header(host.recv(64))[2] == seq
+                    loop.run_once(0)
+        finally:
+            proxy.close()
+            loop.close()
+    assert proxy.get_stats()["scp_window_outstanding"] == 0
+
+
+def test_tcp_proxy_window():
+    loop = EventLoop()
+    with udp_socket(bind_port=0) as board:
+        board.settimeout(2)
+        proxy = TCPtoUDP(0, ("localhost", board.getsockname()[1]))
+        proxy.scp_window = SCPWindow(1)
+        proxy.attach(loop)
+        protocol = TCPDatagramProtocol()
+        try:
+            with socket.create_connection(("localhost", (
+                    proxy.tcp_listen_sock.getsockname()[1]))) as client:
+                client.sendall(b"".join(
+                    protocol.send(scp(READ, seq)) for seq in range(3)))
+                for _ in range(5):
+                    loop.run_once(0.01)
+                assert proxy.get_stats()["scp_window_queued"] == 2
+                for seq in range(3):
+                    request = board.recv(64)
+                    assert parse_header(request)[2] == seq
+                    board.sendto(scp(0x80, seq), proxy.udp_sock.getsockname())
+                    loop.run_once(1)
+        finally:
+            proxy.close()
+            loop.close()
+    assert proxy.tcp_to_udp_packets == 3
+
+
+def test_dedup_answers_retries():
+    replies = []
+    dedup = SCPDeduplicator(in_flight_timeout=0.05, max_remembered=3)
+    assert dedup.request(scp(WRITE, 1, data=b"x"), replies.append, "a")
+    # A retry is absorbed while the original awaits its response...
+    assert not dedup.request(scp(WRITE, 1, data=b"x"), replies.append, "a")
+    # ... but not a different request, nor one from someone else
+    assert dedup.request(scp(READ, 2), replies.append, "a")
+    assert dedup.request(scp(WRITE, 1, data=b"x"), replies.append, "b")
+    # Requests that want no response are always passed on
+    assert dedup.request(scp(WRITE, 3, flags=0x07), replies.append, "a")
+    assert dedup.request(scp(WRITE, 3, flags=0x07), replies.append, "a")
+
+    # Once the response is known, retries are answered with it
+    dedup.response(scp(0x80, 1, data=b"ok"), "a")
+    assert not dedup.request(scp(WRITE, 1, data=b"x"), replies.append, "a")
+    assert replies == [scp(0x80, 1, data=b"ok")]
+    assert dedup.get_stats() == {
+        "scp_dedup_hits": 1, "scp_dedup_absorbed": 1, "scp_dedup_misses": 3}
+
+    # A retry long after the original must mean the original was lost
+    time.sleep(0.06)
+    assert dedup.request(scp(READ, 2), replies.append, "a")
+
+    # The oldest are forgotten when too many are remembered
+    for seq in range(10, 13):
+        dedup.request(scp(READ, seq), replies.append, "a")
+    dedup.response(scp(0x80, 1, data=b"ok"), "a")
+    assert dedup.request(scp(WRITE, 1, data=b"x"), replies.append, "a")
+    assert len(replies) == 1
+
+
+@pytest.mark.parametrize("batch_size", [1, 8])
+def test_udp_proxy_dedup(batch_size):
+    loop = EventLoop()
+    with udp_socket(bind_port=0) as board:
+        board.settimeout(2)
+        proxy = UDPtoUDP(0, ("localhost", board.getsockname()[1]),
+                         batch_size=batch_size)
+        proxy.scp_dedup = SCPDeduplicator()
+        proxy.attach(loop)
+        address = ("localhost", proxy.ext_sock.getsockname()[1])
+        try:
+            with udp_socket(connect_address=address) as host:
+                host.settimeout(2)
+                host.send(scp(WRITE, 7, data=b"data"))
+                loop.run_once(1)
+                request, reply_to = board.recvfrom(64)
+                # The host gives up waiting and tries again
+                host.send(scp(WRITE, 7, data=b"data"))
+                loop.run_once(1)
+                board.sendto(scp(0x80, 7), reply_to)
+                loop.run_once(1)
+                assert host.recv(64) == scp(0x80, 7)
+                # And again, having missed the response
+                host.send(scp(WRITE, 7, data=b"data"))
+                loop.run_once(1)
+                assert host.recv(64) == scp(0x80, 7)
+                board.settimeout(0.05)
+                with pytest.raises(socket.timeout):
+                    board.recv(64)
+        finally:
+            proxy.close()
+            loop.close()
+    stats = proxy.get_stats()
+    assert stats["scp_dedup_hits"] == 1
+    assert stats["scp_dedup_absorbed"] == 1
+    assert stats["ext_to_int_packets"] == 1
+
+
+def read(seq, address, length=4):
+    """ Make an SCP READ request.
+    """
+    return scp(READ, seq, data=struct.pack("<III", address, length, 2))
+
+
+def test_parse_cache_rule():
+    rule = parse_cache_rule("READ@0xf5007f00-0xf5008000=2.5")
+    assert (rule.command, rule.start, rule.end, rule.ttl) == (
+        READ, 0xf5007f00, 0xf5008000, 2.5)
+    assert repr(rule) == "READ@0xf5007f00-0xf5008000=2.5"
+    rule = parse_cache_rule("31")
+    assert (rule.command, rule.start) == (31, None)
+    for bad in ("NOPE", "READ@1", "READ@2-1", "VER=0", "VER=x"):
+        with pytest.raises(ValueError):
+            parse_cache_rule(bad)
+
+
+def test_cache_answers_identical_requests():
+    replies = []
+    cache = SCPResponseCache(
+        [CacheRule(READ, 0x1000, 0x2000, ttl=0.05)], max_entries=2)
+    # Only allowed requests are cached
+    assert cache.request(read(1, 0x3000), replies.append, "a")
+    assert cache.request(scp(WRITE, 2), replies.append, "a")
+    assert cache.request(read(3, 0x1000), replies.append, "a")
+    cache.response(scp(0x80, 3, data=b"data"), "a")
+    # The cached response has the new request's sequence number
+    assert not cache.request(read(4, 0x1000), replies.append, "b")
+    assert replies == [scp(0x80, 4, data=b"data")]
+    assert cache.get_stats() == {
+        "scp_cache_hits": 1, "scp_cache_misses": 1,
+        "scp_cache_invalidations": 0, "scp_cache_entries": 1}
+
+    # Failures are not cached
+    assert cache.request(read(5, 0x1004), replies.append, "a")
+    cache.response(scp(0x81, 5), "a")
+    assert cache.request(read(6, 0x1004), replies.append, "a")
+
+    # The least recently used are forgotten first
+    cache.response(scp(0x80, 6), "a")
+    cache.request(read(7, 0x1000), replies.append, "a")
+    cache.request(read(8, 0x1008), replies.append, "a")
+    cache.response(scp(0x80, 8), "a")
+    assert not cache.request(read(9, 0x1000), replies.append, "a")
+    assert cache.request(read(10, 0x1004), replies.append, "a")
+
+    # Responses go stale, and booting empties the cache
+    time.sleep(0.06)
+    assert cache.request(read(11, 0x1000), replies.append, "a")
+    cache.response(scp(0x80, 11), "a")
+    cache.invalidate()
+    assert cache.request(read(12, 0x1000), replies.append, "a")
+    assert cache.invalidations == 1
+
+
+def test_tcp_client_cache():
+    loop = EventLoop()
+    with socket.socket() as server:
+        server.bind(("localhost", 0))
+        server.listen(1)
+        proxy = UDPtoTCP(0, ("localhost", server.getsockname()[1]))
+        proxy.scp_cache = SCPResponseCache()
+        proxy.attach(loop)
+        protocol = TCPDatagramProtocol()
+        address = ("localhost", proxy.udp_sock.getsockname()[1])
+        try:
+            tunnel, _ = server.accept()
+            with tunnel, udp_socket(connect_address=address) as host:
+                host.settimeout(2)
+                tunnel.settimeout(2)
+                host.send(scp(0, 1))
+                loop.run_once(1)
+                assert protocol.recv_into(tunnel, 64)
+                assert [bytes(d) for d in protocol.frames()] == [scp(0, 1)]
+                tunnel.sendall(protocol.send(scp(0x80, 1, data=b"ver")))
+                loop.run_once(1)
+                assert host.recv(64) == scp(0x80, 1, data=b"ver")
+                # Asked again, the proxy answers by itself
+                host.send(scp(0, 2))
+                loop.run_once(1)
+                assert host.recv(64) == scp(0x80, 2, data=b"ver")
+        finally:
+            proxy.close()
+            loop.close()
+    assert proxy.udp_to_tcp_packets == 1
+    assert proxy.get_stats()["scp_cache_hits"] == 1
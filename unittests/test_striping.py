@@ -0,0 +1,156 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import pytest
+
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.striping import (
+    HELLO, STRIPE_LEAST_QUEUED, STRIPE_ROUND_ROBIN, StripedDatagramProtocol,
+    StripedTCPtoUDP, StripedUDPtoTCP)
+from spinnaker_proxy.support import udp_socket
+from unittests import spin_until, wait_for
+# pylint: disable=protected-access, unused-argument
+
+
+def test_protocol_round_trip():
+    sender = StripedDatagramProtocol()
+    receiver = StripedDatagramProtocol()
+    data = b"".join(sender.hello(1234, 1, 3) + sender.encode(b"abc", 7) +
+                    sender.encode(b"", 8))
+    frames = list(receiver.recv(data[:-3])) + list(receiver.recv(data[-3:]))
+    assert [seq for seq, _ in frames] == [HELLO, 7, 8]
+    assert [datagram for _, datagram in frames[1:]] == [b"abc", b""]
+
+
+@pytest.mark.parametrize("policy", [STRIPE_ROUND_ROBIN, STRIPE_LEAST_QUEUED])
+def test_choose_stripe(policy, do_not_connect):
+    proxy = StripedUDPtoTCP(0, ("localhost", 1), stripes=3, policy=policy,
+                            high_watermark=100)
+    try:
+        for stripe in proxy.stripes:
+            stripe.queue.clear()
+        # Taking turns while all are equal
+        assert [proxy._choose_stripe() for _ in range(4)] == \
+            proxy.stripes + proxy.stripes[:1]
+        proxy.stripes[1].queue.push([bytes(100)])
+        proxy.stripes[2].queue.push([bytes(10)])
+        chosen = [proxy._choose_stripe() for _ in range(3)]
+        if policy == STRIPE_ROUND_ROBIN:
+            # The full one is skipped
+            assert chosen == [proxy.stripes[i] for i in (2, 0, 2)]
+        else:
+            assert chosen == [proxy.stripes[0]] * 3
+    finally:
+        proxy.close()
+
+
+def test_reordering():
+    server = StripedTCPtoUDP(0, ("localhost", 1), ordered=True)
+    forwarded = []
+    server._forward_udp = forwarded.append
+    try:
+        server._receive(2, b"c")
+        server._receive(3, b"d")
+        assert forwarded == []
+        assert server.get_stats()["tcp_reorder_held"] == 2
+        server._receive(0, b"a")
+        server._receive(1, b"b")
+        assert forwarded == [b"a", b"b", b"c", b"d"]
+        # Duplicates are not passed on again
+        server._receive(1, b"b")
+        assert len(forwarded) == 4
+        stats = server.get_stats()
+        assert stats["reordered_datagrams"] == 2
+        assert stats["tcp_reorder_held"] == 0
+    finally:
+        server.close()
+
+
+def test_striped_tunnel():
+    with udp_socket(bind_port=0) as target:
+        server = StripedTCPtoUDP(
+            0, ("localhost", target.getsockname()[1]), ordered=True)
+        client = StripedUDPtoTCP(
+            0, ("localhost", server.tcp_listen_sock.getsockname()[1]),
+            stripes=3, ordered=True)
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=run_proxies, args=([server, client], stop))
+        thread.start()
+        try:
+            wait_for(lambda: len(server.stripes) == 3)
+            with udp_socket(connect_address=(
+                    "localhost", client.udp_sock.getsockname()[1])) as host:
+                target.settimeout(2)
+                datagrams = [bytes([i]) * (i + 1) for i in range(200)]
+                for datagram in datagrams:
+                    host.send(datagram)
+                received = []
+                while len(received) < len(datagrams):
+                    datagram, address = target.recvfrom(1000)
+                    received.append(datagram)
+                # In order, though spread over the connections
+                assert received == datagrams
+                for datagram in datagrams[:10]:
+                    target.sendto(datagram, address)
+                host.settimeout(2)
+                assert [host.recv(100) for _ in range(10)] == datagrams[:10]
+            # Counted just after being sent
+            wait_for(lambda: client.get_stats()["tcp_to_udp_packets"] == 10)
+            stats = server.get_stats()
+            assert stats["tcp_stripes"] == 3
+            assert stats["tcp_connections"] == 3
+            assert stats["tcp_to_udp_packets"] == 200
+        finally:
+            stop.set()
+            thread.join(2)
+
+
+def test_new_client_replaces_old():
+    loop = EventLoop()
+    with udp_socket(bind_port=0) as target:
+        server = StripedTCPtoUDP(0, ("localhost", target.getsockname()[1]))
+        address = ("localhost", server.tcp_listen_sock.getsockname()[1])
+        old = StripedUDPtoTCP(0, address, stripes=2)
+        server.attach(loop)
+        old.attach(loop)
+        spin_until(loop, lambda: server.client_id == old.client_id)
+        new = StripedUDPtoTCP(0, address, stripes=2)
+        new.attach(loop)
+        spin_until(loop, lambda: server.client_id == new.client_id and
+                   len(server.stripes) == 2)
+        # The old client sees its connections closed, and closes
+        spin_until(loop, lambda: old.udp_sock is None)
+        with udp_socket(connect_address=(
+                "localhost", new.udp_sock.getsockname()[1])) as host:
+            host.send(b"hello")
+            target.setblocking(False)
+            received = []
+
+            def receive():
+                try:
+                    received.append(target.recv(100))
+                except BlockingIOError:
+                    pass
+                return received
+
+            spin_until(loop, receive)
+            assert received == [b"hello"]
+        assert server.get_stats()["tcp_connections"] == 4
+        server.close()
+        new.close()
+    loop.close()
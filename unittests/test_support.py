@@ -0,0 +1,116 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+import struct
+
+from spinnaker_proxy.support import MuxDatagramProtocol, TCPDatagramProtocol
+# pylint: disable=protected-access
+
+LENGTH = struct.Struct("!I")
+
+
+def _encode(*datagrams):
+    return b"".join(LENGTH.pack(len(d)) + d for d in datagrams)
+
+
+def test_recv_many_in_one_chunk():
+    datagrams = [bytes([i]) * i for i in range(100)]
+    protocol = TCPDatagramProtocol()
+    assert list(protocol.recv(_encode(*datagrams))) == datagrams
+
+
+def test_recv_byte_by_byte():
+    datagrams = [b"hello", b"", b"world" * 100]
+    protocol = TCPDatagramProtocol()
+    received = []
+    for byte in _encode(*datagrams):
+        received.extend(protocol.recv(bytes([byte])))
+    assert received == datagrams
+
+
+def test_buffer_compacts_and_grows():
+    protocol = TCPDatagramProtocol(capacity=16)
+    # Larger than the initial buffer
+    big = bytes(range(256)) * 4
+    data = _encode(b"abc", big, b"def")
+    received = []
+    # Feed in awkwardly sized pieces so partial datagrams get moved about
+    for i in range(0, len(data), 7):
+        received.extend(protocol.recv(data[i:i + 7]))
+    assert received == [b"abc", big, b"def"]
+    # Once everything is consumed, the buffer is reused from the start
+    assert protocol._start == protocol._end == 0
+
+
+def test_frames_are_views():
+    protocol = TCPDatagramProtocol()
+    with protocol.get_buffer(64) as buf:
+        data = _encode(b"one", b"two")
+        buf[:len(data)] = data
+    protocol.buffer_updated(len(data))
+    frames = []
+    for frame in protocol.frames():
+        assert isinstance(frame, memoryview)
+        frames.append(bytes(frame))
+    assert frames == [b"one", b"two"]
+
+
+def test_recv_into_and_sendmsg():
+    a, b = socket.socketpair()
+    with a, b:
+        sender = TCPDatagramProtocol()
+        receiver = TCPDatagramProtocol()
+        sender.sendmsg(a, b"hello")
+        sender.sendmsg(a, b"")
+        sender.sendmsg(a, b"world")
+        received = []
+        while len(received) < 3:
+            assert receiver.recv_into(b, 4096) > 0
+            received.extend(bytes(f) for f in receiver.frames())
+        assert received == [b"hello", b"", b"world"]
+
+        # Zero means closed
+        a.close()
+        assert receiver.recv_into(b, 4096) == 0
+
+
+def test_send_compatible_with_encode():
+    protocol = TCPDatagramProtocol()
+    assert protocol.send(b"xyz") == b"".join(protocol.encode(b"xyz"))
+
+
+def test_mux_round_trip():
+    a, b = socket.socketpair()
+    with a, b:
+        sender = MuxDatagramProtocol()
+        receiver = MuxDatagramProtocol()
+        sender.sendmsg(a, b"scp", 0)
+        sender.sendmsg(a, b"boot", 1)
+        a.sendall(sender.send(b"", 17900))
+        received = []
+        while len(received) < 3:
+            assert receiver.recv_into(b, 4096) > 0
+            received.extend((c, bytes(f)) for c, f in receiver.frames())
+        assert received == [(0, b"scp"), (1, b"boot"), (17900, b"")]
+
+
+def test_mux_recv_byte_by_byte():
+    protocol = MuxDatagramProtocol()
+    data = protocol.send(b"hello", 3) + protocol.send(b"world", 65535)
+    received = []
+    for byte in data:
+        received.extend(protocol.recv(bytes([byte])))
+    assert received == [(3, b"hello"), (65535, b"world")]
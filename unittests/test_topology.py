@@ -0,0 +1,86 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import pytest
+
+from spinnaker_proxy.topology import (
+    Board, check_ports, parse_topology, read_topology)
+
+DEFAULTS = {
+    "name": None, "target": "board", "scp": "udp", "boot": "udp",
+    "multiplex": False, "extra_ports": [], "scp_port": 17893,
+    "boot_port": 54321, "scp_tunnel_port": 17894, "boot_tunnel_port": 17895,
+    "mux_tunnel_port": 17896,
+}
+
+
+def test_defaults_and_names(tmp_path):
+    path = tmp_path / "topology.json"
+    path.write_text(json.dumps({
+        "defaults": {"boot": "tcp"},
+        "boards": [
+            {"name": "a", "target": "10.0.0.1", "scp_tunnel_port": 20000,
+             "boot_tunnel_port": 20001},
+            {"target": "10.0.0.2", "boot": "udp", "multiplex": True,
+             "mux_tunnel_port": 20002, "extra_ports": [17900]},
+        ]}))
+    a, b = [board.resolve(DEFAULTS) for board in read_topology(str(path))]
+    assert (a.name, a.target, a.scp, a.boot) == ("a", "10.0.0.1", "udp", "tcp")
+    assert (a.scp_tunnel_port, a.boot_tunnel_port) == (20000, 20001)
+    # Boards are named by position if not given a name
+    assert (b.name, b.boot, b.multiplex) == ("1", "udp", True)
+    assert b.scp_port == 17893
+    assert b.extra_ports == [17900]
+    check_ports([a, b], server=True)
+    assert b.listening_ports(server=False) == [17893, 54321, 17900]
+
+
+@pytest.mark.parametrize("data, message", [
+    ([], "boards list"),
+    ({"boards": [], "extra": 1}, "unknown topology keys: extra"),
+    ({"boards": [{"colour": "red"}]}, "unknown settings for board 0"),
+    ({"boards": [{"scp": "sctp"}]}, "scp must be one of udp, tcp"),
+    ({"boards": [{"scp_port": 70000}]}, "scp_port must be a port number"),
+    ({"boards": [{"extra_ports": ["x"]}]}, "extra_ports must be a port"),
+    ({"boards": [{"extra_ports": [1]}]},
+     "extra_ports must be greater than 1, not 1"),
+    ({"boards": [{"name": "a"}, {"name": "a"}]}, "more than one board"),
+])
+def test_invalid_topologies(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_topology(data)
+
+
+def test_missing_target():
+    board = Board(name="a")
+    with pytest.raises(ValueError, match="board a has no target"):
+        board.resolve(dict(DEFAULTS, target=None))
+
+
+def test_port_clashes():
+    boards = [board.resolve(DEFAULTS) for board in parse_topology({
+        "boards": [{"name": "a", "scp_tunnel_port": 20000},
+                   {"name": "b", "boot_tunnel_port": 20000}]})]
+    with pytest.raises(ValueError, match="a and b would both use port 20000"):
+        check_ports(boards, server=True)
+    # As clients, both would listen on the default SCP and boot ports
+    with pytest.raises(ValueError, match="port 17893"):
+        check_ports(boards, server=False)
+
+
+def test_extra_ports_not_on_mux_channels():
+    with pytest.raises(ValueError, match="greater than 1, not 0"):
+        Board(name="a", extra_ports=[0])
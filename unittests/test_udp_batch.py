@@ -0,0 +1,74 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+import time
+import pytest
+
+from spinnaker_proxy.proxies import UDPtoUDP
+from spinnaker_proxy.spinnaker_proxy import run_proxies
+from spinnaker_proxy.support import udp_socket
+from spinnaker_proxy.udp_batch import (
+    HAVE_MMSG, MMsgDatagramBatch, PortableDatagramBatch)
+from .test_proxy_chain import Runner
+
+BATCH_CLASSES = [PortableDatagramBatch] + (
+    [MMsgDatagramBatch] if HAVE_MMSG else [])
+
+
+@pytest.mark.parametrize("batch_class", BATCH_CLASSES)
+def test_recv_and_forward(batch_class):
+    with udp_socket(bind_port=0) as src, udp_socket(bind_port=0) as dst, \
+            udp_socket(bind_port=0) as out:
+        dst_address = ("127.0.0.1", dst.getsockname()[1])
+        datagrams = [bytes([i]) * (i + 1) for i in range(6)]
+        for d in datagrams:
+            src.sendto(d, dst_address)
+        time.sleep(0.1)
+
+        batch = batch_class(4, 64)
+        # No more than the batch size at a time
+        assert batch.recv(dst) == 4
+        assert [bytes(batch.datagram(i)) for i in range(4)] == datagrams[:4]
+        assert batch.address(3) == ("127.0.0.1", src.getsockname()[1])
+        # Forward some, not starting from the beginning
+        batch.forward(dst, 2, ("localhost", out.getsockname()[1]), start=1)
+        assert [out.recv(64) for _ in range(2)] == datagrams[1:3]
+
+        assert batch.recv(dst) == 2
+        assert [bytes(batch.datagram(i)) for i in range(2)] == datagrams[4:]
+        # Nothing waiting is not an error
+        assert batch.recv(dst) == 0
+
+
+def test_batched_proxy():
+    proxy = UDPtoUDP(0, ("localhost", 12372), batch_size=8)
+    port = proxy.ext_sock.getsockname()[1]
+    with udp_socket(bind_port=12372) as r:
+        with Runner(partial(run_proxies, [proxy])):
+            with udp_socket(connect_address=("localhost", port)) as s:
+                r.settimeout(2)
+                s.settimeout(2)
+                datagrams = [bytes([i]) * 10 for i in range(20)]
+                for d in datagrams:
+                    s.send(d)
+                received = []
+                for _ in datagrams:
+                    m, a = r.recvfrom(32)
+                    received.append(m)
+                assert received == datagrams
+                for d in datagrams:
+                    r.sendto(d, a)
+                assert [s.recv(32) for _ in datagrams] == datagrams
@@ -0,0 +1,127 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import pytest
+
+from spinnaker_proxy.event_loop import EventLoop
+from spinnaker_proxy.proxies import UDPtoUDP
+from spinnaker_proxy.support import udp_socket
+# pylint: disable=protected-access
+
+
+class _Fixture(object):
+    """ A UDP to UDP proxy on a loop, in front of a "board", with some hosts.
+    """
+
+    def __init__(self, hosts, **kwargs):
+        self.board = udp_socket(bind_port=0)
+        self.board.settimeout(2)
+        self.loop = EventLoop()
+        self.proxy = UDPtoUDP(
+            0, ("localhost", self.board.getsockname()[1]), **kwargs)
+        self.proxy.attach(self.loop)
+        address = ("localhost", self.proxy.ext_sock.getsockname()[1])
+        self.hosts = [udp_socket(connect_address=address)
+                      for _ in range(hosts)]
+        for host in self.hosts:
+            host.settimeout(2)
+
+    def spin(self, times=20):
+        for _ in range(times):
+            self.loop.run_once(0.01)
+
+    def close(self):
+        self.proxy.close()
+        self.loop.close()
+        self.board.close()
+        for host in self.hosts:
+            host.close()
+
+
+@pytest.fixture
+def fixture():
+    fixtures = []
+
+    def make(hosts, **kwargs):
+        f = _Fixture(hosts, **kwargs)
+        fixtures.append(f)
+        return f
+    yield make
+    for f in fixtures:
+        f.close()
+
+
+@pytest.mark.parametrize("batch_size", [1, 8])
+def test_replies_go_to_right_host(fixture, batch_size):
+    f = fixture(3, batch_size=batch_size)
+    for i, host in enumerate(f.hosts):
+        host.send(b"from %d" % i)
+    f.spin()
+    # Each host appears to the board as a different address
+    requests = [f.board.recvfrom(32) for _ in f.hosts]
+    assert len(set(a for _, a in requests)) == 3
+    # Reply in a different order to that in which they were sent
+    for datagram, address in reversed(requests):
+        f.board.sendto(b"reply to " + datagram, address)
+    f.spin()
+    for i, host in enumerate(f.hosts):
+        assert host.recv(32) == b"reply to from %d" % i
+    assert f.proxy.get_stats() == {
+        "udp_sessions": 3,
+        "udp_sessions_created": 3,
+        "udp_sessions_evicted": 0,
+        "ext_to_int_packets": 3,
+        "ext_to_int_bytes": 18,
+        "int_to_ext_packets": 3,
+        "int_to_ext_bytes": 45,
+        "udp_errors": 0,
+    }
+
+
+def test_least_recently_used_evicted(fixture):
+    f = fixture(3, max_sessions=2)
+    first, second, third = f.hosts
+    first.send(b"1")
+    f.spin()
+    second.send(b"2")
+    f.spin()
+    # Using the first host's session makes the second the oldest
+    first.send(b"1")
+    f.spin()
+    third.send(b"3")
+    f.spin()
+    assert f.proxy.get_stats()["udp_sessions_evicted"] == 1
+    assert set(f.proxy._sessions) == {
+        first.getsockname(), third.getsockname()}
+
+
+def test_idle_sessions_expire(fixture):
+    f = fixture(1, session_timeout=0.5)
+    f.hosts[0].send(b"x")
+    f.spin(2)
+    assert f.proxy.get_stats()["udp_sessions"] == 1
+    assert len(f.loop) == 2
+    time.sleep(0.6)
+    f.spin(30)
+    assert f.proxy.get_stats()["udp_sessions"] == 0
+    assert f.proxy.get_stats()["udp_sessions_evicted"] == 1
+    # The session's socket is closed and no longer watched
+    assert len(f.loop) == 1
+
+    # A host coming back gets a new session
+    f.hosts[0].send(b"y")
+    f.spin()
+    assert f.proxy.get_stats()["udp_sessions_created"] == 2
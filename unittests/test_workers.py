@@ -0,0 +1,122 @@
+# Copyright (c) 2026 The University of Manchester
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import signal
+import socket
+import threading
+import pytest
+
+from spinnaker_proxy.proxies import UDPtoUDP
+from spinnaker_proxy.support import udp_socket
+from spinnaker_proxy.workers import Supervisor, sum_stats
+from unittests import wait_for
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "SO_REUSEPORT"), reason="needs SO_REUSEPORT")
+
+
+def _free_udp_port():
+    with udp_socket(bind_port=0) as s:
+        return s.getsockname()[1]
+
+
+def test_sum_stats():
+    assert sum_stats([{"a": 1, "b": 2}, {"a": 3}, {}]) == {"a": 4, "b": 2}
+    assert sum_stats([{"fec_loss_ppm": 100, "fec_recovered_datagrams": 1},
+                      {"fec_loss_ppm": 20, "fec_recovered_datagrams": 2}]) \
+        == {"fec_loss_ppm": 100, "fec_recovered_datagrams": 3}
+
+
+class _Fixture(object):
+    """ A supervisor running a UDP to UDP proxy in two workers (sharing a\
+        port) in front of a "board" that echoes back datagrams.
+    """
+
+    def __init__(self):
+        self.board = udp_socket(bind_port=0)
+        self.board.settimeout(2)
+        board_address = ("localhost", self.board.getsockname()[1])
+        self.port = _free_udp_port()
+
+        def make_proxies(index):
+            return [UDPtoUDP(self.port, board_address, reuse_port=True)]
+        self.supervisor = Supervisor(make_proxies, 2, stats_interval=0.05)
+        self.supervisor.RESTART_DELAY = 0.1
+        self.stop = threading.Event()
+        self.thread = threading.Thread(
+            target=self.supervisor.run, args=(self.stop, ))
+        self.thread.start()
+        # Until every worker has its socket, the kernel may move flows
+        # between workers as they bind
+        wait_for(lambda: self.supervisor.get_stats()["workers"] == 2 and
+                 all(self.supervisor._stats))
+
+    def round_trips(self, hosts):
+        """ Send from many hosts, echo everything back, and check each host\
+            gets its own reply.
+        """
+        for i, host in enumerate(hosts):
+            host.send(b"%d" % i)
+        for _ in hosts:
+            datagram, address = self.board.recvfrom(32)
+            self.board.sendto(datagram, address)
+        for i, host in enumerate(hosts):
+            assert host.recv(32) == b"%d" % i
+
+    def close(self):
+        self.stop.set()
+        self.thread.join(5)
+        self.board.close()
+
+
+@pytest.fixture
+def fixture():
+    f = _Fixture()
+    yield f
+    f.close()
+
+
+def test_flows_keep_affinity(fixture):
+    hosts = [udp_socket(connect_address=("localhost", fixture.port))
+             for _ in range(16)]
+    try:
+        for host in hosts:
+            host.settimeout(2)
+        # Repeatedly, so that each host's session is reused
+        for _ in range(3):
+            fixture.round_trips(hosts)
+        # Each host had one session, in whichever worker it went to
+        wait_for(lambda: fixture.supervisor.get_stats().get(
+            "udp_sessions_created") == len(hosts))
+        # The proxies in each worker have the same name, so their counters
+        # are exported together
+        wait_for(lambda: fixture.supervisor.get_proxy_stats().get(
+            "UDPtoUDP-0", {}).get("ext_to_int_packets") == 3 * len(hosts))
+    finally:
+        for host in hosts:
+            host.close()
+
+
+def test_crashed_worker_restarted(fixture):
+    victim = fixture.supervisor._processes[0].pid
+    os.kill(victim, signal.SIGKILL)
+    wait_for(lambda: fixture.supervisor.restarts == 1)
+    wait_for(lambda: fixture.supervisor.get_stats()["workers"] == 2)
+    assert fixture.supervisor._processes[0].pid != victim
+
+    with udp_socket(connect_address=("localhost", fixture.port)) as host:
+        host.settimeout(2)
+        fixture.round_trips([host])